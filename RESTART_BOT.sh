@@ -15,7 +15,11 @@ BOT_PID=$(pgrep -f "python.*bot.py")
 if [ ! -z "$BOT_PID" ]; then
     echo "⏹️  Остановка бота (PID: $BOT_PID)..."
     kill $BOT_PID
-    sleep 2
+    # Ждем штатного завершения: бот сохраняет незавершенные диалоги в БД
+    for i in $(seq 1 30); do
+        ps -p $BOT_PID > /dev/null || break
+        sleep 1
+    done
     echo "✅ Бот остановлен"
 else
     echo "ℹ️  Бот не запущен"
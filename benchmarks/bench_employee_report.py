@@ -0,0 +1,122 @@
+"""
+Бенчмарк отчета по сотруднику на синтетической БД
+
+Сравнивает прежний вариант отчета (отдельный запрос исполнителей на каждое
+подключение) с текущим ConnectionRepository.get_employee_report, который
+получает подключения вместе с исполнителями одним запросом.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_employee_report --connections 100000
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from database import Database
+
+EMPLOYEES = 20
+
+
+def _seed(db: Database, connections: int) -> None:
+    """Заполнить БД подключениями напрямую, минуя списание материалов"""
+    rng = random.Random(42)
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO employees (full_name) VALUES (?)",
+            [(f"Сотрудник {i:02d}",) for i in range(EMPLOYEES)]
+        )
+        conn.executemany(
+            """
+            INSERT INTO connections
+            (connection_type, address, router_model, port, fiber_meters,
+             twisted_pair_meters, created_by, created_at)
+            VALUES ('mkd', ?, 'Router', '1', 100, 20, 1,
+                    datetime('2020-01-01', '+' || ? || ' minutes'))
+            """,
+            ((f"ул. Синтетическая, {i}", i * 20) for i in range(1, connections + 1))
+        )
+        links = []
+        for connection_id in range(1, connections + 1):
+            for emp_id in rng.sample(range(1, EMPLOYEES + 1), rng.choice((1, 1, 2, 3))):
+                links.append((connection_id, emp_id))
+        conn.executemany(
+            "INSERT INTO connection_employees (connection_id, employee_id) VALUES (?, ?)",
+            links
+        )
+
+
+def legacy_report(db: Database, employee_id: int) -> Tuple[List[Dict], Dict]:
+    """Прежняя реализация отчета: N+1 запрос исполнителей"""
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT 
+                c.id, c.connection_type, c.address, c.router_model, c.port,
+                c.fiber_meters, c.twisted_pair_meters, c.created_at,
+                COUNT(DISTINCT ce.employee_id) as employee_count
+            FROM connections c
+            JOIN connection_employees ce ON c.id = ce.connection_id
+            WHERE ce.connection_id IN (
+                SELECT connection_id FROM connection_employees WHERE employee_id = ?
+            )
+            GROUP BY c.id
+            ORDER BY c.created_at DESC
+        """, (employee_id,))
+
+        connections = []
+        for row in cursor.fetchall():
+            conn_dict = dict(row)
+            cursor.execute("""
+                SELECT e.full_name
+                FROM employees e
+                JOIN connection_employees ce ON e.id = ce.employee_id
+                WHERE ce.connection_id = ?
+                ORDER BY e.full_name
+            """, (conn_dict['id'],))
+            conn_dict['all_employees'] = [r['full_name'] for r in cursor.fetchall()]
+            connections.append(conn_dict)
+    return connections, {}
+
+
+def _measure(func, repeats: int) -> Tuple[float, int]:
+    """Медиана времени выполнения в мс и количество строк отчета"""
+    timings = []
+    rows = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        connections, _ = func()
+        timings.append((time.perf_counter() - started) * 1000)
+        rows = len(connections)
+    return statistics.median(timings), rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=100_000, help="Подключений в синтетической БД")
+    parser.add_argument('--repeats', type=int, default=5, help="Повторов каждого варианта")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        _seed(db, args.connections)
+
+        employee_id = 1
+        before, rows = _measure(lambda: legacy_report(db, employee_id), args.repeats)
+        after, _ = _measure(lambda: db.get_employee_report(employee_id), args.repeats)
+        db.close()
+
+    print(f"Подключений в БД: {args.connections}, в отчете сотрудника: {rows}")
+    print(f"До (N+1 запрос):    {before:8.1f} мс")
+    print(f"После (один запрос): {after:8.1f} мс")
+    print(f"Ускорение: x{before / after:.1f}")
+
+
+if __name__ == '__main__':
+    main()
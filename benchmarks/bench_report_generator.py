@@ -0,0 +1,177 @@
+"""
+Бенчмарк Excel-отчета по сотруднику на синтетической БД
+
+Сравнивает прежний генератор (списки из БД, обычная книга openpyxl и стили
+на каждую ячейку) с потоковым ReportGenerator.stream_employee_report, который
+пишет книгу в режиме write_only прямо из курсоров. Каждый вариант
+выполняется в отдельном процессе; печатаются время и прирост пикового RSS.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_report_generator --rows 50000
+"""
+import argparse
+import logging
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Tuple
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+from database import Database
+from report_generator import ReportGenerator
+
+START = datetime(2020, 1, 1)
+END = datetime(2100, 1, 1)
+
+
+def _seed(db: Database, rows: int) -> None:
+    """Один сотрудник с rows подключениями и rows движениями материалов"""
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO employees (full_name) VALUES ('Сотрудник Отчетов')")
+        conn.executemany(
+            """
+            INSERT INTO connections
+            (connection_type, address, router_model, port, fiber_meters,
+             twisted_pair_meters, created_by, created_at)
+            VALUES ('mkd', ?, 'Router', '1', 100, 20, 1,
+                    datetime('2020-01-01', '+' || ? || ' minutes'))
+            """,
+            ((f"ул. Синтетическая, {i}", i * 20) for i in range(1, rows + 1))
+        )
+        conn.executemany(
+            "INSERT INTO connection_employees (connection_id, employee_id) VALUES (?, 1)",
+            ((i,) for i in range(1, rows + 1))
+        )
+        conn.executemany(
+            """
+            INSERT INTO material_movement_log
+            (employee_id, operation_type, item_type, item_name, quantity,
+             balance_after, connection_id, created_at)
+            VALUES (1, 'deduct', 'fiber', 'ВОЛС', 100, 0, ?,
+                    datetime('2020-01-01', '+' || ? || ' minutes'))
+            """,
+            ((i, i * 20) for i in range(1, rows + 1))
+        )
+
+
+def legacy_report(db: Database, employee_id: int) -> int:
+    """Прежняя схема: все строки в памяти, стили назначаются каждой ячейке"""
+    connections, stats = db.get_employee_report(employee_id, start_date=START, end_date=END)
+    movements = db.get_employee_movements(employee_id, START, END)
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Отчет"
+    border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                    top=Side(style='thin'), bottom=Side(style='thin'))
+    cell_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    number_alignment = Alignment(horizontal='right', vertical='center')
+
+    for row, conn in enumerate(connections, 7):
+        values = [row - 6, conn['connection_type'], ', '.join(conn['all_employees']),
+                  conn['address'], conn['router_model'], str(conn['port']),
+                  conn['employee_fiber_meters'], conn['employee_twisted_pair_meters'],
+                  conn['created_at']]
+        for col, value in enumerate(values, 1):
+            cell = ws.cell(row=row, column=col, value=value)
+            cell.border = border
+            if col in (7, 8):
+                cell.alignment = number_alignment
+                cell.number_format = '0.00'
+            else:
+                cell.alignment = cell_alignment
+
+    total_row = len(connections) + 8
+    for col, value in ((6, stats['total_fiber_meters']), (7, stats['total_twisted_pair_meters'])):
+        cell = ws.cell(row=total_row, column=col, value=value)
+        cell.font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
+
+    ws = wb.create_sheet(title="Движение материалов")
+    deduct_fill = PatternFill(start_color="FCE4D6", end_color="FCE4D6", fill_type="solid")
+    for row, mov in enumerate(movements, 6):
+        values = [mov['created_at'], mov['operation_type'], mov['item_type'], mov['item_name'],
+                  f"{mov['quantity']} м", f"{mov['balance_after']} м", mov['connection_id']]
+        for col, value in enumerate(values, 1):
+            cell = ws.cell(row=row, column=col, value=value)
+            cell.border = border
+            cell.fill = deduct_fill
+            cell.alignment = number_alignment if col in (5, 6) else cell_alignment
+
+    filename = 'legacy_report.xlsx'
+    wb.save(filename)
+    size = os.path.getsize(filename)
+    os.remove(filename)
+    return size
+
+
+def streaming_report(db: Database, employee_id: int) -> int:
+    """Текущая схема: write_only книга из курсоров БД в буфер"""
+    buffer, _ = ReportGenerator.stream_employee_report(
+        db, employee_id, 'Сотрудник Отчетов', 'Все время', START, END
+    )
+    with buffer:
+        return buffer.seek(0, os.SEEK_END)
+
+
+VARIANTS = {
+    'legacy': legacy_report,
+    'streaming': streaming_report,
+}
+
+
+def _measure(variant: str, db_path: str, workdir: str) -> Tuple[float, float, int]:
+    """
+    Выполнить вариант в текущем (дочернем) процессе
+
+    Returns:
+        Tuple: (время в секундах, прирост пикового RSS в МиБ, размер файла в КиБ)
+    """
+    logging.disable(logging.WARNING)
+    os.chdir(workdir)  # Прежний генератор пишет файл в текущий каталог
+    db = Database(db_path)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    size = VARIANTS[variant](db, 1)
+    elapsed = time.perf_counter() - started
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    db.close()
+    return elapsed, (rss_after - rss_before) / 1024, size // 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50_000, help="Подключений и движений в отчете")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        db = Database(db_path)
+        _seed(db, args.rows)
+        db.close()
+
+        results = {}
+        for variant in VARIANTS:
+            # Свежий процесс на вариант, чтобы пиковый RSS не накапливался
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                results[variant] = pool.submit(_measure, variant, db_path, tmp).result()
+
+    before, after = results['legacy'], results['streaming']
+    print(f"Строк в отчете: {args.rows} подключений + {args.rows} движений")
+    print(f"До (обычная книга):  {before[0]:6.2f} с, пик RSS +{before[1]:6.1f} МиБ, файл {before[2]} КиБ")
+    print(f"После (write_only):  {after[0]:6.2f} с, пик RSS +{after[1]:6.1f} МиБ, файл {after[2]} КиБ")
+    print(f"Ускорение: x{before[0] / after[0]:.1f}, память: {before[1]:.0f} -> {after[1]:.0f} МиБ")
+
+
+if __name__ == '__main__':
+    main()
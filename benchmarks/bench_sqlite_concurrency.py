@@ -0,0 +1,122 @@
+"""
+Бенчмарк параллельного чтения и записи в SQLite
+
+Сравнивает пропускную способность до (журнал отката, PRAGMA по умолчанию)
+и после (WAL и настроенные PRAGMA из DEFAULT_PRAGMAS) при одновременной
+работе потоков, создающих подключения, и потоков, строящих отчеты.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sqlite_concurrency --seconds 5 --readers 4 --writers 2
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+from database import Database
+
+# Режим "до": журнал отката, только таймаут ожидания блокировки
+LEGACY_PRAGMAS: Dict[str, object] = {
+    'journal_mode': 'DELETE',
+    'busy_timeout': 5000,
+}
+
+EMPLOYEES = 10
+SEED_CONNECTIONS = 2000
+
+
+def _seed(db: Database) -> list:
+    """Заполнить БД сотрудниками и историей подключений"""
+    employee_ids = []
+    for i in range(EMPLOYEES):
+        emp_id = db.add_employee(f"Сотрудник {i}")
+        db.add_material_to_employee(emp_id, fiber_meters=10 ** 9, twisted_pair_meters=10 ** 9)
+        employee_ids.append(emp_id)
+
+    for i in range(SEED_CONNECTIONS):
+        emp_id = employee_ids[i % EMPLOYEES]
+        db.create_connection(
+            connection_type='mkd', address=f"ул. Тестовая, {i}", router_model='-',
+            port=str(i), fiber_meters=1, twisted_pair_meters=1,
+            employee_ids=[emp_id], photo_file_ids=[], created_by=1
+        )
+    return employee_ids
+
+
+def run(pragmas: Optional[Dict[str, object]], seconds: float, readers: int, writers: int) -> Dict:
+    """Прогнать нагрузку на свежей БД и вернуть счетчики операций"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), pool_size=readers + writers, pragmas=pragmas)
+        employee_ids = _seed(db)
+
+        counters = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def reader(n: int) -> None:
+            while not stop.is_set():
+                connections, stats = db.get_employee_report(employee_ids[n % EMPLOYEES])
+                with lock:
+                    if connections:
+                        counters['reads'] += 1
+                    else:
+                        counters['errors'] += 1
+                n += 1
+
+        def writer(n: int) -> None:
+            while not stop.is_set():
+                emp_id = employee_ids[n % EMPLOYEES]
+                connection_id = db.create_connection(
+                    connection_type='mkd', address=f"ул. Нагрузочная, {n}", router_model='-',
+                    port=str(n), fiber_meters=1, twisted_pair_meters=1,
+                    employee_ids=[emp_id], photo_file_ids=[], created_by=1
+                )
+                with lock:
+                    if connection_id:
+                        counters['writes'] += 1
+                    else:
+                        counters['errors'] += 1
+                n += 1
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        db.close()
+
+    counters['reads_per_sec'] = counters['reads'] / elapsed
+    counters['writes_per_sec'] = counters['writes'] / elapsed
+    return counters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0, help="Длительность каждого прогона")
+    parser.add_argument('--readers', type=int, default=4, help="Потоков, строящих отчеты")
+    parser.add_argument('--writers', type=int, default=2, help="Потоков, создающих подключения")
+    args = parser.parse_args()
+
+    # Логи каждой операции искажают замер
+    logging.disable(logging.WARNING)
+
+    for title, pragmas in (("До (журнал отката)", LEGACY_PRAGMAS), ("После (WAL)", None)):
+        result = run(pragmas, args.seconds, args.readers, args.writers)
+        print(
+            f"{title:<22} чтений/с: {result['reads_per_sec']:8.1f}   "
+            f"записей/с: {result['writes_per_sec']:8.1f}   ошибок: {result['errors']}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -9,13 +9,21 @@ from telegram.ext import (
     MessageHandler,
     CallbackQueryHandler,
     ConversationHandler,
+    TypeHandler,
     ContextTypes,
     filters
 )
 
 # Импорт конфигурации
 from config import (
-    TELEGRAM_BOT_TOKEN,
+    TELEGRAM_BOT_TOKEN, DATABASE_PATH, DB_POOL_SIZE,
+    REPORT_WORKERS, REPORT_JOBS_PER_USER, REPORT_QUEUE_SIZE, REPORT_CACHE_SIZE,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS, UPDATE_CONCURRENCY, UPDATE_MAX_PENDING,
+    OUTBOUND_WORKERS, OUTBOUND_MAX_ATTEMPTS, OUTBOUND_MAX_DELAY, TELEGRAM_MAX_RETRIES,
+    OUTBOUND_BATCH_SIZE, OUTBOUND_POLL_INTERVAL, PERSISTENCE_FLUSH_INTERVAL,
+    CONVERSATION_TIMEOUT, SESSION_TTL, SESSION_SWEEP_INTERVAL,
+    METRICS_ENABLED, METRICS_LISTEN, METRICS_PORT, SLOW_QUERY_MS,
     MANAGE_ACTION, ADD_EMPLOYEE_NAME, CONFIRM_ADD_EMPLOYEE, DELETE_EMPLOYEE_SELECT, CONFIRM_DELETE_EMPLOYEE,
     SELECT_EMPLOYEE_FOR_MATERIAL, SELECT_MATERIAL_ACTION,
     ENTER_FIBER_AMOUNT, ENTER_TWISTED_AMOUNT, CONFIRM_MATERIAL_OPERATION,
@@ -27,18 +35,45 @@ from config import (
 )
 
 # Импорт базы данных
-from database import Database
+from database import Database, AsyncDatabase
+from database.profiler import QueryProfiler
+
+# Очередь формирования отчетов в отдельных процессах
+from report_jobs import ReportJobQueue, discard_report_file
+from report_cache import ReportCache
+
+# Прием обновлений через webhook
+from webhook import WebhookConfigError, webhook_options
+
+# Параллельная обработка обновлений с порядком внутри чата
+from update_processor import ChatOrderedUpdateProcessor
+
+# Лимиты Telegram и очередь исходящих сообщений с повторами
+from outbound import OutboundQueue, TelegramRateLimiter
+from database.repositories.outbox_repository import CONNECTION_REPORT
+
+# Шаги диалогов и user_data переживают перезапуск бота
+from persistence import SQLitePersistence
+
+# Очистка данных брошенных диалогов
+from sessions import SessionSweeper
+
+# Метрики в формате Prometheus (включаются METRICS_ENABLED)
+from metrics import Metrics, MetricsServer, conversation_collector, instrument_handlers
 
 # Импорт обработчиков команд
 from handlers.commands import (
     start_command,
     help_command,
     cancel_command,
-    cancel_and_start_new
+    cancel_and_start_new,
+    conversation_timeout,
+    slow_queries_command
 )
 
 # Импорт клавиатуры
 from utils.keyboards import get_main_keyboard
+from utils.helpers import deliver_connection_report
 
 # Импорт ConversationHandler для подключений
 from handlers.connection import connection_conv
@@ -49,7 +84,8 @@ from handlers.reports import (
     report_select_period,
     report_generate,
     report_enter_custom_start,
-    report_enter_custom_end
+    report_enter_custom_end,
+    report_job_cancel
 )
 
 # Импорт обработчиков сотрудников
@@ -69,8 +105,51 @@ from handlers.employees import (
     show_employees_list
 )
 
-# Инициализация БД
-db = Database()
+# Реестр метрик; если метрики выключены, компоненты ничего не измеряют
+metrics = Metrics() if METRICS_ENABLED else None
+
+# Инициализация БД (один экземпляр с пулом подключений на весь процесс).
+# Обработчики работают через асинхронную обертку, чтобы запросы
+# не блокировали цикл событий. Каждый запрос замеряется профилировщиком
+# (SLOW_QUERY_MS=0 - профилировщик выключен).
+db = AsyncDatabase(
+    Database(
+        DATABASE_PATH,
+        pool_size=DB_POOL_SIZE,
+        profiler=QueryProfiler(SLOW_QUERY_MS / 1000) if SLOW_QUERY_MS > 0 else None
+    ),
+    reader_threads=max(1, DB_POOL_SIZE - 1),
+    metrics=metrics
+)
+
+
+async def start_services(application: Application) -> None:
+    """Запустить очередь исходящих (недоставленное с прошлого запуска отправляется первым) и сервер метрик"""
+    await application.bot_data['outbound'].start(application.bot)
+    
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server is not None:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logger.error(f"Не удалось запустить сервер метрик на {METRICS_LISTEN}:{METRICS_PORT}: {e}")
+
+
+async def stop_services(application: Application) -> None:
+    """Остановить очередь исходящих (неотправленное остается в БД) и сервер метрик"""
+    await application.bot_data['outbound'].stop()
+    
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server is not None:
+        await metrics_server.stop()
+
+
+async def close_resources(application: Application) -> None:
+    """Остановить процессы отчетов, закрыть потоки и подключения БД при остановке бота"""
+    report_jobs = application.bot_data.get('report_jobs')
+    if report_jobs is not None:
+        report_jobs.shutdown()
+    db.close()
 
 
 def main():
@@ -79,8 +158,64 @@ def main():
         logger.error("TELEGRAM_BOT_TOKEN не найден в .env файле!")
         return
     
-    # Создаем приложение
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # Иначе очистка удалит user_data диалога, который еще не истек
+    if SESSION_TTL <= CONVERSATION_TIMEOUT:
+        logger.error(
+            f"SESSION_TTL ({SESSION_TTL:g} с) должен быть больше "
+            f"CONVERSATION_TIMEOUT ({CONVERSATION_TIMEOUT:g} с)!"
+        )
+        return
+    
+    # Создаем приложение. Обновления разных чатов обрабатываются параллельно,
+    # одного чата - по порядку, чтобы шаги диалогов не перемешивались.
+    # Незавершенные диалоги сохраняются в БД и продолжаются после перезапуска.
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING))
+        .rate_limiter(TelegramRateLimiter(max_retries=TELEGRAM_MAX_RETRIES, metrics=metrics))
+        .persistence(SQLitePersistence(
+            db,
+            update_interval=PERSISTENCE_FLUSH_INTERVAL,
+            conversation_timeout=CONVERSATION_TIMEOUT
+        ))
+        .post_init(start_services)
+        .post_stop(stop_services)
+        .post_shutdown(close_resources)
+        .build()
+    )
+    
+    # Тайм-ауты диалогов и очистка сессий работают через JobQueue
+    if application.job_queue is None:
+        logger.error("JobQueue недоступна: установите python-telegram-bot[job-queue] (requirements.txt)")
+        return
+    
+    # Общий экземпляр БД доступен всем обработчикам через context.bot_data
+    application.bot_data['db'] = db
+    
+    # Отчеты строятся в пуле процессов; каждый процесс открывает свою БД
+    application.bot_data['report_jobs'] = ReportJobQueue(
+        DATABASE_PATH,
+        max_workers=REPORT_WORKERS,
+        per_user_limit=REPORT_JOBS_PER_USER,
+        max_queued=REPORT_QUEUE_SIZE,
+        cleanup=discard_report_file,
+        metrics=metrics
+    )
+    
+    # Уже отправленные отчеты повторно отправляются по file_id
+    application.bot_data['report_cache'] = ReportCache(REPORT_CACHE_SIZE)
+    
+    # Фоновые отправки (отчеты в каналы) сохраняются в БД и повторяются до доставки
+    application.bot_data['outbound'] = OutboundQueue(
+        db,
+        workers=OUTBOUND_WORKERS,
+        max_attempts=OUTBOUND_MAX_ATTEMPTS,
+        max_delay=OUTBOUND_MAX_DELAY,
+        batch_size=OUTBOUND_BATCH_SIZE,
+        poll_interval=OUTBOUND_POLL_INTERVAL,
+        handlers={CONNECTION_REPORT: deliver_connection_report}
+    )
     
     # Фильтр для ввода данных (исключает кнопки главного меню)
     text_input_filter = (
@@ -148,12 +283,16 @@ def main():
             SELECT_REPORT_EMPLOYEE: [CallbackQueryHandler(report_select_period_wrapper, pattern='^(rep_emp_|report_cancel)')],
             SELECT_REPORT_PERIOD: [CallbackQueryHandler(report_generate_wrapper, pattern='^(period_|period_cancel)')],
             ENTER_REPORT_CUSTOM_START: [MessageHandler(text_input_filter, report_enter_custom_start)],
-            ENTER_REPORT_CUSTOM_END: [MessageHandler(text_input_filter, report_custom_end_wrapper)]
+            ENTER_REPORT_CUSTOM_END: [MessageHandler(text_input_filter, report_custom_end_wrapper)],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, conversation_timeout)]
         },
         fallbacks=[
             CommandHandler('cancel', cancel_command),
             MessageHandler(menu_buttons_filter, cancel_and_start_new)
-        ]
+        ],
+        conversation_timeout=CONVERSATION_TIMEOUT,
+        name='report_conversation',
+        persistent=True
     )
     
     # Обработчик управления сотрудниками
@@ -179,23 +318,37 @@ def main():
                 CallbackQueryHandler(enter_router_name_wrapper, pattern='^router_model_'),
                 MessageHandler(text_input_filter, enter_router_name_wrapper)
             ],
-            ENTER_ROUTER_QUANTITY: [MessageHandler(text_input_filter, enter_router_quantity_wrapper)]
+            ENTER_ROUTER_QUANTITY: [MessageHandler(text_input_filter, enter_router_quantity_wrapper)],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, conversation_timeout)]
         },
         fallbacks=[
             CommandHandler('cancel', cancel_command),
             MessageHandler(menu_buttons_filter, cancel_and_start_new)
-        ]
+        ],
+        conversation_timeout=CONVERSATION_TIMEOUT,
+        name='manage_conversation',
+        persistent=True
     )
     
     # Wrapper для show_employees_list
     async def show_employees_list_wrapper(update, context):
         return await show_employees_list(update, context, db)
     
+    # Отметка активности пользователя для очистки брошенных данных (до остальных обработчиков)
+    sessions = SessionSweeper(SESSION_TTL, conversations=[connection_conv, report_conv, manage_conv])
+    application.bot_data['sessions'] = sessions
+    application.add_handler(TypeHandler(Update, sessions.touch), group=-1)
+    application.job_queue.run_repeating(
+        sessions.sweep_job, interval=SESSION_SWEEP_INTERVAL, first=SESSION_SWEEP_INTERVAL, name='session_sweeper'
+    )
+    
     # Добавляем обработчики
     application.add_handler(CommandHandler('start', start_command))
     application.add_handler(CommandHandler('help', help_command))
+    application.add_handler(CommandHandler('slow_queries', slow_queries_command))
     application.add_handler(connection_conv)
     application.add_handler(report_conv)
+    application.add_handler(CallbackQueryHandler(report_job_cancel, pattern=r'^report_job_cancel_\d+$'))
     application.add_handler(manage_conv)
     application.add_handler(MessageHandler(filters.Regex('^👤 Список сотрудников$'), show_employees_list_wrapper))
     application.add_handler(MessageHandler(filters.Regex('^ℹ️ Помощь$'), help_command))
@@ -212,9 +365,47 @@ def main():
         unknown_command
     ))
     
-    # Запускаем бота
-    logger.info("🚀 Бот запущен!")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    # Метрики: время всех обработчиков, шаги диалогов и показатели компонентов
+    if metrics is not None:
+        instrument_handlers(application, metrics)
+        metrics.add_collector(conversation_collector([connection_conv, report_conv, manage_conv]))
+        metrics.add_stats('updates', application.update_processor.stats)
+        metrics.add_stats('telegram', application.bot.rate_limiter.stats)
+        metrics.add_stats('outbound', application.bot_data['outbound'].stats)
+        metrics.add_stats('persistence', application.persistence.stats)
+        metrics.add_stats('sessions', sessions.stats)
+        metrics.add_stats('report_jobs', application.bot_data['report_jobs'].stats)
+        metrics.add_stats('report_cache', application.bot_data['report_cache'].stats)
+        metrics.add_stats('db_cache', db.cache_stats)
+        if db.db.profiler is not None:
+            metrics.add_stats('db_queries', db.db.profiler.stats)
+        application.bot_data['metrics_server'] = MetricsServer(metrics, METRICS_LISTEN, METRICS_PORT)
+    
+    # Запускаем бота: webhook, если задан публичный адрес, иначе опрос getUpdates.
+    # В обоих режимах SIGINT/SIGTERM останавливают прием обновлений, дожидаются
+    # текущих обработчиков и вызывают close_resources.
+    if WEBHOOK_URL:
+        try:
+            options = webhook_options(
+                WEBHOOK_URL,
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET_TOKEN,
+                max_connections=WEBHOOK_MAX_CONNECTIONS
+            )
+        except WebhookConfigError as e:
+            logger.error(f"Неверные настройки webhook: {e}")
+            return
+        
+        logger.info(
+            f"🚀 Бот запущен (webhook {options['webhook_url']}, "
+            f"слушаю {WEBHOOK_LISTEN}:{WEBHOOK_PORT})"
+        )
+        application.run_webhook(allowed_updates=Update.ALL_TYPES, **options)
+    else:
+        logger.info("🚀 Бот запущен!")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == '__main__':
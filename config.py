@@ -71,20 +71,86 @@ CONNECTION_TYPES = {
 # Токен бота
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
+# База данных
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'isp_bot.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+
+# Очередь формирования отчетов (отдельные процессы)
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+REPORT_JOBS_PER_USER = int(os.getenv('REPORT_JOBS_PER_USER', '1'))
+REPORT_QUEUE_SIZE = int(os.getenv('REPORT_QUEUE_SIZE', '20'))
+REPORT_PROGRESS_INTERVAL = float(os.getenv('REPORT_PROGRESS_INTERVAL', '5'))
+# Отчеты больше этого размера (байт) передаются через временный файл, а не в памяти
+REPORT_MAX_MEMORY_SIZE = int(os.getenv('REPORT_MAX_MEMORY_SIZE', str(8 * 1024 * 1024)))
+# Сколько отправленных отчетов (file_id) помнить для повторной отправки
+REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', '256'))
+
+# Параллельная обработка обновлений (внутри одного чата - по порядку)
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '8'))
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '256'))
+
+# Очередь исходящих сообщений (отчеты в каналы) и повторы после ошибок Telegram
+OUTBOUND_WORKERS = int(os.getenv('OUTBOUND_WORKERS', '2'))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv('OUTBOUND_MAX_ATTEMPTS', '15'))
+OUTBOUND_MAX_DELAY = float(os.getenv('OUTBOUND_MAX_DELAY', '600'))
+OUTBOUND_BATCH_SIZE = int(os.getenv('OUTBOUND_BATCH_SIZE', '20'))
+OUTBOUND_POLL_INTERVAL = float(os.getenv('OUTBOUND_POLL_INTERVAL', '5'))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '2'))
+
+# Как часто (секунды) шаги диалогов и user_data сохраняются в БД
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '5'))
+
+# Брошенные диалоги: диалог завершается после CONVERSATION_TIMEOUT секунд без
+# ответа, данные пользователя удаляются после SESSION_TTL секунд без активности
+# (SESSION_TTL должен быть больше CONVERSATION_TIMEOUT, иначе бот не запустится)
+CONVERSATION_TIMEOUT = float(os.getenv('CONVERSATION_TIMEOUT', '3600'))
+SESSION_TTL = float(os.getenv('SESSION_TTL', '7200'))
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '600'))
+
+# Режим webhook (если WEBHOOK_URL не задан, бот опрашивает getUpdates)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').strip()
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '').strip() or None
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# Запросы к БД дольше SLOW_QUERY_MS миллисекунд пишутся в лог с планом (/slow_queries);
+# 0 - запросы не замеряются
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+
+# Метрики в формате Prometheus на локальном адресе http://METRICS_LISTEN:METRICS_PORT/metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '').strip().lower() in ('1', 'true', 'yes')
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))
+
 # Загрузка ID администраторов
 ADMIN_IDS = [int(id.strip()) for id in os.getenv('ADMIN_USER_IDS', '').split(',') if id.strip()]
 
-# ID канала для отправки отчетов (опционально)
-REPORTS_CHANNEL_ID = os.getenv('REPORTS_CHANNEL_ID', '').strip()
-if REPORTS_CHANNEL_ID:
-    try:
-        REPORTS_CHANNEL_ID = int(REPORTS_CHANNEL_ID)
-        logger.info(f"Канал для отчетов настроен: {REPORTS_CHANNEL_ID}")
-    except ValueError:
-        REPORTS_CHANNEL_ID = None
-        logger.warning("REPORTS_CHANNEL_ID имеет неверный формат")
-else:
-    REPORTS_CHANNEL_ID = None
+
+def _parse_chat_ids(name: str) -> list:
+    """Список ID чатов из переменной окружения (через запятую); неверные ID пропускаются"""
+    chat_ids = []
+    for value in os.getenv(name, '').split(','):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            chat_ids.append(int(value))
+        except ValueError:
+            logger.warning(f"{name} имеет неверный формат: {value}")
+    return chat_ids
+
+
+# Каналы для отчетов о подключениях (опционально): общие для всех типов
+# и отдельные для каждого типа (REPORTS_CHANNEL_ID_MKD, _CHS, _LEGAL)
+REPORTS_CHANNEL_IDS = _parse_chat_ids('REPORTS_CHANNEL_ID')
+REPORTS_CHANNELS_BY_TYPE = {
+    conn_type: _parse_chat_ids(f'REPORTS_CHANNEL_ID_{conn_type.upper()}')
+    for conn_type in CONNECTION_TYPES
+}
+if REPORTS_CHANNEL_IDS or any(REPORTS_CHANNELS_BY_TYPE.values()):
+    logger.info(f"Каналы для отчетов настроены: {REPORTS_CHANNEL_IDS}, по типам: {REPORTS_CHANNELS_BY_TYPE}")
 
 
 def is_admin(user_id: int) -> bool:
@@ -3,6 +3,9 @@
 Использует паттерн Repository для разделения ответственности
 """
 from database.db_manager import Database
+from database.async_db import AsyncDatabase
+from database.migrations import SchemaVersionError
+from database.models import ConnectionRow, EmployeeRow, EmployeeWithRouters
 
-__all__ = ['Database']
+__all__ = ['Database', 'AsyncDatabase', 'SchemaVersionError', 'ConnectionRow', 'EmployeeRow', 'EmployeeWithRouters']
 
@@ -0,0 +1,304 @@
+"""
+Асинхронная обертка над Database
+Выполняет запросы в отдельных потоках, не блокируя цикл событий бота
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, List, Dict, Optional, Tuple
+import logging
+
+from database.db_manager import Database
+from database.models import ConnectionRow, EmployeeRow, EmployeeWithRouters
+
+logger = logging.getLogger(__name__)
+
+# Количество потоков для чтения по умолчанию
+DEFAULT_READER_THREADS = 3
+
+
+class AsyncDatabase:
+    """
+    Awaitable-версии публичных методов Database
+
+    Все записи идут через один поток-писатель, поэтому не конкурируют
+    между собой за блокировку SQLite. Чтения выполняются небольшим пулом
+    потоков и не ждут медленных отчетов других пользователей.
+    """
+
+    def __init__(self, db: Database, reader_threads: int = DEFAULT_READER_THREADS, metrics=None):
+        """
+        Args:
+            db: Синхронный экземпляр Database
+            reader_threads: Количество потоков для чтения
+            metrics: Реестр метрик (metrics.Metrics) для времени запросов по методам
+        """
+        if reader_threads < 1:
+            raise ValueError("Нужен хотя бы один поток для чтения")
+
+        self.db = db
+        self.metrics = metrics
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=reader_threads, thread_name_prefix='db-reader')
+
+    def _call(self, func: Callable, *args, **kwargs) -> Any:
+        """Подготовить вызов для потока (с замером времени, если включены метрики)"""
+        call = partial(func, *args, **kwargs)
+        if self.metrics is None:
+            return call
+        return partial(self._timed, self.metrics, getattr(func, '__name__', 'call'), call)
+
+    @staticmethod
+    def _timed(metrics, method: str, call: Callable) -> Any:
+        """Выполнить вызов в потоке и учесть его время по имени метода"""
+        start = time.perf_counter()
+        try:
+            return call()
+        finally:
+            metrics.observe('db_query_seconds', time.perf_counter() - start, method=method)
+
+    async def _read(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить функцию чтения в пуле читателей"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._call(func, *args, **kwargs))
+
+    async def _write(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить функцию записи в потоке-писателе"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._call(func, *args, **kwargs))
+
+    async def run_read(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Выполнить произвольную функцию чтения в пуле читателей
+
+        Нужна для потоковых операций (например, генерации отчета из курсора),
+        которые должны целиком выполняться в одном потоке с подключением.
+        """
+        return await self._read(func, *args, **kwargs)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов кэша чтения"""
+        return self.db.cache_stats()
+
+    def slow_queries(self, limit: int = 10, order: str = 'p95') -> List[Dict]:
+        """Самые медленные запросы по отпечаткам (статистика в памяти, без потока)"""
+        return self.db.slow_queries(limit, order)
+
+    def close(self) -> None:
+        """Дождаться выполнения запросов и закрыть подключения"""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self.db.close()
+
+    # ==================== ЛОГИРОВАНИЕ ДВИЖЕНИЙ ====================
+
+    async def log_material_movement(self, employee_id: int, operation_type: str, item_type: str,
+                                    item_name: str, quantity: float, balance_after: float,
+                                    connection_id: Optional[int] = None,
+                                    created_by: Optional[int] = None) -> bool:
+        """Записать движение материала/роутера в лог"""
+        return await self._write(self.db.log_material_movement, employee_id, operation_type,
+                                 item_type, item_name, quantity, balance_after,
+                                 connection_id, created_by)
+
+    # ==================== СОТРУДНИКИ ====================
+
+    async def add_employee(self, full_name: str) -> Optional[int]:
+        """Добавить нового сотрудника"""
+        return await self._write(self.db.add_employee, full_name)
+
+    async def get_all_employees(self) -> List[EmployeeRow]:
+        """Получить список всех сотрудников"""
+        return await self._read(self.db.get_all_employees)
+
+    async def get_employees_with_routers(self) -> List[EmployeeWithRouters]:
+        """Получить всех сотрудников с балансами и роутерами по моделям (один запрос)"""
+        return await self._read(self.db.get_employees_with_routers)
+
+    async def get_employee_by_id(self, employee_id: int) -> Optional[EmployeeRow]:
+        """Получить сотрудника по ID"""
+        return await self._read(self.db.get_employee_by_id, employee_id)
+
+    async def delete_employee(self, employee_id: int) -> bool:
+        """Удалить сотрудника"""
+        return await self._write(self.db.delete_employee, employee_id)
+
+    # ==================== МАТЕРИАЛЫ ====================
+
+    async def add_material_to_employee(self, employee_id: int, fiber_meters: float = 0,
+                                       twisted_pair_meters: float = 0,
+                                       created_by: Optional[int] = None) -> bool:
+        """Добавить материалы на баланс сотрудника"""
+        return await self._write(self.db.add_material_to_employee, employee_id,
+                                 fiber_meters, twisted_pair_meters, created_by)
+
+    async def deduct_material_from_employee(self, employee_id: int, fiber_meters: float = 0,
+                                            twisted_pair_meters: float = 0,
+                                            connection_id: Optional[int] = None,
+                                            created_by: Optional[int] = None) -> bool:
+        """Списать материалы с баланса сотрудника"""
+        return await self._write(self.db.deduct_material_from_employee, employee_id,
+                                 fiber_meters, twisted_pair_meters, connection_id, created_by)
+
+    async def get_employee_balance(self, employee_id: int) -> Optional[Tuple[float, float]]:
+        """Получить баланс материалов сотрудника (ВОЛС, Витая пара)"""
+        return await self._read(self.db.get_employee_balance, employee_id)
+
+    # ==================== РОУТЕРЫ ====================
+
+    async def add_router_to_employee(self, employee_id: int, router_name: str, quantity: int,
+                                     created_by: Optional[int] = None) -> bool:
+        """Добавить роутеры сотруднику"""
+        return await self._write(self.db.add_router_to_employee, employee_id,
+                                 router_name, quantity, created_by)
+
+    async def deduct_router_from_employee(self, employee_id: int, router_name: str, quantity: int = 1,
+                                          connection_id: Optional[int] = None,
+                                          created_by: Optional[int] = None) -> bool:
+        """Списать роутер у сотрудника"""
+        return await self._write(self.db.deduct_router_from_employee, employee_id,
+                                 router_name, quantity, connection_id, created_by)
+
+    async def get_employee_routers(self, employee_id: int) -> List[Dict]:
+        """Получить список роутеров сотрудника"""
+        return await self._read(self.db.get_employee_routers, employee_id)
+
+    async def get_router_quantity(self, employee_id: int, router_name: str) -> int:
+        """Получить количество конкретного роутера у сотрудника"""
+        return await self._read(self.db.get_router_quantity, employee_id, router_name)
+
+    async def get_all_router_names(self) -> List[str]:
+        """Получить список всех уникальных названий роутеров"""
+        return await self._read(self.db.get_all_router_names)
+
+    async def get_employee_movements(self, employee_id: int, start_date: datetime,
+                                     end_date: datetime) -> List[Dict]:
+        """Получить все движения материалов и роутеров сотрудника за период"""
+        return await self._read(self.db.get_employee_movements, employee_id, start_date, end_date)
+
+    # ==================== ПОДКЛЮЧЕНИЯ ====================
+
+    async def create_connection(
+        self,
+        connection_type: str,
+        address: str,
+        router_model: str,
+        port: str,
+        fiber_meters: float,
+        twisted_pair_meters: float,
+        employee_ids: List[int],
+        photo_file_ids: List[str],
+        created_by: int,
+        material_payer_id: Optional[int] = None,
+        router_quantity: int = 1,
+        contract_signed: bool = False,
+        router_access: bool = False,
+        telegram_bot_connected: bool = False,
+        router_payer_id: Optional[int] = None,
+        report_chat_ids: Optional[List[int]] = None
+    ) -> Optional[int]:
+        """Создать новое подключение, списать материалы и роутеры и поставить отчеты в каналы одной транзакцией"""
+        return await self._write(
+            self.db.create_connection,
+            connection_type=connection_type,
+            address=address,
+            router_model=router_model,
+            port=port,
+            fiber_meters=fiber_meters,
+            twisted_pair_meters=twisted_pair_meters,
+            employee_ids=employee_ids,
+            photo_file_ids=photo_file_ids,
+            created_by=created_by,
+            material_payer_id=material_payer_id,
+            router_quantity=router_quantity,
+            contract_signed=contract_signed,
+            router_access=router_access,
+            telegram_bot_connected=telegram_bot_connected,
+            router_payer_id=router_payer_id,
+            report_chat_ids=report_chat_ids
+        )
+
+    async def get_connection_by_id(self, connection_id: int) -> Optional[ConnectionRow]:
+        """Получить подключение по ID"""
+        return await self._read(self.db.get_connection_by_id, connection_id)
+
+    # ==================== ОТЧЕТЫ ====================
+
+    async def get_employee_report(
+        self,
+        employee_id: int,
+        days: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Tuple[List[Dict], Dict]:
+        """Получить отчет по сотруднику за период"""
+        return await self._read(self.db.get_employee_report, employee_id, days, start_date, end_date)
+
+    async def get_employee_period_stats(self, employee_id: int, start_date: datetime,
+                                        end_date: datetime) -> Dict:
+        """Итоги сотрудника за период из дневных итогов"""
+        return await self._read(self.db.get_employee_period_stats, employee_id, start_date, end_date)
+
+    async def get_report_watermark(self, employee_id: int) -> Optional[Tuple[int, int]]:
+        """Получить версию данных отчета сотрудника"""
+        return await self._read(self.db.get_report_watermark, employee_id)
+
+    async def get_all_connections_count(self) -> int:
+        """Получить общее количество подключений"""
+        return await self._read(self.db.get_all_connections_count)
+
+    # ==================== ИСХОДЯЩИЕ СООБЩЕНИЯ ====================
+
+    async def add_outbox_message(self, chat_id: int, method: str, payload: Dict,
+                                 idempotency_key: Optional[str] = None) -> Optional[int]:
+        """Поставить вызов Bot API в очередь исходящих сообщений"""
+        return await self._write(self.db.add_outbox_message, chat_id, method, payload, idempotency_key)
+
+    async def release_connection_reports(self, connection_id: int, payload: Optional[Dict] = None) -> int:
+        """Разрешить отправку отчетов подключения в каналы"""
+        return await self._write(self.db.release_connection_reports, connection_id, payload)
+
+    async def claim_due_outbox(self, limit: int) -> List[Dict]:
+        """Взять в отправку сообщения очереди, срок которых наступил"""
+        return await self._write(self.db.claim_due_outbox, limit)
+
+    async def release_outbox_claims(self) -> int:
+        """Вернуть в очередь сообщения, отправка которых была прервана"""
+        return await self._write(self.db.release_outbox_claims)
+
+    async def mark_outbox_sent(self, message_id: int) -> bool:
+        """Отметить сообщение очереди отправленным"""
+        return await self._write(self.db.mark_outbox_sent, message_id)
+
+    async def reschedule_outbox(self, message_id: int, attempts: int, delay: float, error: str) -> bool:
+        """Запомнить неудачную попытку отправки и время следующей"""
+        return await self._write(self.db.reschedule_outbox, message_id, attempts, delay, error)
+
+    async def mark_outbox_failed(self, message_id: int, attempts: int, error: str) -> bool:
+        """Отметить сообщение очереди, которое отправить не удастся"""
+        return await self._write(self.db.mark_outbox_failed, message_id, attempts, error)
+
+    async def get_connection_deliveries(self, connection_id: int) -> List[Dict]:
+        """Состояние доставки отчета о подключении по каналам"""
+        return await self._read(self.db.get_connection_deliveries, connection_id)
+
+    async def get_outbox_status_counts(self) -> Dict[str, int]:
+        """Количество сообщений очереди по статусам"""
+        return await self._read(self.db.get_outbox_status_counts)
+
+    # ==================== СОСТОЯНИЕ ДИАЛОГОВ ====================
+
+    async def get_conversation_states(self, name: str, max_age: Optional[float] = None) -> List[Dict]:
+        """Сохраненные шаги диалогов ConversationHandler"""
+        return await self._read(self.db.get_conversation_states, name, max_age)
+
+    async def get_user_data_page(self, after_user_id: int = 0, limit: int = 500) -> List[Dict]:
+        """Страница сохраненных user_data"""
+        return await self._read(self.db.get_user_data_page, after_user_id, limit)
+
+    async def save_conversation_data(self, states: List[Tuple[str, str, Optional[int]]],
+                                     user_data: List[Tuple[int, Optional[str]]]) -> bool:
+        """Записать изменения шагов диалогов и user_data одной транзакцией"""
+        return await self._write(self.db.save_conversation_data, states, user_data)
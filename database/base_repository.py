@@ -2,96 +2,124 @@
 Базовый репозиторий с общими методами для работы с БД
 """
 import sqlite3
-from typing import Optional, List, Dict, Any, Tuple
+from contextlib import AbstractContextManager
+from typing import Optional, List, Dict, Any, Tuple, Type, TypeVar
 import logging
 
+from database.connection_pool import ConnectionPool
+from database.profiler import fingerprint
+
 logger = logging.getLogger(__name__)
 
+Row = TypeVar('Row', bound=tuple)
+
 
 class BaseRepository:
     """Базовый класс для всех репозиториев"""
-    
-    def __init__(self, db_path: str = "isp_bot.db"):
-        """Инициализация репозитория"""
-        self.db_path = db_path
-    
-    def get_connection(self) -> sqlite3.Connection:
-        """Получить подключение к БД с row_factory"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
+
+    def __init__(self, pool: ConnectionPool):
+        """Инициализация репозитория с общим пулом подключений"""
+        self.pool = pool
+        self.db_path = pool.db_path
+
+    def connection(self) -> AbstractContextManager:
+        """Взять подключение из пула (контекстный менеджер)"""
+        return self.pool.connection()
+
+    def writer(self) -> AbstractContextManager:
+        """Взять подключение для записи (через общую очередь записей пула)"""
+        return self.pool.writer()
+
+    def transaction(self) -> AbstractContextManager:
+        """Транзакция записи (вложенные вызовы присоединяются к внешней)"""
+        return self.pool.transaction()
+
     def execute_query(
-        self, 
-        query: str, 
-        params: Tuple = (), 
-        fetch_one: bool = False, 
+        self,
+        query: str,
+        params: Tuple = (),
+        fetch_one: bool = False,
         fetch_all: bool = False,
         commit: bool = True
     ) -> Any:
         """
         Выполнить SQL запрос
-        
+
         Args:
             query: SQL запрос
             params: Параметры запроса
             fetch_one: Вернуть одну запись
             fetch_all: Вернуть все записи
             commit: Выполнить commit
-            
+
         Returns:
             Результат запроса, ID последней вставки, или None
         """
-        conn = None
+        # Чтения идут напрямую, изменения - в транзакции через очередь записей.
+        # Внутри внешней транзакции изменения фиксируются вместе с ней.
+        if fetch_one or fetch_all:
+            context = self.connection()
+        elif commit:
+            context = self.transaction()
+        else:
+            context = self.writer()
+
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            
-            if fetch_one:
-                result = cursor.fetchone()
-                return dict(result) if result else None
-            elif fetch_all:
-                result = cursor.fetchall()
-                return [dict(row) for row in result]
-            else:
-                last_id = cursor.lastrowid
-                if commit:
-                    conn.commit()
-                return last_id
+            with context as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+
+                if fetch_one:
+                    result = cursor.fetchone()
+                    return dict(result) if result else None
+                elif fetch_all:
+                    result = cursor.fetchall()
+                    return [dict(row) for row in result]
+                else:
+                    return cursor.lastrowid
         except Exception as e:
-            logger.error(f"Ошибка выполнения запроса: {e}")
-            if conn:
-                conn.rollback()
+            logger.error(f"Ошибка выполнения запроса: {e} [{fingerprint(query)}]")
             return None
-        finally:
-            if conn:
-                conn.close()
-    
+
+    def fetch_rows(self, row_type: Type[Row], query: str, params: Tuple = ()) -> List[Row]:
+        """
+        Выполнить запрос чтения и вернуть строки как row_type (NamedTuple)
+
+        Строки собираются прямо из кортежей SQLite, без sqlite3.Row и dict.
+        Порядок столбцов запроса должен совпадать с порядком полей row_type.
+
+        Returns:
+            Список строк или пустой список при ошибке
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                return list(map(row_type._make, cursor.execute(query, params)))
+        except Exception as e:
+            logger.error(f"Ошибка выполнения запроса: {e} [{fingerprint(query)}]")
+            return []
+
+    def fetch_row(self, row_type: Type[Row], query: str, params: Tuple = ()) -> Optional[Row]:
+        """Выполнить запрос чтения и вернуть первую строку как row_type или None"""
+        rows = self.fetch_rows(row_type, query, params)
+        return rows[0] if rows else None
+
     def execute_many(self, query: str, params_list: List[Tuple]) -> bool:
         """
         Выполнить множественные вставки
-        
+
         Args:
             query: SQL запрос
             params_list: Список параметров
-            
+
         Returns:
             Успех операции
         """
-        conn = None
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.executemany(query, params_list)
-            conn.commit()
+            with self.transaction() as conn:
+                conn.executemany(query, params_list)
             return True
         except Exception as e:
-            logger.error(f"Ошибка множественного запроса: {e}")
-            if conn:
-                conn.rollback()
+            logger.error(f"Ошибка множественного запроса: {e} [{fingerprint(query)}]")
             return False
-        finally:
-            if conn:
-                conn.close()
-
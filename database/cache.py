@@ -0,0 +1,79 @@
+"""
+Кэш чтения для часто запрашиваемых данных (сотрудники, балансы, роутеры)
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ключи кэша
+EMPLOYEES = 'employees'
+EMPLOYEES_WITH_ROUTERS = 'employees_with_routers'
+ROUTER_NAMES = 'router_names'
+
+
+def employee_key(employee_id: int) -> tuple:
+    """Ключ карточки сотрудника"""
+    return ('employee', employee_id)
+
+
+def balance_key(employee_id: int) -> tuple:
+    """Ключ баланса материалов сотрудника"""
+    return ('balance', employee_id)
+
+
+class ReadThroughCache:
+    """
+    Потокобезопасный кэш со сквозным чтением
+
+    При промахе значение загружается функцией-загрузчиком и сохраняется.
+    Изменяющие методы Database сбрасывают затронутые ключи. Если ключ был
+    сброшен во время загрузки, загруженное (возможно, устаревшее) значение
+    не сохраняется. Возвращаемые объекты общие для всех читателей и не
+    должны изменяться.
+    """
+
+    def __init__(self):
+        """Инициализация пустого кэша"""
+        self._data: Dict[Hashable, Any] = {}
+        self._versions: Dict[Hashable, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Вернуть значение из кэша или загрузить его"""
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            version = (self._epoch, self._versions.get(key, 0))
+
+        value = loader()
+
+        with self._lock:
+            if (self._epoch, self._versions.get(key, 0)) == version:
+                self._data[key] = value
+        return value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Сбросить указанные ключи"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def clear(self) -> None:
+        """Сбросить весь кэш"""
+        with self._lock:
+            self._epoch += 1
+            self._versions.clear()
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
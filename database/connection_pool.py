@@ -0,0 +1,225 @@
+"""
+Пул подключений к SQLite
+Переиспользует открытые подключения вместо sqlite3.connect на каждый запрос
+"""
+import sqlite3
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+import logging
+
+from database.profiler import ProfilingConnection, QueryProfiler
+
+logger = logging.getLogger(__name__)
+
+# Размер пула по умолчанию
+DEFAULT_POOL_SIZE = 5
+
+# Сколько секунд ждать свободное подключение
+DEFAULT_CHECKOUT_TIMEOUT = 10.0
+
+# PRAGMA, применяемые к каждому новому подключению.
+# WAL позволяет читать параллельно с записью, synchronous=NORMAL в режиме WAL
+# не теряет целостность при сбое процесса, а отрицательный cache_size задается в КиБ.
+DEFAULT_PRAGMAS: Dict[str, object] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
+
+class ConnectionPool:
+    """
+    Ограниченный пул подключений к одной БД
+
+    Подключение выдается потоку через контекстный менеджер connection().
+    Повторный вход в том же потоке возвращает то же подключение,
+    поэтому вложенные вызовы репозиториев не занимают лишних слотов.
+
+    Изменяющие запросы выполняются через writer() или transaction(): записи
+    сериализуются одной блокировкой и не конкурируют за блокировку файла БД,
+    а читатели в режиме WAL их не ждут.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_CHECKOUT_TIMEOUT,
+        pragmas: Optional[Dict[str, object]] = None,
+        profiler: Optional[QueryProfiler] = None
+    ):
+        """Инициализация пула (подключения создаются лениво; с profiler замеряется каждый запрос)"""
+        if max_size < 1:
+            raise ValueError("Размер пула должен быть не меньше 1")
+
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.profiler = profiler
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._closed = False
+
+    # ==================== ВЫДАЧА ПОДКЛЮЧЕНИЙ ====================
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Взять подключение из пула и вернуть его по выходу из блока"""
+        local = self._local
+        conn = getattr(local, 'conn', None)
+
+        if conn is not None:
+            # Поток уже держит подключение - используем его повторно
+            local.depth += 1
+            try:
+                yield conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn = self.checkout()
+        local.conn = conn
+        local.depth = 1
+        try:
+            yield conn
+        finally:
+            local.conn = None
+            local.depth = 0
+            self.checkin(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Взять подключение для записи (записи выполняются строго по одной)"""
+        # Сначала подключение, потом блокировка: поток, удерживающий блокировку
+        # записи, никогда не ждет освобождения слота пула
+        with self.connection() as conn:
+            with self._write_lock:
+                yield conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выполнить блок в одной транзакции записи
+
+        Внешний вызов открывает BEGIN IMMEDIATE и фиксирует изменения одним
+        COMMIT по выходу из блока или откатывает их при исключении.
+        Вложенные вызовы в том же потоке присоединяются к внешней транзакции,
+        поэтому методы репозиториев можно объединять в единицу работы.
+        """
+        with self.writer() as conn:
+            local = self._local
+            if getattr(local, 'tx_depth', 0):
+                local.tx_depth += 1
+                try:
+                    yield conn
+                finally:
+                    local.tx_depth -= 1
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            local.tx_depth = 1
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                local.tx_depth = 0
+
+    def checkout(self) -> sqlite3.Connection:
+        """Получить свободное подключение (или создать новое, если есть место)"""
+        if self._closed:
+            raise RuntimeError("Пул подключений закрыт")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._create_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"Нет свободных подключений к БД за {self.timeout} с "
+                f"(размер пула: {self.max_size})"
+            )
+
+    def checkin(self, conn: sqlite3.Connection) -> None:
+        """Вернуть подключение в пул"""
+        try:
+            # Незавершенная транзакция не должна попасть к следующему потоку
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Подключение к БД повреждено и будет закрыто: {e}")
+            self._discard(conn)
+            return
+
+        if self._closed:
+            self._discard(conn)
+            return
+
+        self._idle.put(conn)
+
+    def close(self) -> None:
+        """Закрыть все свободные подключения и запретить выдачу новых"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    @property
+    def size(self) -> int:
+        """Количество открытых подключений"""
+        return self._created
+
+    # ==================== СЛУЖЕБНЫЕ МЕТОДЫ ====================
+
+    def _create_connection(self) -> sqlite3.Connection:
+        """Открыть новое подключение с настроенными PRAGMA"""
+        if self.profiler is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=ProfilingConnection)
+            conn.profiler = self.profiler
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        logger.debug(f"Открыто подключение к БД {self.db_path} ({self._created}/{self.max_size})")
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        """Закрыть подключение и освободить слот пула"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
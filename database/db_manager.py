@@ -2,15 +2,22 @@
 Модуль для работы с базой данных SQLite
 Использует паттерн Repository для разделения ответственности
 """
-import sqlite3
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from datetime import datetime
+from typing import Iterator, List, Dict, Optional, Tuple
 import logging
 
+from database import cache
+from database.connection_pool import ConnectionPool, DEFAULT_POOL_SIZE
+from database.migrations import LATEST_VERSION, get_schema_version, migrate
+from database.models import ConnectionRow, EmployeeRow, EmployeeWithRouters
+from database.profiler import QueryProfiler
 from database.repositories.employee_repository import EmployeeRepository
 from database.repositories.material_repository import MaterialRepository
 from database.repositories.router_repository import RouterRepository
 from database.repositories.connection_repository import ConnectionRepository
+from database.repositories.stats_repository import StatsRepository
+from database.repositories.outbox_repository import OutboxRepository
+from database.repositories.conversation_repository import ConversationRepository
 
 logger = logging.getLogger(__name__)
 
@@ -21,173 +28,103 @@ class Database:
     Использует композицию репозиториев для разделения ответственности
     """
     
-    def __init__(self, db_path: str = "isp_bot.db"):
-        """Инициализация подключения к БД и репозиториев"""
-        self.db_path = db_path
-        
-        # Инициализация репозиториев
-        self.employees_repo = EmployeeRepository(db_path)
-        self.materials_repo = MaterialRepository(db_path)
-        self.routers_repo = RouterRepository(db_path)
-        self.connections_repo = ConnectionRepository(db_path)
-        
-        # Создаем таблицы
-        self.create_tables()
-    
-    def get_connection(self) -> sqlite3.Connection:
-        """Получить подключение к БД"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
-    def create_tables(self):
-        """Создать таблицы БД"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Таблица сотрудников
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS employees (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                full_name TEXT NOT NULL UNIQUE,
-                fiber_balance REAL DEFAULT 0,
-                twisted_pair_balance REAL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Добавляем поля балансов в существующую таблицу (если их нет)
-        try:
-            cursor.execute("ALTER TABLE employees ADD COLUMN fiber_balance REAL DEFAULT 0")
-            logger.info("Добавлено поле fiber_balance в таблицу employees")
-        except sqlite3.OperationalError:
-            pass
-        
-        try:
-            cursor.execute("ALTER TABLE employees ADD COLUMN twisted_pair_balance REAL DEFAULT 0")
-            logger.info("Добавлено поле twisted_pair_balance в таблицу employees")
-        except sqlite3.OperationalError:
-            pass
-        
-        # Таблица подключений
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS connections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                connection_type TEXT NOT NULL DEFAULT 'mkd',
-                address TEXT NOT NULL,
-                router_model TEXT NOT NULL,
-                port TEXT NOT NULL,
-                fiber_meters REAL NOT NULL,
-                twisted_pair_meters REAL NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by INTEGER NOT NULL
-            )
-        """)
-        
-        # Добавляем поле connection_type в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN connection_type TEXT NOT NULL DEFAULT 'mkd'")
-            logger.info("Добавлено поле connection_type в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
-        
-        # Добавляем поле router_quantity в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN router_quantity INTEGER DEFAULT 1")
-            logger.info("Добавлено поле router_quantity в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
+    def __init__(
+        self,
+        db_path: str = "isp_bot.db",
+        pool_size: int = DEFAULT_POOL_SIZE,
+        pragmas: Optional[Dict[str, object]] = None,
+        profiler: Optional[QueryProfiler] = None
+    ):
+        """
+        Инициализация пула подключений к БД и репозиториев
         
-        # Добавляем поле contract_signed в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN contract_signed INTEGER DEFAULT 0")
-            logger.info("Добавлено поле contract_signed в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
+        Args:
+            db_path: Путь к файлу БД
+            pool_size: Максимальное количество подключений в пуле
+            pragmas: PRAGMA для подключений (по умолчанию DEFAULT_PRAGMAS)
+            profiler: Профилировщик запросов (если не задан, запросы не замеряются)
+        """
+        self.db_path = db_path
+        self.profiler = profiler
         
-        # Добавляем поле router_access в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN router_access INTEGER DEFAULT 0")
-            logger.info("Добавлено поле router_access в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
+        # Общий пул подключений для всех репозиториев
+        self.pool = ConnectionPool(db_path, max_size=pool_size, pragmas=pragmas, profiler=profiler)
         
-        # Добавляем поле telegram_bot_connected в существующую таблицу (если его нет)
-        try:
-            cursor.execute("ALTER TABLE connections ADD COLUMN telegram_bot_connected INTEGER DEFAULT 0")
-            logger.info("Добавлено поле telegram_bot_connected в таблицу connections")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
+        # Кэш чтения сотрудников, балансов и каталога роутеров
+        self.cache = cache.ReadThroughCache()
         
-        # Таблица связи подключений и сотрудников (многие ко многим)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS connection_employees (
-                connection_id INTEGER NOT NULL,
-                employee_id INTEGER NOT NULL,
-                PRIMARY KEY (connection_id, employee_id),
-                FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE CASCADE,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Таблица фотографий подключений
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS connection_photos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                connection_id INTEGER NOT NULL,
-                photo_file_id TEXT NOT NULL,
-                photo_category TEXT NOT NULL DEFAULT 'other',
-                photo_order INTEGER NOT NULL,
-                FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE CASCADE
-            )
-        """)
+        # Инициализация репозиториев
+        self.employees_repo = EmployeeRepository(self.pool)
+        self.materials_repo = MaterialRepository(self.pool)
+        self.routers_repo = RouterRepository(self.pool)
+        self.connections_repo = ConnectionRepository(self.pool)
+        self.stats_repo = StatsRepository(self.pool)
+        self.outbox_repo = OutboxRepository(self.pool)
+        self.conversations_repo = ConversationRepository(self.pool)
         
-        # Добавляем поле photo_category в существующую таблицу (если его нет)
+        # Применяем недостающие миграции схемы
         try:
-            cursor.execute("ALTER TABLE connection_photos ADD COLUMN photo_category TEXT NOT NULL DEFAULT 'other'")
-            logger.info("Добавлено поле photo_category в таблицу connection_photos")
-        except sqlite3.OperationalError:
-            # Поле уже существует
-            pass
+            self.migrate()
+        except Exception:
+            self.pool.close()
+            raise
+    
+    def connection(self):
+        """Взять подключение из пула (контекстный менеджер)"""
+        return self.pool.connection()
+    
+    def writer(self):
+        """Взять подключение для записи (через общую очередь записей пула)"""
+        return self.pool.writer()
+    
+    def transaction(self):
+        """Транзакция записи (вложенные вызовы репозиториев присоединяются к ней)"""
+        return self.pool.transaction()
+    
+    def close(self) -> None:
+        """Закрыть все подключения пула"""
+        self.pool.close()
+    
+    def cache_stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов кэша чтения"""
+        return self.cache.stats()
+    
+    def slow_queries(self, limit: int = 10, order: str = 'p95') -> List[Dict]:
+        """Самые медленные запросы по отпечаткам (пустой список без профилировщика)"""
+        if self.profiler is None:
+            return []
+        return self.profiler.top(limit, order)
+    
+    def _invalidate_employees(self, employee_ids: List[int], routers: bool = False) -> None:
+        """Сбросить кэш сотрудников после изменения балансов (и роутеров)"""
+        keys = [cache.EMPLOYEES, cache.EMPLOYEES_WITH_ROUTERS]
+        for employee_id in employee_ids:
+            keys.append(cache.employee_key(employee_id))
+            keys.append(cache.balance_key(employee_id))
+        if routers:
+            keys.append(cache.ROUTER_NAMES)
+        self.cache.invalidate(*keys)
+    
+    def migrate(self) -> int:
+        """
+        Привести схему БД к актуальной версии
         
-        # Таблица роутеров сотрудников
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS employee_routers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                router_name TEXT NOT NULL,
-                quantity INTEGER NOT NULL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
-            )
-        """)
+        Если схема уже актуальна, выполняется только чтение PRAGMA user_version
+        без DDL.
         
-        # Таблица логов движения материалов и роутеров
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS material_movement_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                operation_type TEXT NOT NULL,
-                item_type TEXT NOT NULL,
-                item_name TEXT,
-                quantity REAL NOT NULL,
-                balance_after REAL,
-                connection_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by INTEGER,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE,
-                FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE SET NULL
-            )
-        """)
+        Returns:
+            Версия схемы БД
         
-        conn.commit()
-        conn.close()
-        logger.info("Таблицы БД созданы успешно")
+        Raises:
+            SchemaVersionError: БД создана более новой версией бота
+        """
+        with self.writer() as conn:
+            version = get_schema_version(conn)
+            if version == LATEST_VERSION:
+                return version
+            version = migrate(conn)
+        logger.info(f"Схема БД обновлена до версии {version}")
+        return version
     
     # ==================== ЛОГИРОВАНИЕ ДВИЖЕНИЙ ====================
     
@@ -206,23 +143,8 @@ class Database:
             connection_id: ID подключения (если списание при подключении)
             created_by: ID пользователя, выполнившего операцию
         """
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO material_movement_log 
-                (employee_id, operation_type, item_type, item_name, quantity, 
-                 balance_after, connection_id, created_by)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (employee_id, operation_type, item_type, item_name, quantity,
-                  balance_after, connection_id, created_by))
-            conn.commit()
-            conn.close()
-            logger.info(f"Logged movement: {operation_type} {quantity} {item_type} for employee {employee_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка при логировании движения: {e}")
-            return False
+        return self.materials_repo.log_movement(employee_id, operation_type, item_type, item_name,
+                                                quantity, balance_after, connection_id, created_by)
     
     # ==================== СОТРУДНИКИ ====================
     
@@ -232,51 +154,79 @@ class Database:
         """Добавить нового сотрудника"""
         employee_id = self.employees_repo.create(full_name)
         if employee_id:
+            self.cache.invalidate(cache.EMPLOYEES, cache.EMPLOYEES_WITH_ROUTERS)
             logger.info(f"Добавлен сотрудник: {full_name} (ID: {employee_id})")
         return employee_id
     
-    def get_all_employees(self) -> List[Dict]:
+    def get_all_employees(self) -> List[EmployeeRow]:
         """Получить список всех сотрудников"""
-        return self.employees_repo.get_all()
+        return self.cache.get_or_load(cache.EMPLOYEES, self.employees_repo.get_all)
     
-    def get_employee_by_id(self, employee_id: int) -> Optional[Dict]:
+    def get_employees_with_routers(self) -> List[EmployeeWithRouters]:
+        """Получить всех сотрудников с балансами и роутерами по моделям (один запрос)"""
+        return self.cache.get_or_load(cache.EMPLOYEES_WITH_ROUTERS, self.employees_repo.get_all_with_routers)
+    
+    def get_employee_by_id(self, employee_id: int) -> Optional[EmployeeRow]:
         """Получить сотрудника по ID"""
-        return self.employees_repo.get_by_id(employee_id)
+        return self.cache.get_or_load(
+            cache.employee_key(employee_id),
+            lambda: self.employees_repo.get_by_id(employee_id)
+        )
     
     def delete_employee(self, employee_id: int) -> bool:
         """Удалить сотрудника"""
-        return self.employees_repo.delete(employee_id)
+        deleted = self.employees_repo.delete(employee_id)
+        if deleted:
+            # Вместе с сотрудником удаляются его роутеры
+            self._invalidate_employees([employee_id], routers=True)
+        return deleted
     
     # ==================== МАТЕРИАЛЫ (делегирование MaterialRepository) ====================
     
     def add_material_to_employee(self, employee_id: int, fiber_meters: float = 0, 
                                  twisted_pair_meters: float = 0, created_by: Optional[int] = None) -> bool:
         """Добавить материалы на баланс сотрудника"""
-        return self.materials_repo.add_material(employee_id, fiber_meters, twisted_pair_meters, created_by)
+        added = self.materials_repo.add_material(employee_id, fiber_meters, twisted_pair_meters, created_by)
+        if added:
+            self._invalidate_employees([employee_id])
+        return added
     
     def deduct_material_from_employee(self, employee_id: int, fiber_meters: float = 0,
                                       twisted_pair_meters: float = 0, 
                                       connection_id: Optional[int] = None,
                                       created_by: Optional[int] = None) -> bool:
         """Списать материалы с баланса сотрудника"""
-        return self.materials_repo.deduct_material(employee_id, fiber_meters, twisted_pair_meters, connection_id, created_by)
+        deducted = self.materials_repo.deduct_material(employee_id, fiber_meters, twisted_pair_meters,
+                                                       connection_id, created_by)
+        if deducted:
+            self._invalidate_employees([employee_id])
+        return deducted
     
     def get_employee_balance(self, employee_id: int) -> Optional[Tuple[float, float]]:
         """Получить баланс материалов сотрудника (ВОЛС, Витая пара)"""
-        return self.employees_repo.get_balance(employee_id)
+        return self.cache.get_or_load(
+            cache.balance_key(employee_id),
+            lambda: self.employees_repo.get_balance(employee_id)
+        )
     
     # ==================== РОУТЕРЫ (делегирование RouterRepository) ====================
     
     def add_router_to_employee(self, employee_id: int, router_name: str, quantity: int,
                               created_by: Optional[int] = None) -> bool:
         """Добавить роутеры сотруднику"""
-        return self.routers_repo.add_router(employee_id, router_name, quantity, created_by)
+        added = self.routers_repo.add_router(employee_id, router_name, quantity, created_by)
+        if added:
+            self.cache.invalidate(cache.EMPLOYEES_WITH_ROUTERS, cache.ROUTER_NAMES)
+        return added
     
     def deduct_router_from_employee(self, employee_id: int, router_name: str, quantity: int = 1,
                                     connection_id: Optional[int] = None,
                                     created_by: Optional[int] = None) -> bool:
         """Списать роутер у сотрудника"""
-        return self.routers_repo.deduct_router(employee_id, router_name, quantity, connection_id, created_by)
+        deducted = self.routers_repo.deduct_router(employee_id, router_name, quantity, connection_id, created_by)
+        if deducted:
+            self.cache.invalidate(cache.EMPLOYEES_WITH_ROUTERS, cache.ROUTER_NAMES)
+        return deducted
     
     def get_employee_routers(self, employee_id: int) -> List[Dict]:
         """Получить список роутеров сотрудника"""
@@ -288,13 +238,22 @@ class Database:
     
     def get_all_router_names(self) -> List[str]:
         """Получить список всех уникальных названий роутеров"""
-        return self.routers_repo.get_all_names()
+        return self.cache.get_or_load(cache.ROUTER_NAMES, self.routers_repo.get_all_names)
     
     def get_employee_movements(self, employee_id: int, start_date: datetime, 
                               end_date: datetime) -> List[Dict]:
         """Получить все движения материалов и роутеров сотрудника за период"""
         return self.materials_repo.get_movements(employee_id, start_date, end_date)
     
+    def iter_employee_movements(self, employee_id: int, start_date: datetime,
+                                end_date: datetime) -> Iterator[Dict]:
+        """Построчно выдать движения сотрудника за период (для потоковых отчетов)"""
+        return self.materials_repo.iter_movements(employee_id, start_date, end_date)
+    
+    def iter_all_movements(self, start_date: datetime, end_date: datetime) -> Iterator[Dict]:
+        """Построчно выдать движения всех сотрудников за период одним запросом (для общего отчета)"""
+        return self.materials_repo.iter_all_movements(start_date, end_date)
+    
     # ==================== ПОДКЛЮЧЕНИЯ ====================
     
     def create_connection(
@@ -312,128 +271,93 @@ class Database:
         router_quantity: int = 1,
         contract_signed: bool = False,
         router_access: bool = False,
-        telegram_bot_connected: bool = False
+        telegram_bot_connected: bool = False,
+        router_payer_id: Optional[int] = None,
+        report_chat_ids: Optional[List[int]] = None
     ) -> Optional[int]:
-        """Создать новое подключение и списать материалы с указанного сотрудника
+        """Создать новое подключение и списать материалы и роутеры
+        
+        Все шаги выполняются в одной транзакции: запись подключения, связь
+        с сотрудниками, дневные итоги, фотографии, списание материалов
+        и роутеров, журнал движений и отчеты в каналы в очереди исходящих.
+        Если любого материала или роутера не хватает, ничего не сохраняется.
         
         Args:
             material_payer_id: ID сотрудника, с которого списывать материалы.
                               Если None, материалы списываются поровну со всех.
+            router_payer_id: ID сотрудника, с которого списывать роутер.
+                            Если None или роутер не указан, роутер не списывается.
+            report_chat_ids: Каналы, в которые отправить отчет о подключении
+        
+        Returns:
+            ID подключения или None, если подключение не создано
         """
+        # Кто и сколько платит за материалы
+        if material_payer_id:
+            material_payers = [(material_payer_id, fiber_meters, twisted_pair_meters)]
+        elif employee_ids:
+            emp_count = len(employee_ids)
+            material_payers = [
+                (emp_id, fiber_meters / emp_count, twisted_pair_meters / emp_count)
+                for emp_id in employee_ids
+            ]
+        else:
+            material_payers = []
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Создаем запись подключения
-            cursor.execute("""
-                INSERT INTO connections 
-                (connection_type, address, router_model, port, fiber_meters, twisted_pair_meters, created_by, router_quantity, contract_signed, router_access, telegram_bot_connected)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (connection_type, address, router_model, port, fiber_meters, twisted_pair_meters, created_by, router_quantity, 1 if contract_signed else 0, 1 if router_access else 0, 1 if telegram_bot_connected else 0))
-            
-            connection_id = cursor.lastrowid
-            
-            # Связываем всех сотрудников с подключением
-            for emp_id in employee_ids:
-                cursor.execute("""
-                    INSERT INTO connection_employees (connection_id, employee_id)
-                    VALUES (?, ?)
-                """, (connection_id, emp_id))
-            
-            # Списываем материалы
-            if material_payer_id:
-                # Списываем весь материал с одного сотрудника
-                cursor.execute("""
-                    SELECT fiber_balance, twisted_pair_balance 
-                    FROM employees 
-                    WHERE id = ?
-                """, (material_payer_id,))
-                row = cursor.fetchone()
-                
-                if not row:
-                    logger.error(f"Сотрудник ID {material_payer_id} не найден")
-                    conn.close()
-                    return None
-                
-                current_fiber = row[0] or 0
-                current_twisted = row[1] or 0
-                
-                # Проверяем достаточность материалов
-                if current_fiber < fiber_meters:
-                    logger.warning(f"Недостаточно ВОЛС у сотрудника ID {material_payer_id}: "
-                                 f"есть {current_fiber}м, требуется {fiber_meters}м")
-                    conn.close()
-                    return None
-                
-                if current_twisted < twisted_pair_meters:
-                    logger.warning(f"Недостаточно витой пары у сотрудника ID {material_payer_id}: "
-                                 f"есть {current_twisted}м, требуется {twisted_pair_meters}м")
-                    conn.close()
-                    return None
-                
-                # Сохраняем в БД перед логированием
-                conn.commit()
-                conn.close()
-                
-                # Списываем весь материал с одного сотрудника (с логированием)
-                success = self.deduct_material_from_employee(
-                    material_payer_id, fiber_meters, twisted_pair_meters,
-                    connection_id, created_by
+            with self.transaction():
+                connection_id = self.connections_repo.create(
+                    connection_type, address, router_model, port, fiber_meters,
+                    twisted_pair_meters, created_by, router_quantity,
+                    contract_signed, router_access, telegram_bot_connected
                 )
+                if not connection_id:
+                    raise ValueError("не удалось сохранить запись подключения")
                 
-                if not success:
-                    logger.error(f"Не удалось списать материалы с сотрудника ID {material_payer_id}")
-                    return None
+                if employee_ids and not self.connections_repo.link_employees(connection_id, employee_ids):
+                    raise ValueError("не удалось связать сотрудников с подключением")
                 
-                logger.info(f"Списано у сотрудника ID {material_payer_id}: "
-                          f"ВОЛС -{fiber_meters}м, Витая пара -{twisted_pair_meters}м (полная сумма)")
+                if employee_ids and not self.stats_repo.add_connection(
+                    connection_id, employee_ids, fiber_meters, twisted_pair_meters
+                ):
+                    raise ValueError("не удалось обновить дневные итоги сотрудников")
                 
-                # Переоткрываем соединение для фото
-                conn = self.get_connection()
-                cursor = conn.cursor()
-            else:
-                # Старая логика: делим поровну между всеми
-                emp_count = len(employee_ids)
-                fiber_per_emp = fiber_meters / emp_count if emp_count > 0 else 0
-                twisted_per_emp = twisted_pair_meters / emp_count if emp_count > 0 else 0
+                if photo_file_ids and not self.connections_repo.save_photos(connection_id, photo_file_ids):
+                    raise ValueError("не удалось сохранить фотографии")
                 
-                # Сохраняем в БД перед логированием
-                conn.commit()
-                conn.close()
+                for emp_id, emp_fiber, emp_twisted in material_payers:
+                    if not self.materials_repo.deduct_material(
+                        emp_id, emp_fiber, emp_twisted, connection_id, created_by
+                    ):
+                        raise ValueError(f"не удалось списать материалы с сотрудника ID {emp_id}")
                 
-                for emp_id in employee_ids:
-                    # Списываем с логированием
-                    success = self.deduct_material_from_employee(
-                        emp_id, fiber_per_emp, twisted_per_emp,
-                        connection_id, created_by
-                    )
-                    
-                    if not success:
-                        logger.error(f"Не удалось списать материалы с сотрудника ID {emp_id}")
-                    else:
-                        logger.info(f"Списано у сотрудника ID {emp_id}: "
-                                  f"ВОЛС -{fiber_per_emp}м, Витая пара -{twisted_per_emp}м")
+                if router_payer_id and router_model and router_model != '-':
+                    if not self.routers_repo.deduct_router(
+                        router_payer_id, router_model, router_quantity, connection_id, created_by
+                    ):
+                        raise ValueError(
+                            f"не удалось списать роутер '{router_model}' x{router_quantity} "
+                            f"с сотрудника ID {router_payer_id}"
+                        )
+                    if not self.stats_repo.add_routers(router_payer_id, connection_id, router_quantity):
+                        raise ValueError("не удалось обновить дневные итоги роутеров")
                 
-                # Переоткрываем соединение для фото
-                conn = self.get_connection()
-                cursor = conn.cursor()
-            
-            # Сохраняем фотографии
-            for idx, photo_id in enumerate(photo_file_ids):
-                cursor.execute("""
-                    INSERT INTO connection_photos (connection_id, photo_file_id, photo_category, photo_order)
-                    VALUES (?, ?, ?, ?)
-                """, (connection_id, photo_id, 'general', idx))
+                if report_chat_ids and not self.outbox_repo.add_connection_reports(
+                    connection_id, report_chat_ids
+                ):
+                    raise ValueError("не удалось поставить отчет в очередь для каналов")
             
-            conn.commit()
-            conn.close()
+            self._invalidate_employees(
+                [emp_id for emp_id, _, _ in material_payers],
+                routers=bool(router_payer_id)
+            )
             logger.info(f"Создано подключение ID: {connection_id}, материалы списаны")
             return connection_id
         except Exception as e:
-            logger.error(f"Ошибка при создании подключения: {e}")
+            logger.error(f"Ошибка при создании подключения, изменения отменены: {e}")
             return None
     
-    def get_connection_by_id(self, connection_id: int) -> Optional[Dict]:
+    def get_connection_by_id(self, connection_id: int) -> Optional[ConnectionRow]:
         """Получить подключение по ID"""
         return self.connections_repo.get_by_id(connection_id)
     
@@ -458,86 +382,94 @@ class Database:
         Returns:
             Tuple: (список подключений, итоговая статистика)
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Формируем условие по дате
-        date_condition = ""
-        params = [employee_id]
-        if start_date and end_date:
-            date_condition = "AND c.created_at BETWEEN ? AND ?"
-            params.append(start_date.strftime("%Y-%m-%d %H:%M:%S"))
-            params.append(end_date.strftime("%Y-%m-%d %H:%M:%S"))
-        elif start_date:
-            date_condition = "AND c.created_at >= ?"
-            params.append(start_date.strftime("%Y-%m-%d %H:%M:%S"))
-        elif days is not None:
-            date_limit = datetime.now() - timedelta(days=days)
-            date_condition = "AND c.created_at >= ?"
-            params.append(date_limit.strftime("%Y-%m-%d %H:%M:%S"))
-        
-        # Получаем подключения с участием сотрудника
-        query = f"""
-            SELECT 
-                c.id,
-                c.connection_type,
-                c.address,
-                c.router_model,
-                c.port,
-                c.fiber_meters,
-                c.twisted_pair_meters,
-                c.created_at,
-                COUNT(DISTINCT ce.employee_id) as employee_count
-            FROM connections c
-            JOIN connection_employees ce ON c.id = ce.connection_id
-            WHERE ce.connection_id IN (
-                SELECT connection_id 
-                FROM connection_employees 
-                WHERE employee_id = ?
-            )
-            {date_condition}
-            GROUP BY c.id
-            ORDER BY c.created_at DESC
+        return self.connections_repo.get_employee_report(employee_id, days, start_date, end_date)
+    
+    def iter_employee_report(
+        self,
+        employee_id: int,
+        days: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Iterator[Dict]:
+        """Построчно выдать подключения сотрудника за период (для потоковых отчетов)"""
+        return self.connections_repo.iter_employee_report(employee_id, days, start_date, end_date)
+    
+    def iter_all_employees_report(self, start_date: datetime, end_date: datetime) -> Iterator[Dict]:
+        """Построчно выдать подключения всех сотрудников за период одним запросом (для общего отчета)"""
+        return self.connections_repo.iter_all_employees_report(start_date, end_date)
+    
+    def get_employee_period_stats(self, employee_id: int, start_date: datetime,
+                                  end_date: datetime) -> Dict:
         """
+        Итоги сотрудника за период из дневных итогов (сумма по дням, а не по подключениям)
         
-        cursor.execute(query, params)
-        connections = []
+        Период берется целыми днями от start_date до end_date, как у отчетов
+        с границами по началу и концу дня.
         
-        total_fiber = 0.0
-        total_twisted = 0.0
-        
-        for row in cursor.fetchall():
-            conn_dict = dict(row)
-            emp_count = conn_dict['employee_count']
-            
-            # Рассчитываем долю для сотрудника
-            conn_dict['employee_fiber_meters'] = round(conn_dict['fiber_meters'] / emp_count, 2)
-            conn_dict['employee_twisted_pair_meters'] = round(conn_dict['twisted_pair_meters'] / emp_count, 2)
-            
-            # Получаем список всех исполнителей для этого подключения
-            cursor.execute("""
-                SELECT e.full_name
-                FROM employees e
-                JOIN connection_employees ce ON e.id = ce.employee_id
-                WHERE ce.connection_id = ?
-                ORDER BY e.full_name
-            """, (conn_dict['id'],))
-            conn_dict['all_employees'] = [row['full_name'] for row in cursor.fetchall()]
-            
-            connections.append(conn_dict)
-            total_fiber += conn_dict['employee_fiber_meters']
-            total_twisted += conn_dict['employee_twisted_pair_meters']
-        
-        conn.close()
-        
-        stats = {
-            'total_connections': len(connections),
-            'total_fiber_meters': round(total_fiber, 2),
-            'total_twisted_pair_meters': round(total_twisted, 2)
-        }
-        
-        return connections, stats
+        Returns:
+            Словарь: total_connections, total_fiber_meters,
+            total_twisted_pair_meters, total_routers
+        """
+        return self.stats_repo.get_period_stats(employee_id, start_date, end_date)
+    
+    def get_report_watermark(self, employee_id: int) -> Optional[Tuple[int, int]]:
+        """Получить версию данных отчета сотрудника (максимальные ID подключения и движения, None при ошибке)"""
+        return self.connections_repo.get_report_watermark(employee_id)
     
     def get_all_connections_count(self) -> int:
         """Получить общее количество подключений"""
         return self.connections_repo.get_all_count()
+    
+    # ==================== ИСХОДЯЩИЕ СООБЩЕНИЯ (делегирование OutboxRepository) ====================
+    
+    def add_outbox_message(self, chat_id: int, method: str, payload: Dict,
+                           idempotency_key: Optional[str] = None) -> Optional[int]:
+        """Поставить вызов Bot API в очередь исходящих сообщений (один раз на ключ)"""
+        return self.outbox_repo.add(chat_id, method, payload, idempotency_key)
+    
+    def release_connection_reports(self, connection_id: int, payload: Optional[Dict] = None) -> int:
+        """Разрешить отправку отчетов подключения в каналы (с параметрами копирования)"""
+        return self.outbox_repo.release_connection_reports(connection_id, payload)
+    
+    def claim_due_outbox(self, limit: int) -> List[Dict]:
+        """Взять в отправку до limit сообщений очереди, срок которых наступил"""
+        return self.outbox_repo.claim_due(limit)
+    
+    def release_outbox_claims(self) -> int:
+        """Вернуть в очередь сообщения, отправка которых была прервана остановкой бота"""
+        return self.outbox_repo.release_claims()
+    
+    def mark_outbox_sent(self, message_id: int) -> bool:
+        """Отметить сообщение очереди отправленным"""
+        return self.outbox_repo.mark_sent(message_id)
+    
+    def reschedule_outbox(self, message_id: int, attempts: int, delay: float, error: str) -> bool:
+        """Запомнить неудачную попытку отправки и время следующей"""
+        return self.outbox_repo.reschedule(message_id, attempts, delay, error)
+    
+    def mark_outbox_failed(self, message_id: int, attempts: int, error: str) -> bool:
+        """Отметить сообщение очереди, которое отправить не удастся"""
+        return self.outbox_repo.mark_failed(message_id, attempts, error)
+    
+    def get_connection_deliveries(self, connection_id: int) -> List[Dict]:
+        """Состояние доставки отчета о подключении по каналам"""
+        return self.outbox_repo.get_connection_deliveries(connection_id)
+    
+    def get_outbox_status_counts(self) -> Dict[str, int]:
+        """Количество сообщений очереди по статусам"""
+        return self.outbox_repo.get_status_counts()
+    
+    # ==================== СОСТОЯНИЕ ДИАЛОГОВ (делегирование ConversationRepository) ====================
+    
+    def get_conversation_states(self, name: str, max_age: Optional[float] = None) -> List[Dict]:
+        """Сохраненные шаги диалогов ConversationHandler (expired - брошен дольше max_age)"""
+        return self.conversations_repo.get_states(name, max_age)
+    
+    def get_user_data_page(self, after_user_id: int = 0, limit: int = 500) -> List[Dict]:
+        """Страница сохраненных user_data (по возрастанию user_id)"""
+        return self.conversations_repo.get_user_data_page(after_user_id, limit)
+    
+    def save_conversation_data(self, states: List[Tuple[str, str, Optional[int]]],
+                               user_data: List[Tuple[int, Optional[str]]]) -> bool:
+        """Записать изменения шагов диалогов и user_data одной транзакцией"""
+        return self.conversations_repo.save(states, user_data)
@@ -0,0 +1,345 @@
+"""
+Версионные миграции схемы БД
+Текущая версия схемы хранится в PRAGMA user_version
+"""
+import sqlite3
+from typing import Callable, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaVersionError(RuntimeError):
+    """Версия схемы БД новее, чем известно этой версии бота"""
+
+
+def _add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+    """Добавить столбец в таблицу, если его еще нет (для БД, созданных до миграций)"""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"Добавлено поле {column} в таблицу {table}")
+
+
+def _migration_001_initial_schema(cursor: sqlite3.Cursor) -> None:
+    """Базовая схема: сотрудники, подключения, фото, роутеры, журнал движений"""
+    # Таблица сотрудников
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            full_name TEXT NOT NULL UNIQUE,
+            fiber_balance REAL DEFAULT 0,
+            twisted_pair_balance REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица подключений
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS connections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            connection_type TEXT NOT NULL DEFAULT 'mkd',
+            address TEXT NOT NULL,
+            router_model TEXT NOT NULL,
+            port TEXT NOT NULL,
+            fiber_meters REAL NOT NULL,
+            twisted_pair_meters REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER NOT NULL
+        )
+    """)
+
+    # Таблица связи подключений и сотрудников (многие ко многим)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS connection_employees (
+            connection_id INTEGER NOT NULL,
+            employee_id INTEGER NOT NULL,
+            PRIMARY KEY (connection_id, employee_id),
+            FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE CASCADE,
+            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Таблица фотографий подключений
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS connection_photos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            connection_id INTEGER NOT NULL,
+            photo_file_id TEXT NOT NULL,
+            photo_category TEXT NOT NULL DEFAULT 'other',
+            photo_order INTEGER NOT NULL,
+            FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Таблица роутеров сотрудников
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS employee_routers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            router_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Таблица логов движения материалов и роутеров
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS material_movement_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER NOT NULL,
+            operation_type TEXT NOT NULL,
+            item_type TEXT NOT NULL,
+            item_name TEXT,
+            quantity REAL NOT NULL,
+            balance_after REAL,
+            connection_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER,
+            FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE,
+            FOREIGN KEY (connection_id) REFERENCES connections(id) ON DELETE SET NULL
+        )
+    """)
+
+    # Поля, которые добавлялись в схему постепенно. Порядок сохранен,
+    # чтобы новые и старые БД получили одинаковую структуру таблиц.
+    _add_column_if_missing(cursor, 'employees', 'fiber_balance', 'REAL DEFAULT 0')
+    _add_column_if_missing(cursor, 'employees', 'twisted_pair_balance', 'REAL DEFAULT 0')
+    _add_column_if_missing(cursor, 'connections', 'connection_type', "TEXT NOT NULL DEFAULT 'mkd'")
+    _add_column_if_missing(cursor, 'connections', 'router_quantity', 'INTEGER DEFAULT 1')
+    _add_column_if_missing(cursor, 'connections', 'contract_signed', 'INTEGER DEFAULT 0')
+    _add_column_if_missing(cursor, 'connections', 'router_access', 'INTEGER DEFAULT 0')
+    _add_column_if_missing(cursor, 'connections', 'telegram_bot_connected', 'INTEGER DEFAULT 0')
+    _add_column_if_missing(cursor, 'connection_photos', 'photo_category', "TEXT NOT NULL DEFAULT 'other'")
+
+
+def _migration_002_hot_path_indexes(cursor: sqlite3.Cursor) -> None:
+    """Индексы для отчетов, журнала движений, фотографий и поиска роутеров"""
+    # Подключения сотрудника (покрывающий: connection_id берется из индекса)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_connection_employees_employee
+        ON connection_employees (employee_id, connection_id)
+    """)
+
+    # Отбор подключений по периоду
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_connections_created_at
+        ON connections (created_at)
+    """)
+
+    # Движения сотрудника за период в хронологическом порядке
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movement_log_employee_created
+        ON material_movement_log (employee_id, created_at)
+    """)
+
+    # Поиск роутера сотрудника по названию (покрывающий для остатка)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_employee_routers_employee_router
+        ON employee_routers (employee_id, router_name, quantity)
+    """)
+
+    # Фотографии подключения по порядку
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_connection_photos_connection
+        ON connection_photos (connection_id, photo_order)
+    """)
+
+    # Список названий роутеров в наличии
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_employee_routers_router_quantity
+        ON employee_routers (router_name, quantity)
+    """)
+
+
+def _migration_003_employee_daily_stats(cursor: sqlite3.Cursor) -> None:
+    """Дневные итоги по сотрудникам и их заполнение по накопленной истории"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS employee_daily_stats (
+            employee_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            connections INTEGER NOT NULL DEFAULT 0,
+            fiber_meters REAL NOT NULL DEFAULT 0,
+            twisted_pair_meters REAL NOT NULL DEFAULT 0,
+            routers INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (employee_id, day)
+        ) WITHOUT ROWID
+    """)
+
+    # Доли считаются в Python, чтобы округление совпадало с отчетом.
+    # Формула скопирована из employee_share на момент миграции: миграция
+    # не должна меняться вместе с кодом репозиториев
+    totals = {}
+    rows = cursor.connection.execute("""
+        SELECT
+            ce.employee_id,
+            date(c.created_at) AS day,
+            c.fiber_meters,
+            c.twisted_pair_meters,
+            (SELECT COUNT(*) FROM connection_employees n WHERE n.connection_id = c.id) AS employee_count
+        FROM connections c
+        JOIN connection_employees ce ON ce.connection_id = c.id
+    """)
+    for employee_id, day, fiber, twisted, employee_count in rows:
+        day_totals = totals.setdefault((employee_id, day), [0, 0.0, 0.0, 0])
+        day_totals[0] += 1
+        day_totals[1] += round(fiber / employee_count, 2)
+        day_totals[2] += round(twisted / employee_count, 2)
+
+    # Роутеры, списанные на подключения, относятся ко дню подключения
+    rows = cursor.connection.execute("""
+        SELECT m.employee_id, date(c.created_at) AS day, SUM(m.quantity)
+        FROM material_movement_log m
+        JOIN connections c ON c.id = m.connection_id
+        WHERE m.item_type = 'router' AND m.operation_type = 'deduct'
+        GROUP BY m.employee_id, day
+    """)
+    for employee_id, day, quantity in rows:
+        totals.setdefault((employee_id, day), [0, 0.0, 0.0, 0])[3] += int(quantity)
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO employee_daily_stats
+        (employee_id, day, connections, fiber_meters, twisted_pair_meters, routers)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [key + tuple(values) for key, values in totals.items()])
+    if totals:
+        logger.info(f"Дневные итоги заполнены по истории: {len(totals)} строк")
+
+
+def _migration_004_outbox(cursor: sqlite3.Cursor) -> None:
+    """Очередь исходящих сообщений Telegram с повторными попытками"""
+    # Вызов Bot API: метод, чат и JSON с остальными параметрами.
+    # status: pending - ждет отправки, sending - отправляется,
+    # sent - отправлено, failed - не будет отправлено
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            method TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+    """)
+
+    # Неотправленные сообщения при запуске бота
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_status
+        ON outbox (status, id)
+    """)
+
+
+def _migration_005_outbox_delivery(cursor: sqlite3.Cursor) -> None:
+    """Ключи идемпотентности, связь с подключением и выборка готовых к отправке"""
+    _add_column_if_missing(cursor, 'outbox', 'idempotency_key', 'TEXT')
+    _add_column_if_missing(cursor, 'outbox', 'connection_id', 'INTEGER')
+
+    # Повторная постановка того же сообщения (например, отчета в канал) игнорируется
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_idempotency_key
+        ON outbox (idempotency_key)
+    """)
+
+    # Сообщения подключения (для привязки уже отправленного пользователю отчета)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_connection
+        ON outbox (connection_id)
+    """)
+
+    # Готовые к отправке: статус и время следующей попытки
+    cursor.execute("DROP INDEX IF EXISTS idx_outbox_status")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_due
+        ON outbox (status, next_attempt_at)
+    """)
+
+
+def _migration_006_conversation_persistence(cursor: sqlite3.Cursor) -> None:
+    """Состояния диалогов и user_data, переживающие перезапуск бота"""
+    # Шаг диалога: имя ConversationHandler, ключ (JSON-массив chat_id/user_id)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_states (
+            name TEXT NOT NULL,
+            conversation_key TEXT NOT NULL,
+            state INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (name, conversation_key)
+        ) WITHOUT ROWID
+    """)
+
+    # Данные пользователя: компактный JSON с метками типов (см. persistence.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+# Список миграций: (версия, описание, функция). Номера идут строго по порядку.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "Базовая схема", _migration_001_initial_schema),
+    (2, "Индексы горячих запросов", _migration_002_hot_path_indexes),
+    (3, "Дневные итоги по сотрудникам", _migration_003_employee_daily_stats),
+    (4, "Очередь исходящих сообщений", _migration_004_outbox),
+    (5, "Доставка исходящих сообщений", _migration_005_outbox_delivery),
+    (6, "Сохранение состояния диалогов", _migration_006_conversation_persistence),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы БД"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Применить недостающие миграции
+
+    Каждая миграция выполняется в отдельной транзакции вместе с
+    обновлением user_version, поэтому прерванный запуск безопасно
+    продолжается со следующей неприменённой миграции.
+
+    Returns:
+        Версия схемы после применения миграций
+
+    Raises:
+        SchemaVersionError: БД создана более новой версией бота
+    """
+    version = get_schema_version(conn)
+    if version > LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Версия схемы БД ({version}) новее поддерживаемой ({LATEST_VERSION}). "
+            f"Обновите бота перед запуском."
+        )
+
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Другой процесс мог применить миграцию, пока мы ждали блокировку
+            if get_schema_version(conn) >= number:
+                conn.rollback()
+                continue
+
+            apply(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        logger.info(f"Применена миграция БД {number}: {description}")
+        version = number
+
+    return get_schema_version(conn)
@@ -0,0 +1,70 @@
+"""
+Типизированные строки результатов запросов
+
+Строки - NamedTuple: создаются прямо из кортежа SQLite без промежуточных
+sqlite3.Row и dict, занимают память кортежа и неизменяемы, поэтому
+безопасно раздаются из кэша чтения всем обработчикам.
+"""
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class EmployeeRow(NamedTuple):
+    """Сотрудник с балансами материалов"""
+    id: int
+    full_name: str
+    fiber_balance: float
+    twisted_pair_balance: float
+    created_at: Optional[str]
+
+
+# Столбцы employees в порядке полей EmployeeRow
+EMPLOYEE_COLUMNS = 'id, full_name, fiber_balance, twisted_pair_balance, created_at'
+
+
+class RouterCount(NamedTuple):
+    """Количество роутеров одной модели у сотрудника"""
+    router_name: str
+    quantity: int
+
+
+class EmployeeWithRouters(NamedTuple):
+    """Сотрудник с балансами и роутерами по моделям"""
+    id: int
+    full_name: str
+    fiber_balance: float
+    twisted_pair_balance: float
+    created_at: Optional[str]
+    routers: Tuple[RouterCount, ...]
+    router_count: int               # Всего роутеров
+
+
+class EmployeeRef(NamedTuple):
+    """Исполнитель подключения"""
+    id: int
+    full_name: str
+
+
+class ConnectionRow(NamedTuple):
+    """Подключение с исполнителями и фотографиями"""
+    id: int
+    connection_type: str
+    address: str
+    router_model: str
+    port: str
+    fiber_meters: float
+    twisted_pair_meters: float
+    created_at: str
+    created_by: int
+    router_quantity: int
+    contract_signed: int            # 0/1
+    router_access: int              # 0/1
+    telegram_bot_connected: int     # 0/1
+    employees: List[EmployeeRef]
+    photos: List[str]
+
+
+# Столбцы connections в порядке полей ConnectionRow (без employees и photos)
+CONNECTION_COLUMNS = (
+    'id, connection_type, address, router_model, port, fiber_meters, twisted_pair_meters, '
+    'created_at, created_by, router_quantity, contract_signed, router_access, telegram_bot_connected'
+)
@@ -0,0 +1,256 @@
+"""
+Профилировщик SQL-запросов
+
+Если пулу передан QueryProfiler, подключения создаются классом
+ProfilingConnection, и каждый execute/executemany замеряется: в
+репозиториях, в курсорах Database.create_connection, MaterialRepository
+и RouterRepository. Запросы группируются по отпечатку: тексту SQL, в
+котором литералы заменены на ?, а списки IN (?, ?, ...) свернуты. Для
+каждого отпечатка хранится окно последних длительностей (p50/p95/p99).
+Запросы дольше порога пишутся в лог вместе с планом EXPLAIN QUERY PLAN.
+
+Время execute у SELECT включает планирование и получение первой строки
+(сортировка и агрегаты выполняются до нее), но не чтение остальных строк.
+"""
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию
+DEFAULT_SLOW_THRESHOLD = 0.1
+DEFAULT_WINDOW = 256
+DEFAULT_MAX_FINGERPRINTS = 512
+
+# Запросы, для которых строится план (PRAGMA и BEGIN/COMMIT пропускаются)
+EXPLAINED_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+# Сортировка top(): по p95 или по суммарному времени
+ORDER_KEYS = ('p95', 'total')
+
+_COMMENT = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\?(?:, ?\?)+\)')
+
+
+def fingerprint(sql: str) -> str:
+    """Отпечаток запроса: без комментариев, литералов и лишних пробелов"""
+    sql = _COMMENT.sub(' ', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = ' '.join(sql.split())
+    return _PLACEHOLDER_LIST.sub('(...)', sql)
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    """Процентиль отсортированных значений (ближайший ранг)"""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class QueryStats:
+    """Статистика одного отпечатка запроса"""
+
+    __slots__ = ('fingerprint', 'calls', 'total', 'max', 'slow', 'samples', 'plan')
+
+    def __init__(self, fingerprint: str, window: int):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.samples: deque = deque(maxlen=window)
+        self.plan: Optional[List[str]] = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Счетчики и процентили по окну последних вызовов (секунды)"""
+        ordered = sorted(self.samples)
+        return {
+            'fingerprint': self.fingerprint,
+            'calls': self.calls,
+            'total': self.total,
+            'max': self.max,
+            'slow': self.slow,
+            'p50': _percentile(ordered, 0.5),
+            'p95': _percentile(ordered, 0.95),
+            'p99': _percentile(ordered, 0.99),
+            'plan': list(self.plan or ())
+        }
+
+
+class QueryProfiler:
+    """
+    Статистика времени выполнения запросов по отпечаткам
+
+    Запросы выполняются в нескольких потоках, поэтому статистика
+    защищена блокировкой. Хранится не больше max_fingerprints отпечатков:
+    давно не встречавшиеся вытесняются.
+    """
+
+    def __init__(
+        self,
+        slow_threshold: float = DEFAULT_SLOW_THRESHOLD,
+        window: int = DEFAULT_WINDOW,
+        max_fingerprints: int = DEFAULT_MAX_FINGERPRINTS
+    ):
+        """
+        Args:
+            slow_threshold: С какой длительности (секунды) запрос считается медленным
+            window: Сколько последних длительностей хранить для процентилей
+            max_fingerprints: Сколько отпечатков хранить
+        """
+        self.slow_threshold = slow_threshold
+        self.window = window
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._queries: 'OrderedDict[str, QueryStats]' = OrderedDict()
+        self._fingerprints: Dict[str, str] = {}
+        self._counters = {'queries': 0, 'slow': 0, 'evicted': 0}
+
+    def _fingerprint(self, sql: str) -> str:
+        """Отпечаток с кэшем по тексту запроса (запросы - шаблоны с ?, их немного)"""
+        key = self._fingerprints.get(sql)
+        if key is None:
+            if len(self._fingerprints) >= self.max_fingerprints * 4:
+                self._fingerprints.clear()
+            key = self._fingerprints[sql] = fingerprint(sql)
+        return key
+
+    def record(self, conn: sqlite3.Connection, sql: str, params: Any, seconds: float) -> None:
+        """
+        Учесть выполненный запрос
+
+        Медленный запрос пишется в лог; план строится на том же подключении
+        один раз для отпечатка и хранится вместе со статистикой. Если план
+        построить не удалось, он не сохраняется и строится при следующем
+        медленном выполнении.
+        """
+        key = self._fingerprint(sql)
+        slow = seconds >= self.slow_threshold
+
+        with self._lock:
+            stats = self._queries.get(key)
+            if stats is None:
+                if len(self._queries) >= self.max_fingerprints:
+                    self._queries.popitem(last=False)
+                    self._counters['evicted'] += 1
+                stats = self._queries[key] = QueryStats(key, self.window)
+            else:
+                self._queries.move_to_end(key)
+
+            stats.calls += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.samples.append(seconds)
+            self._counters['queries'] += 1
+            if slow:
+                stats.slow += 1
+                self._counters['slow'] += 1
+            plan = stats.plan
+
+        if not slow:
+            return
+        if plan is None:
+            plan = _explain(conn, sql, params)
+            if plan is not None:
+                stats.plan = plan
+        logger.warning(
+            f"Медленный запрос ({seconds * 1000:.0f} мс): {key}"
+            + (f"\n  план: {' | '.join(plan)}" if plan else "")
+        )
+
+    def top(self, limit: int = 10, order: str = 'p95') -> List[Dict[str, Any]]:
+        """
+        Самые медленные отпечатки
+
+        Args:
+            limit: Сколько вернуть
+            order: p95 - по 95-му процентилю, total - по суммарному времени
+
+        Returns:
+            Список summary() отпечатков по убыванию order
+        """
+        if order not in ORDER_KEYS:
+            raise ValueError(f"Неизвестная сортировка: {order}")
+        with self._lock:
+            summaries = [stats.summary() for stats in self._queries.values()]
+        summaries.sort(key=lambda item: item[order], reverse=True)
+        return summaries[:limit]
+
+    def reset(self) -> None:
+        """Очистить статистику"""
+        with self._lock:
+            self._queries.clear()
+            self._counters = dict.fromkeys(self._counters, 0)
+
+    def stats(self) -> Dict[str, int]:
+        """Число отпечатков и счетчики запросов"""
+        return {'fingerprints': len(self._queries), **self._counters}
+
+
+def _explain(conn: sqlite3.Connection, sql: str, params: Any) -> Optional[List[str]]:
+    """
+    Строки EXPLAIN QUERY PLAN запроса
+
+    Returns:
+        Строки плана, пустой список для запросов без плана (PRAGMA и т.п.)
+        или None, если план построить не удалось
+    """
+    if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+        return []
+    try:
+        # Обычный курсор: сам EXPLAIN не профилируется
+        cursor = sqlite3.Cursor(conn)
+        cursor.row_factory = None
+        return [row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    except sqlite3.Error as e:
+        logger.debug(f"Не удалось построить план запроса: {e}")
+        return None
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Курсор, замеряющий execute и executemany"""
+
+    def execute(self, sql: str, parameters: Any = ()) -> 'ProfilingCursor':
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.profiler.record(self.connection, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> 'ProfilingCursor':
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # План строится по первому набору параметров, если он доступен
+            first = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else ()
+            self.connection.profiler.record(self.connection, sql, first, time.perf_counter() - start)
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """
+    Подключение, все запросы которого идут через ProfilingCursor
+
+    Используется как factory для sqlite3.connect; профилировщик
+    присваивается атрибуту profiler после создания.
+    """
+
+    profiler: QueryProfiler
+
+    def cursor(self, factory: type = ProfilingCursor) -> sqlite3.Cursor:
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> sqlite3.Cursor:
+        return self.cursor().executemany(sql, seq_of_parameters)
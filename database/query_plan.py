@@ -0,0 +1,147 @@
+"""
+Проверка планов запросов репозиториев
+Выполняет все публичные методы Database на пустой БД в памяти, собирает
+выполненные SQL-запросы и проверяет их через EXPLAIN QUERY PLAN.
+
+Запуск из корня проекта (код возврата 1, если есть полные сканирования):
+    python -m database.query_plan
+"""
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+import logging
+
+from database.db_manager import Database
+
+logger = logging.getLogger(__name__)
+
+# Полное сканирование таблицы без индекса: "SCAN connections" или "SCAN c"
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (?!CONSTANT ROW)(?!\()\S+$')
+
+# Запросы, которые проверяются (служебные PRAGMA и BEGIN/COMMIT пропускаются)
+CHECKED_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def _exercise(db: Database) -> None:
+    """Вызвать каждый публичный метод Database хотя бы один раз"""
+    now = datetime.now()
+    week_ago = now - timedelta(days=7)
+
+    emp_id = db.add_employee("Проверка Планов")
+    db.add_material_to_employee(emp_id, fiber_meters=100, twisted_pair_meters=100, created_by=1)
+    db.add_router_to_employee(emp_id, "Router", 2, created_by=1)
+    db.log_material_movement(emp_id, 'add', 'fiber', 'ВОЛС', 1, 101, None, 1)
+
+    connection_id = db.create_connection(
+        connection_type='mkd', address="Адрес", router_model="Router", port="1",
+        fiber_meters=1, twisted_pair_meters=1, employee_ids=[emp_id],
+        photo_file_ids=["photo"], created_by=1, material_payer_id=emp_id,
+        router_payer_id=emp_id, report_chat_ids=[-100]
+    )
+    db.deduct_material_from_employee(emp_id, 1, 1, connection_id, 1)
+    db.deduct_router_from_employee(emp_id, "Router", 1, connection_id, 1)
+
+    db.get_all_employees()
+    db.get_employees_with_routers()
+    db.get_employee_by_id(emp_id)
+    db.get_employee_balance(emp_id)
+    db.get_employee_routers(emp_id)
+    db.get_router_quantity(emp_id, "Router")
+    db.get_all_router_names()
+    db.get_employee_movements(emp_id, week_ago, now)
+    db.get_connection_by_id(connection_id)
+    db.get_employee_report(emp_id)
+    db.get_employee_report(emp_id, days=7)
+    db.get_employee_report(emp_id, start_date=week_ago)
+    db.get_employee_report(emp_id, start_date=week_ago, end_date=now)
+    list(db.iter_employee_report(emp_id, start_date=week_ago, end_date=now))
+    list(db.iter_employee_movements(emp_id, week_ago, now))
+    db.get_report_watermark(emp_id)
+    db.get_employee_period_stats(emp_id, week_ago, now)
+    list(db.iter_all_employees_report(week_ago, now))
+    list(db.iter_all_movements(week_ago, now))
+    db.get_all_connections_count()
+
+    message_id = db.add_outbox_message(-100, 'copy_messages', {'from_chat_id': 1, 'message_ids': [1]}, 'key')
+    db.add_outbox_message(-100, 'copy_messages', {'from_chat_id': 1, 'message_ids': [1]}, 'key')
+    db.release_connection_reports(connection_id, {'from_chat_id': 1, 'message_ids': [1]})
+    db.claim_due_outbox(10)
+    db.release_outbox_claims()
+    db.reschedule_outbox(message_id, 1, 5, "Timed out")
+    db.mark_outbox_failed(message_id, 2, "Chat not found")
+    db.mark_outbox_sent(message_id)
+    db.get_connection_deliveries(connection_id)
+    db.get_outbox_status_counts()
+
+    db.save_conversation_data([('connection', '[1,1]', 1), ('report', '[1,1]', None)], [(1, '{}'), (2, None)])
+    db.get_conversation_states('connection', 3600)
+    db.get_user_data_page(0, 100)
+
+    db.delete_employee(emp_id)
+
+
+def collect_query_plans() -> Dict[str, List[str]]:
+    """
+    Собрать планы всех запросов, выполняемых публичными методами Database
+
+    Returns:
+        Словарь: SQL-запрос -> строки плана EXPLAIN QUERY PLAN
+    """
+    db = Database(':memory:', pool_size=1)
+    statements: List[str] = []
+
+    try:
+        with db.connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                _exercise(db)
+            finally:
+                conn.set_trace_callback(None)
+
+            plans: Dict[str, List[str]] = {}
+            for sql in statements:
+                sql = ' '.join(sql.split())
+                if sql in plans or not sql.upper().startswith(CHECKED_STATEMENTS):
+                    continue
+                plans[sql] = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    finally:
+        db.close()
+
+    return plans
+
+
+def find_full_scans(plans: Dict[str, List[str]]) -> List[Tuple[str, str]]:
+    """Найти шаги плана с полным сканированием таблицы: [(запрос, шаг плана)]"""
+    return [
+        (sql, step)
+        for sql, steps in plans.items()
+        for step in steps
+        if FULL_SCAN_PATTERN.match(step)
+    ]
+
+
+def main() -> int:
+    """Вывести планы запросов и вернуть 1, если найдены полные сканирования"""
+    logging.disable(logging.WARNING)
+
+    plans = collect_query_plans()
+    full_scans = find_full_scans(plans)
+
+    for sql, steps in plans.items():
+        print(sql)
+        for step in steps:
+            marker = '❌' if FULL_SCAN_PATTERN.match(step) else '  '
+            print(f"  {marker} {step}")
+        print()
+
+    if full_scans:
+        print(f"❌ Полное сканирование в {len({sql for sql, _ in full_scans})} запросах")
+        return 1
+
+    print(f"✅ Проверено запросов: {len(plans)}, полных сканирований нет")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,11 +6,17 @@ from database.repositories.employee_repository import EmployeeRepository
 from database.repositories.material_repository import MaterialRepository
 from database.repositories.router_repository import RouterRepository
 from database.repositories.connection_repository import ConnectionRepository
+from database.repositories.stats_repository import StatsRepository
+from database.repositories.outbox_repository import OutboxRepository
+from database.repositories.conversation_repository import ConversationRepository
 
 __all__ = [
     'EmployeeRepository',
     'MaterialRepository',
     'RouterRepository',
-    'ConnectionRepository'
+    'ConnectionRepository',
+    'StatsRepository',
+    'OutboxRepository',
+    'ConversationRepository'
 ]
 
@@ -1,14 +1,23 @@
 """
 Репозиторий для работы с подключениями
 """
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
 
 from database.base_repository import BaseRepository
+from database.models import CONNECTION_COLUMNS, ConnectionRow, EmployeeRef
 
 logger = logging.getLogger(__name__)
 
+# Разделитель имен исполнителей в group_concat (не встречается в ФИО)
+EXECUTORS_SEPARATOR = '\x1f'
+
+
+def employee_share(meters: float, emp_count: int) -> float:
+    """Доля сотрудника в метраже подключения с emp_count исполнителями"""
+    return round(meters / emp_count, 2)
+
 
 class ConnectionRepository(BaseRepository):
     """Репозиторий для управления подключениями"""
@@ -29,27 +38,25 @@ class ConnectionRepository(BaseRepository):
     ) -> Optional[int]:
         """Создать новое подключение"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Создаем запись подключения
-            cursor.execute("""
-                INSERT INTO connections 
-                (connection_type, address, router_model, port, fiber_meters, 
-                 twisted_pair_meters, created_by, router_quantity, contract_signed, 
-                 router_access, telegram_bot_connected)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                connection_type, address, router_model, port, fiber_meters,
-                twisted_pair_meters, created_by, router_quantity,
-                1 if contract_signed else 0,
-                1 if router_access else 0,
-                1 if telegram_bot_connected else 0
-            ))
-            
-            connection_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Создаем запись подключения
+                cursor.execute("""
+                    INSERT INTO connections 
+                    (connection_type, address, router_model, port, fiber_meters, 
+                     twisted_pair_meters, created_by, router_quantity, contract_signed, 
+                     router_access, telegram_bot_connected)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    connection_type, address, router_model, port, fiber_meters,
+                    twisted_pair_meters, created_by, router_quantity,
+                    1 if contract_signed else 0,
+                    1 if router_access else 0,
+                    1 if telegram_bot_connected else 0
+                ))
+                
+                connection_id = cursor.lastrowid
             
             logger.info(f"Создано подключение ID: {connection_id}")
             return connection_id
@@ -84,53 +91,186 @@ class ConnectionRepository(BaseRepository):
             logger.error(f"Ошибка при сохранении фотографий: {e}")
             return False
     
-    def get_by_id(self, connection_id: int) -> Optional[Dict]:
-        """Получить подключение по ID"""
+    def get_by_id(self, connection_id: int) -> Optional[ConnectionRow]:
+        """Получить подключение по ID вместе с исполнителями и фотографиями"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Получаем основную информацию
-            cursor.execute("""
-                SELECT id, connection_type, address, router_model, port, fiber_meters, 
-                       twisted_pair_meters, created_at, created_by, router_quantity, 
-                       contract_signed, router_access, telegram_bot_connected
-                FROM connections
-                WHERE id = ?
-            """, (connection_id,))
-            
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return None
-            
-            connection = dict(row)
-            
-            # Получаем сотрудников
-            cursor.execute("""
-                SELECT e.id, e.full_name
-                FROM employees e
-                JOIN connection_employees ce ON e.id = ce.employee_id
-                WHERE ce.connection_id = ?
-                ORDER BY e.full_name
-            """, (connection_id,))
-            connection['employees'] = [dict(row) for row in cursor.fetchall()]
-            
-            # Получаем фотографии
-            cursor.execute("""
-                SELECT photo_file_id
-                FROM connection_photos
-                WHERE connection_id = ?
-                ORDER BY photo_order
-            """, (connection_id,))
-            connection['photos'] = [row['photo_file_id'] for row in cursor.fetchall()]
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                
+                # Получаем основную информацию
+                cursor.execute(f"""
+                    SELECT {CONNECTION_COLUMNS}
+                    FROM connections
+                    WHERE id = ?
+                """, (connection_id,))
+                
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                # Получаем сотрудников
+                cursor.execute("""
+                    SELECT e.id, e.full_name
+                    FROM employees e
+                    JOIN connection_employees ce ON e.id = ce.employee_id
+                    WHERE ce.connection_id = ?
+                    ORDER BY e.full_name
+                """, (connection_id,))
+                employees = list(map(EmployeeRef._make, cursor))
+                
+                # Получаем фотографии
+                cursor.execute("""
+                    SELECT photo_file_id
+                    FROM connection_photos
+                    WHERE connection_id = ?
+                    ORDER BY photo_order
+                """, (connection_id,))
+                photos = [photo_file_id for photo_file_id, in cursor]
             
-            conn.close()
-            return connection
+            return ConnectionRow(*row, employees, photos)
         except Exception as e:
             logger.error(f"Ошибка при получении подключения: {e}")
             return None
     
+    def _report_query(
+        self,
+        employee_id: Optional[int],
+        days: Optional[int],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> Tuple[str, List]:
+        """
+        Собрать запрос подключений сотрудника за период и его параметры
+        
+        Если employee_id не указан, запрос возвращает доли всех сотрудников
+        одним проходом, сгруппированные по сотрудникам (по ФИО и ID).
+        """
+        if employee_id is None:
+            employee_name = "e.full_name AS employee_name,"
+            source = "JOIN employees e ON e.id = mine.employee_id"
+            condition = "WHERE 1 = 1"
+            order = "e.full_name, e.id, c.created_at DESC, c.id DESC"
+            params = []
+        else:
+            employee_name = ""
+            source = ""
+            condition = "WHERE mine.employee_id = ?"
+            order = "c.created_at DESC, c.id DESC"
+            params = [employee_id]
+        
+        # Формируем условие по дате
+        date_condition = ""
+        if start_date and end_date:
+            date_condition = "AND c.created_at BETWEEN ? AND ?"
+            params.append(start_date.strftime("%Y-%m-%d %H:%M:%S"))
+            params.append(end_date.strftime("%Y-%m-%d %H:%M:%S"))
+        elif start_date:
+            date_condition = "AND c.created_at >= ?"
+            params.append(start_date.strftime("%Y-%m-%d %H:%M:%S"))
+        elif days is not None:
+            date_limit = datetime.now() - timedelta(days=days)
+            date_condition = "AND c.created_at >= ?"
+            params.append(date_limit.strftime("%Y-%m-%d %H:%M:%S"))
+        
+        # Одним запросом получаем подключения сотрудника вместе с числом
+        # исполнителей и их именами (через разделитель EXECUTORS_SEPARATOR)
+        query = f"""
+            SELECT 
+                mine.employee_id,
+                {employee_name}
+                c.id,
+                c.connection_type,
+                c.address,
+                c.router_model,
+                c.port,
+                c.fiber_meters,
+                c.twisted_pair_meters,
+                c.created_at,
+                (
+                    SELECT COUNT(*)
+                    FROM connection_employees ce
+                    WHERE ce.connection_id = c.id
+                ) AS employee_count,
+                (
+                    SELECT group_concat(e.full_name, char({ord(EXECUTORS_SEPARATOR)}))
+                    FROM connection_employees ce
+                    JOIN employees e ON e.id = ce.employee_id
+                    WHERE ce.connection_id = c.id
+                ) AS executors
+            FROM connection_employees mine
+            JOIN connections c ON c.id = mine.connection_id
+            {source}
+            {condition}
+            {date_condition}
+            ORDER BY {order}
+        """
+        return query, params
+    
+    @staticmethod
+    def _report_row(row) -> Dict:
+        """Подключение из строки отчета с долей сотрудника и списком исполнителей"""
+        conn_dict = dict(row)
+        emp_count = conn_dict['employee_count']
+        
+        # Рассчитываем долю для сотрудника
+        conn_dict['employee_fiber_meters'] = employee_share(conn_dict['fiber_meters'], emp_count)
+        conn_dict['employee_twisted_pair_meters'] = employee_share(conn_dict['twisted_pair_meters'], emp_count)
+        
+        # Список всех исполнителей подключения
+        executors = conn_dict.pop('executors')
+        conn_dict['all_employees'] = sorted(executors.split(EXECUTORS_SEPARATOR)) if executors else []
+        return conn_dict
+    
+    def iter_employee_report(
+        self,
+        employee_id: int,
+        days: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Iterator[Dict]:
+        """
+        Построчно выдать подключения сотрудника за период прямо из курсора
+        
+        Подключение из пула занято, пока генератор не исчерпан или не закрыт,
+        поэтому генератор нужно потреблять в одном потоке. Ошибки запроса
+        логируются и пробрасываются, чтобы не получить обрезанный отчет.
+        
+        Yields:
+            Подключение с долей сотрудника (employee_fiber_meters,
+            employee_twisted_pair_meters) и списком исполнителей all_employees
+        """
+        query, params = self._report_query(employee_id, days, start_date, end_date)
+        try:
+            with self.connection() as conn:
+                for row in conn.execute(query, params):
+                    yield self._report_row(row)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении подключений для отчета: {e}")
+            raise
+    
+    def iter_all_employees_report(
+        self,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Iterator[Dict]:
+        """
+        Построчно выдать подключения всех сотрудников за период одним запросом
+        
+        Строки сгруппированы по сотрудникам (ФИО, затем ID) и содержат
+        employee_id, employee_name и долю этого сотрудника. Подключение с несколькими
+        исполнителями выдается по строке на каждого. Как и
+        iter_employee_report, генератор держит подключение из пула.
+        """
+        query, params = self._report_query(None, None, start_date, end_date)
+        try:
+            with self.connection() as conn:
+                for row in conn.execute(query, params):
+                    yield self._report_row(row)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении подключений для общего отчета: {e}")
+            raise
+    
     def get_employee_report(
         self,
         employee_id: int,
@@ -140,77 +280,10 @@ class ConnectionRepository(BaseRepository):
     ) -> tuple[List[Dict], Dict]:
         """Получить отчет по сотруднику за период"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Формируем условие по дате
-            date_condition = ""
-            params = [employee_id]
-            if start_date and end_date:
-                date_condition = "AND c.created_at BETWEEN ? AND ?"
-                params.append(start_date.strftime("%Y-%m-%d %H:%M:%S"))
-                params.append(end_date.strftime("%Y-%m-%d %H:%M:%S"))
-            elif start_date:
-                date_condition = "AND c.created_at >= ?"
-                params.append(start_date.strftime("%Y-%m-%d %H:%M:%S"))
-            elif days is not None:
-                date_limit = datetime.now() - timedelta(days=days)
-                date_condition = "AND c.created_at >= ?"
-                params.append(date_limit.strftime("%Y-%m-%d %H:%M:%S"))
-            
-            # Получаем подключения с участием сотрудника
-            query = f"""
-                SELECT 
-                    c.id,
-                    c.connection_type,
-                    c.address,
-                    c.router_model,
-                    c.port,
-                    c.fiber_meters,
-                    c.twisted_pair_meters,
-                    c.created_at,
-                    COUNT(DISTINCT ce.employee_id) as employee_count
-                FROM connections c
-                JOIN connection_employees ce ON c.id = ce.connection_id
-                WHERE ce.connection_id IN (
-                    SELECT connection_id 
-                    FROM connection_employees 
-                    WHERE employee_id = ?
-                )
-                {date_condition}
-                GROUP BY c.id
-                ORDER BY c.created_at DESC
-            """
-            
-            cursor.execute(query, params)
-            connections = []
-            
-            total_fiber = 0.0
-            total_twisted = 0.0
+            connections = list(self.iter_employee_report(employee_id, days, start_date, end_date))
             
-            for row in cursor.fetchall():
-                conn_dict = dict(row)
-                emp_count = conn_dict['employee_count']
-                
-                # Рассчитываем долю для сотрудника
-                conn_dict['employee_fiber_meters'] = round(conn_dict['fiber_meters'] / emp_count, 2)
-                conn_dict['employee_twisted_pair_meters'] = round(conn_dict['twisted_pair_meters'] / emp_count, 2)
-                
-                # Получаем список всех исполнителей для этого подключения
-                cursor.execute("""
-                    SELECT e.full_name
-                    FROM employees e
-                    JOIN connection_employees ce ON e.id = ce.employee_id
-                    WHERE ce.connection_id = ?
-                    ORDER BY e.full_name
-                """, (conn_dict['id'],))
-                conn_dict['all_employees'] = [row['full_name'] for row in cursor.fetchall()]
-                
-                connections.append(conn_dict)
-                total_fiber += conn_dict['employee_fiber_meters']
-                total_twisted += conn_dict['employee_twisted_pair_meters']
-            
-            conn.close()
+            total_fiber = sum(c['employee_fiber_meters'] for c in connections)
+            total_twisted = sum(c['employee_twisted_pair_meters'] for c in connections)
             
             stats = {
                 'total_connections': len(connections),
@@ -223,6 +296,30 @@ class ConnectionRepository(BaseRepository):
             logger.error(f"Ошибка при получении отчета: {e}")
             return [], {}
     
+    def get_report_watermark(self, employee_id: int) -> Optional[Tuple[int, int]]:
+        """
+        Получить версию данных отчета сотрудника
+        
+        Подключения и движения только добавляются, поэтому максимальные ID
+        растут с каждой записью, влияющей на отчет сотрудника.
+        
+        Returns:
+            Tuple: (максимальный ID подключения, максимальный ID движения)
+            или None при ошибке чтения (версия неизвестна)
+        """
+        try:
+            result = self.execute_query("""
+                SELECT 
+                    (SELECT MAX(connection_id) FROM connection_employees WHERE employee_id = ?) AS connection_id,
+                    (SELECT MAX(id) FROM material_movement_log WHERE employee_id = ?) AS movement_id
+            """, (employee_id, employee_id), fetch_one=True)
+            if result is None:
+                return None
+            return (result['connection_id'] or 0, result['movement_id'] or 0)
+        except Exception as e:
+            logger.error(f"Ошибка при получении версии данных отчета: {e}")
+            return None
+    
     def get_all_count(self) -> int:
         """Получить общее количество подключений"""
         try:
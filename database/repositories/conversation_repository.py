@@ -0,0 +1,97 @@
+"""
+Репозиторий сохраненного состояния диалогов (ConversationHandler и user_data)
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from database.base_repository import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationRepository(BaseRepository):
+    """
+    Репозиторий состояний диалогов и данных пользователей
+    
+    Значения хранятся уже закодированными (ключ диалога и user_data - JSON),
+    кодирование и разбор выполняет слой persistence.
+    """
+    
+    def get_states(self, name: str, max_age: Optional[float] = None) -> List[Dict]:
+        """
+        Получить сохраненные шаги диалогов одного ConversationHandler
+        
+        Args:
+            name: Имя ConversationHandler
+            max_age: Через сколько секунд без изменений диалог считается
+                     брошенным (None - не устаревает)
+        
+        Returns:
+            Список словарей: conversation_key, state, expired (1 - диалог брошен)
+        """
+        modifier = f'-{max_age:.0f} seconds' if max_age else None
+        return self.execute_query("""
+            SELECT conversation_key, state,
+                   COALESCE(updated_at < datetime('now', ?), 0) AS expired
+            FROM conversation_states
+            WHERE name = ?
+        """, (modifier, name), fetch_all=True) or []
+    
+    def get_user_data_page(self, after_user_id: int, limit: int) -> List[Dict]:
+        """
+        Получить страницу данных пользователей по возрастанию user_id
+        
+        Args:
+            after_user_id: Последний user_id предыдущей страницы
+            limit: Размер страницы
+        
+        Returns:
+            Список словарей: user_id, data
+        """
+        return self.execute_query("""
+            SELECT user_id, data
+            FROM user_data
+            WHERE user_id > ?
+            ORDER BY user_id
+            LIMIT ?
+        """, (after_user_id, limit), fetch_all=True) or []
+    
+    def save(
+        self,
+        states: List[Tuple[str, str, Optional[int]]],
+        user_data: List[Tuple[int, Optional[str]]]
+    ) -> bool:
+        """
+        Записать накопленные изменения одной транзакцией
+        
+        Args:
+            states: [(имя диалога, ключ, шаг)]; шаг None - диалог завершен
+            user_data: [(user_id, данные)]; данные None - удалить запись
+        
+        Returns:
+            Успех операции (при ошибке не записывается ничего)
+        """
+        try:
+            with self.transaction() as conn:
+                conn.executemany("""
+                    INSERT INTO conversation_states (name, conversation_key, state)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (name, conversation_key)
+                    DO UPDATE SET state = excluded.state, updated_at = CURRENT_TIMESTAMP
+                """, [row for row in states if row[2] is not None])
+                conn.executemany("""
+                    DELETE FROM conversation_states WHERE name = ? AND conversation_key = ?
+                """, [(name, key) for name, key, state in states if state is None])
+                conn.executemany("""
+                    INSERT INTO user_data (user_id, data)
+                    VALUES (?, ?)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET data = excluded.data, updated_at = CURRENT_TIMESTAMP
+                """, [row for row in user_data if row[1] is not None])
+                conn.executemany("""
+                    DELETE FROM user_data WHERE user_id = ?
+                """, [(user_id,) for user_id, data in user_data if data is None])
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении состояния диалогов: {e}")
+            return False
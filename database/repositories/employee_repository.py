@@ -2,10 +2,12 @@
 Репозиторий для работы с сотрудниками
 """
 import sqlite3
+from itertools import groupby
 from typing import List, Dict, Optional, Tuple
 import logging
 
 from database.base_repository import BaseRepository
+from database.models import EMPLOYEE_COLUMNS, EmployeeRow, EmployeeWithRouters, RouterCount
 
 logger = logging.getLogger(__name__)
 
@@ -24,45 +26,78 @@ class EmployeeRepository(BaseRepository):
             logger.warning(f"Сотрудник {full_name} уже существует")
             return None
     
-    def get_all(self) -> List[Dict]:
+    def get_all(self) -> List[EmployeeRow]:
         """Получить список всех сотрудников"""
-        return self.execute_query("""
-            SELECT id, full_name, fiber_balance, twisted_pair_balance, created_at 
+        return self.fetch_rows(EmployeeRow, f"""
+            SELECT {EMPLOYEE_COLUMNS}
             FROM employees 
             ORDER BY full_name
-        """, fetch_all=True) or []
+        """)
     
-    def get_by_id(self, employee_id: int) -> Optional[Dict]:
+    def get_all_with_routers(self) -> List[EmployeeWithRouters]:
+        """
+        Получить всех сотрудников с балансами и роутерами одним запросом
+        
+        Returns:
+            Список сотрудников (как в get_all) с роутерами по моделям
+            (кортеж RouterCount) и общим количеством роутеров
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                rows = cursor.execute("""
+                    SELECT 
+                        e.id, e.full_name, e.fiber_balance, e.twisted_pair_balance, e.created_at,
+                        r.router_name,
+                        SUM(r.quantity) AS quantity
+                    FROM employees e
+                    LEFT JOIN employee_routers r ON r.employee_id = e.id
+                    GROUP BY e.full_name, r.router_name
+                    ORDER BY e.full_name, r.router_name
+                """).fetchall()
+            
+            employees = []
+            for _, group in groupby(rows, key=lambda row: row[0]):
+                group = list(group)
+                routers = tuple(RouterCount(row[5], row[6]) for row in group if row[5] is not None)
+                employees.append(EmployeeWithRouters(
+                    *group[0][:5], routers, sum(router.quantity for router in routers)
+                ))
+            
+            return employees
+        except Exception as e:
+            logger.error(f"Ошибка при получении сотрудников с роутерами: {e}")
+            return []
+    
+    def get_by_id(self, employee_id: int) -> Optional[EmployeeRow]:
         """Получить сотрудника по ID"""
-        return self.execute_query("""
-            SELECT id, full_name, fiber_balance, twisted_pair_balance, created_at 
+        return self.fetch_row(EmployeeRow, f"""
+            SELECT {EMPLOYEE_COLUMNS}
             FROM employees 
             WHERE id = ?
-        """, (employee_id,), fetch_one=True)
+        """, (employee_id,))
     
     def delete(self, employee_id: int) -> bool:
         """Удалить сотрудника и все связанные данные"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Сначала удаляем роутеры сотрудника (если CASCADE не настроен)
-            cursor.execute("DELETE FROM employee_routers WHERE employee_id = ?", (employee_id,))
-            deleted_routers = cursor.rowcount
-            
-            # Обнуляем балансы материалов (или можно оставить для истории)
-            cursor.execute("""
-                UPDATE employees 
-                SET fiber_balance = 0, twisted_pair_balance = 0 
-                WHERE id = ?
-            """, (employee_id,))
-            
-            # Удаляем сотрудника
-            cursor.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
-            deleted_emp = cursor.rowcount > 0
-            
-            conn.commit()
-            conn.close()
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Сначала удаляем роутеры сотрудника (если CASCADE не настроен)
+                cursor.execute("DELETE FROM employee_routers WHERE employee_id = ?", (employee_id,))
+                deleted_routers = cursor.rowcount
+                
+                # Обнуляем балансы материалов (или можно оставить для истории)
+                cursor.execute("""
+                    UPDATE employees 
+                    SET fiber_balance = 0, twisted_pair_balance = 0 
+                    WHERE id = ?
+                """, (employee_id,))
+                
+                # Удаляем сотрудника
+                cursor.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
+                deleted_emp = cursor.rowcount > 0
             
             if deleted_emp:
                 logger.info(f"Удален сотрудник ID: {employee_id} и {deleted_routers} записей роутеров")
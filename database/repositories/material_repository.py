@@ -1,7 +1,7 @@
 """
 Репозиторий для работы с материалами сотрудников
 """
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime
 import logging
 
@@ -22,19 +22,20 @@ class MaterialRepository(BaseRepository):
     ) -> bool:
         """Добавить материалы на баланс сотрудника"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE employees 
-                SET fiber_balance = fiber_balance + ?,
-                    twisted_pair_balance = twisted_pair_balance + ?
-                WHERE id = ?
-            """, (fiber_meters, twisted_pair_meters, employee_id))
-            
-            updated = cursor.rowcount > 0
-            
-            if updated:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    UPDATE employees 
+                    SET fiber_balance = fiber_balance + ?,
+                        twisted_pair_balance = twisted_pair_balance + ?
+                    WHERE id = ?
+                """, (fiber_meters, twisted_pair_meters, employee_id))
+                
+                updated = cursor.rowcount > 0
+                if not updated:
+                    return False
+                
                 # Получаем новый баланс
                 cursor.execute("""
                     SELECT fiber_balance, twisted_pair_balance 
@@ -44,23 +45,19 @@ class MaterialRepository(BaseRepository):
                 new_fiber = row[0] if row else 0
                 new_twisted = row[1] if row else 0
                 
-                conn.commit()
-                conn.close()
-                
-                # Логируем операции
-                if fiber_meters > 0:
-                    self.log_movement(employee_id, 'add', 'fiber', 'ВОЛС', 
-                                    fiber_meters, new_fiber, None, created_by)
-                if twisted_pair_meters > 0:
-                    self.log_movement(employee_id, 'add', 'twisted_pair', 'Витая пара',
-                                    twisted_pair_meters, new_twisted, None, created_by)
-                
-                logger.info(f"Добавлено материалов сотруднику ID {employee_id}: "
-                          f"ВОЛС +{fiber_meters}м, Витая пара +{twisted_pair_meters}м")
-            else:
-                conn.close()
+                # Логируем операции в той же транзакции (без записи в журнале изменение откатывается)
+                if fiber_meters > 0 and not self.log_movement(
+                    employee_id, 'add', 'fiber', 'ВОЛС', fiber_meters, new_fiber, None, created_by
+                ):
+                    raise ValueError("не удалось записать движение ВОЛС в журнал")
+                if twisted_pair_meters > 0 and not self.log_movement(
+                    employee_id, 'add', 'twisted_pair', 'Витая пара', twisted_pair_meters, new_twisted, None, created_by
+                ):
+                    raise ValueError("не удалось записать движение витой пары в журнал")
             
-            return updated
+            logger.info(f"Добавлено материалов сотруднику ID {employee_id}: "
+                      f"ВОЛС +{fiber_meters}м, Витая пара +{twisted_pair_meters}м")
+            return True
         except Exception as e:
             logger.error(f"Ошибка при добавлении материалов: {e}")
             return False
@@ -75,67 +72,61 @@ class MaterialRepository(BaseRepository):
     ) -> bool:
         """Списать материалы с баланса сотрудника"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Проверяем текущий баланс
-            cursor.execute("""
-                SELECT fiber_balance, twisted_pair_balance 
-                FROM employees 
-                WHERE id = ?
-            """, (employee_id,))
-            row = cursor.fetchone()
-            
-            if not row:
-                logger.warning(f"Сотрудник ID {employee_id} не найден")
-                conn.close()
-                return False
-            
-            current_fiber = row[0] or 0
-            current_twisted = row[1] or 0
-            
-            # Проверяем достаточность средств
-            if current_fiber < fiber_meters:
-                logger.warning(f"Недостаточно ВОЛС у сотрудника ID {employee_id}")
-                conn.close()
-                return False
-            
-            if current_twisted < twisted_pair_meters:
-                logger.warning(f"Недостаточно витой пары у сотрудника ID {employee_id}")
-                conn.close()
-                return False
-            
-            # Списываем материалы
-            cursor.execute("""
-                UPDATE employees 
-                SET fiber_balance = fiber_balance - ?,
-                    twisted_pair_balance = twisted_pair_balance - ?
-                WHERE id = ?
-            """, (fiber_meters, twisted_pair_meters, employee_id))
-            
-            updated = cursor.rowcount > 0
-            
-            if updated:
-                new_fiber = current_fiber - fiber_meters
-                new_twisted = current_twisted - twisted_pair_meters
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Проверяем текущий баланс
+                cursor.execute("""
+                    SELECT fiber_balance, twisted_pair_balance 
+                    FROM employees 
+                    WHERE id = ?
+                """, (employee_id,))
+                row = cursor.fetchone()
+                
+                if not row:
+                    logger.warning(f"Сотрудник ID {employee_id} не найден")
+                    return False
+                
+                current_fiber = row[0] or 0
+                current_twisted = row[1] or 0
                 
-                conn.commit()
-                conn.close()
+                # Проверяем достаточность средств
+                if current_fiber < fiber_meters:
+                    logger.warning(f"Недостаточно ВОЛС у сотрудника ID {employee_id}")
+                    return False
+                
+                if current_twisted < twisted_pair_meters:
+                    logger.warning(f"Недостаточно витой пары у сотрудника ID {employee_id}")
+                    return False
+                
+                # Списываем материалы
+                cursor.execute("""
+                    UPDATE employees 
+                    SET fiber_balance = fiber_balance - ?,
+                        twisted_pair_balance = twisted_pair_balance - ?
+                    WHERE id = ?
+                """, (fiber_meters, twisted_pair_meters, employee_id))
                 
-                # Логируем операции
-                if fiber_meters > 0:
-                    self.log_movement(employee_id, 'deduct', 'fiber', 'ВОЛС',
-                                    fiber_meters, new_fiber, connection_id, created_by)
-                if twisted_pair_meters > 0:
-                    self.log_movement(employee_id, 'deduct', 'twisted_pair', 'Витая пара',
-                                    twisted_pair_meters, new_twisted, connection_id, created_by)
+                updated = cursor.rowcount > 0
+                if not updated:
+                    return False
                 
-                logger.info(f"Списано материалов у сотрудника ID {employee_id}: "
-                          f"ВОЛС -{fiber_meters}м, Витая пара -{twisted_pair_meters}м")
-            else:
-                conn.close()
+                new_fiber = current_fiber - fiber_meters
+                new_twisted = current_twisted - twisted_pair_meters
+                
+                # Логируем операции в той же транзакции (без записи в журнале изменение откатывается)
+                if fiber_meters > 0 and not self.log_movement(
+                    employee_id, 'deduct', 'fiber', 'ВОЛС', fiber_meters, new_fiber, connection_id, created_by
+                ):
+                    raise ValueError("не удалось записать движение ВОЛС в журнал")
+                if twisted_pair_meters > 0 and not self.log_movement(
+                    employee_id, 'deduct', 'twisted_pair', 'Витая пара', twisted_pair_meters, new_twisted, connection_id, created_by
+                ):
+                    raise ValueError("не удалось записать движение витой пары в журнал")
             
-            return updated
+            logger.info(f"Списано материалов у сотрудника ID {employee_id}: "
+                      f"ВОЛС -{fiber_meters}м, Витая пара -{twisted_pair_meters}м")
+            return True
         except Exception as e:
             logger.error(f"Ошибка при списании материалов: {e}")
             return False
@@ -153,7 +144,7 @@ class MaterialRepository(BaseRepository):
     ) -> bool:
         """Записать движение материала в лог"""
         try:
-            self.execute_query("""
+            movement_id = self.execute_query("""
                 INSERT INTO material_movement_log 
                 (employee_id, operation_type, item_type, item_name, quantity, 
                  balance_after, connection_id, created_by)
@@ -161,12 +152,84 @@ class MaterialRepository(BaseRepository):
             """, (employee_id, operation_type, item_type, item_name, quantity,
                   balance_after, connection_id, created_by))
             
+            if movement_id is None:
+                return False
+            
             logger.info(f"Logged movement: {operation_type} {quantity} {item_type} for employee {employee_id}")
             return True
         except Exception as e:
             logger.error(f"Ошибка при логировании движения: {e}")
             return False
     
+    def iter_movements(
+        self,
+        employee_id: int,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Iterator[Dict]:
+        """
+        Построчно выдать движения материалов сотрудника за период из курсора
+        
+        Как и ConnectionRepository.iter_employee_report, генератор держит
+        подключение из пула до исчерпания и пробрасывает ошибки запроса.
+        """
+        try:
+            with self.connection() as conn:
+                for row in conn.execute("""
+                    SELECT 
+                        operation_type,
+                        item_type,
+                        item_name,
+                        quantity,
+                        balance_after,
+                        connection_id,
+                        created_at
+                    FROM material_movement_log
+                    WHERE employee_id = ? 
+                      AND created_at >= ? 
+                      AND created_at <= ?
+                    ORDER BY created_at
+                """, (employee_id, start_date, end_date)):
+                    yield dict(row)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении движений: {e}")
+            raise
+    
+    def iter_all_movements(
+        self,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Iterator[Dict]:
+        """
+        Построчно выдать движения всех сотрудников за период одним запросом
+        
+        Строки сгруппированы по сотрудникам в том же порядке, что и
+        ConnectionRepository.iter_all_employees_report (ФИО, затем ID).
+        """
+        try:
+            with self.connection() as conn:
+                for row in conn.execute("""
+                    SELECT 
+                        m.employee_id,
+                        e.full_name AS employee_name,
+                        m.operation_type,
+                        m.item_type,
+                        m.item_name,
+                        m.quantity,
+                        m.balance_after,
+                        m.connection_id,
+                        m.created_at
+                    FROM material_movement_log m
+                    JOIN employees e ON e.id = m.employee_id
+                    WHERE m.created_at >= ? 
+                      AND m.created_at <= ?
+                    ORDER BY e.full_name, e.id, m.created_at
+                """, (start_date, end_date)):
+                    yield dict(row)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении движений для общего отчета: {e}")
+            raise
+    
     def get_movements(
         self,
         employee_id: int,
@@ -175,21 +238,7 @@ class MaterialRepository(BaseRepository):
     ) -> List[Dict]:
         """Получить все движения материалов сотрудника за период"""
         try:
-            return self.execute_query("""
-                SELECT 
-                    operation_type,
-                    item_type,
-                    item_name,
-                    quantity,
-                    balance_after,
-                    connection_id,
-                    created_at
-                FROM material_movement_log
-                WHERE employee_id = ? 
-                  AND created_at >= ? 
-                  AND created_at <= ?
-                ORDER BY created_at
-            """, (employee_id, start_date, end_date), fetch_all=True) or []
+            return list(self.iter_movements(employee_id, start_date, end_date))
         except Exception as e:
             logger.error(f"Ошибка при получении движений: {e}")
             return []
@@ -0,0 +1,224 @@
+"""
+Репозиторий очереди исходящих сообщений Telegram (outbox)
+"""
+from typing import Dict, List, Optional
+import json
+import logging
+
+from database.base_repository import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+# Статусы сообщений
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+# Отчет о подключении в канал: отправляется копией сообщений пользователя
+# или, если их нет, собирается заново из БД
+CONNECTION_REPORT = 'connection_report'
+
+# Сколько секунд отчет ждет привязки сообщений пользователя, прежде чем
+# отправиться без них (если бот упал между сохранением и отправкой)
+CONNECTION_REPORT_HOLD = 60
+
+
+def connection_report_key(connection_id: int, chat_id: int) -> str:
+    """Ключ идемпотентности отчета о подключении для канала"""
+    return f"{CONNECTION_REPORT}:{connection_id}:{chat_id}"
+
+
+class OutboxRepository(BaseRepository):
+    """
+    Репозиторий исходящих сообщений
+    
+    Сообщение сохраняется до первой попытки отправки и проходит статусы
+    pending -> sending -> sent (или failed). Сообщения с одинаковым ключом
+    идемпотентности сохраняются один раз, поэтому повторная постановка
+    не приводит к дублям в канале.
+    """
+    
+    def add(
+        self,
+        chat_id: int,
+        method: str,
+        payload: Dict,
+        idempotency_key: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Поставить вызов Bot API в очередь
+        
+        Args:
+            chat_id: ID чата получателя
+            method: Метод Bot (например, copy_messages)
+            payload: Остальные параметры вызова (сериализуются в JSON)
+            idempotency_key: Ключ, по которому сообщение ставится не больше одного раза
+        
+        Returns:
+            ID сообщения в очереди (уже существующего, если ключ повторился)
+            или None при ошибке
+        """
+        try:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO outbox (chat_id, method, payload, idempotency_key)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (idempotency_key) DO NOTHING
+                """, (chat_id, method, json.dumps(payload, ensure_ascii=False), idempotency_key))
+                if cursor.rowcount:
+                    return cursor.lastrowid
+                
+                cursor.execute("SELECT id FROM outbox WHERE idempotency_key = ?", (idempotency_key,))
+                return cursor.fetchone()['id']
+        except Exception as e:
+            logger.error(f"Ошибка при постановке сообщения в очередь: {e}")
+            return None
+    
+    def add_connection_reports(self, connection_id: int, chat_ids: List[int]) -> bool:
+        """
+        Поставить отчет о подключении в очередь для каналов
+        
+        Вызывается в транзакции создания подключения. Отчет придерживается
+        на CONNECTION_REPORT_HOLD секунд, чтобы успеть привязать к нему уже
+        отправленные пользователю сообщения (release_connection_reports).
+        """
+        payload = json.dumps({'connection_id': connection_id})
+        return self.execute_many("""
+            INSERT INTO outbox
+            (chat_id, method, payload, idempotency_key, connection_id, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?, datetime('now', ?))
+            ON CONFLICT (idempotency_key) DO NOTHING
+        """, [
+            (chat_id, CONNECTION_REPORT, payload, connection_report_key(connection_id, chat_id),
+             connection_id, f'+{CONNECTION_REPORT_HOLD} seconds')
+            for chat_id in chat_ids
+        ])
+    
+    def release_connection_reports(self, connection_id: int, payload: Optional[Dict] = None) -> int:
+        """
+        Разрешить отправку отчетов подключения в каналы сейчас
+        
+        Args:
+            connection_id: ID подключения
+            payload: Параметры отправки (например, ID сообщений пользователя
+                     для копирования); None - собрать отчет из БД
+        
+        Returns:
+            Количество отчетов, готовых к отправке
+        """
+        payload = dict(payload or {}, connection_id=connection_id)
+        try:
+            with self.transaction() as conn:
+                cursor = conn.execute("""
+                    UPDATE outbox SET payload = ?, next_attempt_at = CURRENT_TIMESTAMP
+                    WHERE connection_id = ? AND method = ? AND status = ?
+                """, (json.dumps(payload), connection_id, CONNECTION_REPORT, PENDING))
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Ошибка при подготовке отчета #{connection_id} к отправке: {e}")
+            return 0
+    
+    def claim_due(self, limit: int) -> List[Dict]:
+        """
+        Взять в отправку до limit сообщений, срок которых наступил
+        
+        Returns:
+            Список словарей: id, chat_id, method, payload (dict), attempts
+        """
+        try:
+            with self.transaction() as conn:
+                rows = [dict(row) for row in conn.execute("""
+                    SELECT id, chat_id, method, payload, attempts
+                    FROM outbox
+                    WHERE status = ? AND next_attempt_at <= datetime('now')
+                    ORDER BY next_attempt_at
+                    LIMIT ?
+                """, (PENDING, limit))]
+                conn.executemany(
+                    "UPDATE outbox SET status = ? WHERE id = ?",
+                    [(SENDING, row['id']) for row in rows]
+                )
+            for row in rows:
+                row['payload'] = json.loads(row['payload'])
+            return rows
+        except Exception as e:
+            logger.error(f"Ошибка при выборке исходящих сообщений: {e}")
+            return []
+    
+    def release_claims(self) -> int:
+        """
+        Вернуть в очередь сообщения, отправка которых была прервана
+        
+        Returns:
+            Количество возвращенных сообщений
+        """
+        try:
+            with self.transaction() as conn:
+                return conn.execute(
+                    "UPDATE outbox SET status = ? WHERE status = ?", (PENDING, SENDING)
+                ).rowcount
+        except Exception as e:
+            logger.error(f"Ошибка при возврате прерванных исходящих сообщений: {e}")
+            return 0
+    
+    def _update_message(self, message_id: int, query: str, params: tuple) -> bool:
+        """
+        Обновить одно сообщение очереди
+        
+        Returns:
+            True, если сообщение с message_id найдено и обновлено
+        """
+        try:
+            with self.transaction() as conn:
+                return conn.execute(query, params).rowcount > 0
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении исходящего сообщения #{message_id}: {e}")
+            return False
+    
+    def mark_sent(self, message_id: int) -> bool:
+        """Отметить сообщение отправленным"""
+        return self._update_message(message_id, """
+            UPDATE outbox SET status = ?, sent_at = CURRENT_TIMESTAMP, last_error = NULL
+            WHERE id = ?
+        """, (SENT, message_id))
+    
+    def reschedule(self, message_id: int, attempts: int, delay: float, error: str) -> bool:
+        """Запомнить неудачную попытку и время следующей (через delay секунд)"""
+        return self._update_message(message_id, """
+            UPDATE outbox
+            SET status = ?, attempts = ?, next_attempt_at = datetime('now', ?), last_error = ?
+            WHERE id = ?
+        """, (PENDING, attempts, f'+{delay:.0f} seconds', error, message_id))
+    
+    def mark_failed(self, message_id: int, attempts: int, error: str) -> bool:
+        """Отметить сообщение, которое отправить не удастся"""
+        return self._update_message(message_id, """
+            UPDATE outbox SET status = ?, attempts = ?, last_error = ?
+            WHERE id = ?
+        """, (FAILED, attempts, error, message_id))
+    
+    def get_connection_deliveries(self, connection_id: int) -> List[Dict]:
+        """Состояние доставки отчета о подключении по каналам"""
+        try:
+            return self.execute_query("""
+                SELECT chat_id, status, attempts, last_error, sent_at
+                FROM outbox
+                WHERE connection_id = ?
+                ORDER BY id
+            """, (connection_id,), fetch_all=True)
+        except Exception as e:
+            logger.error(f"Ошибка при получении доставки отчета #{connection_id}: {e}")
+            return []
+    
+    def get_status_counts(self) -> Dict[str, int]:
+        """Количество сообщений по статусам"""
+        try:
+            rows = self.execute_query("""
+                SELECT status, COUNT(*) AS count FROM outbox GROUP BY status
+            """, fetch_all=True)
+            return {row['status']: row['count'] for row in rows}
+        except Exception as e:
+            logger.error(f"Ошибка при подсчете исходящих сообщений: {e}")
+            return {}
@@ -5,6 +5,8 @@ from typing import List, Dict, Optional
 import logging
 
 from database.base_repository import BaseRepository
+from database.connection_pool import ConnectionPool
+from database.repositories.material_repository import MaterialRepository
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +14,11 @@ logger = logging.getLogger(__name__)
 class RouterRepository(BaseRepository):
     """Репозиторий для управления роутерами сотрудников"""
     
+    def __init__(self, pool: ConnectionPool):
+        super().__init__(pool)
+        # Журнал движений на том же пуле (запись идет в ту же транзакцию)
+        self.movements = MaterialRepository(pool)
+    
     def add_router(
         self,
         employee_id: int,
@@ -21,42 +28,40 @@ class RouterRepository(BaseRepository):
     ) -> bool:
         """Добавить роутеры сотруднику"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Проверяем, есть ли уже такой роутер у сотрудника
-            cursor.execute("""
-                SELECT id, quantity FROM employee_routers 
-                WHERE employee_id = ? AND router_name = ?
-            """, (employee_id, router_name))
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Обновляем количество
-                new_quantity = existing[1] + quantity
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Проверяем, есть ли уже такой роутер у сотрудника
                 cursor.execute("""
-                    UPDATE employee_routers 
-                    SET quantity = ? 
-                    WHERE id = ?
-                """, (new_quantity, existing[0]))
-                logger.info(f"Обновлено количество роутеров '{router_name}' у сотрудника ID {employee_id}: +{quantity} (всего: {new_quantity})")
-            else:
-                # Добавляем новую запись
-                new_quantity = quantity
-                cursor.execute("""
-                    INSERT INTO employee_routers (employee_id, router_name, quantity)
-                    VALUES (?, ?, ?)
-                """, (employee_id, router_name, quantity))
-                logger.info(f"Добавлены роутеры '{router_name}' сотруднику ID {employee_id}: {quantity} шт.")
-            
-            conn.commit()
-            conn.close()
-            
-            # Логируем операцию через MaterialRepository
-            from database.repositories.material_repository import MaterialRepository
-            material_repo = MaterialRepository(self.db_path)
-            material_repo.log_movement(employee_id, 'add', 'router', router_name,
-                                      quantity, new_quantity, None, created_by)
+                    SELECT id, quantity FROM employee_routers 
+                    WHERE employee_id = ? AND router_name = ?
+                """, (employee_id, router_name))
+                existing = cursor.fetchone()
+                
+                if existing:
+                    # Обновляем количество
+                    new_quantity = existing[1] + quantity
+                    cursor.execute("""
+                        UPDATE employee_routers 
+                        SET quantity = ? 
+                        WHERE id = ?
+                    """, (new_quantity, existing[0]))
+                    logger.info(f"Обновлено количество роутеров '{router_name}' у сотрудника ID {employee_id}: +{quantity} (всего: {new_quantity})")
+                else:
+                    # Добавляем новую запись
+                    new_quantity = quantity
+                    cursor.execute("""
+                        INSERT INTO employee_routers (employee_id, router_name, quantity)
+                        VALUES (?, ?, ?)
+                    """, (employee_id, router_name, quantity))
+                    logger.info(f"Добавлены роутеры '{router_name}' сотруднику ID {employee_id}: {quantity} шт.")
+                
+                # Логируем операцию через MaterialRepository в той же транзакции
+                # (без записи в журнале изменение откатывается)
+                if not self.movements.log_movement(
+                    employee_id, 'add', 'router', router_name, quantity, new_quantity, None, created_by
+                ):
+                    raise ValueError("не удалось записать движение роутера в журнал")
             
             return True
         except Exception as e:
@@ -73,50 +78,45 @@ class RouterRepository(BaseRepository):
     ) -> bool:
         """Списать роутер у сотрудника"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Проверяем текущее количество
-            cursor.execute("""
-                SELECT id, quantity FROM employee_routers 
-                WHERE employee_id = ? AND router_name = ?
-            """, (employee_id, router_name))
-            existing = cursor.fetchone()
-            
-            if not existing:
-                logger.warning(f"Роутер '{router_name}' не найден у сотрудника ID {employee_id}")
-                conn.close()
-                return False
-            
-            current_quantity = existing[1]
-            if current_quantity < quantity:
-                logger.warning(f"Недостаточно роутеров '{router_name}' у сотрудника ID {employee_id}")
-                conn.close()
-                return False
-            
-            new_quantity = current_quantity - quantity
-            
-            if new_quantity == 0:
-                # Удаляем запись
-                cursor.execute("DELETE FROM employee_routers WHERE id = ?", (existing[0],))
-                logger.info(f"Списаны все роутеры '{router_name}' у сотрудника ID {employee_id}")
-            else:
-                # Обновляем количество
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Проверяем текущее количество
                 cursor.execute("""
-                    UPDATE employee_routers 
-                    SET quantity = ? 
-                    WHERE id = ?
-                """, (new_quantity, existing[0]))
-                logger.info(f"Списан роутер '{router_name}' у сотрудника ID {employee_id}: -{quantity} (осталось: {new_quantity})")
-            
-            conn.commit()
-            conn.close()
-            
-            # Логируем операцию
-            from database.repositories.material_repository import MaterialRepository
-            material_repo = MaterialRepository(self.db_path)
-            material_repo.log_movement(employee_id, 'deduct', 'router', router_name,
-                                      quantity, new_quantity, connection_id, created_by)
+                    SELECT id, quantity FROM employee_routers 
+                    WHERE employee_id = ? AND router_name = ?
+                """, (employee_id, router_name))
+                existing = cursor.fetchone()
+                
+                if not existing:
+                    logger.warning(f"Роутер '{router_name}' не найден у сотрудника ID {employee_id}")
+                    return False
+                
+                current_quantity = existing[1]
+                if current_quantity < quantity:
+                    logger.warning(f"Недостаточно роутеров '{router_name}' у сотрудника ID {employee_id}")
+                    return False
+                
+                new_quantity = current_quantity - quantity
+                
+                if new_quantity == 0:
+                    # Удаляем запись
+                    cursor.execute("DELETE FROM employee_routers WHERE id = ?", (existing[0],))
+                    logger.info(f"Списаны все роутеры '{router_name}' у сотрудника ID {employee_id}")
+                else:
+                    # Обновляем количество
+                    cursor.execute("""
+                        UPDATE employee_routers 
+                        SET quantity = ? 
+                        WHERE id = ?
+                    """, (new_quantity, existing[0]))
+                    logger.info(f"Списан роутер '{router_name}' у сотрудника ID {employee_id}: -{quantity} (осталось: {new_quantity})")
+                
+                # Логируем операцию в той же транзакции
+                if not self.movements.log_movement(
+                    employee_id, 'deduct', 'router', router_name, quantity, new_quantity, connection_id, created_by
+                ):
+                    raise ValueError("не удалось записать движение роутера в журнал")
             
             return True
         except Exception as e:
@@ -0,0 +1,91 @@
+"""
+Репозиторий для дневной статистики сотрудников (employee_daily_stats)
+"""
+from datetime import datetime
+from typing import Dict, List
+import logging
+
+from database.base_repository import BaseRepository
+from database.repositories.connection_repository import employee_share
+
+logger = logging.getLogger(__name__)
+
+# Формат дня в employee_daily_stats (как date(created_at) в SQLite)
+DAY_FORMAT = "%Y-%m-%d"
+
+
+class StatsRepository(BaseRepository):
+    """
+    Репозиторий дневных итогов по сотрудникам
+    
+    Строка на сотрудника и день: подключения, доли ВОЛС и витой пары
+    (так же, как в отчете) и установленные роутеры. Обновляется в той же
+    транзакции, что и создание подключения, поэтому итоги за период
+    считаются суммой не более чем по строке на день.
+    
+    connections - участия сотрудника: подключение с несколькими
+    исполнителями учитывается у каждого из них, поэтому сумма по
+    сотрудникам не равна числу подключений.
+    """
+    
+    def add_connection(
+        self,
+        connection_id: int,
+        employee_ids: List[int],
+        fiber_meters: float,
+        twisted_pair_meters: float
+    ) -> bool:
+        """Учесть подключение в итогах дня его исполнителей"""
+        emp_count = len(employee_ids)
+        fiber_share = employee_share(fiber_meters, emp_count)
+        twisted_share = employee_share(twisted_pair_meters, emp_count)
+        return self.execute_many("""
+            INSERT INTO employee_daily_stats
+            (employee_id, day, connections, fiber_meters, twisted_pair_meters)
+            VALUES (?, (SELECT date(created_at) FROM connections WHERE id = ?), 1, ?, ?)
+            ON CONFLICT (employee_id, day) DO UPDATE SET
+                connections = connections + 1,
+                fiber_meters = fiber_meters + excluded.fiber_meters,
+                twisted_pair_meters = twisted_pair_meters + excluded.twisted_pair_meters
+        """, [
+            (emp_id, connection_id, fiber_share, twisted_share)
+            for emp_id in employee_ids
+        ])
+    
+    def add_routers(self, employee_id: int, connection_id: int, quantity: int) -> bool:
+        """Учесть роутеры, списанные с сотрудника на подключение, в итогах дня подключения"""
+        return self.execute_many("""
+            INSERT INTO employee_daily_stats (employee_id, day, routers)
+            VALUES (?, (SELECT date(created_at) FROM connections WHERE id = ?), ?)
+            ON CONFLICT (employee_id, day) DO UPDATE SET
+                routers = routers + excluded.routers
+        """, [(employee_id, connection_id, quantity)])
+    
+    def get_period_stats(self, employee_id: int, start_date: datetime, end_date: datetime) -> Dict:
+        """
+        Итоги сотрудника за период (по целым дням от start_date до end_date)
+        
+        Returns:
+            Словарь: total_connections, total_fiber_meters,
+            total_twisted_pair_meters, total_routers
+        """
+        try:
+            result = self.execute_query("""
+                SELECT
+                    COALESCE(SUM(connections), 0) AS connections,
+                    COALESCE(SUM(fiber_meters), 0) AS fiber_meters,
+                    COALESCE(SUM(twisted_pair_meters), 0) AS twisted_pair_meters,
+                    COALESCE(SUM(routers), 0) AS routers
+                FROM employee_daily_stats
+                WHERE employee_id = ? AND day BETWEEN ? AND ?
+            """, (employee_id, start_date.strftime(DAY_FORMAT), end_date.strftime(DAY_FORMAT)), fetch_one=True)
+            
+            return {
+                'total_connections': result['connections'],
+                'total_fiber_meters': round(result['fiber_meters'], 2),
+                'total_twisted_pair_meters': round(result['twisted_pair_meters'], 2),
+                'total_routers': result['routers']
+            }
+        except Exception as e:
+            logger.error(f"Ошибка при получении статистики за период: {e}")
+            return {}
@@ -1,11 +1,19 @@
 """
 Основные команды бота
 """
+import html
+from typing import Dict, List
+
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 
+from config import is_admin
 from utils.keyboards import get_main_keyboard
 
+# Сколько запросов показывать в /slow_queries и предел длины их текста
+SLOW_QUERIES_LIMIT = 10
+SLOW_QUERY_TEXT_LIMIT = 300
+
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработка команды /start"""
@@ -91,3 +99,60 @@ async def cancel_and_start_new(update: Update, context: ContextTypes.DEFAULT_TYP
         reply_markup=get_main_keyboard()
     )
     return ConversationHandler.END
+
+
+async def conversation_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Диалог брошен дольше CONVERSATION_TIMEOUT: удалить черновик и сообщить пользователю"""
+    if update.effective_user:
+        context.application.drop_user_data(update.effective_user.id)
+
+    if update.effective_chat:
+        await context.bot.send_message(
+            update.effective_chat.id,
+            "⌛ Действие отменено: долго не было ответа. Начните заново из меню.",
+            reply_markup=get_main_keyboard()
+        )
+
+
+def _format_slow_queries(queries: List[Dict], order: str) -> str:
+    """Текст ответа /slow_queries (длительности в мс)"""
+    if not queries:
+        return "🐢 Статистики запросов пока нет (или профилировщик выключен: SLOW_QUERY_MS=0)."
+
+    title = "по p95" if order == 'p95' else "по суммарному времени"
+    lines = [f"🐢 <b>Медленные запросы</b> ({title})"]
+    for index, query in enumerate(queries, 1):
+        sql = query['fingerprint']
+        if len(sql) > SLOW_QUERY_TEXT_LIMIT:
+            sql = sql[:SLOW_QUERY_TEXT_LIMIT] + '…'
+        lines.append(
+            f"\n{index}. <code>{html.escape(sql)}</code>\n"
+            f"вызовов {query['calls']}, медленных {query['slow']}, всего {query['total']:.2f} с\n"
+            f"p50 {query['p50'] * 1000:.1f} / p95 {query['p95'] * 1000:.1f} / "
+            f"p99 {query['p99'] * 1000:.1f} / макс {query['max'] * 1000:.1f} мс"
+        )
+        if query['plan']:
+            lines.append(f"план: {html.escape(' | '.join(query['plan']))}")
+    return '\n'.join(lines)
+
+
+async def slow_queries_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработка команды /slow_queries [total] [N] (только для администраторов)
+
+    Показывает самые медленные запросы к БД по p95 или, с аргументом
+    total, по суммарному времени.
+    """
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Команда доступна только администраторам.")
+        return
+
+    order = 'total' if 'total' in context.args else 'p95'
+    limit = next((int(arg) for arg in context.args if arg.isdigit()), SLOW_QUERIES_LIMIT)
+
+    queries = context.bot_data['db'].slow_queries(max(1, min(limit, 30)), order)
+    text = _format_slow_queries(queries, order)
+    # Ограничение Telegram на длину сообщения
+    if len(text) > 4096:
+        text = text[:text.rfind('\n', 0, 4096)]
+    await update.message.reply_text(text, parse_mode='HTML')
@@ -6,80 +6,78 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
 from config import CONFIRM, CONNECTION_TYPES, logger
+from handlers.connection.draft import find_draft
 from utils.keyboards import get_main_keyboard
-from utils.helpers import send_connection_report
-from database import Database
+from utils.helpers import send_connection_report, publish_connection_report, report_channels
+
+
+async def _restart_connection(query, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Черновик потерян или не заполнен: завершить диалог без записи в БД"""
+    context.user_data.clear()
+    await query.edit_message_text(
+        "⚠️ Данные подключения не найдены (возможно, устарели). Начните заново.",
+        reply_markup=None
+    )
+    await query.message.reply_text(
+        "Выберите действие:",
+        reply_markup=get_main_keyboard()
+    )
+    return ConversationHandler.END
 
 
 async def show_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
     """Показать подтверждение перед сохранением"""
     query = update.callback_query
     
-    data = context.user_data['connection_data']
-    photos = context.user_data.get('photos', [])
-    selected_employees = context.user_data.get('selected_employees', [])
+    draft = find_draft(context)
+    if draft is None or not draft.is_complete:
+        return await _restart_connection(query, context)
     
     # Получаем имена выбранных сотрудников
-    employees = db.get_all_employees()
-    employee_names = [emp['full_name'] for emp in employees if emp['id'] in selected_employees]
+    employees = await db.get_all_employees()
+    employee_names = [emp.full_name for emp in employees if emp.id in draft.employee_ids]
     
     # Получаем читаемое название типа подключения
-    conn_type = data.get('connection_type', 'mkd')
+    conn_type = draft.connection_type
     type_name = CONNECTION_TYPES.get(conn_type, conn_type)
     
     # Рассчитываем долю на каждого
-    emp_count = len(selected_employees)
-    fiber_per_emp = round(data['fiber_meters'] / emp_count, 2)
-    twisted_per_emp = round(data['twisted_pair_meters'] / emp_count, 2)
+    emp_count = len(draft.employee_ids)
+    fiber_per_emp = round(draft.fiber_meters / emp_count, 2)
+    twisted_per_emp = round(draft.twisted_pair_meters / emp_count, 2)
     
     # Получаем информацию о плательщиках
-    material_payer_id = context.user_data.get('material_payer_id')
-    router_payer_id = context.user_data.get('router_payer_id')
-    
     payer_info = ""
-    if material_payer_id:
-        payer = db.get_employee_by_id(material_payer_id)
+    if draft.material_payer_id:
+        payer = await db.get_employee_by_id(draft.material_payer_id)
         if payer:
-            payer_info += f"\n\n💰 <b>Материалы списываются с:</b> {payer['full_name']}"
+            payer_info += f"\n\n💰 <b>Материалы списываются с:</b> {payer.full_name}"
     
-    if router_payer_id:
-        router_payer = db.get_employee_by_id(router_payer_id)
+    if draft.router_payer_id:
+        router_payer = await db.get_employee_by_id(draft.router_payer_id)
         if router_payer:
-            router_quantity = data.get('router_quantity', 1)
-            quantity_text = f" ({router_quantity} шт.)" if router_quantity > 1 else ""
-            payer_info += f"\n📡 <b>Роутер списывается с:</b> {router_payer['full_name']}{quantity_text}"
+            quantity_text = f" ({draft.router_quantity} шт.)" if draft.router_quantity > 1 else ""
+            payer_info += f"\n📡 <b>Роутер списывается с:</b> {router_payer.full_name}{quantity_text}"
     
     # Формируем отображение роутера
-    router_model = data.get('router_model', '-')
-    router_quantity = data.get('router_quantity', 1)
-    
-    if router_model == '-' or not router_model:
+    if not draft.has_router:
         router_display = "-"
     else:
-        router_display = router_model
-        if router_quantity > 1:
-            router_display += f" ({router_quantity} шт.)"
+        router_display = draft.router_model
+        if draft.router_quantity > 1:
+            router_display += f" ({draft.router_quantity} шт.)"
     
     # Формируем отображение порта
-    port = data.get('port', '-')
-    port_display = port if port and port != '' else '-'
-    
-    # Получаем информацию о договоре
-    contract_signed = data.get('contract_signed', False)
-    contract_status = "✅ Подписан" if contract_signed else "❌ Не подписан"
+    port_display = draft.port or '-'
     
-    # Получаем информацию о доступе на роутер
-    router_access = data.get('router_access', False)
-    router_access_status = "✅ Получен" if router_access else "⏭️ Пропущено"
-    
-    # Получаем информацию о Телеграмм Боте
-    telegram_bot_connected = data.get('telegram_bot_connected', False)
-    telegram_bot_status = "✅ Подключен" if telegram_bot_connected else "-"
+    contract_status = "✅ Подписан" if draft.contract_signed else "❌ Не подписан"
+    router_access_status = "✅ Получен" if draft.router_access else "⏭️ Пропущено"
+    telegram_bot_status = "✅ Подключен" if draft.telegram_bot_connected else "-"
     
     confirmation_text = f"""
 <b>📋 Подтверждение данных</b>
 
-<b>📍 Адрес:</b> {data['address']}
+<b>📍 Адрес:</b> {draft.address}
 
 <b>Тип подключения:</b> {type_name}
 <b>Модель роутера:</b> {router_display}
@@ -89,8 +87,8 @@ async def show_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE,
 <b>Порт:</b> {port_display}
 
 <b>📏 Проложенный кабель:</b>
-  • ВОЛС: {data['fiber_meters']} м
-  • Витая пара: {data['twisted_pair_meters']} м
+  • ВОЛС: {draft.fiber_meters} м
+  • Витая пара: {draft.twisted_pair_meters} м
 
 <b>👥 Исполнители ({emp_count}):</b>
 {chr(10).join(['  • ' + name for name in employee_names])}
@@ -99,7 +97,7 @@ async def show_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE,
   • ВОЛС: {fiber_per_emp} м
   • Витая пара: {twisted_per_emp} м{payer_info}
 
-<b>📸 Фото:</b> {len(photos)} шт.
+<b>📸 Фото:</b> {len(draft.photos)} шт.
 
 Всё верно? Подтвердите создание отчета.
 """
@@ -136,53 +134,35 @@ async def confirm_connection(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return ConversationHandler.END
     
-    # Сохраняем в БД
-    db = Database()
-    data = context.user_data['connection_data']
-    photos = context.user_data.get('photos', [])
-    selected_employees = context.user_data.get('selected_employees', [])
-    material_payer_id = context.user_data.get('material_payer_id')
-    router_payer_id = context.user_data.get('router_payer_id')
+    # Сохраняем в БД только заполненный черновик
+    draft = find_draft(context)
+    if draft is None or not draft.is_complete:
+        logger.warning(f"Подтверждение без данных подключения от пользователя {update.effective_user.id}")
+        return await _restart_connection(query, context)
+    
+    db = context.bot_data['db']
     user_id = update.effective_user.id
     
-    router_quantity = data.get('router_quantity', 1)
-    contract_signed = data.get('contract_signed', False)
-    router_access = data.get('router_access', False)
-    telegram_bot_connected = data.get('telegram_bot_connected', False)
-    
-    connection_id = db.create_connection(
-        connection_type=data.get('connection_type', 'mkd'),
-        address=data['address'],
-        router_model=data['router_model'],
-        port=data['port'],
-        fiber_meters=data['fiber_meters'],
-        twisted_pair_meters=data['twisted_pair_meters'],
-        employee_ids=selected_employees,
-        photo_file_ids=photos,
+    connection_id = await db.create_connection(
+        connection_type=draft.connection_type,
+        address=draft.address,
+        router_model=draft.router_model,
+        port=draft.port,
+        fiber_meters=draft.fiber_meters,
+        twisted_pair_meters=draft.twisted_pair_meters,
+        employee_ids=draft.employee_ids,
+        photo_file_ids=draft.photos,
         created_by=user_id,
-        material_payer_id=material_payer_id,
-        router_quantity=router_quantity,
-        contract_signed=contract_signed,
-        router_access=router_access,
-        telegram_bot_connected=telegram_bot_connected
+        material_payer_id=draft.material_payer_id,
+        router_quantity=draft.router_quantity,
+        contract_signed=draft.contract_signed,
+        router_access=draft.router_access,
+        telegram_bot_connected=draft.telegram_bot_connected,
+        router_payer_id=draft.router_payer_id,
+        report_chat_ids=report_channels(draft.connection_type)
     )
     
     if connection_id:
-        # Списываем роутер, если указан плательщик и роутер не пропущен
-        router_model = data.get('router_model', '-')
-        if router_payer_id and router_model != '-' and router_model:
-            success = db.deduct_router_from_employee(
-                router_payer_id, 
-                router_model, 
-                router_quantity,
-                connection_id=connection_id,
-                created_by=user_id
-            )
-            if success:
-                logger.info(f"Роутер '{router_model}' x{router_quantity} списан с сотрудника ID {router_payer_id}")
-            else:
-                logger.warning(f"Не удалось списать роутер '{router_model}' x{router_quantity} с сотрудника ID {router_payer_id}")
-        
         # Отправляем подтверждение
         await query.edit_message_text(
             f"✅ <b>Отчет успешно создан!</b>\n\n"
@@ -192,7 +172,16 @@ async def confirm_connection(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         
         # Отправляем отчет с фотографиями
-        await send_connection_report(query.message, connection_id, data, photos, selected_employees, db)
+        sent = await send_connection_report(
+            query.message, connection_id, draft, draft.photos, draft.employee_ids, db
+        )
+        
+        # Отчеты в каналы уже сохранены вместе с подключением; очередь исходящих
+        # отправит их в фоне копиями этих сообщений, пользователь их не ждет
+        context.application.create_task(
+            publish_connection_report(context.bot_data['outbound'], connection_id, sent),
+            update=update
+        )
         
         await query.message.reply_text(
             "Выберите следующее действие:",
@@ -2,13 +2,14 @@
 ConversationHandler для создания подключений
 Интегрирует все модули обработки подключений
 """
-from telegram.ext import ConversationHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram import Update
+from telegram.ext import ConversationHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters
 
 from config import (
     SELECT_CONNECTION_TYPE, UPLOAD_PHOTOS, ENTER_ADDRESS, SELECT_ROUTER,
     ENTER_ROUTER_QUANTITY_CONNECTION, ROUTER_ACCESS, ENTER_PORT, ENTER_FIBER,
     ENTER_TWISTED, CONTRACT_SIGNED, TELEGRAM_BOT_CONFIRM, SELECT_EMPLOYEES, 
-    SELECT_MATERIAL_PAYER, SELECT_ROUTER_PAYER, CONFIRM
+    SELECT_MATERIAL_PAYER, SELECT_ROUTER_PAYER, CONFIRM, CONVERSATION_TIMEOUT
 )
 
 # Импорт обработчиков шагов
@@ -50,6 +51,7 @@ from handlers.connection.cancellation import (
     cancel_by_menu,
     cancel_by_command
 )
+from handlers.commands import conversation_timeout
 
 # Создаем ConversationHandler для подключений
 connection_conv = ConversationHandler(
@@ -110,6 +112,9 @@ connection_conv = ConversationHandler(
         ],
         CONFIRM: [
             CallbackQueryHandler(confirm_connection, pattern='^confirm_')
+        ],
+        ConversationHandler.TIMEOUT: [
+            TypeHandler(Update, conversation_timeout)
         ]
     },
     fallbacks=[
@@ -119,7 +124,8 @@ connection_conv = ConversationHandler(
         ),
         MessageHandler(filters.COMMAND, cancel_by_command)
     ],
+    conversation_timeout=CONVERSATION_TIMEOUT,
     name='connection_conversation',
-    persistent=False
+    persistent=True
 )
 
@@ -0,0 +1,94 @@
+"""
+Черновик подключения, который заполняется по шагам мастера
+"""
+from dataclasses import dataclass, field
+from typing import ClassVar, List, Optional
+
+from telegram.ext import ContextTypes
+
+from persistence import record_type
+
+# Ключ черновика в context.user_data
+DRAFT_KEY = 'connection_draft'
+
+
+@record_type('$cd')
+@dataclass(slots=True)
+class ConnectionDraft:
+    """
+    Данные подключения до подтверждения
+    
+    Хранится в context.user_data одним объектом со __slots__ вместо
+    нескольких словарей. Для сохранения в БД (persistence.py) кодируется
+    списком значений полей с номером версии формата: новые поля
+    добавляются только в конец (старые записи получают значения по
+    умолчанию), при удалении или перестановке полей VERSION повышается.
+    """
+    VERSION: ClassVar[int] = 1
+    
+    connection_type: str = 'mkd'
+    photos: List[str] = field(default_factory=list)
+    upload_message_id: Optional[int] = None
+    address: str = ''
+    router_model: str = '-'
+    router_quantity: int = 1
+    router_access: bool = False
+    port: str = '-'
+    fiber_meters: float = 0.0
+    twisted_pair_meters: float = 0.0
+    contract_signed: bool = False
+    telegram_bot_connected: bool = False
+    employee_ids: List[int] = field(default_factory=list)
+    material_payer_id: Optional[int] = None
+    router_payer_id: Optional[int] = None
+    
+    @property
+    def has_router(self) -> bool:
+        """Роутер выбран (не пропущен)"""
+        return bool(self.router_model) and self.router_model != '-'
+    
+    @property
+    def is_complete(self) -> bool:
+        """Заполнены данные, без которых подключение не сохраняется (адрес и исполнители)"""
+        return bool(self.address) and bool(self.employee_ids)
+    
+    def to_record(self) -> list:
+        """Компактная запись для сохранения: [версия, значения полей по порядку]"""
+        return [self.VERSION, *(getattr(self, name) for name in self.__slots__)]
+    
+    @classmethod
+    def from_record(cls, record: list) -> 'ConnectionDraft':
+        """
+        Восстановить черновик из записи to_record
+        
+        Raises:
+            ValueError: Запись создана более новой версией бота
+        """
+        version, *values = record
+        if version > cls.VERSION or len(values) > len(cls.__slots__):
+            raise ValueError(f"неизвестная версия черновика подключения: {version}")
+        return cls(*values)
+
+
+def start_draft(context: ContextTypes.DEFAULT_TYPE) -> ConnectionDraft:
+    """Начать новый черновик (предыдущий отбрасывается)"""
+    draft = context.user_data[DRAFT_KEY] = ConnectionDraft()
+    return draft
+
+
+def get_draft(context: ContextTypes.DEFAULT_TYPE) -> ConnectionDraft:
+    """Черновик пользователя (пустой, если его нет, например после очистки данных)"""
+    draft = context.user_data.get(DRAFT_KEY)
+    if draft is None:
+        draft = start_draft(context)
+    return draft
+
+
+def find_draft(context: ContextTypes.DEFAULT_TYPE) -> Optional[ConnectionDraft]:
+    """
+    Черновик пользователя или None, если его нет (новый не создается)
+    
+    Для шагов, которые не должны работать с пустым черновиком: после
+    очистки user_data или черновика старого формата мастер начинается заново.
+    """
+    return context.user_data.get(DRAFT_KEY)
@@ -5,7 +5,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from config import SELECT_EMPLOYEES, logger
-from database import Database
+from handlers.connection.draft import get_draft
 
 
 async def select_employee_toggle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -13,40 +13,38 @@ async def select_employee_toggle(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
     
+    selected = get_draft(context).employee_ids
+    
     if query.data == 'employees_done':
-        selected = context.user_data.get('selected_employees', [])
         
         if not selected:
             await query.answer("⚠️ Выберите хотя бы одного сотрудника!", show_alert=True)
             return SELECT_EMPLOYEES
         
         # Проверяем балансы и определяем, кто будет платить за материалы
-        db = Database()
+        db = context.bot_data['db']
         from handlers.connection.validation import check_materials_and_proceed
         return await check_materials_and_proceed(update, context, db)
     
     # Переключаем выбор сотрудника
     emp_id = int(query.data.split('_')[1])
-    selected = context.user_data.get('selected_employees', [])
     
     if emp_id in selected:
         selected.remove(emp_id)
     else:
         selected.append(emp_id)
     
-    context.user_data['selected_employees'] = selected
-    
     # Обновляем клавиатуру
-    db = Database()
-    employees = db.get_all_employees()
+    db = context.bot_data['db']
+    employees = await db.get_all_employees()
     keyboard = []
     
     for emp in employees:
-        is_selected = emp['id'] in selected
+        is_selected = emp.id in selected
         checkbox = "☑" if is_selected else "☐"
         keyboard.append([InlineKeyboardButton(
-            f"{checkbox} {emp['full_name']}", 
-            callback_data=f"emp_{emp['id']}"
+            f"{checkbox} {emp.full_name}", 
+            callback_data=f"emp_{emp.id}"
         )])
     
     keyboard.append([InlineKeyboardButton("✅ Готово", callback_data='employees_done')])
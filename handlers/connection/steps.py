@@ -12,14 +12,13 @@ from config import (
 from utils.keyboards import get_main_keyboard
 from handlers.connection.constants import MAX_PHOTOS, PHOTO_REQUIREMENTS
 from handlers.connection.cancellation import cancel_connection
-from database import Database
+from handlers.connection.draft import get_draft, start_draft
 
 
 async def new_connection_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало создания нового подключения"""
-    # Инициализация данных
-    context.user_data['photos'] = []
-    context.user_data['connection_data'] = {}
+    # Новый черновик подключения
+    start_draft(context)
     
     # Создаем клавиатуру для выбора типа подключения
     keyboard = [
@@ -57,7 +56,7 @@ async def select_connection_type(update: Update, context: ContextTypes.DEFAULT_T
     
     # Извлекаем тип подключения из callback_data
     conn_type = query.data.split('_')[-1]
-    context.user_data['connection_data']['connection_type'] = conn_type
+    get_draft(context).connection_type = conn_type
     
     # Получаем читаемое название
     type_name = CONNECTION_TYPES.get(conn_type, conn_type)
@@ -89,7 +88,8 @@ async def select_connection_type(update: Update, context: ContextTypes.DEFAULT_T
 async def upload_photos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработка загружаемых фотографий"""
     if update.message.photo:
-        photos = context.user_data.get('photos', [])
+        draft = get_draft(context)
+        photos = draft.photos
         
         if len(photos) >= MAX_PHOTOS:
             await update.message.reply_text(f"⚠️ Достигнут лимит в {MAX_PHOTOS} фотографий.")
@@ -98,7 +98,6 @@ async def upload_photos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         # Сохраняем file_id самого большого размера фото
         photo_file_id = update.message.photo[-1].file_id
         photos.append(photo_file_id)
-        context.user_data['photos'] = photos
         
         keyboard = [
             [InlineKeyboardButton("➡️ Продолжить", callback_data='continue_from_photos')],
@@ -113,13 +112,13 @@ async def upload_photos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
                 f"Можете загрузить еще фото или нажмите 'Продолжить'.",
                 reply_markup=reply_markup
             )
-            context.user_data['upload_message_id'] = sent_message.message_id
+            draft.upload_message_id = sent_message.message_id
         else:
             # Для последующих фото - редактируем существующее сообщение
             try:
                 await context.bot.edit_message_text(
                     chat_id=update.effective_chat.id,
-                    message_id=context.user_data.get('upload_message_id'),
+                    message_id=draft.upload_message_id,
                     text=f"✅ Фото {len(photos)}/{MAX_PHOTOS} загружено.\n\n"
                          f"Можете загрузить еще фото или нажмите 'Продолжить'.",
                     reply_markup=reply_markup
@@ -131,7 +130,7 @@ async def upload_photos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
                     f"Можете загрузить еще фото или нажмите 'Продолжить'.",
                     reply_markup=reply_markup
                 )
-                context.user_data['upload_message_id'] = sent_message.message_id
+                draft.upload_message_id = sent_message.message_id
         
         return UPLOAD_PHOTOS
     
@@ -143,7 +142,7 @@ async def ask_address(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     query = update.callback_query
     await query.answer()
     
-    photos_count = len(context.user_data.get('photos', []))
+    photos_count = len(get_draft(context).photos)
     
     # Проверяем, что загружено хотя бы одно фото
     if photos_count == 0:
@@ -189,15 +188,11 @@ async def enter_address(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         )
         return ConversationHandler.END
     
-    # Проверяем и инициализируем connection_data если нужно
-    if 'connection_data' not in context.user_data:
-        context.user_data['connection_data'] = {}
-    
-    context.user_data['connection_data']['address'] = address
+    get_draft(context).address = address
     
     # Получаем список роутеров из БД
-    db = Database()
-    router_names = db.get_all_router_names()
+    db = context.bot_data['db']
+    router_names = await db.get_all_router_names()
     
     # Создаём клавиатуру с роутерами
     keyboard = []
@@ -234,13 +229,11 @@ async def select_router(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     query = update.callback_query
     await query.answer()
     
-    if 'connection_data' not in context.user_data:
-        context.user_data['connection_data'] = {}
-    
     # Обработка пропуска
     if query.data == 'router_skip':
-        context.user_data['connection_data']['router_model'] = '-'
-        context.user_data['connection_data']['router_quantity'] = 0
+        draft = get_draft(context)
+        draft.router_model = '-'
+        draft.router_quantity = 0
         
         # Сразу переходим к шагу "Доступ на роутер"
         keyboard = [
@@ -266,7 +259,7 @@ async def select_router(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     
     # Выбран роутер из списка
     router_name = query.data.replace('select_router_', '')
-    context.user_data['connection_data']['router_model'] = router_name
+    get_draft(context).router_model = router_name
     
     # Добавляем клавиатуру отмены для ввода количества роутеров
     keyboard = [[KeyboardButton("❌ Отмена")]]
@@ -307,10 +300,7 @@ async def enter_router_quantity_connection(update: Update, context: ContextTypes
         if router_quantity <= 0:
             raise ValueError
         
-        if 'connection_data' not in context.user_data:
-            context.user_data['connection_data'] = {}
-        
-        context.user_data['connection_data']['router_quantity'] = router_quantity
+        get_draft(context).router_quantity = router_quantity
         
         # Переход к новому шагу "Доступ на роутер"
         keyboard = [
@@ -350,14 +340,11 @@ async def router_access_handler(update: Update, context: ContextTypes.DEFAULT_TY
         return await cancel_connection(update, context)
     
     # Сохраняем информацию о доступе на роутер
-    if 'connection_data' not in context.user_data:
-        context.user_data['connection_data'] = {}
-    
     if query.data == 'router_access_confirmed':
-        context.user_data['connection_data']['router_access'] = True
+        get_draft(context).router_access = True
         status_text = "✅ Доступ получен"
     else:  # router_access_skipped
-        context.user_data['connection_data']['router_access'] = False
+        get_draft(context).router_access = False
         status_text = "⏭️ Пропущено"
     
     # Создаём inline клавиатуру с кнопкой "Пропустить" для порта
@@ -393,10 +380,7 @@ async def enter_port(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             return await cancel_connection(update, context)
         
         if query.data == 'port_skip':
-            if 'connection_data' not in context.user_data:
-                context.user_data['connection_data'] = {}
-            
-            context.user_data['connection_data']['port'] = '-'
+            get_draft(context).port = '-'
             
             # Добавляем клавиатуру отмены для ввода ВОЛС
             keyboard = [[KeyboardButton("❌ Отмена")]]
@@ -430,10 +414,7 @@ async def enter_port(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         )
         return ConversationHandler.END
     
-    if 'connection_data' not in context.user_data:
-        context.user_data['connection_data'] = {}
-    
-    context.user_data['connection_data']['port'] = port
+    get_draft(context).port = port
     
     # Добавляем клавиатуру отмены для ввода ВОЛС
     keyboard = [[KeyboardButton("❌ Отмена")]]
@@ -470,10 +451,7 @@ async def enter_fiber(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         if fiber_meters < 0:
             raise ValueError
         
-        if 'connection_data' not in context.user_data:
-            context.user_data['connection_data'] = {}
-        
-        context.user_data['connection_data']['fiber_meters'] = fiber_meters
+        get_draft(context).fiber_meters = fiber_meters
         
         await update.message.reply_text(
             f"✅ ВОЛС: {fiber_meters} м\n\n"
@@ -510,10 +488,7 @@ async def enter_twisted(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         if twisted_meters < 0:
             raise ValueError
         
-        if 'connection_data' not in context.user_data:
-            context.user_data['connection_data'] = {}
-        
-        context.user_data['connection_data']['twisted_pair_meters'] = twisted_meters
+        get_draft(context).twisted_pair_meters = twisted_meters
         
         # Переходим к подтверждению договора
         keyboard = [
@@ -552,9 +527,7 @@ async def contract_signed(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return await cancel_connection(update, context)
     
     # Сохраняем подтверждение договора
-    if 'connection_data' not in context.user_data:
-        context.user_data['connection_data'] = {}
-    context.user_data['connection_data']['contract_signed'] = True
+    get_draft(context).contract_signed = True
     
     # Переходим к новому шагу "Телеграмм Бот"
     keyboard = [
@@ -584,19 +557,16 @@ async def telegram_bot_confirm(update: Update, context: ContextTypes.DEFAULT_TYP
         return await cancel_connection(update, context)
     
     # Сохраняем информацию о подключении Телеграмм Бота
-    if 'connection_data' not in context.user_data:
-        context.user_data['connection_data'] = {}
-    
     if query.data == 'telegram_bot_confirmed':
-        context.user_data['connection_data']['telegram_bot_connected'] = True
+        get_draft(context).telegram_bot_connected = True
         status_text = "✅ Телеграмм Бот подключен"
     else:  # telegram_bot_skipped
-        context.user_data['connection_data']['telegram_bot_connected'] = False
+        get_draft(context).telegram_bot_connected = False
         status_text = "⏭️ Пропущено"
     
     # Получаем список сотрудников
-    db = Database()
-    employees = db.get_all_employees()
+    db = context.bot_data['db']
+    employees = await db.get_all_employees()
     
     if not employees:
         await query.edit_message_text(
@@ -611,13 +581,13 @@ async def telegram_bot_confirm(update: Update, context: ContextTypes.DEFAULT_TYP
         return ConversationHandler.END
     
     # Создаем клавиатуру для выбора сотрудников
-    context.user_data['selected_employees'] = []
+    get_draft(context).employee_ids = []
     keyboard = []
     
     for emp in employees:
         keyboard.append([InlineKeyboardButton(
-            f"☐ {emp['full_name']}", 
-            callback_data=f"emp_{emp['id']}"
+            f"☐ {emp.full_name}", 
+            callback_data=f"emp_{emp.id}"
         )])
     
     keyboard.append([InlineKeyboardButton("✅ Готово", callback_data='employees_done')])
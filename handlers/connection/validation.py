@@ -5,30 +5,29 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
 from config import SELECT_MATERIAL_PAYER, SELECT_ROUTER_PAYER
+from handlers.connection.draft import get_draft
 from utils.keyboards import get_main_keyboard
-from database import Database
 
 
 async def check_materials_and_proceed(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
     """Проверить балансы материалов и определить плательщика"""
     query = update.callback_query
     
-    data = context.user_data['connection_data']
-    selected_employees = context.user_data.get('selected_employees', [])
-    fiber_meters = data['fiber_meters']
-    twisted_pair_meters = data['twisted_pair_meters']
+    draft = get_draft(context)
+    fiber_meters = draft.fiber_meters
+    twisted_pair_meters = draft.twisted_pair_meters
     
     # Получаем балансы всех выбранных сотрудников
     employees_with_balance = []
-    for emp_id in selected_employees:
-        emp = db.get_employee_by_id(emp_id)
+    for emp_id in draft.employee_ids:
+        emp = await db.get_employee_by_id(emp_id)
         if emp:
-            fiber_balance = emp.get('fiber_balance', 0) or 0
-            twisted_balance = emp.get('twisted_pair_balance', 0) or 0
+            fiber_balance = emp.fiber_balance or 0
+            twisted_balance = emp.twisted_pair_balance or 0
             has_enough = (fiber_balance >= fiber_meters and twisted_balance >= twisted_pair_meters)
             employees_with_balance.append({
                 'id': emp_id,
-                'name': emp['full_name'],
+                'name': emp.full_name,
                 'fiber': fiber_balance,
                 'twisted': twisted_balance,
                 'has_enough': has_enough
@@ -63,7 +62,7 @@ async def check_materials_and_proceed(update: Update, context: ContextTypes.DEFA
     
     elif len(employees_with_enough) == 1:
         # Только у одного есть материалы - списываем с него автоматически
-        context.user_data['material_payer_id'] = employees_with_enough[0]['id']
+        draft.material_payer_id = employees_with_enough[0]['id']
         # Переходим к проверке роутеров
         return await check_routers_and_proceed(update, context, db)
     
@@ -99,9 +98,9 @@ async def select_material_payer(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     
     payer_id = int(query.data.split('_')[1])
-    context.user_data['material_payer_id'] = payer_id
+    get_draft(context).material_payer_id = payer_id
     
-    db = Database()
+    db = context.bot_data['db']
     # Переходим к проверке роутеров
     return await check_routers_and_proceed(update, context, db)
 
@@ -110,26 +109,25 @@ async def check_routers_and_proceed(update: Update, context: ContextTypes.DEFAUL
     """Проверить наличие роутеров и определить плательщика"""
     query = update.callback_query
     
-    data = context.user_data['connection_data']
-    selected_employees = context.user_data.get('selected_employees', [])
-    router_model = data['router_model']
-    required_quantity = data.get('router_quantity', 1)
+    draft = get_draft(context)
+    router_model = draft.router_model
+    required_quantity = draft.router_quantity
     
     # Если роутер пропущен, сразу переходим к подтверждению
-    if router_model == '-' or not router_model:
+    if not draft.has_router:
         from handlers.connection.confirmation import show_confirmation
         return await show_confirmation(update, context, db)
     
     # Получаем информацию о роутерах у сотрудников
     employees_with_router = []
-    for emp_id in selected_employees:
-        emp = db.get_employee_by_id(emp_id)
+    for emp_id in draft.employee_ids:
+        emp = await db.get_employee_by_id(emp_id)
         if emp:
-            router_quantity = db.get_router_quantity(emp_id, router_model)
+            router_quantity = await db.get_router_quantity(emp_id, router_model)
             has_enough = router_quantity >= required_quantity
             employees_with_router.append({
                 'id': emp_id,
-                'name': emp['full_name'],
+                'name': emp.full_name,
                 'quantity': router_quantity,
                 'has_enough': has_enough
             })
@@ -162,7 +160,7 @@ async def check_routers_and_proceed(update: Update, context: ContextTypes.DEFAUL
     
     elif len(employees_with_enough) == 1:
         # Только у одного есть достаточно роутеров
-        context.user_data['router_payer_id'] = employees_with_enough[0]['id']
+        draft.router_payer_id = employees_with_enough[0]['id']
         from handlers.connection.confirmation import show_confirmation
         return await show_confirmation(update, context, db)
     
@@ -197,9 +195,9 @@ async def select_router_payer(update: Update, context: ContextTypes.DEFAULT_TYPE
     await query.answer()
     
     payer_id = int(query.data.split('_')[-1])
-    context.user_data['router_payer_id'] = payer_id
+    get_draft(context).router_payer_id = payer_id
     
-    db = Database()
+    db = context.bot_data['db']
     from handlers.connection.confirmation import show_confirmation
     return await show_confirmation(update, context, db)
 
@@ -85,7 +85,7 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return ADD_EMPLOYEE_NAME
     
     if query.data == 'manage_delete':
-        employees = db.get_all_employees()
+        employees = await db.get_all_employees()
         
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников для удаления.")
@@ -95,8 +95,8 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         keyboard = []
         for emp in employees:
             keyboard.append([InlineKeyboardButton(
-                f"🗑 {emp['full_name']}", 
-                callback_data=f"del_emp_{emp['id']}"
+                f"🗑 {emp.full_name}", 
+                callback_data=f"del_emp_{emp.id}"
             )])
         
         keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='delete_cancel')])
@@ -111,7 +111,7 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return DELETE_EMPLOYEE_SELECT
     
     if query.data == 'manage_materials':
-        employees = db.get_all_employees()
+        employees = await db.get_all_employees()
         
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников.")
@@ -120,11 +120,11 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         
         keyboard = []
         for emp in employees:
-            fiber = emp.get('fiber_balance', 0) or 0
-            twisted = emp.get('twisted_pair_balance', 0) or 0
+            fiber = emp.fiber_balance or 0
+            twisted = emp.twisted_pair_balance or 0
             keyboard.append([InlineKeyboardButton(
-                f"📦 {emp['full_name']} (ВОЛС: {fiber}м, ВП: {twisted}м)",
-                callback_data=f"mat_emp_{emp['id']}"
+                f"📦 {emp.full_name} (ВОЛС: {fiber}м, ВП: {twisted}м)",
+                callback_data=f"mat_emp_{emp.id}"
             )])
         
         keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_manage')])
@@ -139,7 +139,7 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return SELECT_EMPLOYEE_FOR_MATERIAL
     
     if query.data == 'manage_routers':
-        employees = db.get_all_employees()
+        employees = await db.get_employees_with_routers()
         
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников.")
@@ -148,12 +148,11 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         
         keyboard = []
         for emp in employees:
-            routers = db.get_employee_routers(emp['id'])
-            router_count = sum(r['quantity'] for r in routers)
+            router_count = emp.router_count
             router_text = f"{router_count} шт." if router_count > 0 else "нет"
             keyboard.append([InlineKeyboardButton(
-                f"📡 {emp['full_name']} ({router_text})",
-                callback_data=f"rtr_emp_{emp['id']}"
+                f"📡 {emp.full_name} ({router_text})",
+                callback_data=f"rtr_emp_{emp.id}"
             )])
         
         keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_manage')])
@@ -168,17 +167,17 @@ async def manage_action(update: Update, context: ContextTypes.DEFAULT_TYPE, db)
         return SELECT_EMPLOYEE_FOR_ROUTER
     
     if query.data == 'manage_list':
-        employees = db.get_all_employees()
+        employees = await db.get_all_employees()
         
         if not employees:
             text = "📋 <b>Список сотрудников</b>\n\nСписок пуст."
         else:
             emp_lines = []
             for idx, emp in enumerate(employees, 1):
-                fiber = emp.get('fiber_balance', 0) or 0
-                twisted = emp.get('twisted_pair_balance', 0) or 0
+                fiber = emp.fiber_balance or 0
+                twisted = emp.twisted_pair_balance or 0
                 emp_lines.append(
-                    f"{idx}. {emp['full_name']}\n"
+                    f"{idx}. {emp.full_name}\n"
                     f"   📦 ВОЛС: {fiber}м | Витая пара: {twisted}м"
                 )
             emp_list = '\n\n'.join(emp_lines)
@@ -199,7 +198,7 @@ async def add_employee_name(update: Update, context: ContextTypes.DEFAULT_TYPE,
         await update.message.reply_text("⚠️ ФИО должно содержать минимум 3 символа. Попробуйте еще раз:")
         return ADD_EMPLOYEE_NAME
     
-    employee_id = db.add_employee(full_name)
+    employee_id = await db.add_employee(full_name)
     
     if employee_id:
         await update.message.reply_text(
@@ -228,11 +227,14 @@ async def delete_employee_confirm(update: Update, context: ContextTypes.DEFAULT_
         return ConversationHandler.END
     
     emp_id = int(query.data.split('_')[2])
-    employee = db.get_employee_by_id(emp_id)
+    employee = await db.get_employee_by_id(emp_id)
     
-    if db.delete_employee(emp_id):
+    if await db.delete_employee(emp_id):
+        report_cache = context.bot_data.get('report_cache')
+        if report_cache is not None:
+            report_cache.invalidate_employee(emp_id)
         await query.edit_message_text(
-            f"✅ Сотрудник <b>{employee['full_name']}</b> удален!",
+            f"✅ Сотрудник <b>{employee.full_name}</b> удален!",
             parse_mode='HTML'
         )
     else:
@@ -251,7 +253,7 @@ async def select_employee_for_material(update: Update, context: ContextTypes.DEF
         return await manage_action(update, context, db)
     
     emp_id = int(query.data.split('_')[2])
-    employee = db.get_employee_by_id(emp_id)
+    employee = await db.get_employee_by_id(emp_id)
     
     if not employee:
         await query.edit_message_text("❌ Сотрудник не найден.")
@@ -261,8 +263,8 @@ async def select_employee_for_material(update: Update, context: ContextTypes.DEF
     # Сохраняем ID сотрудника в контексте
     context.user_data['selected_employee_id'] = emp_id
     
-    fiber = employee.get('fiber_balance', 0) or 0
-    twisted = employee.get('twisted_pair_balance', 0) or 0
+    fiber = employee.fiber_balance or 0
+    twisted = employee.twisted_pair_balance or 0
     
     keyboard = [
         [InlineKeyboardButton("➕ Добавить материалы", callback_data='mat_action_add')],
@@ -274,7 +276,7 @@ async def select_employee_for_material(update: Update, context: ContextTypes.DEF
     text = f"""
 📦 <b>Управление материалами</b>
 
-👤 <b>Сотрудник:</b> {employee['full_name']}
+👤 <b>Сотрудник:</b> {employee.full_name}
 
 📊 <b>Текущий баланс:</b>
   • ВОЛС: {fiber} м
@@ -294,14 +296,14 @@ async def select_material_action(update: Update, context: ContextTypes.DEFAULT_T
     
     if query.data == 'mat_back_to_list':
         # Возврат к списку сотрудников
-        employees = db.get_all_employees()
+        employees = await db.get_all_employees()
         keyboard = []
         for emp in employees:
-            fiber = emp.get('fiber_balance', 0) or 0
-            twisted = emp.get('twisted_pair_balance', 0) or 0
+            fiber = emp.fiber_balance or 0
+            twisted = emp.twisted_pair_balance or 0
             keyboard.append([InlineKeyboardButton(
-                f"📦 {emp['full_name']} (ВОЛС: {fiber}м, ВП: {twisted}м)",
-                callback_data=f"mat_emp_{emp['id']}"
+                f"📦 {emp.full_name} (ВОЛС: {fiber}м, ВП: {twisted}м)",
+                callback_data=f"mat_emp_{emp.id}"
             )])
         
         keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_manage')])
@@ -316,13 +318,13 @@ async def select_material_action(update: Update, context: ContextTypes.DEFAULT_T
         return SELECT_EMPLOYEE_FOR_MATERIAL
     
     emp_id = context.user_data.get('selected_employee_id')
-    employee = db.get_employee_by_id(emp_id)
+    employee = await db.get_employee_by_id(emp_id)
     
     if query.data == 'mat_action_add':
         context.user_data['material_action'] = 'add'
         await query.edit_message_text(
             f"➕ <b>Добавление материалов</b>\n\n"
-            f"👤 Сотрудник: {employee['full_name']}\n\n"
+            f"👤 Сотрудник: {employee.full_name}\n\n"
             f"Введите количество метров <b>ВОЛС</b> для добавления:\n"
             f"(Введите 0, если не нужно добавлять)",
             parse_mode='HTML'
@@ -333,7 +335,7 @@ async def select_material_action(update: Update, context: ContextTypes.DEFAULT_T
         context.user_data['material_action'] = 'deduct'
         await query.edit_message_text(
             f"➖ <b>Списание материалов</b>\n\n"
-            f"👤 Сотрудник: {employee['full_name']}\n\n"
+            f"👤 Сотрудник: {employee.full_name}\n\n"
             f"Введите количество метров <b>ВОЛС</b> для списания:\n"
             f"(Введите 0, если не нужно списывать)",
             parse_mode='HTML'
@@ -353,7 +355,7 @@ async def enter_fiber_amount(update: Update, context: ContextTypes.DEFAULT_TYPE,
         context.user_data['fiber_amount'] = fiber_amount
         
         emp_id = context.user_data.get('selected_employee_id')
-        employee = db.get_employee_by_id(emp_id)
+        employee = await db.get_employee_by_id(emp_id)
         action = context.user_data.get('material_action')
         action_text = "добавления" if action == 'add' else "списания"
         
@@ -382,18 +384,18 @@ async def enter_twisted_amount(update: Update, context: ContextTypes.DEFAULT_TYP
         fiber_amount = context.user_data.get('fiber_amount', 0)
         action = context.user_data.get('material_action')
         
-        employee = db.get_employee_by_id(emp_id)
+        employee = await db.get_employee_by_id(emp_id)
         
         if action == 'add':
-            success = db.add_material_to_employee(emp_id, fiber_amount, twisted_amount)
+            success = await db.add_material_to_employee(emp_id, fiber_amount, twisted_amount)
             if success:
-                updated_emp = db.get_employee_by_id(emp_id)
-                new_fiber = updated_emp.get('fiber_balance', 0) or 0
-                new_twisted = updated_emp.get('twisted_pair_balance', 0) or 0
+                updated_emp = await db.get_employee_by_id(emp_id)
+                new_fiber = updated_emp.fiber_balance or 0
+                new_twisted = updated_emp.twisted_pair_balance or 0
                 
                 await update.message.reply_text(
                     f"✅ <b>Материалы добавлены!</b>\n\n"
-                    f"👤 Сотрудник: {employee['full_name']}\n\n"
+                    f"👤 Сотрудник: {employee.full_name}\n\n"
                     f"➕ Добавлено:\n"
                     f"  • ВОЛС: +{fiber_amount} м\n"
                     f"  • Витая пара: +{twisted_amount} м\n\n"
@@ -409,15 +411,15 @@ async def enter_twisted_amount(update: Update, context: ContextTypes.DEFAULT_TYP
                     reply_markup=get_main_keyboard()
                 )
         else:  # deduct
-            success = db.deduct_material_from_employee(emp_id, fiber_amount, twisted_amount)
+            success = await db.deduct_material_from_employee(emp_id, fiber_amount, twisted_amount)
             if success:
-                updated_emp = db.get_employee_by_id(emp_id)
-                new_fiber = updated_emp.get('fiber_balance', 0) or 0
-                new_twisted = updated_emp.get('twisted_pair_balance', 0) or 0
+                updated_emp = await db.get_employee_by_id(emp_id)
+                new_fiber = updated_emp.fiber_balance or 0
+                new_twisted = updated_emp.twisted_pair_balance or 0
                 
                 await update.message.reply_text(
                     f"✅ <b>Материалы списаны!</b>\n\n"
-                    f"👤 Сотрудник: {employee['full_name']}\n\n"
+                    f"👤 Сотрудник: {employee.full_name}\n\n"
                     f"➖ Списано:\n"
                     f"  • ВОЛС: -{fiber_amount} м\n"
                     f"  • Витая пара: -{twisted_amount} м\n\n"
@@ -428,11 +430,11 @@ async def enter_twisted_amount(update: Update, context: ContextTypes.DEFAULT_TYP
                     reply_markup=get_main_keyboard()
                 )
             else:
-                old_fiber = employee.get('fiber_balance', 0) or 0
-                old_twisted = employee.get('twisted_pair_balance', 0) or 0
+                old_fiber = employee.fiber_balance or 0
+                old_twisted = employee.twisted_pair_balance or 0
                 await update.message.reply_text(
                     f"❌ <b>Недостаточно материалов!</b>\n\n"
-                    f"👤 Сотрудник: {employee['full_name']}\n\n"
+                    f"👤 Сотрудник: {employee.full_name}\n\n"
                     f"📊 Текущий баланс:\n"
                     f"  • ВОЛС: {old_fiber} м\n"
                     f"  • Витая пара: {old_twisted} м\n\n"
@@ -466,8 +468,8 @@ async def select_employee_for_router(update: Update, context: ContextTypes.DEFAU
     emp_id = int(query.data.split('_')[-1])
     context.user_data['selected_employee_id'] = emp_id
     
-    employee = db.get_employee_by_id(emp_id)
-    routers = db.get_employee_routers(emp_id)
+    employee = await db.get_employee_by_id(emp_id)
+    routers = await db.get_employee_routers(emp_id)
     
     # Формируем текст с роутерами
     router_text = ""
@@ -486,7 +488,7 @@ async def select_employee_for_router(update: Update, context: ContextTypes.DEFAU
     
     await query.edit_message_text(
         f"📡 <b>Роутеры сотрудника</b>\n\n"
-        f"👤 {employee['full_name']}\n\n"
+        f"👤 {employee.full_name}\n\n"
         f"📊 Текущие роутеры:\n{router_text}\n"
         f"Выберите действие:",
         reply_markup=reply_markup,
@@ -503,15 +505,14 @@ async def select_router_action(update: Update, context: ContextTypes.DEFAULT_TYP
     
     if query.data == 'rtr_back_to_list':
         # Возврат к списку сотрудников
-        employees = db.get_all_employees()
+        employees = await db.get_employees_with_routers()
         keyboard = []
         for emp in employees:
-            routers = db.get_employee_routers(emp['id'])
-            router_count = sum(r['quantity'] for r in routers)
+            router_count = emp.router_count
             router_text = f"{router_count} шт." if router_count > 0 else "нет"
             keyboard.append([InlineKeyboardButton(
-                f"📡 {emp['full_name']} ({router_text})",
-                callback_data=f"rtr_emp_{emp['id']}"
+                f"📡 {emp.full_name} ({router_text})",
+                callback_data=f"rtr_emp_{emp.id}"
             )])
         
         keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data='back_to_manage')])
@@ -547,7 +548,7 @@ async def select_router_action(update: Update, context: ContextTypes.DEFAULT_TYP
         )
     else:  # deduct
         emp_id = context.user_data.get('selected_employee_id')
-        routers = db.get_employee_routers(emp_id)
+        routers = await db.get_employee_routers(emp_id)
         
         if not routers:
             await query.edit_message_text("⚠️ У сотрудника нет роутеров для списания.")
@@ -612,7 +613,7 @@ async def enter_router_name(update: Update, context: ContextTypes.DEFAULT_TYPE,
         emp_id = context.user_data.get('selected_employee_id')
         
         # Получаем информацию о роутере
-        routers = db.get_employee_routers(emp_id)
+        routers = await db.get_employee_routers(emp_id)
         selected_router = next((r for r in routers if r['id'] == router_id), None)
         
         if not selected_router:
@@ -659,15 +660,15 @@ async def enter_router_quantity(update: Update, context: ContextTypes.DEFAULT_TY
         router_name = context.user_data.get('router_name')
         action = context.user_data.get('router_action')
         
-        employee = db.get_employee_by_id(emp_id)
+        employee = await db.get_employee_by_id(emp_id)
         
         if action == 'add':
-            success = db.add_router_to_employee(emp_id, router_name, quantity, created_by=update.effective_user.id)
+            success = await db.add_router_to_employee(emp_id, router_name, quantity, created_by=update.effective_user.id)
             if success:
-                new_quantity = db.get_router_quantity(emp_id, router_name)
+                new_quantity = await db.get_router_quantity(emp_id, router_name)
                 await update.message.reply_text(
                     f"✅ <b>Роутеры добавлены!</b>\n\n"
-                    f"👤 Сотрудник: {employee['full_name']}\n"
+                    f"👤 Сотрудник: {employee.full_name}\n"
                     f"📡 Роутер: {router_name}\n"
                     f"➕ Добавлено: {quantity} шт.\n"
                     f"📊 Всего: {new_quantity} шт.",
@@ -680,12 +681,12 @@ async def enter_router_quantity(update: Update, context: ContextTypes.DEFAULT_TY
                     reply_markup=get_main_keyboard()
                 )
         else:  # deduct
-            success = db.deduct_router_from_employee(emp_id, router_name, quantity, created_by=update.effective_user.id)
+            success = await db.deduct_router_from_employee(emp_id, router_name, quantity, created_by=update.effective_user.id)
             if success:
-                new_quantity = db.get_router_quantity(emp_id, router_name)
+                new_quantity = await db.get_router_quantity(emp_id, router_name)
                 await update.message.reply_text(
                     f"✅ <b>Роутеры списаны!</b>\n\n"
-                    f"👤 Сотрудник: {employee['full_name']}\n"
+                    f"👤 Сотрудник: {employee.full_name}\n"
                     f"📡 Роутер: {router_name}\n"
                     f"➖ Списано: {quantity} шт.\n"
                     f"📊 Осталось: {new_quantity} шт.",
@@ -711,7 +712,7 @@ async def enter_router_quantity(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def show_employees_list(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> None:
     """Показать список всех сотрудников с их материалами"""
-    employees = db.get_all_employees()
+    employees = await db.get_employees_with_routers()
     
     if not employees:
         await update.message.reply_text(
@@ -727,13 +728,13 @@ async def show_employees_list(update: Update, context: ContextTypes.DEFAULT_TYPE
     message = "👤 <b>Список сотрудников</b>\n\n"
     
     for idx, emp in enumerate(employees, 1):
-        emp_name = emp['full_name']
-        fiber_balance = emp.get('fiber_balance', 0) or 0
-        twisted_balance = emp.get('twisted_pair_balance', 0) or 0
+        emp_name = emp.full_name
+        fiber_balance = emp.fiber_balance or 0
+        twisted_balance = emp.twisted_pair_balance or 0
         
-        # Получаем роутеры сотрудника
-        routers = db.get_employee_routers(emp['id'])
-        router_count = sum(r['quantity'] for r in routers)
+        # Роутеры сотрудника уже получены вместе со списком
+        routers = emp.routers
+        router_count = emp.router_count
         
         message += f"{idx}. <b>{emp_name}</b>\n"
         message += f"   📦 Материалы:\n"
@@ -745,7 +746,7 @@ async def show_employees_list(update: Update, context: ContextTypes.DEFAULT_TYPE
         if routers:
             message += "   Модели:\n"
             for router in routers:
-                message += f"   • {router['router_name']}: {router['quantity']} шт.\n"
+                message += f"   • {router.router_name}: {router.quantity} шт.\n"
         
         message += "\n"
     
@@ -18,7 +18,7 @@ from config import (
     ENTER_ROUTER_NAME,
     ENTER_ROUTER_QUANTITY,
 )
-from database import Database
+from database import AsyncDatabase
 
 from . import listing, materials, mutations, routers, start
 
@@ -26,7 +26,7 @@ from . import listing, materials, mutations, routers, start
 class EmployeeFlow:
     """Инкапсулирует логику управления сотрудниками"""
 
-    def __init__(self, db: Database) -> None:
+    def __init__(self, db: AsyncDatabase) -> None:
         self.db = db
 
     # --- Основные действия ---
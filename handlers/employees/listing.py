@@ -11,7 +11,7 @@ from utils.keyboards import get_main_keyboard
 
 async def show_employees_list(flow: "EmployeeFlow", update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Выводит список сотрудников с материалами и роутерами"""
-    employees = flow.db.get_all_employees()
+    employees = await flow.db.get_employees_with_routers()
 
     if not employees:
         await update.message.reply_text(
@@ -26,12 +26,12 @@ async def show_employees_list(flow: "EmployeeFlow", update: Update, context: Con
     message_lines = ["👤 <b>Список сотрудников</b>\n"]
 
     for idx, emp in enumerate(employees, 1):
-        fiber_balance = emp.get("fiber_balance", 0) or 0
-        twisted_balance = emp.get("twisted_pair_balance", 0) or 0
-        routers = flow.db.get_employee_routers(emp["id"])
-        router_count = sum(r["quantity"] for r in routers)
+        fiber_balance = emp.fiber_balance or 0
+        twisted_balance = emp.twisted_pair_balance or 0
+        routers = emp.routers
+        router_count = emp.router_count
 
-        message_lines.append(f"{idx}. <b>{emp['full_name']}</b>")
+        message_lines.append(f"{idx}. <b>{emp.full_name}</b>")
         message_lines.append("   📦 Материалы:")
         message_lines.append(f"   • ВОЛС: {fiber_balance} м")
         message_lines.append(f"   • Витая пара: {twisted_balance} м")
@@ -41,7 +41,7 @@ async def show_employees_list(flow: "EmployeeFlow", update: Update, context: Con
             message_lines.append("   Модели:")
             for router in routers:
                 message_lines.append(
-                    f"   • {router['router_name']}: {router['quantity']} шт."
+                    f"   • {router.router_name}: {router.quantity} шт."
                 )
         message_lines.append("")
 
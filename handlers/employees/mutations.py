@@ -20,7 +20,7 @@ async def add_employee_name(flow: "EmployeeFlow", update: Update, context: Conte
         )
         return ADD_EMPLOYEE_NAME
 
-    employee_id = flow.db.add_employee(full_name)
+    employee_id = await flow.db.add_employee(full_name)
 
     if employee_id:
         await update.message.reply_text(
@@ -49,11 +49,14 @@ async def delete_employee_confirm(flow: "EmployeeFlow", update: Update, context:
         return ConversationHandler.END
 
     emp_id = int(query.data.split("_")[2])
-    employee = flow.db.get_employee_by_id(emp_id)
+    employee = await flow.db.get_employee_by_id(emp_id)
 
-    if flow.db.delete_employee(emp_id):
+    if await flow.db.delete_employee(emp_id):
+        report_cache = context.bot_data.get("report_cache")
+        if report_cache is not None:
+            report_cache.invalidate_employee(emp_id)
         await query.edit_message_text(
-            f"✅ Сотрудник <b>{employee['full_name']}</b> удален!",
+            f"✅ Сотрудник <b>{employee.full_name}</b> удален!",
             parse_mode="HTML",
         )
     else:
@@ -30,8 +30,8 @@ async def select_employee_for_router(
     emp_id = int(query.data.split("_")[-1])
     context.user_data["selected_employee_id"] = emp_id
 
-    employee = flow.db.get_employee_by_id(emp_id)
-    routers = flow.db.get_employee_routers(emp_id)
+    employee = await flow.db.get_employee_by_id(emp_id)
+    routers = await flow.db.get_employee_routers(emp_id)
 
     router_text = ""
     if routers:
@@ -48,7 +48,7 @@ async def select_employee_for_router(
 
     await query.edit_message_text(
         "📡 <b>Роутеры сотрудника</b>\n\n"
-        f"👤 {employee['full_name']}\n\n"
+        f"👤 {employee.full_name}\n\n"
         f"📊 Текущие роутеры:\n{router_text}\n"
         "Выберите действие:",
         reply_markup=InlineKeyboardMarkup(keyboard),
@@ -63,17 +63,16 @@ async def select_router_action(flow: "EmployeeFlow", update: Update, context: Co
     await query.answer()
 
     if query.data == "rtr_back_to_list":
-        employees = flow.db.get_all_employees()
+        employees = await flow.db.get_employees_with_routers()
         keyboard = []
         for emp in employees:
-            routers = flow.db.get_employee_routers(emp["id"])
-            router_count = sum(r["quantity"] for r in routers)
+            router_count = emp.router_count
             router_text = f"{router_count} шт." if router_count > 0 else "нет"
             keyboard.append(
                 [
                     InlineKeyboardButton(
-                        f"📡 {emp['full_name']} ({router_text})",
-                        callback_data=f"rtr_emp_{emp['id']}",
+                        f"📡 {emp.full_name} ({router_text})",
+                        callback_data=f"rtr_emp_{emp.id}",
                     )
                 ]
             )
@@ -105,7 +104,7 @@ async def select_router_action(flow: "EmployeeFlow", update: Update, context: Co
         return ENTER_ROUTER_NAME
 
     emp_id = context.user_data.get("selected_employee_id")
-    routers = flow.db.get_employee_routers(emp_id)
+    routers = await flow.db.get_employee_routers(emp_id)
     if not routers:
         await query.edit_message_text("⚠️ У сотрудника нет роутеров для списания.")
         await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
@@ -155,7 +154,7 @@ async def enter_router_name(flow: "EmployeeFlow", update: Update, context: Conte
 
         router_id = int(query.data.split("_")[-1])
         emp_id = context.user_data.get("selected_employee_id")
-        routers = flow.db.get_employee_routers(emp_id)
+        routers = await flow.db.get_employee_routers(emp_id)
         selected_router = next((r for r in routers if r["id"] == router_id), None)
 
         if not selected_router:
@@ -164,14 +163,14 @@ async def enter_router_name(flow: "EmployeeFlow", update: Update, context: Conte
             context.user_data.clear()
             return ConversationHandler.END
 
-        success = flow.db.deduct_router_from_employee(emp_id, selected_router["router_name"], 1)
-        employee = flow.db.get_employee_by_id(emp_id)
+        success = await flow.db.deduct_router_from_employee(emp_id, selected_router["router_name"], 1)
+        employee = await flow.db.get_employee_by_id(emp_id)
 
         if success:
-            new_quantity = flow.db.get_router_quantity(emp_id, selected_router["router_name"])
+            new_quantity = await flow.db.get_router_quantity(emp_id, selected_router["router_name"])
             await query.edit_message_text(
                 "✅ <b>Роутер списан!</b>\n\n"
-                f"👤 Сотрудник: {employee['full_name']}\n"
+                f"👤 Сотрудник: {employee.full_name}\n"
                 f"📡 Роутер: {selected_router['router_name']}\n"
                 "➖ Списано: 1 шт.\n"
                 f"📊 Осталось: {new_quantity} шт.",
@@ -210,15 +209,15 @@ async def enter_router_quantity(flow: "EmployeeFlow", update: Update, context: C
     router_name = context.user_data.get("router_name")
     action = context.user_data.get("router_action")
 
-    employee = flow.db.get_employee_by_id(emp_id)
+    employee = await flow.db.get_employee_by_id(emp_id)
 
     if action == "add":
-        success = flow.db.add_router_to_employee(emp_id, router_name, quantity)
+        success = await flow.db.add_router_to_employee(emp_id, router_name, quantity)
         if success:
-            new_quantity = flow.db.get_router_quantity(emp_id, router_name)
+            new_quantity = await flow.db.get_router_quantity(emp_id, router_name)
             await update.message.reply_text(
                 "✅ <b>Роутеры добавлены!</b>\n\n"
-                f"👤 Сотрудник: {employee['full_name']}\n"
+                f"👤 Сотрудник: {employee.full_name}\n"
                 f"📡 Роутер: {router_name}\n"
                 f"➕ Добавлено: {quantity} шт.\n"
                 f"📊 Всего: {new_quantity} шт.",
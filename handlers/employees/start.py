@@ -76,14 +76,14 @@ async def manage_action(flow: "EmployeeFlow", update: Update, context: ContextTy
         return ADD_EMPLOYEE_NAME
 
     if data == "manage_delete":
-        employees = flow.db.get_all_employees()
+        employees = await flow.db.get_all_employees()
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников для удаления.")
             await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
             return ConversationHandler.END
 
         keyboard = [
-            [InlineKeyboardButton(f"🗑 {emp['full_name']}", callback_data=f"del_emp_{emp['id']}")]
+            [InlineKeyboardButton(f"🗑 {emp.full_name}", callback_data=f"del_emp_{emp.id}")]
             for emp in employees
         ]
         keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="delete_cancel")])
@@ -96,7 +96,7 @@ async def manage_action(flow: "EmployeeFlow", update: Update, context: ContextTy
         return DELETE_EMPLOYEE_SELECT
 
     if data == "manage_materials":
-        employees = flow.db.get_all_employees()
+        employees = await flow.db.get_all_employees()
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников.")
             await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
@@ -104,13 +104,13 @@ async def manage_action(flow: "EmployeeFlow", update: Update, context: ContextTy
 
         keyboard = []
         for emp in employees:
-            fiber = emp.get("fiber_balance", 0) or 0
-            twisted = emp.get("twisted_pair_balance", 0) or 0
+            fiber = emp.fiber_balance or 0
+            twisted = emp.twisted_pair_balance or 0
             keyboard.append(
                 [
                     InlineKeyboardButton(
-                        f"📦 {emp['full_name']} (ВОЛС: {fiber}м, ВП: {twisted}м)",
-                        callback_data=f"mat_emp_{emp['id']}",
+                        f"📦 {emp.full_name} (ВОЛС: {fiber}м, ВП: {twisted}м)",
+                        callback_data=f"mat_emp_{emp.id}",
                     )
                 ]
             )
@@ -124,7 +124,7 @@ async def manage_action(flow: "EmployeeFlow", update: Update, context: ContextTy
         return SELECT_EMPLOYEE_FOR_MATERIAL
 
     if data == "manage_routers":
-        employees = flow.db.get_all_employees()
+        employees = await flow.db.get_employees_with_routers()
         if not employees:
             await query.edit_message_text("⚠️ В системе нет сотрудников.")
             await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
@@ -132,14 +132,13 @@ async def manage_action(flow: "EmployeeFlow", update: Update, context: ContextTy
 
         keyboard = []
         for emp in employees:
-            routers = flow.db.get_employee_routers(emp["id"])
-            router_count = sum(r["quantity"] for r in routers)
+            router_count = emp.router_count
             router_text = f"{router_count} шт." if router_count > 0 else "нет"
             keyboard.append(
                 [
                     InlineKeyboardButton(
-                        f"📡 {emp['full_name']} ({router_text})",
-                        callback_data=f"rtr_emp_{emp['id']}",
+                        f"📡 {emp.full_name} ({router_text})",
+                        callback_data=f"rtr_emp_{emp.id}",
                     )
                 ]
             )
@@ -153,16 +152,16 @@ async def manage_action(flow: "EmployeeFlow", update: Update, context: ContextTy
         return SELECT_EMPLOYEE_FOR_ROUTER
 
     if data == "manage_list":
-        employees = flow.db.get_all_employees()
+        employees = await flow.db.get_all_employees()
         if not employees:
             text = "📋 <b>Список сотрудников</b>\n\nСписок пуст."
         else:
             lines = []
             for idx, emp in enumerate(employees, 1):
-                fiber = emp.get("fiber_balance", 0) or 0
-                twisted = emp.get("twisted_pair_balance", 0) or 0
+                fiber = emp.fiber_balance or 0
+                twisted = emp.twisted_pair_balance or 0
                 lines.append(
-                    f"{idx}. {emp['full_name']}\n"
+                    f"{idx}. {emp.full_name}\n"
                     f"   📦 ВОЛС: {fiber}м | Витая пара: {twisted}м"
                 )
             text = f"📋 <b>Список сотрудников ({len(employees)}):</b>\n\n" + "\n\n".join(lines)
@@ -1,27 +1,43 @@
 """
 Обработчики для формирования отчетов
 """
-import os
+import asyncio
 import logging
 from datetime import datetime, timedelta
+from typing import Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes, ConversationHandler
 
 from config import (
     SELECT_REPORT_EMPLOYEE,
     SELECT_REPORT_PERIOD,
     ENTER_REPORT_CUSTOM_START,
-    ENTER_REPORT_CUSTOM_END
+    ENTER_REPORT_CUSTOM_END,
+    REPORT_PROGRESS_INTERVAL,
+    REPORT_MAX_MEMORY_SIZE
 )
 from utils.keyboards import get_main_keyboard
-from report_generator import ReportGenerator
+from report_cache import period_key
+from report_jobs import (
+    CANCELLED,
+    ReportJobError,
+    ReportJobLimitError,
+    ALL_EMPLOYEES_NAME,
+    build_all_employees_report,
+    build_employee_report,
+    discard_report_file
+)
 
 logger = logging.getLogger(__name__)
 
 DATE_INPUT_FORMAT = "%d.%m.%Y"
 ALL_TIME_START = datetime(2020, 1, 1)
 
+# Вместо ID сотрудника в user_data: общий отчет по всем сотрудникам
+ALL_EMPLOYEES = 'all'
+
 
 def _parse_date_input(text: str):
     """Преобразовать строку в дату согласно формату ввода"""
@@ -48,7 +64,7 @@ async def _generate_report_for_period(
     end_date: datetime,
     query=None
 ) -> int:
-    """Общая реализация формирования и отправки отчета"""
+    """Поставить отчет за период в очередь и доставить его в фоне"""
     emp_id = context.user_data.get('report_employee_id')
     message = update.effective_message
     
@@ -60,90 +76,220 @@ async def _generate_report_for_period(
         context.user_data.clear()
         return ConversationHandler.END
     
-    employee = db.get_employee_by_id(emp_id)
-    if not employee:
-        await message.reply_text(
-            "❌ Не удалось найти информацию о сотруднике. Попробуйте еще раз.",
-            reply_markup=get_main_keyboard()
-        )
+    cache = context.bot_data.get('report_cache')
+    cache_key = None
+    period_stats = None
+    if emp_id == ALL_EMPLOYEES:
+        # Общий отчет: все сотрудники одной книгой, без кэша
+        cache = None
+        employee_name = None
+        task = (build_all_employees_report, period_name, start_date, end_date, REPORT_MAX_MEMORY_SIZE)
+    else:
+        employee = await db.get_employee_by_id(emp_id)
+        if not employee:
+            await message.reply_text(
+                "❌ Не удалось найти информацию о сотруднике. Попробуйте еще раз.",
+                reply_markup=get_main_keyboard()
+            )
+            context.user_data.clear()
+            return ConversationHandler.END
+        
+        # Тот же отчет по неизменившимся данным отправляем по file_id без построения
+        employee_name = employee.full_name
+        period = period_key(start_date, end_date)
+        watermark = await db.get_report_watermark(emp_id)
+        cache_key = (emp_id, period, watermark)
+        if cache is not None:
+            cached = cache.get(emp_id, period, watermark)
+            if cached is not None:
+                if await _send_cached_report(message, query, cached, employee_name, period_name):
+                    context.user_data.clear()
+                    return ConversationHandler.END
+                cache.discard(emp_id, period)
+        task = (build_employee_report, emp_id, employee_name, period_name,
+                start_date, end_date, REPORT_MAX_MEMORY_SIZE)
+        # Итоги для подписи - сумма дневных итогов, а не пересчет подключений
+        period_stats = await db.get_employee_period_stats(emp_id, start_date, end_date)
+    
+    jobs = context.bot_data['report_jobs']
+    try:
+        job = jobs.submit(update.effective_user.id, *task)
+    except ReportJobError as exc:
+        logger.warning(f"Отчет не поставлен в очередь: {exc}")
+        if isinstance(exc, ReportJobLimitError):
+            text = "⚠️ У вас уже формируется отчет. Дождитесь его или нажмите «❌ Отмена»."
+        else:
+            text = "⚠️ Сейчас формируется слишком много отчетов. Попробуйте через пару минут."
+        await message.reply_text(text, reply_markup=get_main_keyboard())
         context.user_data.clear()
         return ConversationHandler.END
     
+    cancel_markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton("❌ Отмена", callback_data=f"report_job_cancel_{job.id}")]
+    ])
+    progress_text = _progress_text(jobs, job)
     if query:
-        await query.edit_message_text("⏳ Формирую отчет, подождите...")
-        target_message = query.message
+        await query.edit_message_text(progress_text, reply_markup=cancel_markup)
+        progress_message = query.message
     else:
-        target_message = message
-        await target_message.reply_text("⏳ Формирую отчет, подождите...")
+        progress_message = await message.reply_text(progress_text, reply_markup=cancel_markup)
+    
+    # Отчет доставляется в фоне, чтобы бот продолжал обрабатывать
+    # нажатия (в том числе «❌ Отмена» этого отчета)
+    context.application.create_task(
+        _deliver_report(jobs, job, progress_message, cancel_markup, progress_text,
+                        employee_name, period_name, period_stats=period_stats,
+                        cache=cache, cache_key=cache_key),
+        update=update
+    )
     
-    try:
-        connections, stats = db.get_employee_report(
-            emp_id,
-            start_date=start_date,
-            end_date=end_date
-        )
-        movements = db.get_employee_movements(emp_id, start_date, end_date)
-    except Exception as exc:
-        logger.error(f"Ошибка при получении данных для отчета: {exc}")
-        await target_message.reply_text(
-            "❌ Не удалось получить данные. Попробуйте позже.",
-            reply_markup=get_main_keyboard()
+    context.user_data.clear()
+    return ConversationHandler.END
+
+
+def _report_caption(employee_name: Optional[str], period_name: str, stats: dict) -> str:
+    """Подпись к файлу отчета (employee_name=None - общий отчет)"""
+    if employee_name is None:
+        title = (
+            f"📊 Отчет: <b>{ALL_EMPLOYEES_NAME}</b>\n"
+            f"Сотрудников: {stats.get('total_employees', 0)}\n"
         )
-        context.user_data.clear()
-        return ConversationHandler.END
+    else:
+        title = f"📊 Отчет по сотруднику: <b>{employee_name}</b>\n"
+    return (
+        f"{title}"
+        f"Период: {period_name}\n"
+        f"Подключений: {stats.get('total_connections', 0)}\n"
+        f"ВОЛС: {stats.get('total_fiber_meters', 0)} м\n"
+        f"Витая пара: {stats.get('total_twisted_pair_meters', 0)} м"
+    )
+
+
+async def _send_cached_report(message, query, cached, employee_name: str, period_name: str) -> bool:
+    """
+    Отправить ранее загруженный отчет по file_id
     
-    if not connections and not movements:
-        await target_message.reply_text(
-            f"ℹ️ У сотрудника <b>{employee['full_name']}</b> нет данных за период {period_name}.",
-            parse_mode='HTML',
-            reply_markup=get_main_keyboard()
+    Returns:
+        True, если отчет отправлен; False, если file_id не принят Telegram
+    """
+    try:
+        await message.reply_document(
+            document=cached.file_id,
+            caption=_report_caption(employee_name, period_name, cached.stats),
+            parse_mode='HTML'
         )
-        context.user_data.clear()
-        return ConversationHandler.END
+    except TelegramError as exc:
+        logger.warning(f"Не удалось отправить отчет из кэша: {exc}")
+        return False
     
+    logger.info(f"Отчет {cached.filename} отправлен из кэша")
+    if query:
+        await _edit_progress(query.message, "✅ Отчет сформирован!")
+    await message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
+    return True
+
+
+def _progress_text(jobs, job) -> str:
+    """Текст сообщения о ходе формирования отчета"""
+    position = jobs.position(job)
+    if position:
+        return f"⏳ Отчет в очереди (позиция {position}), подождите..."
+    return f"⏳ Формирую отчет, подождите... {int(job.elapsed())} с"
+
+
+async def _edit_progress(message, text: str, **kwargs) -> None:
+    """Обновить сообщение о ходе отчета, не прерываясь на ошибках Telegram"""
     try:
-        filename = ReportGenerator.generate_employee_report(
-            employee_name=employee['full_name'],
-            connections=connections,
-            stats=stats,
-            period_name=period_name,
-            movements=movements
-        )
-        
-        with open(filename, 'rb') as file:
-            await target_message.reply_document(
+        await message.edit_text(text, **kwargs)
+    except TelegramError as exc:
+        logger.warning(f"Не удалось обновить сообщение о ходе отчета: {exc}")
+
+
+async def _deliver_report(
+    jobs,
+    job,
+    progress_message,
+    cancel_markup: InlineKeyboardMarkup,
+    progress_text: str,
+    employee_name: Optional[str],
+    period_name: str,
+    period_stats: Optional[dict] = None,
+    cache=None,
+    cache_key: tuple = None
+) -> None:
+    """Дождаться задачи отчета, обновляя сообщение о ходе, и отправить файл"""
+    try:
+        while True:
+            try:
+                result = await asyncio.wait_for(job.wait(), timeout=REPORT_PROGRESS_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                text = _progress_text(jobs, job)
+                if text != progress_text:
+                    await _edit_progress(progress_message, text, reply_markup=cancel_markup)
+                    progress_text = text
+    except Exception as exc:
+        logger.error(f"Ошибка при генерации отчета: {exc}")
+        await _edit_progress(progress_message, "❌ Ошибка при формировании отчета. Попробуйте позже.")
+        await progress_message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
+        return
+    
+    if job.state == CANCELLED:
+        await _edit_progress(progress_message, "❌ Формирование отчета отменено.")
+        await progress_message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
+        return
+    
+    if result is None:
+        if employee_name is None:
+            text = f"ℹ️ Ни у одного сотрудника нет данных за период {period_name}."
+        else:
+            text = f"ℹ️ У сотрудника <b>{employee_name}</b> нет данных за период {period_name}."
+        await _edit_progress(progress_message, text, parse_mode='HTML')
+        await progress_message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
+        return
+    
+    stats = period_stats or result.stats
+    try:
+        with result.open() as file:
+            sent = await progress_message.reply_document(
                 document=file,
-                filename=filename,
-                caption=(
-                    f"📊 Отчет по сотруднику: <b>{employee['full_name']}</b>\n"
-                    f"Период: {period_name}\n"
-                    f"Подключений: {stats.get('total_connections', 0)}\n"
-                    f"ВОЛС: {stats.get('total_fiber_meters', 0)} м\n"
-                    f"Витая пара: {stats.get('total_twisted_pair_meters', 0)} м"
-                ),
+                filename=result.filename,
+                caption=_report_caption(employee_name, period_name, stats),
                 parse_mode='HTML'
             )
         
-        os.remove(filename)
+        if cache is not None and sent.document:
+            cache.put(*cache_key, sent.document.file_id, result.filename, stats)
         
-        await target_message.reply_text(
-            "✅ Отчет сформирован!",
+        await _edit_progress(progress_message, "✅ Отчет сформирован!")
+        await progress_message.reply_text(
+            "Выберите действие:",
             reply_markup=get_main_keyboard()
         )
     except Exception as exc:
-        logger.error(f"Ошибка при генерации отчета: {exc}")
-        await target_message.reply_text(
+        logger.error(f"Ошибка при отправке отчета: {exc}")
+        await progress_message.reply_text(
             "❌ Ошибка при формировании отчета. Попробуйте позже.",
             reply_markup=get_main_keyboard()
         )
+    finally:
+        discard_report_file(result)
+
+
+async def report_job_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Отмена формирующегося отчета кнопкой «❌ Отмена»"""
+    query = update.callback_query
+    job_id = int(query.data.rsplit('_', 1)[1])
     
-    context.user_data.clear()
-    return ConversationHandler.END
+    if context.bot_data['report_jobs'].cancel(job_id, update.effective_user.id):
+        await query.answer("Отменяю формирование отчета...")
+    else:
+        await query.answer("Отчет уже сформирован или отменен")
 
 
 async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -> int:
     """Начало формирования отчета"""
-    employees = db.get_all_employees()
+    employees = await db.get_all_employees()
     
     if not employees:
         text = "⚠️ В системе нет ни одного сотрудника!"
@@ -154,9 +300,9 @@ async def report_start(update: Update, context: ContextTypes.DEFAULT_TYPE, db) -
             await update.message.reply_text(text, reply_markup=get_main_keyboard())
         return ConversationHandler.END
     
-    keyboard = []
+    keyboard = [[InlineKeyboardButton("📊 Все сотрудники", callback_data=f"rep_emp_{ALL_EMPLOYEES}")]]
     for emp in employees:
-        keyboard.append([InlineKeyboardButton(emp['full_name'], callback_data=f"rep_emp_{emp['id']}")])
+        keyboard.append([InlineKeyboardButton(emp.full_name, callback_data=f"rep_emp_{emp.id}")])
     
     keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data='report_cancel')])
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -182,11 +328,16 @@ async def report_select_period(update: Update, context: ContextTypes.DEFAULT_TYP
         await query.message.reply_text("Выберите действие:", reply_markup=get_main_keyboard())
         return ConversationHandler.END
     
-    # Сохраняем выбранного сотрудника
-    emp_id = int(query.data.split('_')[2])
-    context.user_data['report_employee_id'] = emp_id
-    
-    employee = db.get_employee_by_id(emp_id)
+    # Сохраняем выбранного сотрудника (или общий отчет по всем)
+    selected = query.data.split('_')[2]
+    if selected == ALL_EMPLOYEES:
+        context.user_data['report_employee_id'] = ALL_EMPLOYEES
+        employee_name = ALL_EMPLOYEES_NAME
+    else:
+        emp_id = int(selected)
+        context.user_data['report_employee_id'] = emp_id
+        employee = await db.get_employee_by_id(emp_id)
+        employee_name = employee.full_name
     
     keyboard = [
         [InlineKeyboardButton("📅 Последняя неделя", callback_data='period_7')],
@@ -198,7 +349,7 @@ async def report_select_period(update: Update, context: ContextTypes.DEFAULT_TYP
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.edit_message_text(
-        f"Выбран сотрудник: <b>{employee['full_name']}</b>\n\n"
+        f"Выбран сотрудник: <b>{employee_name}</b>\n\n"
         f"Выберите период для отчета:",
         reply_markup=reply_markup,
         parse_mode='HTML'
@@ -235,8 +386,10 @@ async def report_generate(update: Update, context: ContextTypes.DEFAULT_TYPE, db
     }
     
     days, period_name = period_map[query.data]
-    end_date = datetime.now()
-    start_date = ALL_TIME_START if days is None else end_date - timedelta(days=days)
+    # Границы по целым дням: повторные запросы за день дают тот же ключ кэша
+    now = datetime.now()
+    end_date = _end_of_day(now)
+    start_date = ALL_TIME_START if days is None else _start_of_day(now - timedelta(days=days))
     
     return await _generate_report_for_period(
         update=update,
@@ -0,0 +1,347 @@
+"""
+Метрики работы бота в текстовом формате Prometheus
+
+Metrics собирает гистограммы времени и счетчики: время каждого
+обработчика и его ошибки, время запросов к БД по методам, время
+формирования отчетов и задержку вызовов Bot API по методам. Текущие
+значения (диалоги по шагам, очереди, кэши) снимаются в момент запроса
+через сборщики и показатели stats() компонентов.
+
+Метрики включаются настройкой METRICS_ENABLED; MetricsServer отдает их
+на локальном HTTP-адресе /metrics. Без нее компоненты получают
+metrics=None и ничего не измеряют.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from telegram.ext import Application, BaseHandler, ConversationHandler
+
+logger = logging.getLogger(__name__)
+
+# Префикс имен метрик
+PREFIX = 'isp_bot_'
+
+# Границы корзин гистограмм (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Значения по умолчанию для HTTP-сервера
+DEFAULT_LISTEN = '127.0.0.1'
+DEFAULT_PORT = 9464
+
+# Описания метрик, которые пишут компоненты бота
+DESCRIPTIONS = {
+    'handler_seconds': 'Время выполнения обработчика обновления',
+    'handler_errors_total': 'Исключения в обработчиках обновлений',
+    'db_query_seconds': 'Время выполнения метода БД в потоке (без ожидания очереди)',
+    'report_seconds': 'Время формирования отчета в процессе (без ожидания очереди)',
+    'report_queue_seconds': 'Время ожидания отчета в очереди',
+    'telegram_request_seconds': 'Задержка вызова Bot API',
+    'telegram_errors_total': 'Ошибки вызовов Bot API',
+    'conversations': 'Незавершенные диалоги по шагам',
+}
+
+# Метка, которую получают функции-обертки instrument_handlers
+_INSTRUMENTED = '_metrics_handler'
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, Any], float]
+
+
+class Histogram:
+    """Гистограмма значений с накопленными счетчиками по корзинам"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Учесть значение"""
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    """Метки в виде ключа словаря"""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    """Экранировать значение метки"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    """{name="value",...} или пустая строка"""
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Число в формате Prometheus (целые - без дробной части)"""
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metrics:
+    """
+    Реестр метрик
+
+    Запись идет из цикла событий и из потоков БД, поэтому изменения
+    защищены блокировкой; render вызывается при каждом запросе /metrics.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: Границы корзин гистограмм в секундах
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Учесть значение гистограммы name (секунды)"""
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Увеличить счетчик name (имя оканчивается на _total)"""
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Измерить время блока в гистограмму name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """
+        Добавить сборщик текущих значений
+
+        collector вызывается при каждом запросе метрик и возвращает
+        тройки (имя, метки, значение); значения отдаются как gauge.
+        """
+        self._collectors.append(collector)
+
+    def add_stats(self, component: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        """Отдавать числовые значения stats() компонента как {component}_{ключ}"""
+        def collect() -> Iterable[Sample]:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)):
+                    yield f'{component}_{key}', {}, value
+        self.add_collector(collect)
+
+    def _collect(self) -> Dict[str, Dict[Labels, float]]:
+        """Текущие значения всех сборщиков (ошибка сборщика не мешает остальным)"""
+        gauges: Dict[str, Dict[Labels, float]] = {}
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    gauges.setdefault(name, {})[_labels(labels)] = value
+            except Exception as e:
+                logger.error(f"Ошибка сборщика метрик {collector}: {e}")
+        return gauges
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus (version 0.0.4)"""
+        gauges = self._collect()
+        lines: List[str] = []
+
+        def header(name: str, kind: str) -> None:
+            if name in DESCRIPTIONS:
+                lines.append(f'# HELP {PREFIX}{name} {DESCRIPTIONS[name]}')
+            lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+        with self._lock:
+            for name in sorted(self._histograms):
+                header(name, 'histogram')
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        le = (('le', _format_value(bound)),)
+                        lines.append(f'{PREFIX}{name}_bucket{_format_labels(labels, le)} {count}')
+                    inf = (('le', '+Inf'),)
+                    lines.append(f'{PREFIX}{name}_bucket{_format_labels(labels, inf)} {histogram.count}')
+                    lines.append(f'{PREFIX}{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}')
+                    lines.append(f'{PREFIX}{name}_count{_format_labels(labels)} {histogram.count}')
+
+            for name in sorted(self._counters):
+                header(name, 'counter')
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f'{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for name in sorted(gauges):
+            header(name, 'gauge')
+            for labels, value in sorted(gauges[name].items()):
+                lines.append(f'{PREFIX}{name}{_format_labels(labels)} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _handler_name(callback: Callable) -> str:
+    """Имя обработчика для метки (без суффикса _wrapper оберток bot.py)"""
+    name = getattr(callback, '__name__', type(callback).__name__)
+    return name[:-len('_wrapper')] if name.endswith('_wrapper') else name
+
+
+def _timed_callback(metrics: Metrics, callback: Callable, handler: str, conversation: str) -> Callable:
+    """Обертка обработчика: время выполнения и исключения"""
+    @functools.wraps(callback)
+    async def timed(update: object, context: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            metrics.inc('handler_errors_total', handler=handler, conversation=conversation)
+            raise
+        finally:
+            metrics.observe(
+                'handler_seconds', time.perf_counter() - start, handler=handler, conversation=conversation
+            )
+    setattr(timed, _INSTRUMENTED, True)
+    return timed
+
+
+def _instrument(metrics: Metrics, handler: BaseHandler, conversation: str) -> int:
+    """Обернуть обработчик (и вложенные обработчики диалога); вернуть их число"""
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        return sum(_instrument(metrics, item, handler.name or '') for item in nested)
+
+    if getattr(handler.callback, _INSTRUMENTED, False):
+        return 0
+    handler.callback = _timed_callback(metrics, handler.callback, _handler_name(handler.callback), conversation)
+    return 1
+
+
+def instrument_handlers(application: Application, metrics: Metrics) -> int:
+    """
+    Измерять время всех зарегистрированных обработчиков
+
+    Вызывается после добавления обработчиков. Обработчики внутри
+    ConversationHandler получают метку conversation с именем диалога.
+    Повторный вызов не оборачивает обработчики второй раз.
+
+    Returns:
+        Количество обернутых обработчиков
+    """
+    count = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            count += _instrument(metrics, handler, '')
+    logger.info(f"Метрики: обработчиков под наблюдением {count}")
+    return count
+
+
+def conversation_collector(conversations: Iterable[ConversationHandler]) -> Callable[[], Iterable[Sample]]:
+    """
+    Сборщик числа незавершенных диалогов по шагам
+
+    У ConversationHandler нет публичного доступа к текущим шагам, поэтому
+    читается его словарь _conversations; значение, которое не является
+    номером шага (неблокирующий обработчик еще выполняется), считается
+    как шаг pending.
+    """
+    conversations = list(conversations)
+
+    def collect() -> Iterable[Sample]:
+        for conv in conversations:
+            counts: Dict[str, int] = {}
+            for state in list(getattr(conv, '_conversations', {}).values()):
+                label = str(state) if isinstance(state, int) else 'pending'
+                counts[label] = counts.get(label, 0) + 1
+            for state, count in counts.items():
+                yield 'conversations', {'conversation': conv.name or '', 'state': state}, count
+    return collect
+
+
+class MetricsServer:
+    """
+    Локальный HTTP-сервер, отдающий GET /metrics
+
+    Запросы обслуживаются в цикле событий бота; сервер рассчитан на
+    опрос Prometheus раз в несколько секунд, а не на внешний доступ.
+    """
+
+    def __init__(self, metrics: Metrics, listen: str = DEFAULT_LISTEN, port: int = DEFAULT_PORT):
+        """
+        Args:
+            metrics: Реестр метрик
+            listen: Адрес сервера
+            port: Порт сервера (0 - выбрать свободный)
+        """
+        self.metrics = metrics
+        self.listen = listen
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Начать прием запросов"""
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Метрики доступны на http://{self.listen}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        """Закрыть сервер"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Ответить на один HTTP-запрос"""
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки запроса не нужны, но их надо дочитать
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+
+            parts = request.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status = '200 OK'
+                body = self.metrics.render().encode()
+            else:
+                status = '404 Not Found'
+                body = b'not found\n'
+
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug(f"Запрос метрик прерван: {e}")
+        finally:
+            writer.close()
@@ -0,0 +1,423 @@
+"""
+Исходящие сообщения Telegram: ограничение частоты и очередь с повторами
+
+Telegram ограничивает частоту отправки: около 30 сообщений в секунду
+всего, около одного в секунду в личный чат и 20 в минуту в группу или
+канал. При превышении Bot API отвечает ошибкой RetryAfter (flood control).
+
+TelegramRateLimiter подключается к Application и применяется ко всем
+вызовам Bot API: выдерживает общие и по-чатовые лимиты (token bucket)
+и повторяет запрос после паузы, указанной в RetryAfter.
+
+OutboundQueue - очередь фоновых отправок (отчеты в каналы), которые
+должны дойти, даже если Telegram временно недоступен или бот
+перезапустился. Источник истины - таблица outbox: сообщение попадает
+туда до первой попытки (отчет о подключении - в одной транзакции с
+самим подключением), а диспетчер пачками забирает из нее сообщения,
+срок которых наступил, и повторяет неудачные попытки с экспоненциальной
+задержкой.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, NamedTuple, Optional, Union
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram (сообщений в секунду) и допустимые всплески
+OVERALL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+PRIVATE_CHAT_BURST = 3
+GROUP_CHAT_RATE = 20 / 60
+GROUP_CHAT_BURST = 3
+
+# Значения по умолчанию
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 15
+DEFAULT_BASE_DELAY = 2
+DEFAULT_MAX_DELAY = 600
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_POLL_INTERVAL = 5
+
+# Сколько чатов помнить, прежде чем удалять простаивающие ограничители
+MAX_CHAT_BUCKETS = 512
+
+# Ошибки, при которых повтор не поможет (чат недоступен, неверный запрос)
+PERMANENT_ERRORS = (BadRequest, Forbidden, InvalidToken, ChatMigrated)
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты «ведро токенов»
+
+    Ведро вмещает capacity токенов и пополняется со скоростью rate в
+    секунду; каждая отправка забирает токен. Если токенов нет, вызов
+    резервирует следующий и ждет его, поэтому ожидающие обслуживаются
+    в порядке обращения.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            rate: Токенов в секунду
+            capacity: Размер ведра (допустимый всплеск)
+            clock: Источник времени в секундах
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Забрать токен; вернуть, сколько секунд ждать до его появления"""
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def is_idle(self) -> bool:
+        """Ведро полное: ограничитель можно удалить без потери лимита"""
+        self._refill()
+        return self._tokens >= self.capacity
+
+    async def acquire(self) -> None:
+        """Дождаться токена"""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+    """
+    Ограничение частоты всех вызовов Bot API с учетом RetryAfter
+
+    Запросы к чатам проходят общий лимит и лимит своего чата (для личных
+    чатов и для групп и каналов он разный). После RetryAfter все запросы
+    приостанавливаются на указанное Telegram время и повторяются не больше
+    max_retries раз; затем ошибка передается вызывающему коду.
+    """
+
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, clock: Callable[[], float] = time.monotonic,
+                 metrics=None):
+        """
+        Args:
+            max_retries: Повторов запроса после RetryAfter
+            clock: Источник времени в секундах
+            metrics: Реестр метрик (metrics.Metrics) для задержки вызовов по методам
+        """
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self._clock = clock
+        self._overall = TokenBucket(OVERALL_RATE, OVERALL_RATE, clock)
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._paused_until = 0.0
+        self._counters = {'requests': 0, 'retry_after': 0}
+
+    async def initialize(self) -> None:
+        """Ресурсы не требуются"""
+
+    async def shutdown(self) -> None:
+        """Ресурсы не требуются"""
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        """Ограничитель чата (группы, каналы и @username - по групповому лимиту)"""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                for key in [key for key, old in self._chats.items() if old.is_idle()]:
+                    del self._chats[key]
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST, self._clock)
+            else:
+                bucket = TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST, self._clock)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _wait_turn(self, chat_id: Optional[Union[int, str]]) -> None:
+        """Дождаться конца паузы после RetryAfter и токенов лимитов"""
+        pause = self._paused_until - self._clock()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        if chat_id is not None:
+            await self._chat_bucket(chat_id).acquire()
+            await self._overall.acquire()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int]
+    ) -> Any:
+        """Выполнить запрос с учетом лимитов (rate_limit_args - свое число повторов)"""
+        chat_id = data.get('chat_id')
+        if isinstance(chat_id, str) and chat_id.lstrip('-').isdigit():
+            chat_id = int(chat_id)
+        max_retries = self.max_retries if rate_limit_args is None else rate_limit_args
+
+        for attempt in range(max_retries + 1):
+            await self._wait_turn(chat_id)
+            self._counters['requests'] += 1
+            try:
+                return await self._call(endpoint, callback, args, kwargs)
+            except RetryAfter as e:
+                self._counters['retry_after'] += 1
+                self._paused_until = max(self._paused_until, self._clock() + _seconds(e.retry_after))
+                if attempt == max_retries:
+                    logger.warning(f"Лимит Telegram ({endpoint}, чат {chat_id}): повторы исчерпаны")
+                    raise
+                logger.info(f"Лимит Telegram ({endpoint}, чат {chat_id}): повтор через {e.retry_after} с")
+        return None
+
+    async def _call(self, endpoint: str, callback: Callable[..., Coroutine[Any, Any, Any]],
+                    args: Any, kwargs: Dict[str, Any]) -> Any:
+        """Выполнить запрос (без ожидания лимитов) и учесть его задержку и ошибки"""
+        if self.metrics is None:
+            return await callback(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except TelegramError as e:
+            self.metrics.inc('telegram_errors_total', method=endpoint, error=type(e).__name__)
+            raise
+        finally:
+            self.metrics.observe('telegram_request_seconds', time.perf_counter() - start, method=endpoint)
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики запросов и ответов RetryAfter"""
+        return {'chats': len(self._chats), **self._counters}
+
+
+def _seconds(retry_after: Any) -> float:
+    """RetryAfter.retry_after в секундах (число или timedelta)"""
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class OutboundMessage(NamedTuple):
+    """Вызов Bot API из очереди outbox"""
+    id: int                 # ID записи в outbox
+    chat_id: int            # Чат получателя
+    method: str             # Метод Bot (например, copy_messages) или свой обработчик
+    params: Dict[str, Any]  # Остальные параметры вызова
+    attempts: int = 0       # Сделано неудачных попыток
+
+
+# Свой способ отправки: (bot, db, chat_id, params)
+DeliveryHandler = Callable[[Any, Any, int, Dict[str, Any]], Awaitable[Any]]
+
+
+class OutboundQueue:
+    """
+    Диспетчер очереди outbox с повторами
+
+    Диспетчер забирает из БД до batch_size сообщений, срок которых
+    наступил (статус sending), и раздает их обработчикам; следующая пачка
+    берется, когда предыдущая отправлена. Новые сообщения будят
+    диспетчер сразу, повторы подхватываются не реже раза в poll_interval.
+
+    Сетевые ошибки и таймауты повторяются с экспоненциальной задержкой (со
+    случайным разбросом) до max_attempts попыток, после RetryAfter - через
+    указанное Telegram время без учета попытки. Если чат недоступен или
+    запрос неверен, сообщение помечается как failed. При запуске
+    сообщения, прерванные остановкой бота, возвращаются в очередь.
+
+    Таймаут не гарантирует, что сообщение не дошло, поэтому при повторе
+    возможен дубль; от повторной постановки защищают ключи идемпотентности.
+    """
+
+    def __init__(
+        self,
+        db,
+        workers: int = DEFAULT_WORKERS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        handlers: Optional[Dict[str, DeliveryHandler]] = None
+    ):
+        """
+        Args:
+            db: AsyncDatabase
+            workers: Количество одновременных отправок
+            max_attempts: Максимум попыток отправки сообщения
+            base_delay: Задержка перед первым повтором (секунды)
+            max_delay: Максимальная задержка между повторами (секунды)
+            batch_size: Сколько сообщений диспетчер забирает из БД за раз
+            poll_interval: Как часто проверять повторы, срок которых наступил (секунды)
+            handlers: Свои способы отправки по имени метода (например, отчет
+                      о подключении, который собирается при отправке)
+        """
+        if workers < 1:
+            raise ValueError("Нужен хотя бы один обработчик очереди")
+
+        self.db = db
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.handlers = dict(handlers or {})
+        self._bot = None
+        self._ready: 'asyncio.Queue[OutboundMessage]' = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._counters = {'queued': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+    async def start(self, bot) -> int:
+        """
+        Запустить диспетчер и обработчики
+
+        Неотправленные сообщения из БД (в том числе прерванные остановкой
+        бота) отправляются диспетчером в порядке их срока.
+
+        Returns:
+            Количество сообщений, отправка которых была прервана
+        """
+        self._bot = bot
+        interrupted = await self.db.release_outbox_claims()
+        if interrupted:
+            logger.info(f"Очередь исходящих: возвращено прерванных сообщений: {interrupted}")
+
+        self._tasks = [asyncio.create_task(self._dispatch(), name="outbound-dispatcher")]
+        self._tasks += [
+            asyncio.create_task(self._worker(), name=f"outbound-{number}")
+            for number in range(self.workers)
+        ]
+        return interrupted
+
+    async def stop(self) -> None:
+        """Остановить диспетчер и обработчики; неотправленные сообщения остаются в БД"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def send(self, chat_id: int, method: str, idempotency_key: Optional[str] = None,
+                   **params) -> Optional[int]:
+        """
+        Поставить вызов Bot API в очередь
+
+        Args:
+            chat_id: Чат получателя
+            method: Метод Bot (например, copy_messages)
+            idempotency_key: Ключ, по которому сообщение ставится не больше одного раза
+            **params: Остальные параметры вызова (должны сериализоваться в JSON)
+
+        Returns:
+            ID сообщения в outbox или None, если сохранить не удалось
+        """
+        message_id = await self.db.add_outbox_message(chat_id, method, params, idempotency_key)
+        if message_id is None:
+            logger.error(f"Не удалось поставить {method} в чат {chat_id} в очередь исходящих")
+            return None
+
+        self._counters['queued'] += 1
+        self.wake()
+        return message_id
+
+    def wake(self) -> None:
+        """Проверить очередь сейчас (в БД появились сообщения к отправке)"""
+        self._wakeup.set()
+
+    def backoff(self, attempts: int) -> float:
+        """Задержка перед повтором после attempts неудачных попыток"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1)
+
+    async def _dispatch(self) -> None:
+        """Забирать из БД сообщения, срок которых наступил, пачками по batch_size"""
+        while True:
+            self._wakeup.clear()
+            try:
+                batch = await self.db.claim_due_outbox(self.batch_size)
+            except Exception as e:
+                logger.error(f"Ошибка выборки очереди исходящих: {e}")
+                batch = []
+
+            for row in batch:
+                self._ready.put_nowait(
+                    OutboundMessage(row['id'], row['chat_id'], row['method'], row['payload'], row['attempts'])
+                )
+            if batch:
+                # Следующая пачка - после отправки текущей
+                await self._ready.join()
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        """Отправлять готовые сообщения по одному"""
+        while True:
+            message = await self._ready.get()
+            try:
+                await self._deliver(message)
+            except Exception as e:
+                logger.error(f"Ошибка обработки исходящего сообщения {message.id}: {e}")
+            finally:
+                self._ready.task_done()
+
+    async def _deliver(self, message: OutboundMessage) -> None:
+        """Одна попытка отправки и запись ее результата"""
+        attempts = message.attempts + 1
+        try:
+            handler = self.handlers.get(message.method)
+            if handler is not None:
+                await handler(self._bot, self.db, message.chat_id, message.params)
+            else:
+                await getattr(self._bot, message.method)(chat_id=message.chat_id, **message.params)
+        except RetryAfter as e:
+            # Ожидание лимита Telegram не считается неудачной попыткой
+            await self._retry(message, message.attempts, _seconds(e.retry_after), e)
+        except TelegramError as e:
+            if isinstance(e, PERMANENT_ERRORS):
+                await self._fail(message, attempts, e)
+            else:
+                await self._retry(message, attempts, self.backoff(attempts), e)
+        except Exception as e:
+            await self._fail(message, attempts, e)
+        else:
+            self._counters['sent'] += 1
+            await self.db.mark_outbox_sent(message.id)
+
+    async def _retry(self, message: OutboundMessage, attempts: int, delay: float, error: Exception) -> None:
+        """Запланировать повтор или отказаться, если попытки исчерпаны"""
+        if attempts >= self.max_attempts:
+            await self._fail(message, attempts, error)
+            return
+
+        self._counters['retried'] += 1
+        logger.warning(
+            f"Исходящее сообщение {message.id} ({message.method} в {message.chat_id}) "
+            f"не отправлено: {error}. Повтор через {delay:.0f} с"
+        )
+        await self.db.reschedule_outbox(message.id, attempts, delay, str(error))
+
+    async def _fail(self, message: OutboundMessage, attempts: int, error: Exception) -> None:
+        """Отметить сообщение, которое отправить не удастся"""
+        self._counters['failed'] += 1
+        logger.error(
+            f"Исходящее сообщение {message.id} ({message.method} в {message.chat_id}) "
+            f"не будет отправлено после {attempts} попыток: {error}"
+        )
+        await self.db.mark_outbox_failed(message.id, attempts, str(error))
+
+    def stats(self) -> Dict[str, int]:
+        """Размер пачки в отправке и счетчики"""
+        return {'ready': self._ready.qsize(), **self._counters}
@@ -0,0 +1,292 @@
+"""
+Сохранение состояния диалогов в SQLite
+Шаги ConversationHandler и context.user_data переживают перезапуск бота
+"""
+import asyncio
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+from telegram.ext import BasePersistence, ConversationHandler, PersistenceInput
+
+from database import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+# Интервал (секунды), с которым Application передает изменения в persistence.
+# Это верхняя граница потерь при аварийном завершении процесса.
+DEFAULT_FLUSH_INTERVAL = 5
+
+# Размер страницы при загрузке user_data на старте
+LOAD_PAGE_SIZE = 500
+
+# Метки типов, которых нет в JSON: {"$dt": "2024-01-31T00:00:00"}
+_DECODERS = {
+    '$dt': datetime.fromisoformat,
+    '$d': date.fromisoformat,
+    '$set': set,
+}
+
+# Классы, сохраняемые компактной записью: класс -> метка (см. record_type)
+_RECORD_TYPES: Dict[type, str] = {}
+
+
+def record_type(tag: str) -> Callable[[type], type]:
+    """
+    Декоратор класса, который сохраняется как {tag: запись}
+
+    Класс предоставляет to_record() (список значений с номером версии
+    формата) и classmethod from_record(record).
+    """
+    def register(cls: type) -> type:
+        _RECORD_TYPES[cls] = tag
+        _DECODERS[tag] = cls.from_record
+        return cls
+    return register
+
+
+def _encode_value(value: Any) -> Dict:
+    """Значение, которое json не умеет сохранять, в помеченный словарь"""
+    tag = _RECORD_TYPES.get(type(value))
+    if tag is not None:
+        return {tag: value.to_record()}
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'$d': value.isoformat()}
+    if isinstance(value, (set, frozenset)):
+        return {'$set': list(value)}
+    raise TypeError(f"тип {type(value).__name__} не сохраняется")
+
+
+def _decode_object(obj: Dict) -> Any:
+    """Обратное преобразование помеченных словарей"""
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        decoder = _DECODERS.get(tag)
+        if decoder is not None:
+            return decoder(value)
+    return obj
+
+
+def encode(value: Any) -> str:
+    """Компактный JSON с метками типов"""
+    return json.dumps(value, default=_encode_value, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode(text: str) -> Any:
+    """Разобрать значение, сохраненное encode"""
+    return json.loads(text, object_hook=_decode_object)
+
+
+def encode_user_data(user_id: int, data: Dict) -> Optional[str]:
+    """
+    Закодировать user_data пользователя
+
+    Значения, которые не сохраняются (например, объекты Telegram),
+    пропускаются по одному, не теряя остальные поля.
+
+    Returns:
+        JSON или None, если сохранять нечего
+    """
+    if not data:
+        return None
+    try:
+        return encode(data)
+    except (TypeError, ValueError):
+        pass
+
+    fields = {}
+    for key, value in data.items():
+        try:
+            encode(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Поле user_data '{key}' пользователя {user_id} не сохранено: {e}")
+            continue
+        fields[key] = value
+    return encode(fields) if fields else None
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Persistence для Application поверх таблиц conversation_states и user_data
+
+    Изменения копятся в памяти (write-behind): Application передает их раз в
+    update_interval секунд, и все изменения одного прогона записываются одной
+    транзакцией, а не отдельной записью на каждое нажатие кнопки. Шаг диалога
+    и user_data пользователя попадают в одну транзакцию, поэтому после сбоя
+    они не расходятся между собой. bot_data и chat_data не сохраняются:
+    в bot_data лежат подключения к БД и очереди.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        update_interval: float = DEFAULT_FLUSH_INTERVAL,
+        conversation_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            db: Асинхронная обертка БД
+            update_interval: Как часто (секунды) изменения сбрасываются в БД
+            conversation_timeout: Диалоги, не менявшиеся дольше (секунды),
+                                  при загрузке завершаются, а не восстанавливаются
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = db
+        self.conversation_timeout = conversation_timeout
+        self._states: Dict[Tuple[str, str], Optional[object]] = {}
+        self._user_data: Dict[int, Optional[str]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stats = {'flushes': 0, 'records': 0, 'errors': 0}
+
+    # ==================== ЗАГРУЗКА ====================
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        """Загрузить user_data всех пользователей (поврежденные записи пропускаются)"""
+        user_data = {}
+        after_user_id = 0
+        while True:
+            rows = await self.db.get_user_data_page(after_user_id, LOAD_PAGE_SIZE)
+            for row in rows:
+                try:
+                    user_data[row['user_id']] = decode(row['data'])
+                except ValueError as e:
+                    logger.warning(f"Не удалось восстановить user_data пользователя {row['user_id']}: {e}")
+            if len(rows) < LOAD_PAGE_SIZE:
+                break
+            after_user_id = rows[-1]['user_id']
+
+        logger.info(f"Восстановлены данные {len(user_data)} пользователей")
+        return user_data
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        """
+        Загрузить шаги диалогов ConversationHandler с именем name
+
+        Таймауты диалогов не переживают перезапуск, поэтому брошенные
+        дольше conversation_timeout диалоги возвращаются в состоянии END:
+        ConversationHandler завершает их и удаляет из БД при следующем сбросе.
+        """
+        conversations = {}
+        expired = 0
+        for row in await self.db.get_conversation_states(name, self.conversation_timeout):
+            try:
+                key = tuple(json.loads(row['conversation_key']))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Пропущен поврежденный ключ диалога {name}: {e}")
+                continue
+            if row['expired']:
+                conversations[key] = ConversationHandler.END
+                expired += 1
+            else:
+                conversations[key] = row['state']
+
+        if conversations:
+            logger.info(
+                f"Восстановлено незавершенных диалогов {name}: {len(conversations) - expired}, "
+                f"завершено брошенных: {expired}"
+            )
+        return conversations
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        """chat_data не сохраняется"""
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        """bot_data не сохраняется"""
+        return {}
+
+    async def get_callback_data(self) -> None:
+        """callback_data не сохраняется"""
+        return None
+
+    # ==================== ИЗМЕНЕНИЯ ====================
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        """Запомнить новый шаг диалога (None - диалог завершен)"""
+        self._states[(name, encode(list(key)))] = new_state
+        self._schedule_flush()
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        """Запомнить user_data пользователя"""
+        self._user_data[user_id] = encode_user_data(user_id, data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        """Удалить user_data пользователя"""
+        self._user_data[user_id] = None
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        """chat_data не сохраняется"""
+
+    async def update_bot_data(self, data: Dict) -> None:
+        """bot_data не сохраняется"""
+
+    async def update_callback_data(self, data: Any) -> None:
+        """callback_data не сохраняется"""
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        """chat_data не сохраняется"""
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        """Данные в памяти всегда актуальнее сохраненных"""
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        """chat_data не сохраняется"""
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        """bot_data не сохраняется"""
+
+    # ==================== ЗАПИСЬ ====================
+
+    def _schedule_flush(self) -> None:
+        """
+        Запланировать запись накопленного
+
+        Application вызывает update_* для всех изменений прогона подряд;
+        задача записи выполняется после них и забирает их все сразу.
+        """
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        """
+        Записать накопленные изменения одной транзакцией
+
+        Вызывается после каждого прогона update_persistence и при остановке бота.
+        Изменения, пришедшие во время записи (новая задача для них не
+        планируется), записываются следующим проходом той же задачи.
+        Если запись не удалась, изменения остаются в буфере до следующей попытки.
+        """
+        async with self._flush_lock:
+            while self._states or self._user_data:
+                states, self._states = self._states, {}
+                user_data, self._user_data = self._user_data, {}
+
+                saved = await self.db.save_conversation_data(
+                    [(name, key, state) for (name, key), state in states.items()],
+                    list(user_data.items())
+                )
+                if not saved:
+                    # Более новые изменения, пришедшие во время записи, не затираются
+                    for key, state in states.items():
+                        self._states.setdefault(key, state)
+                    for user_id, data in user_data.items():
+                        self._user_data.setdefault(user_id, data)
+                    self._stats['errors'] += 1
+                    logger.error("Состояние диалогов не сохранено, повтор при следующем сбросе")
+                    return
+
+                self._stats['flushes'] += 1
+                self._stats['records'] += len(states) + len(user_data)
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики: flushes - записей в БД, records - сохраненных изменений, pending - в буфере"""
+        return dict(self._stats, pending=len(self._states) + len(self._user_data))
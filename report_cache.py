@@ -0,0 +1,133 @@
+"""
+Кэш отправленных отчетов
+
+Отчет за тот же период по неизменившимся данным повторно не строится:
+бот отправляет уже загруженный в Telegram файл по его file_id. Запись
+привязана к версии данных сотрудника (максимальным ID подключения и
+движения) и устаревает, как только появляется новое подключение или
+движение материалов. Если версию данных прочитать не удалось (None),
+кэш не используется: отчет строится заново и не запоминается.
+"""
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Значение по умолчанию
+DEFAULT_MAX_ENTRIES = 256
+
+# Формат границ периода в ключе кэша
+PERIOD_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class CachedReport(NamedTuple):
+    """Отчет, уже загруженный в Telegram"""
+    watermark: Tuple[int, int]  # Версия данных, по которой построен отчет
+    file_id: str                # file_id документа в Telegram
+    filename: str               # Имя файла отчета
+    stats: Dict                 # Итоговая статистика для подписи
+
+
+def period_key(start_date: datetime, end_date: datetime) -> Tuple[str, str]:
+    """Нормализованный ключ периода (с точностью до секунды)"""
+    return (start_date.strftime(PERIOD_FORMAT), end_date.strftime(PERIOD_FORMAT))
+
+
+class ReportCache:
+    """
+    LRU-кэш file_id отчетов по ключу (сотрудник, период)
+
+    Хранится одна запись на сотрудника и период. Запись с другой версией
+    данных считается устаревшей и удаляется при обращении. Используется
+    только из цикла событий бота, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            max_entries: Максимум хранимых отчетов (0 - кэш выключен)
+        """
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple, CachedReport]' = OrderedDict()
+        self._counters = {'hits': 0, 'misses': 0, 'stale': 0, 'evicted': 0, 'bypassed': 0}
+
+    def get(
+        self,
+        employee_id: int,
+        period: Tuple[str, str],
+        watermark: Optional[Tuple[int, int]]
+    ) -> Optional[CachedReport]:
+        """
+        Найти отчет, построенный по текущей версии данных
+
+        Returns:
+            Запись кэша или None, если отчета нет, данные изменились
+            или версия данных неизвестна (watermark=None)
+        """
+        if watermark is None:
+            self._counters['bypassed'] += 1
+            return None
+
+        key = (employee_id, period)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._counters['misses'] += 1
+            return None
+
+        if entry.watermark != tuple(watermark):
+            del self._entries[key]
+            self._counters['stale'] += 1
+            self._counters['misses'] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._counters['hits'] += 1
+        return entry
+
+    def put(
+        self,
+        employee_id: int,
+        period: Tuple[str, str],
+        watermark: Optional[Tuple[int, int]],
+        file_id: str,
+        filename: str,
+        stats: Dict
+    ) -> None:
+        """
+        Запомнить загруженный отчет, вытеснив самые давние при переполнении
+
+        Отчет с неизвестной версией данных (watermark=None) не запоминается.
+        """
+        if self.max_entries <= 0 or watermark is None:
+            return
+
+        key = (employee_id, period)
+        self._entries[key] = CachedReport(tuple(watermark), file_id, filename, stats)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evicted'] += 1
+
+    def discard(self, employee_id: int, period: Tuple[str, str]) -> None:
+        """Удалить запись (например, если Telegram больше не принимает file_id)"""
+        self._entries.pop((employee_id, period), None)
+
+    def invalidate_employee(self, employee_id: int) -> int:
+        """
+        Удалить все отчеты сотрудника
+
+        Returns:
+            Количество удаленных записей
+        """
+        keys = [key for key in self._entries if key[0] == employee_id]
+        for key in keys:
+            del self._entries[key]
+        if keys:
+            logger.info(f"Кэш отчетов сотрудника {employee_id} сброшен ({len(keys)} шт.)")
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        """Размер кэша и счетчики попаданий"""
+        return {'size': len(self._entries), **self._counters}
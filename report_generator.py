@@ -1,346 +1,703 @@
 """
 Модуль для генерации отчетов в Excel
+
+Книга строится в режиме openpyxl write_only: строки пишутся по мере чтения
+из курсора БД, поэтому память не растет с объемом истории. Готовая книга
+сохраняется в буфер SpooledTemporaryFile, а не в рабочий каталог. Оформление
+задается именованными стилями, которые создаются один раз на книгу и
+разделяются всеми ячейками.
 """
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.fonts import DEFAULT_FONT
 from datetime import datetime
-from typing import List, Dict
+from itertools import chain, groupby
+from tempfile import SpooledTemporaryFile
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import logging
 
 from config import CONNECTION_TYPES
 
 logger = logging.getLogger(__name__)
 
+# Имена стилей книги
+STYLE_TITLE = 'report_title'
+STYLE_INFO_BOLD = 'report_info_bold'
+STYLE_INFO = 'report_info'
+STYLE_INFO_SMALL = 'report_info_small'
+STYLE_HEADER = 'report_header'
+STYLE_TEXT = 'report_text'
+STYLE_NUMBER = 'report_number'
+STYLE_TOTAL_LABEL = 'report_total_label'
+STYLE_TOTAL_NUMBER = 'report_total_number'
+STYLE_EMPLOYEE_TOTAL_LABEL = 'report_employee_total_label'
+STYLE_EMPLOYEE_TOTAL_NUMBER = 'report_employee_total_number'
+STYLE_ADD_TEXT = 'movement_add_text'
+STYLE_ADD_NUMBER = 'movement_add_number'
+STYLE_DEDUCT_TEXT = 'movement_deduct_text'
+STYLE_DEDUCT_NUMBER = 'movement_deduct_number'
+
+# Столбцы листа "Отчет": (заголовок, ширина)
+REPORT_COLUMNS = [
+    ('Столбец', 12),
+    ('Тип', 15),
+    ('Исполнители', 25),
+    ('Адрес подключения', 30),
+    ('Модель роутера', 15),
+    ('Порт', 10),
+    ('Кол-во ВОЛС м', 12),
+    ('Кол-во Вит.пар м', 12),
+    ('Дата', 18),
+]
+
+# Столбцы листа "Движение материалов": (заголовок, ширина)
+MOVEMENT_COLUMNS = [
+    ('Дата', 18),
+    ('Операция', 12),
+    ('Тип', 15),
+    ('Название', 20),
+    ('Количество', 12),
+    ('Остаток', 12),
+    ('Связь с подключением', 20),
+]
+
+# Столбцы листа "Сводка" общего отчета: (заголовок, ширина)
+SUMMARY_COLUMNS = [
+    ('№', 8),
+    ('Сотрудник', 30),
+    ('Подключений', 14),
+    ('Кол-во ВОЛС м', 14),
+    ('Кол-во Вит.пар м', 14),
+    ('Движений', 12),
+]
+
+SUMMARY_SHEET_TITLE = "Сводка"
+
+# Ограничения Excel на имя листа
+SHEET_TITLE_MAX_LENGTH = 31
+SHEET_TITLE_FORBIDDEN = str.maketrans({char: ' ' for char in '[]:*?/\\'})
+
+MOVEMENT_ITEM_TYPES = {
+    'fiber': 'ВОЛС',
+    'twisted_pair': 'Витая пара',
+    'router': 'Роутер'
+}
+
+HEADER_ROW_HEIGHT = 30
+
+# Размер книги, до которого отчет целиком хранится в памяти (байт)
+DEFAULT_MAX_MEMORY_SIZE = 8 * 1024 * 1024
+
+
+def _build_styles() -> List[NamedStyle]:
+    """Создать именованные стили отчета (по одному набору на книгу)"""
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    info_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    text_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    number_alignment = Alignment(horizontal='right', vertical='center')
+    
+    total_font = Font(name='Arial', size=11, bold=True)
+    total_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+    employee_font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
+    employee_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
+    # Зелёный для добавления, красный для списания
+    add_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+    deduct_fill = PatternFill(start_color="FCE4D6", end_color="FCE4D6", fill_type="solid")
+    
+    return [
+        NamedStyle(STYLE_TITLE, font=Font(name='Arial', size=14, bold=True),
+                   alignment=Alignment(horizontal='center', vertical='center')),
+        NamedStyle(STYLE_INFO_BOLD, font=Font(name='Arial', size=11, bold=True), alignment=info_alignment),
+        NamedStyle(STYLE_INFO, font=Font(name='Arial', size=11), alignment=info_alignment),
+        NamedStyle(STYLE_INFO_SMALL, font=Font(name='Arial', size=10), alignment=info_alignment),
+        NamedStyle(
+            STYLE_HEADER,
+            font=Font(name='Arial', size=12, bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+            alignment=Alignment(horizontal='center', vertical='center', wrap_text=True),
+            border=border
+        ),
+        NamedStyle(STYLE_TEXT, font=DEFAULT_FONT, alignment=text_alignment, border=border),
+        NamedStyle(STYLE_NUMBER, font=DEFAULT_FONT, alignment=number_alignment, border=border,
+                   number_format='0.00'),
+        NamedStyle(STYLE_TOTAL_LABEL, font=total_font, fill=total_fill, border=border,
+                   alignment=Alignment(horizontal='right', vertical='center')),
+        NamedStyle(STYLE_TOTAL_NUMBER, font=total_font, fill=total_fill, border=border,
+                   alignment=number_alignment, number_format='0.00'),
+        NamedStyle(STYLE_EMPLOYEE_TOTAL_LABEL, font=employee_font, fill=employee_fill, border=border,
+                   alignment=Alignment(horizontal='right', vertical='center')),
+        NamedStyle(STYLE_EMPLOYEE_TOTAL_NUMBER, font=employee_font, fill=employee_fill, border=border,
+                   alignment=number_alignment, number_format='0.00'),
+        NamedStyle(STYLE_ADD_TEXT, font=DEFAULT_FONT, fill=add_fill, border=border,
+                   alignment=text_alignment),
+        NamedStyle(STYLE_ADD_NUMBER, font=DEFAULT_FONT, fill=add_fill, border=border,
+                   alignment=number_alignment),
+        NamedStyle(STYLE_DEDUCT_TEXT, font=DEFAULT_FONT, fill=deduct_fill, border=border,
+                   alignment=text_alignment),
+        NamedStyle(STYLE_DEDUCT_NUMBER, font=DEFAULT_FONT, fill=deduct_fill, border=border,
+                   alignment=number_alignment),
+    ]
+
+
+def _format_date(value: Any) -> Any:
+    """Дата из БД в формате ДД.ММ.ГГГГ ЧЧ:ММ (как есть, если не разобрать)"""
+    try:
+        return datetime.fromisoformat(value).strftime('%d.%m.%Y %H:%M')
+    except (TypeError, ValueError):
+        return value
+
+
+def _column_letter(index: int) -> str:
+    """Буква столбца по номеру (1 = A); в отчетах не больше 26 столбцов"""
+    return chr(ord('A') + index - 1)
+
+
+def _sheet_title(name: str, used: set) -> str:
+    """Допустимое и уникальное в книге имя листа для сотрудника"""
+    base = name.translate(SHEET_TITLE_FORBIDDEN).strip()[:SHEET_TITLE_MAX_LENGTH] or "Сотрудник"
+    title, number = base, 1
+    while title.lower() in used:
+        number += 1
+        suffix = f" ({number})"
+        title = base[:SHEET_TITLE_MAX_LENGTH - len(suffix)] + suffix
+    used.add(title.lower())
+    return title
+
+
+def _employee_key(row: Dict) -> Tuple[str, int]:
+    """Ключ группировки строк общего отчета (порядок запросов: ФИО, затем ID)"""
+    return row['employee_name'], row['employee_id']
+
+
+def _track_ids(rows: Iterable[Dict], ids: Set[int]) -> Iterator[Dict]:
+    """Выдать строки, запоминая их id (подключение с несколькими исполнителями - один id)"""
+    for row in rows:
+        ids.add(row['id'])
+        yield row
+
 
 class ReportGenerator:
     """Класс для генерации Excel-отчетов"""
     
+    @staticmethod
+    def _create_workbook() -> Tuple[Workbook, Dict[str, StyleArray]]:
+        """
+        Создать потоковую книгу с зарегистрированными стилями
+        
+        Returns:
+            Tuple: (книга, массивы стилей по имени для ReportGenerator._cell)
+        """
+        wb = Workbook(write_only=True)
+        styles = {}
+        for style in _build_styles():
+            wb.add_named_style(style)
+            styles[style.name] = style.as_tuple()
+        return wb, styles
+    
+    @staticmethod
+    def _cell(ws, value: Any, style: StyleArray) -> WriteOnlyCell:
+        """
+        Ячейка потокового листа с именованным стилем
+        
+        Равносильно cell.style = имя, но без поиска стиля по имени и копии
+        на каждую ячейку: все ячейки стиля разделяют один массив. Ячейки
+        write_only не изменяются после создания, так что это безопасно.
+        """
+        cell = WriteOnlyCell(ws, value=value)
+        cell._style = style
+        return cell
+    
+    @staticmethod
+    def _setup_sheet(ws, columns: List[Tuple[str, int]], header_row: int) -> None:
+        """Задать ширину столбцов и высоту строки заголовков (до записи строк)"""
+        for col_num, (_, width) in enumerate(columns, 1):
+            ws.column_dimensions[_column_letter(col_num)].width = width
+        ws.row_dimensions[header_row].height = HEADER_ROW_HEIGHT
+    
+    @staticmethod
+    def _append_info(ws, row: int, last_column: str, value: str, style: StyleArray) -> None:
+        """Добавить строку-шапку, объединенную на всю ширину таблицы"""
+        ws.merged_cells.add(f'A{row}:{last_column}{row}')
+        ws.append([ReportGenerator._cell(ws, value, style)])
+    
+    @staticmethod
+    def _append_header(ws, columns: List[Tuple[str, int]], style: StyleArray) -> None:
+        """Добавить строку заголовков столбцов"""
+        cell = ReportGenerator._cell
+        ws.append([cell(ws, header, style) for header, _ in columns])
+    
+    @staticmethod
+    def report_filename(employee_name: str) -> str:
+        """Имя файла отчета для отправки пользователю"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f"report_{employee_name.replace(' ', '_')}_{timestamp}.xlsx"
+    
     @staticmethod
     def generate_employee_report(
         employee_name: str,
-        connections: List[Dict],
-        stats: Dict,
+        connections: Iterable[Dict],
+        stats: Optional[Dict],
         period_name: str,
-        movements: List[Dict] = None
-    ) -> str:
+        movements: Optional[Iterable[Dict]] = None,
+        max_memory_size: int = DEFAULT_MAX_MEMORY_SIZE
+    ) -> SpooledTemporaryFile:
         """
         Генерирует Excel-отчет по сотруднику
         
         Args:
             employee_name: ФИО сотрудника
-            connections: Список подключений
-            stats: Итоговая статистика
+            connections: Подключения (список или генератор из курсора БД)
+            stats: Итоговая статистика; если None, итоги считаются
+                   по ходу записи подключений
             period_name: Название периода
-            movements: Список движений материалов и роутеров (опционально)
+            movements: Движения материалов и роутеров (опционально,
+                       список или генератор)
+            max_memory_size: Размер книги в байтах, сверх которого буфер
+                             переносится во временный файл
         
         Returns:
-            Путь к созданному файлу
+            Буфер с книгой, позиция - в начале
         """
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Отчет"
-        
-        # Стили
-        header_font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        title_font = Font(name='Arial', size=14, bold=True)
-        title_alignment = Alignment(horizontal='center', vertical='center')
-        
-        cell_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-        number_alignment = Alignment(horizontal='right', vertical='center')
-        
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        buffer = SpooledTemporaryFile(max_size=max_memory_size, mode='w+b')
+        ReportGenerator._write_employee_report(
+            buffer, employee_name, connections, stats, period_name, movements
         )
+        buffer.seek(0)
+        return buffer
+    
+    @staticmethod
+    def stream_employee_report(
+        db,
+        employee_id: int,
+        employee_name: str,
+        period_name: str,
+        start_date: datetime,
+        end_date: datetime,
+        max_memory_size: int = DEFAULT_MAX_MEMORY_SIZE
+    ) -> Tuple[Optional[SpooledTemporaryFile], Dict]:
+        """
+        Сформировать отчет, читая подключения и движения прямо из курсоров БД
         
-        total_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
-        total_font = Font(name='Arial', size=11, bold=True)
+        Выполняется синхронно и целиком в одном потоке (курсоры держат
+        подключение из пула); бот вызывает его в процессе-исполнителе
+        очереди отчетов.
         
-        # Заголовок отчета
-        ws.merge_cells('A1:H1')
-        ws['A1'] = f"Сводный отчет по монтажнику"
-        ws['A1'].font = title_font
-        ws['A1'].alignment = title_alignment
+        Args:
+            db: Синхронный экземпляр Database
+            employee_id: ID сотрудника
+            employee_name: ФИО сотрудника
+            period_name: Название периода
+            start_date: Начало периода
+            end_date: Конец периода
+            max_memory_size: Порог переноса буфера на диск (байт)
+        
+        Returns:
+            Tuple: (буфер с книгой или None, если за период нет данных,
+                    итоговая статистика с числом движений total_movements)
+        """
+        buffer = SpooledTemporaryFile(max_size=max_memory_size, mode='w+b')
+        try:
+            stats = ReportGenerator._write_employee_report(
+                buffer,
+                employee_name,
+                db.iter_employee_report(employee_id, start_date=start_date, end_date=end_date),
+                None,
+                period_name,
+                db.iter_employee_movements(employee_id, start_date, end_date)
+            )
+        except Exception:
+            buffer.close()
+            raise
+        
+        if not stats['total_connections'] and not stats['total_movements']:
+            buffer.close()
+            return None, stats
+        buffer.seek(0)
+        return buffer, stats
+    
+    @staticmethod
+    def stream_all_employees_report(
+        db,
+        period_name: str,
+        start_date: datetime,
+        end_date: datetime,
+        max_memory_size: int = DEFAULT_MAX_MEMORY_SIZE
+    ) -> Tuple[Optional[SpooledTemporaryFile], Dict]:
+        """
+        Сформировать общий отчет по всем сотрудникам за период
         
-        # Информация о сотруднике и периоде
-        ws.merge_cells('A2:H2')
-        ws['A2'] = f"Исполнитель: {employee_name}"
-        ws['A2'].font = Font(name='Arial', size=11, bold=True)
-        ws['A2'].alignment = cell_alignment
+        Подключения и движения всех сотрудников читаются двумя запросами,
+        сгруппированными по сотрудникам, и пишутся в одну книгу: лист
+        "Сводка" и по листу на каждого сотрудника с данными за период.
         
-        ws.merge_cells('A3:H3')
-        ws['A3'] = f"Период: {period_name}"
-        ws['A3'].font = Font(name='Arial', size=11)
-        ws['A3'].alignment = cell_alignment
+        Args:
+            db: Синхронный экземпляр Database
+            period_name: Название периода
+            start_date: Начало периода
+            end_date: Конец периода
+            max_memory_size: Порог переноса буфера на диск (байт)
         
-        ws.merge_cells('A4:H4')
-        ws['A4'] = f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-        ws['A4'].font = Font(name='Arial', size=10)
-        ws['A4'].alignment = cell_alignment
+        Returns:
+            Tuple: (буфер с книгой или None, если за период нет данных,
+                    итоговая статистика с числом сотрудников total_employees;
+                    total_connections - число разных подключений)
+        """
+        buffer = SpooledTemporaryFile(max_size=max_memory_size, mode='w+b')
+        try:
+            # Потоки подключений и движений читаются поочередно: оба курсора
+            # работают на одном подключении пула, которое держится до конца
+            # отчета и не возвращается в пул, пока второй курсор еще читает
+            with db.connection():
+                stats = ReportGenerator._write_all_employees_report(
+                    buffer,
+                    db.iter_all_employees_report(start_date, end_date),
+                    db.iter_all_movements(start_date, end_date),
+                    period_name
+                )
+        except Exception:
+            buffer.close()
+            raise
+        
+        if not stats['total_employees']:
+            buffer.close()
+            return None, stats
+        buffer.seek(0)
+        return buffer, stats
+    
+    @staticmethod
+    def _write_all_employees_report(
+        output: BinaryIO,
+        connections: Iterable[Dict],
+        movements: Iterable[Dict],
+        period_name: str
+    ) -> Dict:
+        """
+        Записать общую книгу в output и вернуть итоговую статистику
+        
+        connections и movements должны быть упорядочены по (ФИО, ID
+        сотрудника): группы обоих потоков сливаются за один проход.
+        """
+        wb, styles = ReportGenerator._create_workbook()
+        cell = ReportGenerator._cell
+        
+        # Сводка - первый лист книги, но ее строки известны только после
+        # листов сотрудников (у каждого листа write_only свой поток записи)
+        summary = wb.create_sheet(title=SUMMARY_SHEET_TITLE)
+        last_column = _column_letter(len(SUMMARY_COLUMNS))
+        ReportGenerator._setup_sheet(summary, SUMMARY_COLUMNS, header_row=5)
+        ReportGenerator._append_info(summary, 1, last_column, "Сводный отчет по всем сотрудникам", styles[STYLE_TITLE])
+        ReportGenerator._append_info(summary, 2, last_column, f"Период: {period_name}", styles[STYLE_INFO])
+        ReportGenerator._append_info(
+            summary, 3, last_column,
+            f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}",
+            styles[STYLE_INFO_SMALL]
+        )
+        summary.append([])
+        ReportGenerator._append_header(summary, SUMMARY_COLUMNS, styles[STYLE_HEADER])
+        
+        text, number = styles[STYLE_TEXT], styles[STYLE_NUMBER]
+        totals = {'fiber': 0.0, 'twisted': 0.0, 'movements': 0}
+        used_titles = {SUMMARY_SHEET_TITLE.lower()}
+        employees = 0
+        
+        # У подключения с несколькими исполнителями строка на каждого: в сводке
+        # оно учитывается у каждого, а в общем итоге - один раз
+        connection_ids: Set[int] = set()
+        connection_groups = groupby(_track_ids(connections, connection_ids), key=_employee_key)
+        movement_groups = groupby(movements, key=_employee_key)
+        connection_group = next(connection_groups, None)
+        movement_group = next(movement_groups, None)
+        
+        while connection_group is not None or movement_group is not None:
+            key = min(group[0] for group in (connection_group, movement_group) if group is not None)
+            employee_connections = connection_group[1] if connection_group and connection_group[0] == key else ()
+            employee_movements = movement_group[1] if movement_group and movement_group[0] == key else ()
+            
+            employee_name = key[0]
+            count, fiber, twisted, movements_count = ReportGenerator._add_employee_sheet(
+                wb, styles, _sheet_title(employee_name, used_titles), employee_name,
+                period_name, employee_connections, employee_movements
+            )
+            
+            # Группа groupby действительна до перехода к следующей
+            if employee_connections:
+                connection_group = next(connection_groups, None)
+            if employee_movements:
+                movement_group = next(movement_groups, None)
+            
+            employees += 1
+            summary.append([
+                cell(summary, employees, text),
+                cell(summary, employee_name, text),
+                cell(summary, count, number),
+                cell(summary, round(fiber, 2), number),
+                cell(summary, round(twisted, 2), number),
+                cell(summary, movements_count, number),
+            ])
+            totals['fiber'] += fiber
+            totals['twisted'] += twisted
+            totals['movements'] += movements_count
+        
+        stats = {
+            'total_employees': employees,
+            'total_connections': len(connection_ids),
+            'total_fiber_meters': round(totals['fiber'], 2),
+            'total_twisted_pair_meters': round(totals['twisted'], 2),
+            'total_movements': totals['movements']
+        }
+        
+        # Итог сводки: подпись объединена на столбцы "№" и "Сотрудник"
+        summary.append([])
+        total_row = 5 + employees + 2
+        label_style = styles[STYLE_EMPLOYEE_TOTAL_LABEL]
+        number_style = styles[STYLE_EMPLOYEE_TOTAL_NUMBER]
+        summary.merged_cells.add(f'A{total_row}:B{total_row}')
+        summary.append([
+            cell(summary, "Итого:", label_style),
+            cell(summary, None, label_style),
+            cell(summary, stats['total_connections'], number_style),
+            cell(summary, stats['total_fiber_meters'], number_style),
+            cell(summary, stats['total_twisted_pair_meters'], number_style),
+            cell(summary, stats['total_movements'], number_style),
+        ])
+        
+        wb.save(output)
+        
+        logger.info(
+            f"Общий отчет создан: {output.tell()} байт ({employees} сотрудников, "
+            f"{stats['total_connections']} подключений, {stats['total_movements']} движений)"
+        )
+        return stats
+    
+    @staticmethod
+    def _add_employee_sheet(
+        wb: Workbook,
+        styles: Dict[str, StyleArray],
+        title: str,
+        employee_name: str,
+        period_name: str,
+        connections: Iterable[Dict],
+        movements: Iterable[Dict]
+    ) -> Tuple[int, float, float, int]:
+        """
+        Добавить лист сотрудника общего отчета: подключения с итогом, под ними движения
+        
+        Returns:
+            Tuple: (подключений, сумма ВОЛС, сумма витой пары, движений)
+        """
+        ws = wb.create_sheet(title=title)
+        last_column = _column_letter(len(REPORT_COLUMNS))
+        
+        ReportGenerator._setup_sheet(ws, REPORT_COLUMNS, header_row=5)
+        ReportGenerator._append_info(ws, 1, last_column, "Сводный отчет по монтажнику", styles[STYLE_TITLE])
+        ReportGenerator._append_info(ws, 2, last_column, f"Исполнитель: {employee_name}", styles[STYLE_INFO_BOLD])
+        ReportGenerator._append_info(ws, 3, last_column, f"Период: {period_name}", styles[STYLE_INFO])
+        ws.append([])
+        
+        # Заголовки (строка 5) и подключения (с 6 строки)
+        ReportGenerator._append_header(ws, REPORT_COLUMNS, styles[STYLE_HEADER])
+        count, fiber, twisted = ReportGenerator._append_connections(ws, styles, connections)
+        
+        ws.append([])
+        row = 6 + count + 1
+        ReportGenerator._append_total(
+            ws, row, f"Итого {employee_name}:", round(fiber, 2), round(twisted, 2),
+            styles[STYLE_EMPLOYEE_TOTAL_LABEL], styles[STYLE_EMPLOYEE_TOTAL_NUMBER]
+        )
+        
+        # Движения материалов - отдельной таблицей под подключениями
+        movements = iter(movements)
+        first = next(movements, None)
+        movements_count = 0
+        if first is not None:
+            ws.append([])
+            ReportGenerator._append_info(
+                ws, row + 2, _column_letter(len(MOVEMENT_COLUMNS)),
+                "Движение материалов и роутеров", styles[STYLE_INFO_BOLD]
+            )
+            ws.row_dimensions[row + 3].height = HEADER_ROW_HEIGHT
+            ReportGenerator._append_header(ws, MOVEMENT_COLUMNS, styles[STYLE_HEADER])
+            movements_count = ReportGenerator._append_movements(ws, styles, chain([first], movements))
+        
+        return count, fiber, twisted, movements_count
+    
+    @staticmethod
+    def _write_employee_report(
+        output: BinaryIO,
+        employee_name: str,
+        connections: Iterable[Dict],
+        stats: Optional[Dict],
+        period_name: str,
+        movements: Optional[Iterable[Dict]]
+    ) -> Dict:
+        """Записать книгу отчета в output и вернуть итоговую статистику"""
+        wb, styles = ReportGenerator._create_workbook()
+        ws = wb.create_sheet(title="Отчет")
+        last_column = _column_letter(len(REPORT_COLUMNS))
+        
+        ReportGenerator._setup_sheet(ws, REPORT_COLUMNS, header_row=6)
+        
+        # Заголовок отчета и информация о сотруднике и периоде
+        ReportGenerator._append_info(ws, 1, last_column, "Сводный отчет по монтажнику", styles[STYLE_TITLE])
+        ReportGenerator._append_info(ws, 2, last_column, f"Исполнитель: {employee_name}", styles[STYLE_INFO_BOLD])
+        ReportGenerator._append_info(ws, 3, last_column, f"Период: {period_name}", styles[STYLE_INFO])
+        ReportGenerator._append_info(
+            ws, 4, last_column,
+            f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}",
+            styles[STYLE_INFO_SMALL]
+        )
+        ws.append([])
         
         # Заголовки столбцов (строка 6)
-        headers = [
-            'Столбец',
-            'Тип',
-            'Исполнители',
-            'Адрес подключения',
-            'Модель роутера',
-            'Порт',
-            'Кол-во ВОЛС м',
-            'Кол-во Вит.пар м',
-            'Дата'
+        ReportGenerator._append_header(ws, REPORT_COLUMNS, styles[STYLE_HEADER])
+        
+        # Данные подключений (с 7 строки)
+        count, total_fiber, total_twisted = ReportGenerator._append_connections(ws, styles, connections)
+        
+        if stats is None:
+            stats = {
+                'total_connections': count,
+                'total_fiber_meters': round(total_fiber, 2),
+                'total_twisted_pair_meters': round(total_twisted, 2)
+            }
+        
+        # Итоги: пустая строка, "Итого общее" и итого для сотрудника
+        # (подписи объединены до столбца "Порт", суммы под ВОЛС и витой парой)
+        ws.append([])
+        total_row = 7 + count + 1
+        totals = [
+            ("Итого общее:", styles[STYLE_TOTAL_LABEL], styles[STYLE_TOTAL_NUMBER]),
+            (f"Итого {employee_name}:", styles[STYLE_EMPLOYEE_TOTAL_LABEL], styles[STYLE_EMPLOYEE_TOTAL_NUMBER]),
         ]
+        for row, (label, label_style, number_style) in enumerate(totals, total_row):
+            ReportGenerator._append_total(
+                ws, row, label, stats.get('total_fiber_meters', 0),
+                stats.get('total_twisted_pair_meters', 0), label_style, number_style
+            )
+        
+        # Создаём второй лист с движениями материалов, если они есть
+        movements_count = 0
+        if movements is not None:
+            movements = iter(movements)
+            first = next(movements, None)
+            if first is not None:
+                movements_count = ReportGenerator._add_movements_sheet(
+                    wb, styles, employee_name, period_name, chain([first], movements)
+                )
+        
+        stats = dict(stats, total_movements=movements_count)
+        
+        wb.save(output)
+        
+        logger.info(
+            f"Отчет по {employee_name} создан: {output.tell()} байт "
+            f"({count} подключений, {movements_count} движений)"
+        )
+        return stats
+    
+    @staticmethod
+    def _append_connections(ws, styles: Dict[str, StyleArray],
+                            connections: Iterable[Dict]) -> Tuple[int, float, float]:
+        """
+        Добавить строки подключений
         
-        ws.row_dimensions[6].height = 30
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=6, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Ширина столбцов
-        ws.column_dimensions['A'].width = 12  # Столбец
-        ws.column_dimensions['B'].width = 15  # Тип
-        ws.column_dimensions['C'].width = 25  # Исполнители
-        ws.column_dimensions['D'].width = 30  # Адрес
-        ws.column_dimensions['E'].width = 15  # Модель роутера
-        ws.column_dimensions['F'].width = 10  # Порт
-        ws.column_dimensions['G'].width = 12  # ВОЛС
-        ws.column_dimensions['H'].width = 12  # Витая пара
-        ws.column_dimensions['I'].width = 18  # Дата
-        
-        # Данные подключений
-        current_row = 7
+        Returns:
+            Tuple: (количество подключений, сумма ВОЛС, сумма витой пары)
+        """
+        cell = ReportGenerator._cell
+        text, number = styles[STYLE_TEXT], styles[STYLE_NUMBER]
+        count = 0
+        total_fiber = 0.0
+        total_twisted = 0.0
         for idx, conn in enumerate(connections, 1):
-            # Форматируем дату
-            try:
-                created_at = datetime.fromisoformat(conn['created_at'])
-                date_str = created_at.strftime('%d.%m.%Y %H:%M')
-            except:
-                date_str = conn['created_at']
-            
-            # Список исполнителей через запятую
-            executors = ', '.join(conn['all_employees'])
-            
             # Получаем читаемое название типа подключения
             conn_type = conn.get('connection_type', 'mkd')
-            type_name = CONNECTION_TYPES.get(conn_type, conn_type)
-            
-            row_data = [
-                idx,  # Номер по порядку
-                type_name,  # Тип подключения
-                executors,
-                conn['address'],
-                conn['router_model'],
-                str(conn['port']),
-                conn['employee_fiber_meters'],
-                conn['employee_twisted_pair_meters'],
-                date_str
-            ]
             
-            for col_num, value in enumerate(row_data, 1):
-                cell = ws.cell(row=current_row, column=col_num)
-                cell.value = value
-                cell.border = border
-                
-                if col_num in [7, 8]:  # Числовые столбцы (сдвинулись на 1)
-                    cell.alignment = number_alignment
-                    cell.number_format = '0.00'
-                else:
-                    cell.alignment = cell_alignment
+            ws.append([
+                cell(ws, idx, text),  # Номер по порядку
+                cell(ws, CONNECTION_TYPES.get(conn_type, conn_type), text),
+                cell(ws, ', '.join(conn['all_employees']), text),
+                cell(ws, conn['address'], text),
+                cell(ws, conn['router_model'], text),
+                cell(ws, str(conn['port']), text),
+                cell(ws, conn['employee_fiber_meters'], number),
+                cell(ws, conn['employee_twisted_pair_meters'], number),
+                cell(ws, _format_date(conn['created_at']), text),
+            ])
             
-            current_row += 1
-        
-        # Итоги
-        current_row += 1
-        
-        # Итого общее
-        ws.merge_cells(f'A{current_row}:E{current_row}')
-        cell = ws.cell(row=current_row, column=1)
-        cell.value = "Итого общее:"
-        cell.font = total_font
-        cell.fill = total_fill
-        cell.alignment = Alignment(horizontal='right', vertical='center')
-        cell.border = border
-        
-        # Итого ВОЛС
-        cell = ws.cell(row=current_row, column=6)
-        cell.value = stats['total_fiber_meters']
-        cell.font = total_font
-        cell.fill = total_fill
-        cell.alignment = number_alignment
-        cell.number_format = '0.00'
-        cell.border = border
-        
-        # Итого витая пара
-        cell = ws.cell(row=current_row, column=7)
-        cell.value = stats['total_twisted_pair_meters']
-        cell.font = total_font
-        cell.fill = total_fill
-        cell.alignment = number_alignment
-        cell.number_format = '0.00'
-        cell.border = border
-        
-        # Пустая ячейка для выравнивания
-        cell = ws.cell(row=current_row, column=8)
-        cell.fill = total_fill
-        cell.border = border
-        
-        # Итого для сотрудника (с учетом деления)
-        current_row += 1
-        ws.merge_cells(f'A{current_row}:E{current_row}')
-        cell = ws.cell(row=current_row, column=1)
-        cell.value = f"Итого {employee_name}:"
-        cell.font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.alignment = Alignment(horizontal='right', vertical='center')
-        cell.border = border
-        
-        # Итого ВОЛС для сотрудника
-        cell = ws.cell(row=current_row, column=6)
-        cell.value = stats['total_fiber_meters']
-        cell.font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.alignment = number_alignment
-        cell.number_format = '0.00'
-        cell.border = border
-        
-        # Итого витая пара для сотрудника
-        cell = ws.cell(row=current_row, column=7)
-        cell.value = stats['total_twisted_pair_meters']
-        cell.font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.alignment = number_alignment
-        cell.number_format = '0.00'
-        cell.border = border
-        
-        # Пустая ячейка для выравнивания
-        cell = ws.cell(row=current_row, column=8)
-        cell.fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        cell.border = border
-        
-        # Создаём второй лист с движениями материалов, если они есть
-        if movements and len(movements) > 0:
-            ReportGenerator._add_movements_sheet(wb, employee_name, period_name, movements)
-        
-        # Сохранение файла
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"report_{employee_name.replace(' ', '_')}_{timestamp}.xlsx"
-        wb.save(filename)
-        
-        logger.info(f"Отчет создан: {filename}")
-        return filename
+            count = idx
+            total_fiber += conn['employee_fiber_meters']
+            total_twisted += conn['employee_twisted_pair_meters']
+        return count, total_fiber, total_twisted
+    
+    @staticmethod
+    def _append_total(ws, row: int, label: str, fiber: float, twisted: float,
+                      label_style: StyleArray, number_style: StyleArray) -> None:
+        """Строка итога: подпись объединена до столбца "Порт", суммы под ВОЛС и витой парой"""
+        cell = ReportGenerator._cell
+        ws.merged_cells.add(f'A{row}:F{row}')
+        ws.append(
+            [cell(ws, label, label_style)]
+            + [cell(ws, None, label_style) for _ in range(5)]
+            + [
+                cell(ws, fiber, number_style),
+                cell(ws, twisted, number_style),
+                cell(ws, None, label_style),
+            ]
+        )
     
     @staticmethod
-    def _add_movements_sheet(wb: Workbook, employee_name: str, period_name: str, movements: List[Dict]):
+    def _add_movements_sheet(wb: Workbook, styles: Dict[str, StyleArray], employee_name: str,
+                             period_name: str, movements: Iterable[Dict]) -> int:
         """
         Добавляет лист с движениями материалов и роутеров
         
         Args:
-            wb: Workbook объект
+            wb: Workbook объект (write_only, со стилями отчета)
+            styles: Массивы стилей из ReportGenerator._create_workbook
             employee_name: ФИО сотрудника
             period_name: Название периода
-            movements: Список движений
+            movements: Движения (список или генератор)
+        
+        Returns:
+            Количество записанных движений
         """
-        # Создаём новый лист
         ws = wb.create_sheet(title="Движение материалов")
+        last_column = _column_letter(len(MOVEMENT_COLUMNS))
         
-        # Стили
-        header_font = Font(name='Arial', size=12, bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        ReportGenerator._setup_sheet(ws, MOVEMENT_COLUMNS, header_row=5)
         
-        title_font = Font(name='Arial', size=14, bold=True)
-        title_alignment = Alignment(horizontal='center', vertical='center')
+        # Заголовок и информация
+        ReportGenerator._append_info(ws, 1, last_column, "Движение материалов и роутеров", styles[STYLE_TITLE])
+        ReportGenerator._append_info(ws, 2, last_column, f"Исполнитель: {employee_name}", styles[STYLE_INFO_BOLD])
+        ReportGenerator._append_info(ws, 3, last_column, f"Период: {period_name}", styles[STYLE_INFO])
+        ws.append([])
         
-        cell_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-        number_alignment = Alignment(horizontal='right', vertical='center')
-        
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Зелёный для добавления
-        add_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
-        # Красный для списания
-        deduct_fill = PatternFill(start_color="FCE4D6", end_color="FCE4D6", fill_type="solid")
-        
-        # Заголовок
-        ws.merge_cells('A1:G1')
-        ws['A1'] = f"Движение материалов и роутеров"
-        ws['A1'].font = title_font
-        ws['A1'].alignment = title_alignment
-        
-        # Информация
-        ws.merge_cells('A2:G2')
-        ws['A2'] = f"Исполнитель: {employee_name}"
-        ws['A2'].font = Font(name='Arial', size=11, bold=True)
-        ws['A2'].alignment = cell_alignment
-        
-        ws.merge_cells('A3:G3')
-        ws['A3'] = f"Период: {period_name}"
-        ws['A3'].font = Font(name='Arial', size=11)
-        ws['A3'].alignment = cell_alignment
-        
-        # Заголовки столбцов
-        headers = [
-            'Дата',
-            'Операция',
-            'Тип',
-            'Название',
-            'Количество',
-            'Остаток',
-            'Связь с подключением'
-        ]
-        
-        ws.row_dimensions[5].height = 30
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=5, column=col_num)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Ширина столбцов
-        ws.column_dimensions['A'].width = 18  # Дата
-        ws.column_dimensions['B'].width = 12  # Операция
-        ws.column_dimensions['C'].width = 15  # Тип
-        ws.column_dimensions['D'].width = 20  # Название
-        ws.column_dimensions['E'].width = 12  # Количество
-        ws.column_dimensions['F'].width = 12  # Остаток
-        ws.column_dimensions['G'].width = 20  # Связь
+        # Заголовки столбцов (строка 5)
+        ReportGenerator._append_header(ws, MOVEMENT_COLUMNS, styles[STYLE_HEADER])
         
         # Данные движений
-        current_row = 6
+        count = ReportGenerator._append_movements(ws, styles, movements)
+        
+        logger.info(f"Добавлен лист 'Движение материалов' с {count} записями")
+        return count
+    
+    @staticmethod
+    def _append_movements(ws, styles: Dict[str, StyleArray], movements: Iterable[Dict]) -> int:
+        """Добавить строки движений и вернуть их количество"""
+        cell = ReportGenerator._cell
+        count = 0
         for mov in movements:
-            # Форматируем дату
-            try:
-                created_at = datetime.fromisoformat(mov['created_at'])
-                date_str = created_at.strftime('%d.%m.%Y %H:%M')
-            except:
-                date_str = mov['created_at']
-            
-            # Операция
-            operation = "Добавление" if mov['operation_type'] == 'add' else "Списание"
-            
-            # Тип
-            type_map = {
-                'fiber': 'ВОЛС',
-                'twisted_pair': 'Витая пара',
-                'router': 'Роутер'
-            }
-            item_type = type_map.get(mov['item_type'], mov['item_type'])
+            is_add = mov['operation_type'] == 'add'
+            text_style = styles[STYLE_ADD_TEXT] if is_add else styles[STYLE_DEDUCT_TEXT]
+            number_style = styles[STYLE_ADD_NUMBER] if is_add else styles[STYLE_DEDUCT_NUMBER]
             
             # Количество
             if mov['item_type'] == 'router':
@@ -353,30 +710,14 @@ class ReportGenerator:
             # Связь с подключением
             conn_link = f"Подключение #{mov['connection_id']}" if mov['connection_id'] else "-"
             
-            row_data = [
-                date_str,
-                operation,
-                item_type,
-                mov['item_name'],
-                quantity_str,
-                balance_str,
-                conn_link
-            ]
-            
-            # Определяем цвет фона
-            row_fill = add_fill if mov['operation_type'] == 'add' else deduct_fill
-            
-            for col_num, value in enumerate(row_data, 1):
-                cell = ws.cell(row=current_row, column=col_num)
-                cell.value = value
-                cell.border = border
-                cell.fill = row_fill
-                
-                if col_num in [5, 6]:  # Количество и остаток
-                    cell.alignment = number_alignment
-                else:
-                    cell.alignment = cell_alignment
-            
-            current_row += 1
-        
-        logger.info(f"Добавлен лист 'Движение материалов' с {len(movements)} записями")
+            ws.append([
+                cell(ws, _format_date(mov['created_at']), text_style),
+                cell(ws, "Добавление" if is_add else "Списание", text_style),
+                cell(ws, MOVEMENT_ITEM_TYPES.get(mov['item_type'], mov['item_type']), text_style),
+                cell(ws, mov['item_name'], text_style),
+                cell(ws, quantity_str, number_style),
+                cell(ws, balance_str, number_style),
+                cell(ws, conn_link, text_style),
+            ])
+            count += 1
+        return count
@@ -0,0 +1,391 @@
+"""
+Очередь формирования отчетов в отдельных процессах
+
+openpyxl нагружает процессор и держит GIL, поэтому отчеты строятся в пуле
+процессов и не замедляют обработку нажатий остальных пользователей.
+Очередь ограничивает число одновременных задач пользователя и общую
+длину очереди, ведет счетчики и позволяет отменить задачу.
+"""
+import asyncio
+import io
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
+from multiprocessing import get_context
+from typing import Any, BinaryIO, Callable, Dict, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию
+DEFAULT_WORKERS = 2
+DEFAULT_PER_USER_LIMIT = 1
+DEFAULT_MAX_QUEUED = 20
+
+# Состояния задачи
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# Название общего отчета (в имени файла и подписи)
+ALL_EMPLOYEES_NAME = "Все сотрудники"
+
+# БД процесса-исполнителя (открывается один раз при старте процесса)
+_worker_db = None
+
+
+class ReportJobError(RuntimeError):
+    """Задачу нельзя поставить в очередь"""
+
+
+class ReportJobLimitError(ReportJobError):
+    """У пользователя уже максимум активных задач"""
+
+
+class ReportQueueFullError(ReportJobError):
+    """Очередь отчетов переполнена"""
+
+
+def _init_worker(db_path: str) -> None:
+    """Открыть БД в процессе-исполнителе"""
+    global _worker_db
+    from database import Database
+
+    _worker_db = Database(db_path, pool_size=1)
+
+
+class ReportFile(NamedTuple):
+    """Готовый отчет, переданный из процесса-исполнителя"""
+    filename: str             # Имя файла для пользователя
+    stats: Dict               # Итоговая статистика отчета
+    content: Optional[bytes]  # Книга целиком, если уместилась в память
+    path: Optional[str]       # Временный файл, если книга больше порога
+
+    def open(self) -> BinaryIO:
+        """Открыть содержимое отчета для чтения"""
+        if self.content is not None:
+            return io.BytesIO(self.content)
+        return open(self.path, 'rb')
+
+
+def build_employee_report(
+    employee_id: int,
+    employee_name: str,
+    period_name: str,
+    start_date: datetime,
+    end_date: datetime,
+    max_memory_size: int
+) -> Optional[ReportFile]:
+    """
+    Сформировать отчет по сотруднику в процессе-исполнителе
+
+    Книга до max_memory_size байт возвращается в памяти, большая - через
+    временный файл в системном каталоге временных файлов.
+
+    Returns:
+        Готовый отчет или None, если за период нет данных
+    """
+    from report_generator import ReportGenerator
+
+    buffer, stats = ReportGenerator.stream_employee_report(
+        _worker_db, employee_id, employee_name, period_name, start_date, end_date,
+        max_memory_size=max_memory_size
+    )
+    return _report_file(buffer, stats, ReportGenerator.report_filename(employee_name), max_memory_size)
+
+
+def build_all_employees_report(
+    period_name: str,
+    start_date: datetime,
+    end_date: datetime,
+    max_memory_size: int
+) -> Optional[ReportFile]:
+    """
+    Сформировать общий отчет по всем сотрудникам в процессе-исполнителе
+
+    Returns:
+        Готовый отчет или None, если за период нет данных
+    """
+    from report_generator import ReportGenerator
+
+    buffer, stats = ReportGenerator.stream_all_employees_report(
+        _worker_db, period_name, start_date, end_date, max_memory_size=max_memory_size
+    )
+    return _report_file(buffer, stats, ReportGenerator.report_filename(ALL_EMPLOYEES_NAME), max_memory_size)
+
+
+def _report_file(
+    buffer: Optional[BinaryIO],
+    stats: Dict,
+    filename: str,
+    max_memory_size: int
+) -> Optional[ReportFile]:
+    """Передать книгу из буфера в памяти или, если она больше порога, через временный файл"""
+    if buffer is None:
+        return None
+
+    with buffer:
+        size = buffer.seek(0, io.SEEK_END)
+        buffer.seek(0)
+        if size <= max_memory_size:
+            return ReportFile(filename, stats, buffer.read(), None)
+
+        fd, path = tempfile.mkstemp(prefix='report_', suffix='.xlsx')
+        with os.fdopen(fd, 'wb') as file:
+            shutil.copyfileobj(buffer, file)
+        return ReportFile(filename, stats, None, path)
+
+
+def discard_report_file(result: Optional[ReportFile]) -> None:
+    """Удалить временный файл отчета, если книга не поместилась в память"""
+    if result is not None and result.path and os.path.exists(result.path):
+        os.remove(result.path)
+
+
+class ReportJob:
+    """Задача формирования отчета"""
+
+    def __init__(self, job_id: int, user_id: int, name: str = ''):
+        self.id = job_id
+        self.user_id = user_id
+        self.name = name
+        self.state = QUEUED
+        self.created_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def done(self) -> bool:
+        """Задача завершена (успешно, с ошибкой или отменена)"""
+        return self._task is not None and self._task.done()
+
+    def elapsed(self) -> float:
+        """Секунд с момента постановки в очередь"""
+        return (self.finished_at or time.monotonic()) - self.created_at
+
+    async def wait(self) -> Any:
+        """
+        Дождаться результата задачи
+
+        Returns:
+            Результат функции задачи или None, если задача отменена
+
+        Raises:
+            Исключение, с которым завершилась функция задачи
+        """
+        try:
+            return await asyncio.shield(self._task)
+        except asyncio.CancelledError:
+            if self._task.cancelled():
+                return None
+            raise
+
+
+class ReportJobQueue:
+    """
+    Ограниченная очередь задач поверх ProcessPoolExecutor
+
+    Задачи ждут свободного процесса в цикле событий, поэтому ожидающую
+    задачу можно отменить в любой момент. Уже запущенную в процессе задачу
+    прервать нельзя: ее результат отбрасывается и передается в cleanup.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_workers: int = DEFAULT_WORKERS,
+        per_user_limit: int = DEFAULT_PER_USER_LIMIT,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        cleanup: Optional[Callable[[Any], None]] = None,
+        metrics=None
+    ):
+        """
+        Args:
+            db_path: Путь к БД для процессов-исполнителей
+            max_workers: Количество процессов
+            per_user_limit: Активных (ожидающих и выполняемых) задач на пользователя
+            max_queued: Максимум задач, ожидающих свободного процесса
+            cleanup: Вызывается с результатом задачи, отмененной во время выполнения
+            metrics: Реестр метрик (metrics.Metrics) для времени ожидания и формирования
+        """
+        if max_workers < 1:
+            raise ValueError("Нужен хотя бы один процесс для отчетов")
+
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.per_user_limit = per_user_limit
+        self.max_queued = max_queued
+        self.cleanup = cleanup
+        self.metrics = metrics
+
+        self._pool = self._create_pool()
+        self._slots = asyncio.Semaphore(max_workers)
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, ReportJob] = {}
+        self._by_user: Dict[int, Set[int]] = {}
+        self._counters = {
+            'submitted': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'rejected': 0
+        }
+        self._max_queue_depth = 0
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        """Создать пул процессов (spawn: родитель держит потоки БД)"""
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.db_path,)
+        )
+
+    def _queued(self) -> List[ReportJob]:
+        """Задачи, ожидающие процесса, в порядке постановки"""
+        return [job for job in self._jobs.values() if job.state == QUEUED]
+
+    def submit(self, user_id: int, func: Callable, *args) -> ReportJob:
+        """
+        Поставить задачу в очередь
+
+        Args:
+            user_id: Telegram ID пользователя, запросившего отчет
+            func: Функция уровня модуля (выполняется в другом процессе)
+            *args: Аргументы функции (должны сериализоваться pickle)
+
+        Raises:
+            ReportJobLimitError: У пользователя уже per_user_limit активных задач
+            ReportQueueFullError: В очереди уже max_queued задач
+        """
+        if len(self._by_user.get(user_id, ())) >= self.per_user_limit:
+            self._counters['rejected'] += 1
+            raise ReportJobLimitError(f"У пользователя {user_id} уже есть активный отчет")
+
+        queued = len(self._queued())
+        if queued >= self.max_queued:
+            self._counters['rejected'] += 1
+            raise ReportQueueFullError(f"В очереди отчетов уже {queued} задач")
+
+        job = ReportJob(next(self._ids), user_id, getattr(func, '__name__', ''))
+        self._jobs[job.id] = job
+        self._by_user.setdefault(user_id, set()).add(job.id)
+        self._counters['submitted'] += 1
+        job._task = asyncio.create_task(self._run(job, func, args))
+        job._task.add_done_callback(partial(self._finish, job))
+
+        self._max_queue_depth = max(self._max_queue_depth, queued + 1)
+        logger.info(
+            f"Отчет #{job.id} пользователя {user_id} поставлен в очередь "
+            f"(ожидают: {queued + 1}, выполняются: {self.running_count()})"
+        )
+        return job
+
+    async def _run(self, job: ReportJob, func: Callable, args: tuple) -> Any:
+        """Дождаться свободного процесса и выполнить задачу"""
+        async with self._slots:
+            job.state = RUNNING
+            job.started_at = time.monotonic()
+            future = self._pool.submit(func, *args)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # Процесс не прервать: результат отбрасываем по готовности
+                future.add_done_callback(self._discard)
+                raise
+            except BrokenProcessPool:
+                logger.error("Пул процессов отчетов сломан, создаю новый")
+                self._pool = self._create_pool()
+                raise
+
+    def _finish(self, job: ReportJob, task: asyncio.Task) -> None:
+        """Учесть завершение задачи (в том числе отмененной до запуска)"""
+        job.finished_at = time.monotonic()
+        self._jobs.pop(job.id, None)
+        user_jobs = self._by_user.get(job.user_id)
+        if user_jobs is not None:
+            user_jobs.discard(job.id)
+            if not user_jobs:
+                del self._by_user[job.user_id]
+
+        if task.cancelled():
+            job.state = CANCELLED
+            self._counters['cancelled'] += 1
+            logger.info(f"Отчет #{job.id} отменен")
+        elif task.exception() is not None:
+            job.state = FAILED
+            self._counters['failed'] += 1
+            logger.error(f"Ошибка при формировании отчета #{job.id}: {task.exception()}")
+        else:
+            job.state = DONE
+            self._counters['completed'] += 1
+            logger.info(f"Отчет #{job.id} готов за {job.elapsed():.1f} с")
+        self._observe(job)
+
+    def _observe(self, job: ReportJob) -> None:
+        """Учесть время ожидания и формирования завершенной задачи в метриках"""
+        if self.metrics is None:
+            return
+        started_at = job.started_at or job.finished_at
+        self.metrics.observe('report_queue_seconds', started_at - job.created_at, report=job.name)
+        if job.started_at is not None:
+            self.metrics.observe(
+                'report_seconds', job.finished_at - job.started_at, report=job.name, state=job.state
+            )
+
+    def _discard(self, future: Future) -> None:
+        """Передать результат отмененной задачи в cleanup"""
+        if self.cleanup is None or future.cancelled() or future.exception() is not None:
+            return
+        try:
+            self.cleanup(future.result())
+        except Exception as e:
+            logger.error(f"Ошибка при очистке результата отмененного отчета: {e}")
+
+    def cancel(self, job_id: int, user_id: Optional[int] = None) -> bool:
+        """
+        Отменить задачу
+
+        Args:
+            job_id: ID задачи
+            user_id: Если указан, отменить только задачу этого пользователя
+
+        Returns:
+            True, если задача была активна и отменена
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.done() or (user_id is not None and job.user_id != user_id):
+            return False
+        return job._task.cancel()
+
+    def position(self, job: ReportJob) -> int:
+        """Позиция задачи в очереди ожидания (1 - следующая), 0 - не ожидает"""
+        for index, queued in enumerate(self._queued(), 1):
+            if queued is job:
+                return index
+        return 0
+
+    def running_count(self) -> int:
+        """Количество выполняемых задач"""
+        return sum(1 for job in self._jobs.values() if job.state == RUNNING)
+
+    def stats(self) -> Dict[str, int]:
+        """Глубина очереди и счетчики задач"""
+        return {
+            'queued': len(self._queued()),
+            'running': self.running_count(),
+            'max_queue_depth': self._max_queue_depth,
+            'users': len(self._by_user),
+            **self._counters
+        }
+
+    def shutdown(self) -> None:
+        """Отменить ожидающие задачи и остановить процессы"""
+        for job in list(self._jobs.values()):
+            if job._task is not None:
+                job._task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
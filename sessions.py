@@ -0,0 +1,151 @@
+"""
+Очистка брошенных диалогов
+
+Монтажники часто бросают оформление подключения на середине, и в
+context.user_data остаются списки фото и черновик подключения. Диалоги
+завершаются по conversation_timeout, а SessionSweeper периодически
+удаляет user_data/chat_data пользователей и чатов, которые давно не
+присылали обновлений, и публикует число живых диалогов и объем их данных.
+"""
+import sys
+import time
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable
+import logging
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, ConversationHandler
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию (секунды)
+DEFAULT_TTL = 2 * 60 * 60
+DEFAULT_SWEEP_INTERVAL = 10 * 60
+
+
+def deep_sizeof(value: Any) -> int:
+    """Приблизительный объем значения в памяти вместе с вложенными контейнерами"""
+    seen = set()
+    stack = [value]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, Mapping):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, '__slots__'):
+            stack.extend(getattr(item, name, None) for name in item.__slots__)
+    return size
+
+
+class SessionSweeper:
+    """
+    Вытеснение user_data и chat_data по времени последней активности
+
+    Время активности отмечает touch (TypeHandler в группе -1, до остальных
+    обработчиков). Пользователи, данные которых восстановлены из БД после
+    перезапуска, считаются активными в момент создания SessionSweeper.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        conversations: Iterable[ConversationHandler] = (),
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            ttl: Сколько секунд без активности хранить данные
+            conversations: Диалоги, живые сессии которых учитываются в статистике
+            clock: Источник времени в секундах
+        """
+        if ttl <= 0:
+            raise ValueError("ttl должен быть больше нуля")
+
+        self.ttl = ttl
+        self.conversations = list(conversations)
+        self._clock = clock
+        self._started = clock()
+        self._user_seen: Dict[int, float] = {}
+        self._chat_seen: Dict[int, float] = {}
+        self._stats = {'evicted_users': 0, 'evicted_chats': 0, 'sweeps': 0}
+        self._last = {'users': 0, 'chats': 0, 'conversations': 0, 'bytes': 0}
+
+    async def touch(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Отметить активность пользователя и чата обновления"""
+        if not isinstance(update, Update):
+            return
+        now = self._clock()
+        if update.effective_user:
+            self._user_seen[update.effective_user.id] = now
+        if update.effective_chat:
+            self._chat_seen[update.effective_chat.id] = now
+
+    def _expired(self, seen: Dict[int, float], key: int, deadline: float) -> bool:
+        """Данные не обновлялись дольше ttl"""
+        return seen.get(key, self._started) < deadline
+
+    def sweep(self, application: Application) -> Dict[str, int]:
+        """
+        Удалить данные неактивных пользователей и чатов
+
+        Удаление идет через Application.drop_user_data/drop_chat_data,
+        поэтому записи удаляются и из persistence.
+
+        Returns:
+            Статистика после очистки (см. stats)
+        """
+        deadline = self._clock() - self.ttl
+
+        users = [uid for uid in application.user_data if self._expired(self._user_seen, uid, deadline)]
+        for user_id in users:
+            application.drop_user_data(user_id)
+            self._user_seen.pop(user_id, None)
+
+        chats = [cid for cid in application.chat_data if self._expired(self._chat_seen, cid, deadline)]
+        for chat_id in chats:
+            application.drop_chat_data(chat_id)
+            self._chat_seen.pop(chat_id, None)
+
+        # Отметки активности без данных не нужны после истечения ttl
+        for seen in (self._user_seen, self._chat_seen):
+            for key in [key for key, last in seen.items() if last < deadline]:
+                del seen[key]
+
+        self._stats['evicted_users'] += len(users)
+        self._stats['evicted_chats'] += len(chats)
+        self._stats['sweeps'] += 1
+        self._last = {
+            'users': len(application.user_data),
+            'chats': len(application.chat_data),
+            'conversations': sum(len(conv.timeout_jobs) for conv in self.conversations),
+            'bytes': deep_sizeof(application.user_data) + deep_sizeof(application.chat_data)
+        }
+
+        stats = self.stats()
+        logger.info(
+            f"Сессии: диалогов {stats['conversations']}, user_data {stats['users']}, "
+            f"chat_data {stats['chats']}, ~{stats['bytes'] // 1024} КБ; "
+            f"удалено пользователей {len(users)}, чатов {len(chats)}"
+        )
+        return stats
+
+    async def sweep_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Задача JobQueue для периодической очистки"""
+        self.sweep(context.application)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Живые сессии на момент последней очистки и счетчики
+
+        conversations - диалогов с активным таймаутом, users/chats - записей
+        user_data/chat_data, bytes - их примерный объем в памяти.
+        """
+        return dict(self._last, tracked=len(self._user_seen) + len(self._chat_seen), **self._stats)
+
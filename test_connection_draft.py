@@ -0,0 +1,141 @@
+"""
+Тесты для черновика подключения (handlers/connection/draft.py)
+"""
+import json
+import unittest
+from types import SimpleNamespace
+
+from telegram.ext import ConversationHandler
+
+from handlers.connection.confirmation import confirm_connection, show_confirmation
+from handlers.connection.draft import ConnectionDraft, find_draft
+from persistence import decode, encode
+from sessions import deep_sizeof
+
+
+class TestConnectionDraft(unittest.TestCase):
+    """Тесты хранения черновика в user_data"""
+
+    def _draft(self) -> ConnectionDraft:
+        """Заполненный черновик"""
+        return ConnectionDraft(
+            connection_type='private',
+            photos=['p1', 'p2'],
+            address='ул. Ленина, 1',
+            router_model='TP-Link',
+            router_quantity=2,
+            fiber_meters=10.5,
+            employee_ids=[3, 4],
+            material_payer_id=3
+        )
+
+    def test_roundtrip(self):
+        """Черновик восстанавливается из user_data со всеми полями"""
+        draft = self._draft()
+
+        restored = decode(encode({'connection_draft': draft, 'report_employee_id': 1}))
+
+        self.assertEqual(restored, {'connection_draft': draft, 'report_employee_id': 1})
+        self.assertTrue(restored['connection_draft'].has_router)
+
+    def test_compact_record(self):
+        """Черновик сохраняется списком значений без имен полей"""
+        encoded = encode(self._draft())
+
+        self.assertEqual(json.loads(encoded)['$cd'][0], ConnectionDraft.VERSION)
+        self.assertNotIn('address', encoded)
+
+    def test_older_record_gets_defaults(self):
+        """Поля, добавленные позже записи, получают значения по умолчанию"""
+        restored = decode('{"$cd":[1,"mkd",["p1"],17]}')
+
+        self.assertEqual(restored.photos, ['p1'])
+        self.assertEqual(restored.upload_message_id, 17)
+        self.assertEqual((restored.address, restored.router_quantity, restored.employee_ids), ('', 1, []))
+        self.assertFalse(restored.has_router)
+
+    def test_newer_version_rejected(self):
+        """Запись более новой версии не восстанавливается молча"""
+        with self.assertRaises(ValueError):
+            decode(json.dumps({'$cd': [ConnectionDraft.VERSION + 1, 'mkd']}))
+
+    def test_slots(self):
+        """Черновик без __dict__, объем учитывает значения полей"""
+        draft = self._draft()
+
+        self.assertFalse(hasattr(draft, '__dict__'))
+        self.assertGreater(deep_sizeof(draft), deep_sizeof(ConnectionDraft()))
+
+
+class FakeQuery:
+    """Нажатие кнопки: запоминает ответы бота"""
+
+    def __init__(self, data: str):
+        self.data = data
+        self.texts = []
+        self.message = SimpleNamespace(reply_text=self._reply)
+
+    async def answer(self):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.texts.append(text)
+
+    async def _reply(self, text, **kwargs):
+        self.texts.append(text)
+
+
+class FakeDatabase:
+    """БД, в которую подтверждение не должно ничего писать"""
+
+    def __init__(self):
+        self.created = []
+
+    async def create_connection(self, **kwargs):
+        self.created.append(kwargs)
+        return 1
+
+    async def get_all_employees(self):
+        return []
+
+
+class TestConfirmationWithoutDraft(unittest.IsolatedAsyncioTestCase):
+    """Подтверждение без заполненного черновика"""
+
+    def setUp(self):
+        self.db = FakeDatabase()
+        self.query = FakeQuery('confirm_yes')
+        self.update = SimpleNamespace(callback_query=self.query, effective_user=SimpleNamespace(id=7))
+
+    def _context(self, user_data: dict):
+        return SimpleNamespace(user_data=user_data, bot_data={'db': self.db})
+
+    async def test_missing_draft_not_saved(self):
+        """Черновик потерян (очистка сессий): подключение не создается, диалог завершается"""
+        context = self._context({})
+
+        state = await confirm_connection(self.update, context)
+
+        self.assertEqual(state, ConversationHandler.END)
+        self.assertEqual(self.db.created, [])
+        self.assertIn("Начните заново", self.query.texts[0])
+        self.assertIsNone(find_draft(context))
+
+    async def test_incomplete_draft_not_saved(self):
+        """Черновик без исполнителей не сохраняется"""
+        context = self._context({'connection_draft': ConnectionDraft(address='ул. Ленина, 1')})
+
+        self.assertEqual(await confirm_connection(self.update, context), ConversationHandler.END)
+        self.assertEqual(self.db.created, [])
+        self.assertEqual(context.user_data, {})
+
+    async def test_show_confirmation_without_employees(self):
+        """Экран подтверждения без исполнителей завершает диалог, а не делит на ноль"""
+        context = self._context({'connection_draft': ConnectionDraft(address='ул. Ленина, 1')})
+
+        self.assertEqual(await show_confirmation(self.update, context, self.db), ConversationHandler.END)
+        self.assertIn("Начните заново", self.query.texts[0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
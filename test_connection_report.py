@@ -0,0 +1,137 @@
+"""
+Тесты для отчетов о подключении в каналах (utils/helpers.py)
+"""
+import os
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from telegram import Chat, Message
+
+from database import AsyncDatabase, Database
+from utils import helpers
+from utils.helpers import deliver_connection_report, publish_connection_report, report_channels
+
+
+class FakeOutbound:
+    """Очередь исходящих: только БД и пробуждение диспетчера"""
+
+    def __init__(self, db):
+        self.db = db
+        self.woken = 0
+
+    def wake(self):
+        self.woken += 1
+
+
+class FakeBot:
+    """Запоминает отправки в каналы"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def copy_messages(self, chat_id, from_chat_id, message_ids):
+        self.calls.append(('copy_messages', chat_id, from_chat_id, list(message_ids)))
+
+    async def send_media_group(self, chat_id, media):
+        self.calls.append(('send_media_group', chat_id, [item.media for item in media], media[0].caption))
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.calls.append(('send_message', chat_id, text))
+
+
+def _album(chat_id: int, count: int) -> list:
+    """Сообщения альбома, уже отправленные пользователю"""
+    chat = Chat(id=chat_id, type=Chat.PRIVATE)
+    return [Message(message_id=10 + i, date=datetime.now(), chat=chat) for i in range(count)]
+
+
+@patch.object(helpers, 'REPORTS_CHANNELS_BY_TYPE', {'mkd': [-2, -1], 'chs': [-3]})
+@patch.object(helpers, 'REPORTS_CHANNEL_IDS', [-1])
+class TestReportChannels(unittest.TestCase):
+    """Тесты выбора каналов"""
+
+    def test_report_channels(self):
+        """Общие каналы и каналы типа объединяются без повторов"""
+        self.assertEqual(report_channels('mkd'), [-1, -2])
+        self.assertEqual(report_channels('chs'), [-1, -3])
+        self.assertEqual(report_channels('legal'), [-1])
+
+
+class TestConnectionReportDelivery(unittest.IsolatedAsyncioTestCase):
+    """Тесты отчета в каналы через outbox"""
+
+    def setUp(self):
+        self.test_db_path = "test_connection_report.db"
+        self.db = AsyncDatabase(Database(self.test_db_path), reader_threads=1)
+        self.outbound = FakeOutbound(self.db)
+
+    def tearDown(self):
+        self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+
+    async def _create_connection(self, photos) -> int:
+        emp_id = await self.db.add_employee("Монтажник Иван")
+        await self.db.add_material_to_employee(emp_id, fiber_meters=100, twisted_pair_meters=100)
+        return await self.db.create_connection(
+            connection_type='mkd', address="ул. Каналов, д. 1", router_model="-", port="1",
+            fiber_meters=10, twisted_pair_meters=5, employee_ids=[emp_id],
+            photo_file_ids=photos, created_by=1, material_payer_id=emp_id,
+            report_chat_ids=[-1, -2]
+        )
+
+    async def test_published_report_copies_user_messages(self):
+        """Отчеты в каналы получают ID сообщений пользователя и копируются одним вызовом"""
+        connection_id = await self._create_connection(["p1", "p2", "p3"])
+
+        released = await publish_connection_report(self.outbound, connection_id, _album(42, 3))
+        claimed = await self.db.claim_due_outbox(10)
+
+        self.assertEqual(released, 2)
+        self.assertEqual(self.outbound.woken, 1)
+        self.assertEqual([row['chat_id'] for row in claimed], [-1, -2])
+
+        bot = FakeBot()
+        for row in claimed:
+            await deliver_connection_report(bot, self.db, row['chat_id'], row['payload'])
+
+        self.assertEqual(bot.calls, [
+            ('copy_messages', -1, 42, [10, 11, 12]),
+            ('copy_messages', -2, 42, [10, 11, 12])
+        ])
+
+    async def test_report_rebuilt_without_user_messages(self):
+        """Без сообщений пользователя отчет собирается из БД по file_id фотографий"""
+        connection_id = await self._create_connection(["p1", "p2"])
+
+        await publish_connection_report(self.outbound, connection_id, [])
+        row = (await self.db.claim_due_outbox(1))[0]
+
+        bot = FakeBot()
+        await deliver_connection_report(bot, self.db, row['chat_id'], row['payload'])
+
+        method, chat_id, photos, caption = bot.calls[0]
+        self.assertEqual((method, chat_id, photos), ('send_media_group', -1, ["p1", "p2"]))
+        self.assertIn(f"#{connection_id}", caption)
+        self.assertIn("ул. Каналов, д. 1", caption)
+        self.assertIn("Монтажник Иван", caption)
+
+    async def test_report_without_photos(self):
+        """Отчет без фотографий отправляется текстом"""
+        connection_id = await self._create_connection([])
+
+        bot = FakeBot()
+        await deliver_connection_report(bot, self.db, -1, {'connection_id': connection_id})
+
+        self.assertEqual(bot.calls[0][0], 'send_message')
+
+    async def test_deleted_connection(self):
+        """Отчет по несуществующему подключению не отправляется"""
+        with self.assertRaises(LookupError):
+            await deliver_connection_report(FakeBot(), self.db, -1, {'connection_id': 999})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
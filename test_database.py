@@ -1,9 +1,17 @@
 """
 Тесты для модуля database.py
 """
+import asyncio
 import unittest
 import os
-from database import Database
+import sqlite3
+import threading
+from database import Database, AsyncDatabase, SchemaVersionError, EmployeeRow
+from database.connection_pool import ConnectionPool
+from database.migrations import LATEST_VERSION
+from database.query_plan import collect_query_plans, find_full_scans
+from database.profiler import QueryProfiler, fingerprint
+from database import cache
 
 
 class TestDatabase(unittest.TestCase):
@@ -16,6 +24,7 @@ class TestDatabase(unittest.TestCase):
     
     def tearDown(self):
         """Очистка после тестов - удаление тестовой БД"""
+        self.db.close()
         if os.path.exists(self.test_db_path):
             os.remove(self.test_db_path)
     
@@ -45,7 +54,7 @@ class TestDatabase(unittest.TestCase):
         
         employees = self.db.get_all_employees()
         self.assertEqual(len(employees), 3)
-        self.assertTrue(all(isinstance(emp, dict) for emp in employees))
+        self.assertTrue(all(isinstance(emp, EmployeeRow) for emp in employees))
     
     def test_get_employee_by_id(self):
         """Тест получения сотрудника по ID"""
@@ -53,8 +62,8 @@ class TestDatabase(unittest.TestCase):
         employee = self.db.get_employee_by_id(emp_id)
         
         self.assertIsNotNone(employee)
-        self.assertEqual(employee['full_name'], "Тестовый Сотрудник")
-        self.assertEqual(employee['id'], emp_id)
+        self.assertEqual(employee.full_name, "Тестовый Сотрудник")
+        self.assertEqual(employee.id, emp_id)
     
     def test_get_nonexistent_employee(self):
         """Тест получения несуществующего сотрудника"""
@@ -77,16 +86,60 @@ class TestDatabase(unittest.TestCase):
         result = self.db.delete_employee(99999)
         self.assertFalse(result)
     
+    def _add_stocked_employee(self, full_name):
+        """Добавить сотрудника с запасом материалов для подключений"""
+        emp_id = self.db.add_employee(full_name)
+        self.db.add_material_to_employee(emp_id, fiber_meters=1000, twisted_pair_meters=1000)
+        return emp_id
+    
+    def test_get_employees_with_routers(self):
+        """Сотрудники с балансами и роутерами по моделям одним запросом"""
+        emp1 = self.db.add_employee("Борисов")
+        self.db.add_employee("Андреев")
+        self.db.add_material_to_employee(emp1, fiber_meters=50)
+        self.db.add_router_to_employee(emp1, "Keenetic", 2)
+        self.db.add_router_to_employee(emp1, "TP-Link", 1)
+        
+        employees = self.db.get_employees_with_routers()
+        
+        self.assertEqual([e.full_name for e in employees], ["Андреев", "Борисов"])
+        self.assertEqual(employees[0].routers, ())
+        self.assertEqual(employees[0].router_count, 0)
+        self.assertEqual(employees[1].fiber_balance, 50)
+        self.assertEqual(employees[1].router_count, 3)
+        self.assertEqual(employees[1].routers, (("Keenetic", 2), ("TP-Link", 1)))
+        self.assertEqual(employees[1].routers[0].router_name, "Keenetic")
+    
+    def test_cache_hits_and_invalidation(self):
+        """Повторные чтения берутся из кэша, изменения сбрасывают его"""
+        emp_id = self.db.add_employee("Кэшев")
+        
+        self.db.get_all_employees()
+        self.db.get_all_employees()
+        self.assertEqual(self.db.cache_stats()['hits'], 1)
+        
+        self.db.add_material_to_employee(emp_id, fiber_meters=25)
+        self.assertEqual(self.db.get_all_employees()[0].fiber_balance, 25)
+        self.assertEqual(self.db.get_employee_balance(emp_id), (25, 0))
+        
+        self.assertEqual(self.db.get_all_router_names(), [])
+        self.db.add_router_to_employee(emp_id, "Keenetic", 1)
+        self.assertEqual(self.db.get_all_router_names(), ["Keenetic"])
+        
+        self.db.add_employee("Новиков")
+        self.assertEqual(len(self.db.get_all_employees()), 2)
+    
     # ==================== ТЕСТЫ ПОДКЛЮЧЕНИЙ ====================
     
     def test_create_connection(self):
         """Тест создания подключения"""
         # Добавляем сотрудников
-        emp1 = self.db.add_employee("Монтажник 1")
-        emp2 = self.db.add_employee("Монтажник 2")
+        emp1 = self._add_stocked_employee("Монтажник 1")
+        emp2 = self._add_stocked_employee("Монтажник 2")
         
         # Создаем подключение
         conn_id = self.db.create_connection(
+            connection_type="mkd",
             address="ул. Тестовая, д. 1",
             router_model="Test Router",
             port="8",
@@ -103,10 +156,11 @@ class TestDatabase(unittest.TestCase):
     def test_get_connection_by_id(self):
         """Тест получения подключения по ID"""
         # Подготовка данных
-        emp1 = self.db.add_employee("Монтажник А")
-        emp2 = self.db.add_employee("Монтажник Б")
+        emp1 = self._add_stocked_employee("Монтажник А")
+        emp2 = self._add_stocked_employee("Монтажник Б")
         
         conn_id = self.db.create_connection(
+            connection_type="mkd",
             address="ул. Ленина, д. 10",
             router_model="Keenetic",
             port="5",
@@ -121,17 +175,171 @@ class TestDatabase(unittest.TestCase):
         connection = self.db.get_connection_by_id(conn_id)
         
         self.assertIsNotNone(connection)
-        self.assertEqual(connection['address'], "ул. Ленина, д. 10")
-        self.assertEqual(connection['router_model'], "Keenetic")
-        self.assertEqual(connection['fiber_meters'], 150.0)
-        self.assertEqual(len(connection['employees']), 2)
-        self.assertEqual(len(connection['photos']), 3)
+        self.assertEqual(connection.address, "ул. Ленина, д. 10")
+        self.assertEqual(connection.router_model, "Keenetic")
+        self.assertEqual(connection.fiber_meters, 150.0)
+        self.assertEqual(len(connection.employees), 2)
+        self.assertEqual(len(connection.photos), 3)
+    
+    def test_create_connection_is_atomic(self):
+        """При нехватке материалов подключение не создается и ничего не списывается"""
+        payer = self._add_stocked_employee("Плательщик")
+        poor = self.db.add_employee("Без материалов")
+        self.db.add_router_to_employee(payer, "Keenetic", 1)
+        
+        conn_id = self.db.create_connection(
+            connection_type="mkd",
+            address="ул. Тестовая, д. 2",
+            router_model="Keenetic",
+            port="1",
+            fiber_meters=100.0,
+            twisted_pair_meters=20.0,
+            employee_ids=[payer, poor],
+            photo_file_ids=["photo1"],
+            created_by=123456789,
+            material_payer_id=poor,
+            router_payer_id=payer
+        )
+        
+        self.assertIsNone(conn_id)
+        self.assertEqual(self.db.get_all_connections_count(), 0)
+        self.assertEqual(self.db.get_router_quantity(payer, "Keenetic"), 1)
+        self.assertEqual(self.db.get_employee_balance(payer), (1000, 1000))
+    
+    def test_create_connection_deducts_router(self):
+        """Роутер списывается вместе с созданием подключения"""
+        payer = self._add_stocked_employee("Монтажник")
+        self.db.add_router_to_employee(payer, "Keenetic", 3)
+        
+        conn_id = self.db.create_connection(
+            connection_type="mkd",
+            address="ул. Тестовая, д. 3",
+            router_model="Keenetic",
+            port="1",
+            fiber_meters=100.0,
+            twisted_pair_meters=20.0,
+            employee_ids=[payer],
+            photo_file_ids=[],
+            created_by=123456789,
+            material_payer_id=payer,
+            router_quantity=2,
+            router_payer_id=payer
+        )
+        
+        self.assertIsNotNone(conn_id)
+        self.assertEqual(self.db.get_router_quantity(payer, "Keenetic"), 1)
+        self.assertEqual(self.db.get_employee_balance(payer), (900, 980))
+    
+    def test_stock_change_rolled_back_without_movement_log(self):
+        """Если запись в журнал движений не удалась, остатки не меняются"""
+        payer = self._add_stocked_employee("Монтажник")
+        self.db.add_router_to_employee(payer, "Keenetic", 1)
+        with self.db.transaction() as conn:
+            conn.execute("""
+                CREATE TRIGGER fail_movement_log BEFORE INSERT ON material_movement_log
+                BEGIN SELECT RAISE(ABORT, 'журнал недоступен'); END
+            """)
+        
+        self.assertFalse(self.db.add_material_to_employee(payer, fiber_meters=10))
+        self.assertFalse(self.db.add_router_to_employee(payer, "Keenetic", 1))
+        conn_id = self.db.create_connection(
+            connection_type="mkd",
+            address="ул. Тестовая, д. 5",
+            router_model="Keenetic",
+            port="1",
+            fiber_meters=100.0,
+            twisted_pair_meters=20.0,
+            employee_ids=[payer],
+            photo_file_ids=[],
+            created_by=123456789,
+            material_payer_id=payer,
+            router_payer_id=payer
+        )
+        
+        self.assertIsNone(conn_id)
+        self.assertEqual(self.db.get_all_connections_count(), 0)
+        self.assertEqual(self.db.get_employee_balance(payer), (1000, 1000))
+        self.assertEqual(self.db.get_router_quantity(payer, "Keenetic"), 1)
+    
+    def _create_reported_connection(self, payer: int, material_payer_id: int) -> int:
+        """Подключение с отчетами в два канала"""
+        return self.db.create_connection(
+            connection_type="mkd",
+            address="ул. Тестовая, д. 4",
+            router_model="-",
+            port="1",
+            fiber_meters=100.0,
+            twisted_pair_meters=20.0,
+            employee_ids=[payer],
+            photo_file_ids=["photo1"],
+            created_by=123456789,
+            material_payer_id=material_payer_id,
+            report_chat_ids=[-1001, -1002]
+        )
+    
+    def test_create_connection_queues_channel_reports(self):
+        """Отчеты в каналы сохраняются вместе с подключением и ждут привязки сообщений"""
+        payer = self._add_stocked_employee("Монтажник")
+        
+        conn_id = self._create_reported_connection(payer, payer)
+        deliveries = self.db.get_connection_deliveries(conn_id)
+        
+        self.assertEqual([d['chat_id'] for d in deliveries], [-1001, -1002])
+        self.assertEqual({d['status'] for d in deliveries}, {'pending'})
+        self.assertEqual(self.db.claim_due_outbox(10), [])
+        
+        released = self.db.release_connection_reports(conn_id, {'from_chat_id': 42, 'message_ids': [7, 8]})
+        claimed = self.db.claim_due_outbox(10)
+        
+        self.assertEqual(released, 2)
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(claimed[0]['payload'], {'from_chat_id': 42, 'message_ids': [7, 8], 'connection_id': conn_id})
+        self.assertEqual(self.db.get_outbox_status_counts(), {'sending': 2})
+    
+    def test_channel_reports_rolled_back_with_connection(self):
+        """Если подключение не создано, отчеты в каналы не ставятся"""
+        payer = self._add_stocked_employee("Монтажник")
+        poor = self.db.add_employee("Без материалов")
+        
+        conn_id = self._create_reported_connection(payer, poor)
+        
+        self.assertIsNone(conn_id)
+        self.assertEqual(self.db.get_outbox_status_counts(), {})
+    
+    def test_outbox_idempotency_key(self):
+        """Сообщение с тем же ключом ставится в очередь один раз"""
+        first = self.db.add_outbox_message(-1001, 'send_message', {'text': 'a'}, 'report:1')
+        second = self.db.add_outbox_message(-1001, 'send_message', {'text': 'a'}, 'report:1')
+        other = self.db.add_outbox_message(-1001, 'send_message', {'text': 'b'})
+        
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(self.db.get_outbox_status_counts(), {'pending': 2})
+    
+    def test_outbox_updates_report_missing_message(self):
+        """Обновление несуществующего сообщения очереди не считается успешным"""
+        message_id = self.db.add_outbox_message(-1001, 'send_message', {'text': 'a'})
+        
+        self.assertTrue(self.db.reschedule_outbox(message_id, 1, 5, "Timed out"))
+        self.assertTrue(self.db.mark_outbox_sent(message_id))
+        self.assertFalse(self.db.mark_outbox_sent(message_id + 1))
+        self.assertFalse(self.db.reschedule_outbox(message_id + 1, 1, 5, "Timed out"))
+        self.assertFalse(self.db.mark_outbox_failed(message_id + 1, 1, "Forbidden"))
+        self.assertEqual(self.db.get_outbox_status_counts(), {'sent': 1})
+    
+    def test_interrupted_sends_released(self):
+        """Сообщения, взятые в отправку до остановки, возвращаются в очередь"""
+        self.db.add_outbox_message(-1001, 'send_message', {'text': 'a'})
+        self.db.claim_due_outbox(10)
+        
+        self.assertEqual(self.db.release_outbox_claims(), 1)
+        self.assertEqual(len(self.db.claim_due_outbox(10)), 1)
     
     # ==================== ТЕСТЫ ОТЧЕТОВ ====================
     
     def test_get_employee_report_empty(self):
         """Тест получения отчета для сотрудника без подключений"""
-        emp_id = self.db.add_employee("Новый Сотрудник")
+        emp_id = self._add_stocked_employee("Новый Сотрудник")
         connections, stats = self.db.get_employee_report(emp_id)
         
         self.assertEqual(len(connections), 0)
@@ -141,9 +349,10 @@ class TestDatabase(unittest.TestCase):
     
     def test_get_employee_report_single(self):
         """Тест отчета с одним подключением (один исполнитель)"""
-        emp_id = self.db.add_employee("Единственный Исполнитель")
+        emp_id = self._add_stocked_employee("Единственный Исполнитель")
         
         conn_id = self.db.create_connection(
+            connection_type="mkd",
             address="ул. Мира, д. 5",
             router_model="TP-Link",
             port="3",
@@ -163,11 +372,12 @@ class TestDatabase(unittest.TestCase):
     
     def test_get_employee_report_shared(self):
         """Тест отчета с разделенным подключением (два исполнителя)"""
-        emp1 = self.db.add_employee("Исполнитель 1")
-        emp2 = self.db.add_employee("Исполнитель 2")
+        emp1 = self._add_stocked_employee("Исполнитель 1")
+        emp2 = self._add_stocked_employee("Исполнитель 2")
         
         # Создаем подключение с двумя исполнителями
         self.db.create_connection(
+            connection_type="mkd",
             address="ул. Пушкина, д. 3",
             router_model="Mikrotik",
             port="12",
@@ -185,13 +395,38 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(stats['total_fiber_meters'], 100.0)  # 200 / 2
         self.assertEqual(stats['total_twisted_pair_meters'], 15.0)  # 30 / 2
     
+    def test_get_employee_report_executors(self):
+        """В отчете у каждого подключения свой список исполнителей"""
+        emp1 = self._add_stocked_employee("Петров")
+        emp2 = self._add_stocked_employee("Алексеев")
+        
+        for address, employee_ids in (("Адрес 1", [emp1]), ("Адрес 2", [emp1, emp2])):
+            self.db.create_connection(
+                connection_type="mkd",
+                address=address,
+                router_model="Router",
+                port="1",
+                fiber_meters=10.0,
+                twisted_pair_meters=10.0,
+                employee_ids=employee_ids,
+                photo_file_ids=[],
+                created_by=123456789
+            )
+        
+        connections, _ = self.db.get_employee_report(emp1)
+        executors = {conn['address']: conn['all_employees'] for conn in connections}
+        
+        self.assertEqual(executors["Адрес 1"], ["Петров"])
+        self.assertEqual(executors["Адрес 2"], ["Алексеев", "Петров"])
+    
     def test_get_employee_report_multiple(self):
         """Тест отчета с несколькими подключениями"""
-        emp1 = self.db.add_employee("Многозадачный 1")
-        emp2 = self.db.add_employee("Многозадачный 2")
+        emp1 = self._add_stocked_employee("Многозадачный 1")
+        emp2 = self._add_stocked_employee("Многозадачный 2")
         
         # Первое подключение (один исполнитель)
         self.db.create_connection(
+            connection_type="mkd",
             address="Адрес 1",
             router_model="Router 1",
             port="1",
@@ -204,6 +439,7 @@ class TestDatabase(unittest.TestCase):
         
         # Второе подключение (два исполнителя)
         self.db.create_connection(
+            connection_type="mkd",
             address="Адрес 2",
             router_model="Router 2",
             port="2",
@@ -223,7 +459,7 @@ class TestDatabase(unittest.TestCase):
     
     def test_get_connections_count(self):
         """Тест подсчета общего количества подключений"""
-        emp_id = self.db.add_employee("Тестовый")
+        emp_id = self._add_stocked_employee("Тестовый")
         
         # Изначально 0
         count = self.db.get_all_connections_count()
@@ -232,6 +468,7 @@ class TestDatabase(unittest.TestCase):
         # Добавляем 3 подключения
         for i in range(3):
             self.db.create_connection(
+                connection_type="mkd",
                 address=f"Адрес {i}",
                 router_model="Router",
                 port=str(i),
@@ -244,6 +481,556 @@ class TestDatabase(unittest.TestCase):
         
         count = self.db.get_all_connections_count()
         self.assertEqual(count, 3)
+    
+    def test_employee_period_stats(self):
+        """Итоги за период из дневных итогов совпадают с отчетом, роутеры учитываются"""
+        from datetime import datetime, timedelta
+        
+        emp1 = self._add_stocked_employee("Итогов 1")
+        emp2 = self._add_stocked_employee("Итогов 2")
+        self.db.add_router_to_employee(emp1, "Keenetic", 3)
+        for employee_ids in ([emp1], [emp1, emp2], [emp1, emp2]):
+            self.db.create_connection(
+                connection_type="mkd", address="Адрес", router_model="Keenetic", port="1",
+                fiber_meters=100.0, twisted_pair_meters=10.0, employee_ids=employee_ids,
+                photo_file_ids=[], created_by=123456789, material_payer_id=emp1,
+                router_payer_id=emp1
+            )
+        
+        now = datetime.now()
+        start, end = now - timedelta(days=1), now + timedelta(days=1)
+        _, report_stats = self.db.get_employee_report(emp1, start_date=start, end_date=end)
+        stats = self.db.get_employee_period_stats(emp1, start, end)
+        
+        self.assertEqual(stats['total_connections'], report_stats['total_connections'])
+        self.assertEqual(stats['total_fiber_meters'], report_stats['total_fiber_meters'])
+        self.assertEqual(stats['total_twisted_pair_meters'], 20.0)
+        self.assertEqual(stats['total_routers'], 3)
+        self.assertEqual(self.db.get_employee_period_stats(emp2, start, end)['total_routers'], 0)
+        self.assertEqual(
+            self.db.get_employee_period_stats(emp1, datetime(2000, 1, 1), datetime(2000, 12, 31))['total_connections'],
+            0
+        )
+    
+    def test_failed_connection_rolls_back_daily_stats(self):
+        """Откат создания подключения откатывает и дневные итоги"""
+        from datetime import datetime, timedelta
+        
+        emp_id = self.db.add_employee("Без Материалов")
+        connection_id = self.db.create_connection(
+            connection_type="mkd", address="Адрес", router_model="-", port="1",
+            fiber_meters=100.0, twisted_pair_meters=10.0, employee_ids=[emp_id],
+            photo_file_ids=[], created_by=123456789, material_payer_id=emp_id
+        )
+        
+        self.assertIsNone(connection_id)
+        now = datetime.now()
+        stats = self.db.get_employee_period_stats(emp_id, now - timedelta(days=1), now + timedelta(days=1))
+        self.assertEqual(stats['total_connections'], 0)
+    
+    def test_report_watermark(self):
+        """Версия данных отчета растет с новым подключением или движением сотрудника"""
+        emp_id = self._add_stocked_employee("Версионов")
+        other_id = self.db.add_employee("Посторонний")
+        
+        empty = self.db.get_report_watermark(other_id)
+        self.assertEqual(empty, (0, 0))
+        
+        before = self.db.get_report_watermark(emp_id)
+        self.db.add_material_to_employee(other_id, fiber_meters=10)
+        self.assertEqual(self.db.get_report_watermark(emp_id), before)
+        
+        self.db.add_material_to_employee(emp_id, fiber_meters=10)
+        after_movement = self.db.get_report_watermark(emp_id)
+        self.assertEqual(after_movement[0], before[0])
+        self.assertGreater(after_movement[1], before[1])
+        
+        connection_id = self.db.create_connection(
+            connection_type="mkd", address="Адрес", router_model="Router", port="1",
+            fiber_meters=10.0, twisted_pair_meters=1.0, employee_ids=[emp_id],
+            photo_file_ids=[], created_by=123456789
+        )
+        self.assertEqual(self.db.get_report_watermark(emp_id)[0], connection_id)
+
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Тесты для пула подключений"""
+    
+    def setUp(self):
+        self.test_db_path = "test_pool.db"
+        self.pool = ConnectionPool(self.test_db_path, max_size=2, timeout=0.1)
+    
+    def tearDown(self):
+        self.pool.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+    
+    def test_connection_reused(self):
+        """Подключение возвращается в пул и переиспользуется"""
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        
+        self.assertIs(first, second)
+        self.assertEqual(self.pool.size, 1)
+    
+    def test_nested_checkout_same_thread(self):
+        """Вложенный вход в том же потоке не занимает второй слот"""
+        with self.pool.connection() as outer:
+            with self.pool.connection() as inner:
+                self.assertIs(outer, inner)
+        
+        self.assertEqual(self.pool.size, 1)
+    
+    def test_pool_is_bounded(self):
+        """При исчерпании пула ожидание завершается ошибкой по таймауту"""
+        acquired = threading.Barrier(3)
+        release = threading.Event()
+        
+        def hold_connection():
+            with self.pool.connection():
+                acquired.wait(1)
+                release.wait(1)
+        
+        workers = [threading.Thread(target=hold_connection) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        acquired.wait(1)
+        
+        with self.assertRaises(TimeoutError):
+            with self.pool.connection():
+                pass
+        
+        release.set()
+        for worker in workers:
+            worker.join()
+    
+    def test_wal_enabled(self):
+        """Подключения открываются в режиме WAL"""
+        with self.pool.connection() as conn:
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        
+        self.assertEqual(mode, 'wal')
+    
+    def test_reader_not_blocked_by_writer(self):
+        """Чтение не ждет незавершенной транзакции записи"""
+        with self.pool.writer() as conn:
+            conn.execute("CREATE TABLE items (id INTEGER)")
+            conn.commit()
+        
+        writing = threading.Event()
+        release = threading.Event()
+        
+        def hold_write():
+            with self.pool.writer() as conn:
+                conn.execute("INSERT INTO items VALUES (1)")
+                writing.set()
+                release.wait(1)
+                conn.commit()
+        
+        worker = threading.Thread(target=hold_write)
+        worker.start()
+        writing.wait(1)
+        
+        with self.pool.connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        
+        release.set()
+        worker.join()
+        self.assertEqual(count, 0)
+    
+    def test_uncommitted_changes_rolled_back_on_checkin(self):
+        """Незакоммиченная транзакция откатывается при возврате в пул"""
+        with self.pool.connection() as conn:
+            conn.execute("CREATE TABLE items (id INTEGER)")
+            conn.commit()
+            conn.execute("INSERT INTO items VALUES (1)")
+        
+        with self.pool.connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        
+        self.assertEqual(count, 0)
+
+
+class TestMigrations(unittest.TestCase):
+    """Тесты для миграций схемы"""
+    
+    def setUp(self):
+        self.test_db_path = "test_migrations.db"
+    
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+    
+    def _user_version(self):
+        conn = sqlite3.connect(self.test_db_path)
+        try:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+    
+    def test_new_database_gets_latest_version(self):
+        """Новая БД сразу получает последнюю версию схемы"""
+        db = Database(self.test_db_path)
+        db.close()
+        
+        self.assertEqual(self._user_version(), LATEST_VERSION)
+    
+    def test_legacy_database_upgraded(self):
+        """Старая БД без user_version получает недостающие столбцы"""
+        conn = sqlite3.connect(self.test_db_path)
+        conn.execute("""
+            CREATE TABLE employees (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                full_name TEXT NOT NULL UNIQUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("INSERT INTO employees (full_name) VALUES ('Иванов Иван')")
+        conn.commit()
+        conn.close()
+        
+        db = Database(self.test_db_path)
+        employee = db.get_all_employees()[0]
+        db.close()
+        
+        self.assertEqual(employee.full_name, 'Иванов Иван')
+        self.assertEqual(employee.fiber_balance, 0)
+        self.assertEqual(self._user_version(), LATEST_VERSION)
+    
+    def test_daily_stats_backfilled(self):
+        """Миграция заполняет дневные итоги по уже накопленным подключениям"""
+        from datetime import datetime
+        
+        db = Database(self.test_db_path)
+        emp1 = db.add_employee("Историев 1")
+        emp2 = db.add_employee("Историев 2")
+        db.add_material_to_employee(emp1, fiber_meters=1000, twisted_pair_meters=1000)
+        for employee_ids in ([emp1], [emp1, emp2]):
+            db.create_connection(
+                connection_type="mkd", address="Адрес", router_model="-", port="1",
+                fiber_meters=10.0, twisted_pair_meters=1.0, employee_ids=employee_ids,
+                photo_file_ids=[], created_by=1, material_payer_id=emp1
+            )
+        db.close()
+        
+        # БД до миграции 3: таблицы итогов еще нет
+        conn = sqlite3.connect(self.test_db_path)
+        conn.execute("DROP TABLE employee_daily_stats")
+        conn.execute("PRAGMA user_version = 2")
+        conn.commit()
+        conn.close()
+        
+        db = Database(self.test_db_path)
+        start, end = datetime(2000, 1, 1), datetime(2100, 1, 1)
+        stats1 = db.get_employee_period_stats(emp1, start, end)
+        stats2 = db.get_employee_period_stats(emp2, start, end)
+        db.close()
+        
+        self.assertEqual(stats1['total_connections'], 2)
+        self.assertEqual(stats1['total_fiber_meters'], 15.0)
+        self.assertEqual(stats2['total_fiber_meters'], 5.0)
+        self.assertEqual(self._user_version(), LATEST_VERSION)
+    
+    def test_newer_schema_rejected(self):
+        """БД с версией схемы новее поддерживаемой не открывается"""
+        conn = sqlite3.connect(self.test_db_path)
+        conn.execute(f"PRAGMA user_version = {LATEST_VERSION + 1}")
+        conn.close()
+        
+        with self.assertRaises(SchemaVersionError):
+            Database(self.test_db_path)
+
+
+class TestAsyncDatabase(unittest.IsolatedAsyncioTestCase):
+    """Тесты для асинхронной обертки над БД"""
+    
+    def setUp(self):
+        self.test_db_path = "test_async.db"
+        self.db = AsyncDatabase(Database(self.test_db_path), reader_threads=2)
+    
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+    
+    async def test_write_then_read(self):
+        """Запись и чтение через асинхронные методы"""
+        emp_id = await self.db.add_employee("Иванов Иван")
+        await self.db.add_material_to_employee(emp_id, fiber_meters=100)
+        
+        employee = await self.db.get_employee_by_id(emp_id)
+        balance = await self.db.get_employee_balance(emp_id)
+        
+        self.assertEqual(employee.full_name, "Иванов Иван")
+        self.assertEqual(balance, (100, 0))
+    
+    async def test_writes_use_single_thread(self):
+        """Все записи выполняются в одном потоке-писателе"""
+        threads = set()
+        
+        def record_thread(name):
+            threads.add(threading.current_thread().name)
+            return self.db.db.add_employee(name)
+        
+        await asyncio.gather(*(
+            self.db._write(record_thread, f"Сотрудник {i}") for i in range(5)
+        ))
+        
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(len(await self.db.get_all_employees()), 5)
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Проверка планов запросов репозиториев"""
+    
+    def test_no_full_table_scans(self):
+        """Ни один запрос репозиториев не сканирует таблицу целиком"""
+        plans = collect_query_plans()
+        
+        self.assertTrue(plans)
+        self.assertEqual(find_full_scans(plans), [])
+    
+    def test_full_scan_detected(self):
+        """Полное сканирование без индекса распознается"""
+        plans = {
+            "q1": ["SCAN employee_routers"],
+            "q2": ["SCAN employees USING INDEX sqlite_autoindex_employees_1"],
+            "q3": ["SEARCH c USING INTEGER PRIMARY KEY (rowid=?)"],
+        }
+        
+        self.assertEqual(find_full_scans(plans), [("q1", "SCAN employee_routers")])
+
+
+
+class TestQueryProfiler(unittest.TestCase):
+    """Тесты профилировщика запросов"""
+    
+    def setUp(self):
+        self.test_db_path = "test_profiler.db"
+        self.profiler = QueryProfiler(slow_threshold=10)
+        self.db = Database(self.test_db_path, profiler=self.profiler)
+    
+    def tearDown(self):
+        self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+    
+    def _calls(self, sql_prefix: str) -> int:
+        """Число вызовов отпечатков, начинающихся с sql_prefix"""
+        return sum(q['calls'] for q in self.profiler.top(1000) if q['fingerprint'].startswith(sql_prefix))
+    
+    def test_fingerprint(self):
+        """Литералы, списки параметров и пробелы нормализуются"""
+        self.assertEqual(
+            fingerprint("SELECT *  FROM employees\n WHERE id IN (?, ?, ?) AND full_name = 'Иванов' -- комментарий"),
+            "SELECT * FROM employees WHERE id IN (...) AND full_name = ?"
+        )
+        self.assertEqual(fingerprint("SELECT 1 FROM t1 LIMIT 20"), "SELECT ? FROM t1 LIMIT ?")
+    
+    def test_all_statements_timed(self):
+        """Запросы репозиториев и курсоров create_connection попадают в статистику"""
+        emp_id = self.db.add_employee("Профилев")
+        self.db.add_material_to_employee(emp_id, fiber_meters=100, twisted_pair_meters=100)
+        for _ in range(3):
+            self.db.get_employee_by_id(emp_id)
+            self.db.cache.invalidate(cache.employee_key(emp_id))
+        
+        self.db.create_connection(
+            connection_type='mkd', address="Адрес", router_model="-", port="1",
+            fiber_meters=1, twisted_pair_meters=1, employee_ids=[emp_id],
+            photo_file_ids=["p1", "p2"], created_by=1, material_payer_id=emp_id
+        )
+        
+        self.assertEqual(self._calls("SELECT id, full_name, fiber_balance"), 3)
+        self.assertGreaterEqual(self._calls("INSERT INTO connection_photos"), 1)
+        self.assertEqual(self.profiler.stats()['slow'], 0)
+        
+        query = self.profiler.top(1, order='total')[0]
+        self.assertLessEqual(query['p50'], query['p95'])
+        self.assertLessEqual(query['p99'], query['max'])
+    
+    def test_slow_query_logged_with_plan(self):
+        """Медленный запрос пишется в лог с планом, план сохраняется в статистике"""
+        self.profiler.slow_threshold = 0
+        emp_id = self.db.add_employee("Медленный")
+        
+        with self.assertLogs('database.profiler', level='WARNING') as logs:
+            self.db.get_employee_routers(emp_id)
+        
+        self.assertTrue(any('план:' in line for line in logs.output))
+        routers_fingerprint = (
+            "SELECT id, router_name, quantity, created_at FROM employee_routers "
+            "WHERE employee_id = ? ORDER BY router_name"
+        )
+        routers_query = next(q for q in self.db.slow_queries(1000) if q['fingerprint'] == routers_fingerprint)
+        self.assertTrue(routers_query['plan'])
+        self.assertGreaterEqual(routers_query['slow'], 1)
+    
+    def test_failed_plan_retried(self):
+        """План, который не удалось построить, не сохраняется и строится при следующем медленном запросе"""
+        emp_id = self.db.add_employee("Планов")
+        self.profiler.slow_threshold = 0
+        sql = "UPDATE employees SET fiber_balance = ? WHERE id = ?"
+        
+        def query():
+            return next(q for q in self.profiler.top(1000) if q['fingerprint'] == sql)
+        
+        with self.db.transaction() as conn:
+            # Параметры генератора недоступны профилировщику: план не построить
+            conn.executemany(sql, ((meters, emp_id) for meters in (1, 2)))
+            self.assertEqual(query()['plan'], [])
+            
+            conn.executemany(sql, [(3, emp_id)])
+        
+        self.assertEqual(query()['slow'], 2)
+        self.assertTrue(query()['plan'])
+
+
+
+class TestReportGenerator(unittest.TestCase):
+    """Тесты потоковой генерации Excel-отчета"""
+    
+    def setUp(self):
+        """Тестовая БД с сотрудником и двумя подключениями"""
+        self.test_db_path = "test_report_bot.db"
+        self.db = Database(self.test_db_path)
+        self.emp_id = self.db.add_employee("Отчетов Олег")
+        self.db.add_material_to_employee(self.emp_id, fiber_meters=1000, twisted_pair_meters=1000)
+        for n in range(2):
+            self.db.create_connection(
+                connection_type='mkd', address=f"Адрес {n}", router_model="-", port="1",
+                fiber_meters=10, twisted_pair_meters=5, employee_ids=[self.emp_id],
+                photo_file_ids=[], created_by=1, material_payer_id=self.emp_id
+            )
+    
+    def tearDown(self):
+        """Удаление тестовой БД"""
+        self.db.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+    
+    def test_stream_employee_report(self):
+        """Отчет пишется из курсоров БД в буфер, итоги считаются по ходу записи"""
+        from datetime import datetime
+        from openpyxl import load_workbook
+        from report_generator import ReportGenerator, STYLE_TOTAL_NUMBER
+        
+        buffer, stats = ReportGenerator.stream_employee_report(
+            self.db, self.emp_id, "Отчетов Олег", "Все время",
+            datetime(2020, 1, 1), datetime(2100, 1, 1)
+        )
+        self.addCleanup(buffer.close)
+        
+        self.assertEqual([name for name in os.listdir('.') if name.endswith('.xlsx')], [])
+        self.assertEqual(buffer.tell(), 0)
+        self.assertEqual(stats['total_connections'], 2)
+        self.assertEqual(stats['total_fiber_meters'], 20)
+        self.assertEqual(stats['total_movements'], 6)
+        
+        wb = load_workbook(buffer)
+        self.assertEqual(wb.sheetnames, ["Отчет", "Движение материалов"])
+        ws = wb["Отчет"]
+        self.assertEqual(ws['D7'].value, "Адрес 1")
+        self.assertEqual(ws['G10'].value, 20)
+        self.assertEqual(ws['G10'].style, STYLE_TOTAL_NUMBER)
+        self.assertIn("A10:F10", [str(r) for r in ws.merged_cells.ranges])
+        self.assertEqual(wb["Движение материалов"].max_row, 5 + 6)
+    
+    def test_stream_employee_report_empty(self):
+        """Без данных за период вместо буфера возвращается None"""
+        from datetime import datetime
+        from report_generator import ReportGenerator
+        
+        buffer, stats = ReportGenerator.stream_employee_report(
+            self.db, self.emp_id, "Отчетов Олег", "Прошлое",
+            datetime(2000, 1, 1), datetime(2000, 12, 31)
+        )
+        
+        self.assertIsNone(buffer)
+        self.assertEqual(stats['total_connections'], 0)
+        self.assertEqual(stats['total_movements'], 0)
+    
+    def test_stream_all_employees_report(self):
+        """Общий отчет: сводка и лист на каждого сотрудника с данными за период"""
+        from datetime import datetime
+        from openpyxl import load_workbook
+        from report_generator import ReportGenerator
+        
+        # Общее подключение делится поровну; сотрудник без данных в книгу не попадает
+        partner_id = self.db.add_employee("Аверин: Павел")
+        self.db.add_employee("Без Данных")
+        self.db.create_connection(
+            connection_type='mkd', address="Общий адрес", router_model="-", port="2",
+            fiber_meters=30, twisted_pair_meters=10, employee_ids=[self.emp_id, partner_id],
+            photo_file_ids=[], created_by=1, material_payer_id=self.emp_id
+        )
+        
+        buffer, stats = ReportGenerator.stream_all_employees_report(
+            self.db, "Все время", datetime(2020, 1, 1), datetime(2100, 1, 1)
+        )
+        self.addCleanup(buffer.close)
+        
+        self.assertEqual(stats['total_employees'], 2)
+        # Общее подключение в итоге учитывается один раз
+        self.assertEqual(stats['total_connections'], 3)
+        self.assertEqual(stats['total_fiber_meters'], 50)
+        self.assertEqual(stats['total_movements'], 8)
+        
+        wb = load_workbook(buffer)
+        self.assertEqual(wb.sheetnames, ["Сводка", "Аверин  Павел", "Отчетов Олег"])
+        summary = wb["Сводка"]
+        self.assertEqual(
+            [[c.value for c in row] for row in summary.iter_rows(min_row=6, max_row=7)],
+            [[1, "Аверин: Павел", 1, 15, 5, 0], [2, "Отчетов Олег", 3, 35, 15, 8]]
+        )
+        self.assertEqual(summary['C9'].value, 3)
+        self.assertEqual(summary['D9'].value, 50)
+        
+        ws = wb["Отчетов Олег"]
+        self.assertEqual(ws['D6'].value, "Общий адрес")
+        self.assertEqual(ws['G10'].value, 35)
+        self.assertEqual(ws['A12'].value, "Движение материалов и роутеров")
+        self.assertEqual(ws.max_row, 13 + 8)
+    
+    def test_all_employees_report_uses_one_connection(self):
+        """Подключения и движения общего отчета читаются на одном подключении пула"""
+        from datetime import datetime
+        from unittest.mock import patch
+        from report_generator import ReportGenerator
+        
+        with patch.object(self.db.pool, 'checkout', wraps=self.db.pool.checkout) as checkout:
+            buffer, _ = ReportGenerator.stream_all_employees_report(
+                self.db, "Все время", datetime(2020, 1, 1), datetime(2100, 1, 1)
+            )
+        buffer.close()
+        
+        self.assertEqual(checkout.call_count, 1)
+        self.assertIsNone(self.db.pool._local.conn)
+        self.assertEqual(self.db.pool._local.depth, 0)
+    
+    def test_stream_all_employees_report_empty(self):
+        """Без данных за период общий отчет не создается"""
+        from datetime import datetime
+        from report_generator import ReportGenerator
+        
+        buffer, stats = ReportGenerator.stream_all_employees_report(
+            self.db, "Прошлое", datetime(2000, 1, 1), datetime(2000, 12, 31)
+        )
+        
+        self.assertIsNone(buffer)
+        self.assertEqual(stats['total_employees'], 0)
+    
+    def test_iter_employee_report_matches_list(self):
+        """Генератор подключений выдает те же строки, что и get_employee_report"""
+        connections, _ = self.db.get_employee_report(self.emp_id)
+        
+        self.assertEqual(list(self.db.iter_employee_report(self.emp_id)), connections)
+        # Подключение вернулось в пул после исчерпания генератора
+        self.assertIsNotNone(self.db.get_employee_by_id(self.emp_id))
 
 
 if __name__ == '__main__':
@@ -27,9 +27,9 @@ def test_material_logic():
     print("📋 Список сотрудников:")
     print()
     for emp in employees:
-        fiber = emp.get('fiber_balance', 0) or 0
-        twisted = emp.get('twisted_pair_balance', 0) or 0
-        print(f"  • {emp['full_name']} (ID: {emp['id']})")
+        fiber = emp.fiber_balance or 0
+        twisted = emp.twisted_pair_balance or 0
+        print(f"  • {emp.full_name} (ID: {emp.id})")
         print(f"    ВОЛС: {fiber} м")
         print(f"    Витая пара: {twisted} м")
         print()
@@ -47,15 +47,15 @@ def test_material_logic():
         emp1 = employees[0]
         emp2 = employees[1]
         
-        fiber1 = emp1.get('fiber_balance', 0) or 0
-        twisted1 = emp1.get('twisted_pair_balance', 0) or 0
-        fiber2 = emp2.get('fiber_balance', 0) or 0
-        twisted2 = emp2.get('twisted_pair_balance', 0) or 0
+        fiber1 = emp1.fiber_balance or 0
+        twisted1 = emp1.twisted_pair_balance or 0
+        fiber2 = emp2.fiber_balance or 0
+        twisted2 = emp2.twisted_pair_balance or 0
         
-        print(f"Исполнитель 1: {emp1['full_name']}")
+        print(f"Исполнитель 1: {emp1.full_name}")
         print(f"  ВОЛС: {fiber1}м, Витая пара: {twisted1}м")
         print()
-        print(f"Исполнитель 2: {emp2['full_name']}")
+        print(f"Исполнитель 2: {emp2.full_name}")
         print(f"  ВОЛС: {fiber2}м, Витая пара: {twisted2}м")
         print()
         
@@ -72,23 +72,23 @@ def test_material_logic():
         emp2_has_enough = (fiber2 >= test_fiber and twisted2 >= test_twisted)
         
         print("Результат проверки:")
-        print(f"  {emp1['full_name']}: {'✅ Достаточно' if emp1_has_enough else '❌ Недостаточно'}")
-        print(f"  {emp2['full_name']}: {'✅ Достаточно' if emp2_has_enough else '❌ Недостаточно'}")
+        print(f"  {emp1.full_name}: {'✅ Достаточно' if emp1_has_enough else '❌ Недостаточно'}")
+        print(f"  {emp2.full_name}: {'✅ Достаточно' if emp2_has_enough else '❌ Недостаточно'}")
         print()
         
         if emp1_has_enough and emp2_has_enough:
             print("💡 Логика бота: Предложит выбрать плательщика")
         elif emp1_has_enough and not emp2_has_enough:
-            print(f"💡 Логика бота: Автоматически спишет с {emp1['full_name']}")
+            print(f"💡 Логика бота: Автоматически спишет с {emp1.full_name}")
         elif not emp1_has_enough and emp2_has_enough:
-            print(f"💡 Логика бота: Автоматически спишет с {emp2['full_name']}")
+            print(f"💡 Логика бота: Автоматически спишет с {emp2.full_name}")
         else:
             print("💡 Логика бота: Блокирует создание подключения")
         
         print()
         print("📊 В отчёте будет указано (для зарплаты):")
-        print(f"  {emp1['full_name']}: ВОЛС {test_fiber/2}м, ВП {test_twisted/2}м")
-        print(f"  {emp2['full_name']}: ВОЛС {test_fiber/2}м, ВП {test_twisted/2}м")
+        print(f"  {emp1.full_name}: ВОЛС {test_fiber/2}м, ВП {test_twisted/2}м")
+        print(f"  {emp2.full_name}: ВОЛС {test_fiber/2}м, ВП {test_twisted/2}м")
         
     else:
         print("⚠️  Для теста нужно минимум 2 сотрудника")
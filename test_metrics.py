@@ -0,0 +1,161 @@
+"""
+Тесты для метрик в формате Prometheus (metrics.py)
+"""
+import asyncio
+import os
+import unittest
+
+from telegram.error import RetryAfter
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+
+from database import AsyncDatabase, Database
+from metrics import Metrics, MetricsServer, conversation_collector, instrument_handlers
+from outbound import TelegramRateLimiter
+
+
+async def step_wrapper(update, context):
+    return 1
+
+
+async def broken(update, context):
+    raise RuntimeError("ошибка обработчика")
+
+
+class TestMetrics(unittest.TestCase):
+    """Тесты реестра и текстового формата"""
+
+    def test_histogram_format(self):
+        """Гистограмма выводится накопленными корзинами, суммой и количеством"""
+        metrics = Metrics(buckets=(0.1, 1))
+        metrics.observe('handler_seconds', 0.05, handler='start')
+        metrics.observe('handler_seconds', 0.5, handler='start')
+
+        text = metrics.render()
+
+        self.assertIn('# TYPE isp_bot_handler_seconds histogram', text)
+        self.assertIn('isp_bot_handler_seconds_bucket{handler="start",le="0.1"} 1', text)
+        self.assertIn('isp_bot_handler_seconds_bucket{handler="start",le="1"} 2', text)
+        self.assertIn('isp_bot_handler_seconds_bucket{handler="start",le="+Inf"} 2', text)
+        self.assertIn('isp_bot_handler_seconds_sum{handler="start"} 0.55', text)
+        self.assertIn('isp_bot_handler_seconds_count{handler="start"} 2', text)
+
+    def test_counters_and_collectors(self):
+        """Счетчики накапливаются, сборщики снимают значения при запросе, ошибка сборщика пропускается"""
+        metrics = Metrics()
+        metrics.inc('telegram_errors_total', method='sendMessage', error='Forbidden')
+        metrics.inc('telegram_errors_total', method='sendMessage', error='Forbidden')
+        metrics.add_stats('outbound', lambda: {'pending': 3, 'name': 'x'})
+        metrics.add_collector(lambda: 1 / 0)
+        metrics.add_collector(lambda: [('conversations', {'conversation': 'a"b'}, 1)])
+
+        text = metrics.render()
+
+        self.assertIn('isp_bot_telegram_errors_total{error="Forbidden",method="sendMessage"} 2', text)
+        self.assertIn('# TYPE isp_bot_outbound_pending gauge\nisp_bot_outbound_pending 3', text)
+        self.assertNotIn('outbound_name', text)
+        self.assertIn('isp_bot_conversations{conversation="a\\"b"} 1', text)
+
+
+class TestInstrumentation(unittest.IsolatedAsyncioTestCase):
+    """Тесты измерения обработчиков и компонентов"""
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.conv = ConversationHandler(
+            entry_points=[CommandHandler('start', step_wrapper)],
+            states={1: [MessageHandler(filters.TEXT, broken)]},
+            fallbacks=[],
+            name='test_conversation'
+        )
+        self.application = Application.builder().token('1:test').build()
+        self.application.add_handler(self.conv)
+        self.application.add_handler(CommandHandler('help', step_wrapper))
+
+    async def test_handlers_timed_once(self):
+        """Обработчики, в том числе внутри диалога, измеряются; повторный вызов их не оборачивает"""
+        self.assertEqual(instrument_handlers(self.application, self.metrics), 3)
+        self.assertEqual(instrument_handlers(self.application, self.metrics), 0)
+
+        self.assertEqual(await self.conv.entry_points[0].callback(None, None), 1)
+        with self.assertRaises(RuntimeError):
+            await self.conv.states[1][0].callback(None, None)
+
+        text = self.metrics.render()
+        self.assertIn('isp_bot_handler_seconds_count{conversation="test_conversation",handler="step"} 1', text)
+        self.assertIn('isp_bot_handler_errors_total{conversation="test_conversation",handler="broken"} 1', text)
+
+    def test_conversations_by_state(self):
+        """Незавершенные диалоги считаются по шагам"""
+        self.conv._conversations.update({(1, 1): 1, (2, 2): 1, (3, 3): 2})
+
+        samples = sorted(
+            (labels['state'], count) for _, labels, count in conversation_collector([self.conv])()
+        )
+
+        self.assertEqual(samples, [('1', 2), ('2', 1)])
+
+    async def test_telegram_latency_and_errors(self):
+        """Задержка и ошибки Bot API учитываются по методам, включая повторы после RetryAfter"""
+        limiter = TelegramRateLimiter(max_retries=1, metrics=self.metrics)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RetryAfter(0)
+            return True
+
+        await limiter.process_request(flaky, (), {}, 'sendMessage', {'chat_id': 42}, None)
+
+        text = self.metrics.render()
+        self.assertIn('isp_bot_telegram_request_seconds_count{method="sendMessage"} 2', text)
+        self.assertIn('isp_bot_telegram_errors_total{error="RetryAfter",method="sendMessage"} 1', text)
+
+    async def test_db_methods_timed(self):
+        """Время запросов к БД учитывается по имени метода"""
+        db = AsyncDatabase(Database("test_metrics.db"), reader_threads=1, metrics=self.metrics)
+        try:
+            await db.add_employee("Иванов")
+            await db.get_all_employees()
+        finally:
+            db.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists("test_metrics.db" + suffix):
+                    os.remove("test_metrics.db" + suffix)
+
+        text = self.metrics.render()
+        self.assertIn('isp_bot_db_query_seconds_count{method="add_employee"} 1', text)
+        self.assertIn('isp_bot_db_query_seconds_count{method="get_all_employees"} 1', text)
+
+
+class TestMetricsServer(unittest.IsolatedAsyncioTestCase):
+    """Тесты HTTP-сервера метрик"""
+
+    async def _get(self, port: int, path: str) -> bytes:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def test_metrics_endpoint(self):
+        """GET /metrics отдает текстовый формат, другие пути - 404"""
+        metrics = Metrics()
+        metrics.inc('handler_errors_total', handler='start')
+        server = MetricsServer(metrics, port=0)
+        await server.start()
+        try:
+            response = await self._get(server.port, '/metrics')
+            missing = await self._get(server.port, '/')
+        finally:
+            await server.stop()
+
+        self.assertTrue(response.startswith(b'HTTP/1.1 200 OK'))
+        self.assertIn(b'text/plain; version=0.0.4', response)
+        self.assertIn(b'isp_bot_handler_errors_total{handler="start"} 1', response)
+        self.assertTrue(missing.startswith(b'HTTP/1.1 404'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,223 @@
+"""
+Тесты для лимитов Telegram и очереди исходящих сообщений (outbound.py)
+"""
+import asyncio
+import os
+import unittest
+
+from telegram.error import Forbidden, RetryAfter, TimedOut
+
+from database import AsyncDatabase, Database
+from outbound import OutboundQueue, TelegramRateLimiter, TokenBucket
+
+
+class FakeClock:
+    """Управляемое время для ограничителей"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBot:
+    """Бот, который отвечает заранее заданными ошибками, затем успехом"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.copies = []
+
+    async def copy_messages(self, chat_id, from_chat_id, message_ids):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.copies.append((chat_id, from_chat_id, list(message_ids)))
+        return ()
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Тесты ведра токенов"""
+
+    def test_burst_then_rate(self):
+        """Всплеск в пределах емкости проходит сразу, дальше - с заданной частотой"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.reserve(), 0.5)
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+
+        clock.now = 10
+        self.assertTrue(bucket.is_idle())
+        self.assertEqual(bucket.reserve(), 0)
+
+
+class TestTelegramRateLimiter(unittest.IsolatedAsyncioTestCase):
+    """Тесты ограничителя вызовов Bot API"""
+
+    async def test_retry_after_is_retried(self):
+        """После RetryAfter запрос повторяется, пока не исчерпаны повторы"""
+        limiter = TelegramRateLimiter(max_retries=1)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RetryAfter(0)
+            return True
+
+        result = await limiter.process_request(flaky, (), {}, 'sendMessage', {'chat_id': 42}, None)
+
+        self.assertTrue(result)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(limiter.stats()['retry_after'], 1)
+
+    async def test_retry_after_raised_when_exhausted(self):
+        """Без повторов RetryAfter передается вызывающему коду"""
+        limiter = TelegramRateLimiter(max_retries=0)
+
+        async def flood():
+            raise RetryAfter(0)
+
+        with self.assertRaises(RetryAfter):
+            await limiter.process_request(flood, (), {}, 'sendMessage', {'chat_id': '-100123'}, None)
+
+    def test_group_and_private_limits(self):
+        """Для групп и каналов лимит строже, чем для личных чатов"""
+        limiter = TelegramRateLimiter()
+
+        self.assertEqual(limiter._chat_bucket(42).rate, 1)
+        self.assertLess(limiter._chat_bucket(-100123).rate, 1)
+        self.assertLess(limiter._chat_bucket('@channel').rate, 1)
+
+
+class TestOutboundQueue(unittest.IsolatedAsyncioTestCase):
+    """Тесты очереди исходящих сообщений с сохранением в БД"""
+
+    def setUp(self):
+        self.test_db_path = "test_outbound.db"
+        self.db = AsyncDatabase(Database(self.test_db_path), reader_threads=1)
+        self.queues = []
+
+    async def asyncTearDown(self):
+        for queue in self.queues:
+            await queue.stop()
+
+    def tearDown(self):
+        self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+
+    async def _queue(self, bot, **kwargs) -> OutboundQueue:
+        queue = OutboundQueue(self.db, base_delay=0.01, max_delay=0.02, poll_interval=0.01, **kwargs)
+        self.queues.append(queue)
+        await queue.start(bot)
+        return queue
+
+    async def _settle(self) -> dict:
+        """Дождаться, пока в outbox не останется сообщений в работе"""
+        for _ in range(300):
+            counts = await self.db.get_outbox_status_counts()
+            if not counts.get('pending') and not counts.get('sending'):
+                return counts
+            await asyncio.sleep(0.01)
+        self.fail(f"Очередь не отправлена: {counts}")
+
+    async def test_delivered_and_marked_sent(self):
+        """Сообщение отправляется и отмечается в outbox"""
+        bot = FakeBot()
+        queue = await self._queue(bot)
+
+        await queue.send(-100, 'copy_messages', from_chat_id=42, message_ids=[1, 2])
+        await self._settle()
+
+        self.assertEqual(bot.copies, [(-100, 42, [1, 2])])
+        self.assertEqual(await self.db.get_outbox_status_counts(), {'sent': 1})
+
+    async def test_network_errors_retried_with_backoff(self):
+        """Таймауты повторяются, пока сообщение не будет доставлено"""
+        bot = FakeBot([TimedOut(), TimedOut()])
+        queue = await self._queue(bot)
+
+        await queue.send(-100, 'copy_messages', from_chat_id=42, message_ids=[1])
+        await self._settle()
+
+        self.assertEqual(len(bot.copies), 1)
+        self.assertEqual(queue.stats()['retried'], 2)
+        self.assertEqual(await self.db.get_outbox_status_counts(), {'sent': 1})
+
+    async def test_retry_after_does_not_use_attempts(self):
+        """Ожидание лимита Telegram не расходует попытки"""
+        bot = FakeBot([RetryAfter(0), RetryAfter(0), RetryAfter(0)])
+        queue = await self._queue(bot, max_attempts=1)
+
+        await queue.send(-100, 'copy_messages', from_chat_id=42, message_ids=[1])
+        await self._settle()
+
+        self.assertEqual(len(bot.copies), 1)
+        self.assertEqual(queue.stats()['failed'], 0)
+
+    async def test_permanent_error_marks_failed(self):
+        """Недоступный канал не повторяется, сообщение помечается как failed"""
+        bot = FakeBot([Forbidden("bot is not a member of the channel")])
+        queue = await self._queue(bot)
+
+        await queue.send(-100, 'copy_messages', from_chat_id=42, message_ids=[1])
+        await self._settle()
+
+        self.assertEqual(bot.copies, [])
+        self.assertEqual(await self.db.get_outbox_status_counts(), {'failed': 1})
+
+    async def test_attempts_exhausted(self):
+        """После max_attempts неудач сообщение помечается как failed"""
+        bot = FakeBot([TimedOut()] * 5)
+        queue = await self._queue(bot, max_attempts=3)
+
+        await queue.send(-100, 'copy_messages', from_chat_id=42, message_ids=[1])
+        await self._settle()
+
+        self.assertEqual(queue.stats()['failed'], 1)
+        self.assertEqual(len(bot.errors), 2)
+
+    async def test_pending_restored_on_start(self):
+        """Неотправленные и прерванные до остановки сообщения отправляются после запуска"""
+        await self.db.add_outbox_message(-100, 'copy_messages', {'from_chat_id': 42, 'message_ids': [7]})
+        await self.db.add_outbox_message(-200, 'copy_messages', {'from_chat_id': 42, 'message_ids': [8]})
+        await self.db.claim_due_outbox(1)
+
+        bot = FakeBot()
+        queue = await self._queue(bot)
+        await self._settle()
+
+        self.assertEqual(sorted(bot.copies), [(-200, 42, [8]), (-100, 42, [7])])
+        self.assertEqual(await self.db.get_outbox_status_counts(), {'sent': 2})
+
+    async def test_batches(self):
+        """Диспетчер забирает сообщения пачками и отправляет все"""
+        bot = FakeBot()
+        queue = await self._queue(bot, batch_size=2)
+
+        for chat_id in range(5):
+            await queue.send(-chat_id - 1, 'copy_messages', from_chat_id=42, message_ids=[chat_id])
+        await self._settle()
+
+        self.assertEqual(len(bot.copies), 5)
+        self.assertEqual(queue.stats()['sent'], 5)
+
+    async def test_custom_handler(self):
+        """Метод с собственным обработчиком отправляется через него"""
+        delivered = []
+
+        async def deliver(bot, db, chat_id, params):
+            delivered.append((chat_id, params))
+
+        queue = await self._queue(FakeBot(), handlers={'connection_report': deliver})
+        await self.db.add_outbox_message(-100, 'connection_report', {'connection_id': 1})
+        queue.wake()
+        await self._settle()
+
+        self.assertEqual(delivered, [(-100, {'connection_id': 1})])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,164 @@
+"""
+Тесты для сохранения состояния диалогов (persistence.py)
+"""
+import os
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from telegram.ext import ConversationHandler
+
+import persistence
+from database import AsyncDatabase, Database
+from persistence import SQLitePersistence, decode, encode, encode_user_data
+
+
+class TestEncoding(unittest.TestCase):
+    """Тесты компактного кодирования"""
+
+    def test_typed_values_roundtrip(self):
+        """Даты и множества восстанавливаются с исходным типом"""
+        data = {
+            'report_custom_start': datetime(2024, 1, 31),
+            'selected_employees': [1, 2],
+            'connection_data': {'address': 'ул. Ленина, 1', 'router_access': True},
+            'tags': {'a'}
+        }
+
+        self.assertEqual(decode(encode(data)), data)
+        self.assertNotIn(' ', encode([1, 2]))
+
+    def test_unsupported_value_skipped(self):
+        """Значение без кодирования пропускается, остальные поля сохраняются"""
+        encoded = encode_user_data(1, {'photos': ['p1'], 'message': object()})
+
+        self.assertEqual(decode(encoded), {'photos': ['p1']})
+        self.assertIsNone(encode_user_data(1, {}))
+
+
+class TestSQLitePersistence(unittest.IsolatedAsyncioTestCase):
+    """Тесты записи и восстановления после перезапуска"""
+
+    def setUp(self):
+        self.test_db_path = "test_persistence.db"
+        self.db = AsyncDatabase(Database(self.test_db_path), reader_threads=1)
+
+    def tearDown(self):
+        self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+
+    async def test_restored_after_restart(self):
+        """Шаг диалога и user_data восстанавливаются новым экземпляром"""
+        store = SQLitePersistence(self.db)
+        await store.update_conversation('connection_conversation', (42, 42), 3)
+        await store.update_user_data(42, {'photos': ['p1', 'p2'], 'connection_data': {'port': '5'}})
+        await store.flush()
+
+        restored = SQLitePersistence(self.db)
+        self.assertEqual(await restored.get_conversations('connection_conversation'), {(42, 42): 3})
+        self.assertEqual(await restored.get_conversations('report_conversation'), {})
+        self.assertEqual(
+            await restored.get_user_data(),
+            {42: {'photos': ['p1', 'p2'], 'connection_data': {'port': '5'}}}
+        )
+
+    async def test_batched_writes(self):
+        """Изменения одного прогона записываются одной транзакцией, последнее значение побеждает"""
+        store = SQLitePersistence(self.db)
+        for state in (1, 2, 3):
+            await store.update_conversation('manage_conversation', (7, 7), state)
+        await store.update_user_data(7, {'router_action': 'add'})
+        await store.update_user_data(8, {'router_action': 'deduct'})
+        await store.flush()
+
+        stats = store.stats()
+        self.assertEqual((stats['flushes'], stats['records'], stats['pending']), (1, 3, 0))
+        self.assertEqual(
+            await SQLitePersistence(self.db).get_conversations('manage_conversation'), {(7, 7): 3}
+        )
+
+    async def test_ended_conversation_removed(self):
+        """Завершенный диалог и удаленные данные не восстанавливаются"""
+        store = SQLitePersistence(self.db)
+        await store.update_conversation('report_conversation', (5, 5), 1)
+        await store.update_user_data(5, {'report_employee_id': 1})
+        await store.flush()
+
+        await store.update_conversation('report_conversation', (5, 5), None)
+        await store.drop_user_data(5)
+        await store.flush()
+
+        restored = SQLitePersistence(self.db)
+        self.assertEqual(await restored.get_conversations('report_conversation'), {})
+        self.assertEqual(await restored.get_user_data(), {})
+
+    async def test_failed_write_kept_for_retry(self):
+        """Если запись не удалась, изменения остаются в буфере до следующего сброса"""
+        store = SQLitePersistence(self.db)
+        await store.update_conversation('connection_conversation', (1, 1), 2)
+
+        with patch.object(self.db, 'save_conversation_data', return_value=False):
+            await store.flush()
+        self.assertEqual(store.stats()['pending'], 1)
+
+        await store.flush()
+        self.assertEqual(
+            await SQLitePersistence(self.db).get_conversations('connection_conversation'), {(1, 1): 2}
+        )
+
+    async def test_changes_during_write_flushed(self):
+        """Изменения, пришедшие во время записи, записываются той же задачей без новых вызовов"""
+        store = SQLitePersistence(self.db)
+        save = self.db.save_conversation_data
+        batches = []
+
+        async def save_with_concurrent_change(states, user_data):
+            batches.append(states)
+            if len(batches) == 1:
+                await store.update_conversation('connection_conversation', (2, 2), 5)
+            return await save(states, user_data)
+
+        with patch.object(self.db, 'save_conversation_data', side_effect=save_with_concurrent_change):
+            await store.update_conversation('connection_conversation', (1, 1), 2)
+            await store._flush_task
+
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(store.stats()['pending'], 0)
+        self.assertEqual(
+            await SQLitePersistence(self.db).get_conversations('connection_conversation'),
+            {(1, 1): 2, (2, 2): 5}
+        )
+
+    async def test_abandoned_conversation_ended_on_load(self):
+        """Диалог, брошенный дольше conversation_timeout, при загрузке завершается"""
+        store = SQLitePersistence(self.db)
+        await store.update_conversation('connection_conversation', (1, 1), 2)
+        await store.update_conversation('connection_conversation', (2, 2), 4)
+        await store.flush()
+        with self.db.db.transaction() as conn:
+            conn.execute("""
+                UPDATE conversation_states SET updated_at = datetime('now', '-2 hours')
+                WHERE conversation_key = '[1,1]'
+            """)
+
+        restored = SQLitePersistence(self.db, conversation_timeout=3600)
+
+        self.assertEqual(
+            await restored.get_conversations('connection_conversation'),
+            {(1, 1): ConversationHandler.END, (2, 2): 4}
+        )
+
+    @patch.object(persistence, 'LOAD_PAGE_SIZE', 2)
+    async def test_user_data_loaded_by_pages(self):
+        """user_data загружается страницами, поврежденные записи пропускаются"""
+        await self.db.save_conversation_data([], [(i, encode({'n': i})) for i in range(1, 6)] + [(6, '{')])
+
+        user_data = await SQLitePersistence(self.db).get_user_data()
+
+        self.assertEqual(user_data, {i: {'n': i} for i in range(1, 6)})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,90 @@
+"""
+Тесты для кэша отправленных отчетов (report_cache.py)
+"""
+import unittest
+from datetime import datetime
+
+from report_cache import ReportCache, period_key
+
+STATS = {'total_connections': 1, 'total_fiber_meters': 10, 'total_twisted_pair_meters': 1}
+
+
+class TestReportCache(unittest.TestCase):
+    """Тесты LRU-кэша file_id отчетов"""
+
+    def setUp(self):
+        """Кэш на два отчета"""
+        self.cache = ReportCache(max_entries=2)
+        self.period = period_key(datetime(2024, 1, 1), datetime(2024, 1, 31, 23, 59, 59))
+
+    def test_hit_with_same_watermark(self):
+        """Отчет по той же версии данных берется из кэша"""
+        self.cache.put(1, self.period, (5, 7), 'file-1', 'report.xlsx', STATS)
+
+        entry = self.cache.get(1, self.period, (5, 7))
+
+        self.assertEqual(entry.file_id, 'file-1')
+        self.assertEqual(entry.stats, STATS)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_new_data_invalidates(self):
+        """Новое подключение или движение делает запись устаревшей"""
+        self.cache.put(1, self.period, (5, 7), 'file-1', 'report.xlsx', STATS)
+
+        self.assertIsNone(self.cache.get(1, self.period, (5, 8)))
+        # Устаревшая запись удалена и не вернется даже со старой версией
+        self.assertIsNone(self.cache.get(1, self.period, (5, 7)))
+        self.assertEqual(self.cache.stats()['stale'], 1)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_period_is_part_of_key(self):
+        """Отчеты за разные периоды хранятся отдельно"""
+        other = period_key(datetime(2024, 2, 1), datetime(2024, 2, 29, 23, 59, 59))
+        self.cache.put(1, self.period, (5, 7), 'file-1', 'report.xlsx', STATS)
+
+        self.assertIsNone(self.cache.get(1, other, (5, 7)))
+        self.assertIsNotNone(self.cache.get(1, self.period, (5, 7)))
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняется давно не использованный отчет"""
+        self.cache.put(1, self.period, (1, 1), 'file-1', 'report.xlsx', STATS)
+        self.cache.put(2, self.period, (1, 1), 'file-2', 'report.xlsx', STATS)
+        self.cache.get(1, self.period, (1, 1))
+        self.cache.put(3, self.period, (1, 1), 'file-3', 'report.xlsx', STATS)
+
+        self.assertIsNone(self.cache.get(2, self.period, (1, 1)))
+        self.assertIsNotNone(self.cache.get(1, self.period, (1, 1)))
+        self.assertIsNotNone(self.cache.get(3, self.period, (1, 1)))
+        self.assertEqual(self.cache.stats()['evicted'], 1)
+
+    def test_invalidate_employee(self):
+        """Удаление сотрудника сбрасывает все его отчеты"""
+        other = period_key(datetime(2024, 2, 1), datetime(2024, 2, 29, 23, 59, 59))
+        self.cache.put(1, self.period, (1, 1), 'file-1', 'report.xlsx', STATS)
+        self.cache.put(1, other, (1, 1), 'file-2', 'report.xlsx', STATS)
+
+        self.assertEqual(self.cache.invalidate_employee(1), 2)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_unknown_watermark_bypasses_cache(self):
+        """Если версию данных прочитать не удалось, кэш не используется"""
+        self.cache.put(1, self.period, (5, 7), 'file-1', 'report.xlsx', STATS)
+        self.cache.put(2, self.period, None, 'file-2', 'report.xlsx', STATS)
+
+        self.assertIsNone(self.cache.get(1, self.period, None))
+        self.assertIsNone(self.cache.get(2, self.period, None))
+        self.assertEqual(self.cache.stats()['size'], 1)
+        self.assertEqual(self.cache.stats()['bypassed'], 2)
+        # Запись с известной версией остается
+        self.assertIsNotNone(self.cache.get(1, self.period, (5, 7)))
+
+    def test_disabled(self):
+        """С нулевым размером кэш ничего не хранит"""
+        cache = ReportCache(max_entries=0)
+        cache.put(1, self.period, (1, 1), 'file-1', 'report.xlsx', STATS)
+
+        self.assertIsNone(cache.get(1, self.period, (1, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,188 @@
+"""
+Тесты для очереди формирования отчетов (report_jobs.py)
+"""
+import asyncio
+import os
+import time
+import unittest
+from datetime import datetime
+
+from database import Database
+from report_jobs import (
+    CANCELLED,
+    DONE,
+    ReportJobQueue,
+    ReportJobLimitError,
+    ReportQueueFullError,
+    build_all_employees_report,
+    build_employee_report,
+    discard_report_file
+)
+
+
+class TestReportJobQueue(unittest.IsolatedAsyncioTestCase):
+    """Тесты очереди отчетов в пуле процессов"""
+
+    def setUp(self):
+        """Тестовая БД для процессов-исполнителей"""
+        self.test_db_path = "test_report_jobs.db"
+        Database(self.test_db_path).close()
+        self.queues = []
+
+    async def asyncTearDown(self):
+        """Остановка очередей"""
+        for queue in self.queues:
+            queue.shutdown()
+
+    def tearDown(self):
+        """Удаление тестовой БД"""
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.test_db_path + suffix):
+                os.remove(self.test_db_path + suffix)
+
+    def _queue(self, **kwargs) -> ReportJobQueue:
+        queue = ReportJobQueue(self.test_db_path, **kwargs)
+        self.queues.append(queue)
+        return queue
+
+    async def test_job_runs_in_process(self):
+        """Задача выполняется в пуле и возвращает результат"""
+        queue = self._queue(max_workers=1)
+
+        job = queue.submit(1, os.getpid)
+        result = await job.wait()
+
+        self.assertNotEqual(result, os.getpid())
+        self.assertEqual(job.state, DONE)
+        self.assertEqual(queue.stats()['completed'], 1)
+        self.assertEqual(queue.stats()['queued'], 0)
+
+    async def test_per_user_limit(self):
+        """Вторая задача того же пользователя отклоняется, другого - принимается"""
+        queue = self._queue(max_workers=1, per_user_limit=1)
+
+        first = queue.submit(1, time.sleep, 0.2)
+        with self.assertRaises(ReportJobLimitError):
+            queue.submit(1, time.sleep, 0)
+        second = queue.submit(2, time.sleep, 0)
+
+        await asyncio.gather(first.wait(), second.wait())
+        self.assertEqual(queue.stats()['rejected'], 1)
+
+        # После завершения пользователь снова может поставить отчет
+        await queue.submit(1, time.sleep, 0).wait()
+
+    async def test_cancel_queued_job(self):
+        """Ожидающую задачу может отменить только ее владелец"""
+        queue = self._queue(max_workers=1)
+
+        running = queue.submit(1, time.sleep, 0.2)
+        waiting = queue.submit(2, time.sleep, 0)
+        await asyncio.sleep(0)
+
+        self.assertEqual(queue.position(waiting), 1)
+        self.assertEqual(queue.stats()['running'], 1)
+        self.assertFalse(queue.cancel(waiting.id, user_id=1))
+        self.assertTrue(queue.cancel(waiting.id, user_id=2))
+
+        self.assertIsNone(await waiting.wait())
+        self.assertEqual(waiting.state, CANCELLED)
+        await running.wait()
+        self.assertEqual(queue.stats()['cancelled'], 1)
+        self.assertFalse(queue.cancel(running.id))
+
+    async def test_queue_full(self):
+        """Сверх max_queued ожидающих задач очередь не принимает"""
+        queue = self._queue(max_workers=1, max_queued=1)
+
+        running = queue.submit(1, time.sleep, 0.2)
+        await asyncio.sleep(0)
+        waiting = queue.submit(2, time.sleep, 0)
+
+        with self.assertRaises(ReportQueueFullError):
+            queue.submit(3, time.sleep, 0)
+        self.assertEqual(queue.stats()['max_queue_depth'], 1)
+
+        await asyncio.gather(running.wait(), waiting.wait())
+
+    async def test_cancel_running_job_cleans_result(self):
+        """Результат задачи, отмененной во время выполнения, уходит в cleanup"""
+        discarded = []
+        queue = self._queue(max_workers=1, cleanup=discarded.append)
+
+        job = queue.submit(1, time.sleep, 0.3)
+        # Даем пулу передать задачу процессу, чтобы ее уже нельзя было снять
+        await asyncio.sleep(0.1)
+        queue.cancel(job.id)
+        self.assertIsNone(await job.wait())
+
+        for _ in range(100):
+            if discarded:
+                break
+            await asyncio.sleep(0.05)
+        self.assertEqual(discarded, [None])
+
+    async def test_build_employee_report(self):
+        """Отчет строится процессом-исполнителем по его собственной БД"""
+        db = Database(self.test_db_path)
+        emp_id = db.add_employee("Процессов Петр")
+        db.add_material_to_employee(emp_id, fiber_meters=100, twisted_pair_meters=50)
+        db.close()
+        queue = self._queue(max_workers=1)
+
+        small = await queue.submit(
+            1, build_employee_report, emp_id, "Процессов Петр", "Все время",
+            datetime(2020, 1, 1), datetime(2100, 1, 1), 1024 * 1024
+        ).wait()
+        empty = await queue.submit(
+            1, build_employee_report, emp_id, "Процессов Петр", "Прошлое",
+            datetime(2000, 1, 1), datetime(2000, 12, 31), 1024 * 1024
+        ).wait()
+
+        self.assertIsNone(empty)
+        self.assertIsNone(small.path)
+        self.assertEqual(small.stats['total_movements'], 2)
+        self.assertTrue(small.filename.startswith("report_Процессов_Петр_"))
+        with small.open() as file:
+            self.assertEqual(file.read(2), b'PK')
+        self.assertEqual([name for name in os.listdir('.') if name.endswith('.xlsx')], [])
+
+    async def test_build_all_employees_report(self):
+        """Общий отчет по всем сотрудникам строится тем же пулом"""
+        db = Database(self.test_db_path)
+        for name in ("Первый Петр", "Второй Иван"):
+            db.add_material_to_employee(db.add_employee(name), fiber_meters=100)
+        db.close()
+        queue = self._queue(max_workers=1)
+
+        result = await queue.submit(
+            1, build_all_employees_report, "Все время",
+            datetime(2020, 1, 1), datetime(2100, 1, 1), 1024 * 1024
+        ).wait()
+
+        self.assertEqual(result.stats['total_employees'], 2)
+        self.assertTrue(result.filename.startswith("report_Все_сотрудники_"))
+
+    async def test_build_employee_report_spills_to_disk(self):
+        """Книга больше порога передается через временный файл вне рабочего каталога"""
+        db = Database(self.test_db_path)
+        emp_id = db.add_employee("Дисков Денис")
+        db.add_material_to_employee(emp_id, fiber_meters=100, twisted_pair_meters=50)
+        db.close()
+        queue = self._queue(max_workers=1)
+
+        result = await queue.submit(
+            1, build_employee_report, emp_id, "Дисков Денис", "Все время",
+            datetime(2020, 1, 1), datetime(2100, 1, 1), 1
+        ).wait()
+
+        self.assertIsNone(result.content)
+        self.assertNotEqual(os.path.dirname(os.path.abspath(result.path)), os.getcwd())
+        with result.open() as file:
+            self.assertEqual(file.read(2), b'PK')
+        discard_report_file(result)
+        self.assertFalse(os.path.exists(result.path))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
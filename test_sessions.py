@@ -0,0 +1,91 @@
+"""
+Тесты для очистки брошенных диалогов (sessions.py)
+"""
+import unittest
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application
+
+from sessions import SessionSweeper, deep_sizeof
+
+
+class FakeClock:
+    """Управляемое время"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _update(user_id: int) -> Update:
+    """Сообщение пользователя в личном чате"""
+    message = Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=user_id, type=Chat.PRIVATE),
+        from_user=User(id=user_id, first_name='Монтажник', is_bot=False),
+        text='ул. Ленина, 1'
+    )
+    return Update(update_id=user_id, message=message)
+
+
+class TestSessionSweeper(unittest.IsolatedAsyncioTestCase):
+    """Тесты вытеснения user_data и chat_data"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.application = Application.builder().token('1:test').build()
+        self.sweeper = SessionSweeper(ttl=100, clock=self.clock)
+
+    def _draft(self, user_id: int) -> None:
+        """Черновик подключения в user_data и запись в chat_data"""
+        self.application.user_data[user_id]['photos'] = ['p1', 'p2']
+        self.application.chat_data[user_id]['seen'] = True
+
+    async def test_idle_data_evicted(self):
+        """Данные пользователя без активности дольше ttl удаляются"""
+        self._draft(1)
+        self._draft(2)
+        await self.sweeper.touch(_update(1), None)
+
+        self.clock.now = 60
+        await self.sweeper.touch(_update(2), None)
+
+        self.clock.now = 150
+        stats = self.sweeper.sweep(self.application)
+
+        self.assertEqual(list(self.application.user_data), [2])
+        self.assertEqual(list(self.application.chat_data), [2])
+        self.assertEqual((stats['evicted_users'], stats['evicted_chats']), (1, 1))
+        self.assertEqual((stats['users'], stats['tracked']), (1, 2))
+
+    async def test_restored_data_kept_for_ttl(self):
+        """Данные без отметок активности (восстановленные из БД) живут ttl с момента запуска"""
+        self._draft(3)
+
+        self.clock.now = 50
+        self.sweeper.sweep(self.application)
+        self.assertIn(3, self.application.user_data)
+
+        self.clock.now = 101
+        self.sweeper.sweep(self.application)
+        self.assertNotIn(3, self.application.user_data)
+
+    def test_footprint(self):
+        """Объем данных учитывает вложенные значения"""
+        small = deep_sizeof({'photos': []})
+        large = deep_sizeof({'photos': ['AgACAgIAAxkBAAI' + str(i) * 40 for i in range(50)]})
+
+        self.assertGreater(large, small + 50 * 40)
+
+    def test_invalid_ttl(self):
+        """Нулевой ttl отклоняется"""
+        with self.assertRaises(ValueError):
+            SessionSweeper(ttl=0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,95 @@
+"""
+Тесты для параллельной обработки обновлений (update_processor.py)
+"""
+import asyncio
+import unittest
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+
+from update_processor import ChatOrderedUpdateProcessor, sequence_key
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    """Текстовое сообщение от пользователя в личном чате"""
+    user = User(id=chat_id, first_name='Монтажник', is_bot=False)
+    message = Message(
+        message_id=update_id,
+        date=datetime.now(),
+        chat=Chat(id=chat_id, type=Chat.PRIVATE),
+        from_user=user,
+        text=str(update_id)
+    )
+    return Update(update_id=update_id, message=message)
+
+
+class TestChatOrderedUpdateProcessor(unittest.IsolatedAsyncioTestCase):
+    """Тесты порядка и параллельности обработки"""
+
+    async def asyncSetUp(self):
+        self.processor = ChatOrderedUpdateProcessor(concurrency=2, max_pending=16)
+        await self.processor.initialize()
+        self.log = []
+
+    async def asyncTearDown(self):
+        await self.processor.shutdown()
+
+    async def _handle(self, update: Update, delay: float) -> None:
+        self.log.append(('start', update.update_id))
+        await asyncio.sleep(delay)
+        self.log.append(('end', update.update_id))
+
+    def _submit(self, update: Update, delay: float = 0.01) -> asyncio.Task:
+        """Обработка в отдельной задаче, как это делает Application"""
+        return asyncio.create_task(self.processor.process_update(update, self._handle(update, delay)))
+
+    async def test_same_chat_in_order(self):
+        """Обновления одного чата обрабатываются по одному и по порядку"""
+        delays = [0.05, 0.01, 0.03, 0]
+        await asyncio.gather(*(self._submit(_update(i, 42), delay) for i, delay in enumerate(delays)))
+
+        expected = []
+        for i in range(len(delays)):
+            expected += [('start', i), ('end', i)]
+        self.assertEqual(self.log, expected)
+
+    async def test_different_chats_in_parallel(self):
+        """Обновления разных чатов не ждут друг друга"""
+        await asyncio.gather(self._submit(_update(1, 1), 0.05), self._submit(_update(2, 2), 0.01))
+
+        self.assertEqual(self.log[:2], [('start', 1), ('start', 2)])
+        self.assertLess(self.log.index(('end', 2)), self.log.index(('end', 1)))
+
+    async def test_concurrency_limit(self):
+        """Одновременно выполняется не больше concurrency обработчиков"""
+        await asyncio.gather(*(self._submit(_update(i, i), 0.02) for i in range(6)))
+
+        stats = self.processor.stats()
+        self.assertEqual(stats['max_active'], 2)
+        self.assertEqual(stats['processed'], 6)
+        self.assertEqual(stats['chats'], 0)
+
+    async def test_waiting_updates_do_not_take_slots(self):
+        """Очередь одного чата не занимает слоты, нужные другим чатам"""
+        album = [self._submit(_update(i, 42), 0.05) for i in range(5)]
+        await asyncio.sleep(0)
+        other = self._submit(_update(100, 7), 0)
+
+        await asyncio.wait_for(other, 0.04)
+        self.assertIn(('end', 100), self.log)
+        self.assertNotIn(('end', 1), self.log)
+        await asyncio.gather(*album)
+
+    def test_sequence_key(self):
+        """Порядок соблюдается по чату; прочие объекты не упорядочиваются"""
+        self.assertEqual(sequence_key(_update(1, 42)), 42)
+        self.assertIsNone(sequence_key('custom update'))
+
+    def test_invalid_concurrency(self):
+        """Нулевой лимит отклоняется"""
+        with self.assertRaises(ValueError):
+            ChatOrderedUpdateProcessor(concurrency=0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
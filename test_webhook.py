@@ -0,0 +1,158 @@
+"""
+Тесты для режима webhook (webhook.py)
+"""
+import asyncio
+import json
+import socket
+import unittest
+import urllib.error
+import urllib.request
+
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+from telegram.request import BaseRequest
+
+from webhook import WebhookConfigError, webhook_options
+
+BOT_USER = {'id': 123, 'is_bot': True, 'first_name': 'Test', 'username': 'test_bot'}
+
+
+class FakeBotApi(BaseRequest):
+    """Отвечает на вызовы Bot API без обращения к сети и запоминает их"""
+
+    def __init__(self):
+        self.calls = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        name = url.rsplit('/', 1)[1]
+        self.calls[name] = request_data.parameters if request_data else {}
+        result = BOT_USER if name == 'getMe' else True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _post(url: str, payload: dict, secret_token: str) -> int:
+    """POST обновления, как его отправляет Telegram; возвращает HTTP-статус"""
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': secret_token}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class TestWebhookOptions(unittest.TestCase):
+    """Тесты параметров webhook"""
+
+    def test_options(self):
+        """Путь добавляется к публичному адресу и к локальному серверу"""
+        options = webhook_options('https://bot.example.com/', port=9000, path='/hook/', secret_token='abc_1-2')
+
+        self.assertEqual(options['webhook_url'], 'https://bot.example.com/hook')
+        self.assertEqual(options['url_path'], 'hook')
+        self.assertEqual(options['port'], 9000)
+        self.assertEqual(options['secret_token'], 'abc_1-2')
+
+    def test_random_secret_token(self):
+        """Без заданного токена создается случайный допустимый"""
+        first = webhook_options('https://bot.example.com')['secret_token']
+        second = webhook_options('https://bot.example.com')['secret_token']
+
+        self.assertNotEqual(first, second)
+        self.assertRegex(first, r'^[A-Za-z0-9_-]+$')
+
+    def test_invalid_settings(self):
+        """Адрес без https и недопустимый токен отклоняются"""
+        with self.assertRaises(WebhookConfigError):
+            webhook_options('http://bot.example.com')
+        with self.assertRaises(WebhookConfigError):
+            webhook_options('https://bot.example.com', secret_token='with space')
+
+
+class TestWebhookServer(unittest.IsolatedAsyncioTestCase):
+    """Локальный сервер webhook принимает POST обновлений с верным токеном"""
+
+    async def asyncSetUp(self):
+        self.api = FakeBotApi()
+        self.application = (
+            Application.builder()
+            .token('123:TEST')
+            .request(self.api)
+            .get_updates_request(FakeBotApi())
+            .build()
+        )
+        self.received = asyncio.Queue()
+
+        async def remember(update: Update, context) -> None:
+            await self.received.put(update.effective_message.text)
+
+        self.application.add_handler(MessageHandler(filters.TEXT, remember))
+
+        self.port = _free_port()
+        self.options = webhook_options('https://bot.example.com', port=self.port, secret_token='s3cret')
+        await self.application.initialize()
+        await self.application.updater.start_webhook(**self.options)
+        await self.application.start()
+        self.url = f"http://127.0.0.1:{self.port}/{self.options['url_path']}"
+
+    async def asyncTearDown(self):
+        await self.application.updater.stop()
+        await self.application.stop()
+        await self.application.shutdown()
+
+    def _update(self, text: str) -> dict:
+        return {
+            'update_id': 1,
+            'message': {
+                'message_id': 1,
+                'date': 0,
+                'chat': {'id': 42, 'type': 'private'},
+                'from': {'id': 42, 'is_bot': False, 'first_name': 'Admin'},
+                'text': text
+            }
+        }
+
+    async def _post(self, payload: dict, secret_token: str) -> int:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _post, self.url, payload, secret_token)
+
+    async def test_webhook_registered_with_secret(self):
+        """При запуске webhook регистрируется в Telegram с секретным токеном"""
+        params = self.api.calls['setWebhook']
+
+        self.assertEqual(params['url'], 'https://bot.example.com/telegram')
+        self.assertEqual(params['secret_token'], 's3cret')
+
+    async def test_update_delivered(self):
+        """Обновление с верным токеном доходит до обработчика"""
+        status = await self._post(self._update('привет'), 's3cret')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(await asyncio.wait_for(self.received.get(), 5), 'привет')
+
+    async def test_wrong_secret_rejected(self):
+        """Запрос с неверным токеном отклоняется и не обрабатывается"""
+        status = await self._post(self._update('чужой'), 'wrong')
+
+        self.assertEqual(status, 403)
+        await asyncio.sleep(0.1)
+        self.assertTrue(self.received.empty())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
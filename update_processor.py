@@ -0,0 +1,119 @@
+"""
+Параллельная обработка обновлений с сохранением порядка внутри чата
+
+Обновления разных чатов обрабатываются одновременно (не больше заданного
+числа), а обновления одного чата - строго по очереди, в порядке
+поступления. ConversationHandler хранит состояние диалога по чату и
+пользователю, поэтому, например, альбом из десяти фото проходит шаг
+загрузки фото последовательно, а монтажники в разных чатах не ждут друг
+друга.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_PENDING = 256
+
+
+def sequence_key(update: object) -> Optional[Hashable]:
+    """
+    Ключ очереди, внутри которой обновления обрабатываются по порядку
+
+    Returns:
+        ID чата, ID пользователя для обновлений без чата (inline-запросы)
+        или None, если порядок не важен
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return ('user', update.effective_user.id)
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обработчик обновлений: параллельно между чатами, по порядку внутри чата
+
+    Базовый семафор BaseUpdateProcessor ограничивает число принятых, но еще
+    не обработанных обновлений (max_pending). Одновременно выполняется не
+    больше concurrency обработчиков; обновление, ожидающее предыдущее
+    обновление своего чата, слот не занимает, поэтому один активный чат не
+    тормозит остальные.
+    """
+
+    __slots__ = ('concurrency', '_slots', '_chat_locks', '_chat_waiters', '_counters')
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, max_pending: int = DEFAULT_MAX_PENDING):
+        """
+        Args:
+            concurrency: Максимум одновременно выполняемых обработчиков
+            max_pending: Максимум принятых в обработку обновлений, включая
+                         ожидающие своей очереди в чате (не меньше concurrency)
+
+        Raises:
+            ValueError: concurrency меньше 1
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency должно быть положительным")
+        # Больше 1, иначе Application обрабатывает обновления без отдельных задач
+        super().__init__(max(concurrency, max_pending, 2))
+        self.concurrency = concurrency
+        self._slots = asyncio.BoundedSemaphore(concurrency)
+        self._chat_locks: Dict[Hashable, asyncio.Lock] = {}
+        self._chat_waiters: Dict[Hashable, int] = {}
+        self._counters = {'processed': 0, 'active': 0, 'max_active': 0}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Дождаться предыдущих обновлений чата и свободного слота, затем обработать"""
+        key = sequence_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        lock = self._chat_locks.get(key)
+        if lock is None:
+            lock = self._chat_locks[key] = asyncio.Lock()
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                await self._run(coroutine)
+        finally:
+            # Очередь чата удаляется, когда в ней не осталось обновлений
+            self._chat_waiters[key] -= 1
+            if not self._chat_waiters[key]:
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        """Выполнить обработчик в одном из concurrency слотов"""
+        async with self._slots:
+            self._counters['active'] += 1
+            self._counters['max_active'] = max(self._counters['max_active'], self._counters['active'])
+            try:
+                await coroutine
+            finally:
+                self._counters['active'] -= 1
+                self._counters['processed'] += 1
+
+    async def initialize(self) -> None:
+        """Ресурсы не требуются"""
+        logger.info(
+            f"Обработка обновлений: до {self.concurrency} одновременно, "
+            f"по порядку внутри чата"
+        )
+
+    async def shutdown(self) -> None:
+        """Ресурсы не требуются"""
+
+    def stats(self) -> Dict[str, int]:
+        """Число чатов с обновлениями в работе и счетчики обработки"""
+        return {'chats': len(self._chat_locks), **self._counters}
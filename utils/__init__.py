@@ -2,7 +2,7 @@
 Пакет утилит
 """
 from .keyboards import get_main_keyboard
-from .helpers import send_connection_report
+from .helpers import send_connection_report, publish_connection_report
 
-__all__ = ['get_main_keyboard', 'send_connection_report']
+__all__ = ['get_main_keyboard', 'send_connection_report', 'publish_connection_report']
 
@@ -1,13 +1,17 @@
 """
 Вспомогательные функции
 """
-from typing import Dict, List
-from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Union
+from datetime import datetime, timezone
 import logging
 
-from telegram import InputMediaPhoto
+from telegram import InputMediaPhoto, Message
 
-from config import REPORTS_CHANNEL_ID, CONNECTION_TYPES
+from config import REPORTS_CHANNEL_IDS, REPORTS_CHANNELS_BY_TYPE, CONNECTION_TYPES
+from database.models import ConnectionRow
+
+if TYPE_CHECKING:
+    from handlers.connection.draft import ConnectionDraft
 
 logger = logging.getLogger(__name__)
 
@@ -23,18 +27,24 @@ def _create_media_group(photos: List[str], caption: str) -> List[InputMediaPhoto
     return media_group
 
 
-def _format_report_text(connection_id: int, data: Dict, employee_names: List[str]) -> str:
-    """Форматировать текст отчёта"""
-    conn_type = data.get('connection_type', 'mkd')
+def _format_report_text(connection_id: int, data: Union['ConnectionDraft', ConnectionRow],
+                        employee_names: List[str], created_at: Optional[datetime] = None) -> str:
+    """
+    Форматировать текст отчёта
+    
+    data - черновик из мастера или сохраненное подключение (поля совпадают),
+    created_at - дата подключения, по умолчанию сейчас
+    """
+    conn_type = data.connection_type
     type_name = CONNECTION_TYPES.get(conn_type, conn_type)
     
     emp_count = len(employee_names)
-    fiber_per_emp = round(data['fiber_meters'] / emp_count, 2)
-    twisted_per_emp = round(data['twisted_pair_meters'] / emp_count, 2)
+    fiber_per_emp = round(data.fiber_meters / emp_count, 2)
+    twisted_per_emp = round(data.twisted_pair_meters / emp_count, 2)
     
     # Получаем информацию о роутерах (если есть)
-    router_model = data.get('router_model', '-')
-    router_quantity = data.get('router_quantity', 1)
+    router_model = data.router_model
+    router_quantity = data.router_quantity
     
     # Если роутер пропущен или "-", отображаем "-"
     if router_model == '-' or not router_model:
@@ -45,25 +55,22 @@ def _format_report_text(connection_id: int, data: Dict, employee_names: List[str
         router_info += f" ({router_quantity} шт.)"
     
     # Получаем информацию о порте
-    port = data.get('port', '-')
-    port_display = port if port and port != '' else '-'
+    port_display = data.port or '-'
     
     # Получаем информацию о договоре
-    contract_signed = data.get('contract_signed', False)
-    contract_status = "✅ Подписан" if contract_signed else "❌ Не подписан"
+    contract_status = "✅ Подписан" if data.contract_signed else "❌ Не подписан"
     
     # Получаем информацию о доступе на роутер
-    router_access = data.get('router_access', False)
-    router_access_status = "✅ Получен" if router_access else "⏭️ Пропущено"
+    router_access_status = "✅ Получен" if data.router_access else "⏭️ Пропущено"
     
     # Получаем информацию о Телеграмм Боте
-    telegram_bot_connected = data.get('telegram_bot_connected', False)
+    telegram_bot_connected = data.telegram_bot_connected
     telegram_bot_status = "✅ Подключен" if telegram_bot_connected else "-"
     
     return f"""
 <b>📋 ОТЧЕТ О ПОДКЛЮЧЕНИИ #{connection_id}</b>
 
-<b>📍 Адрес:</b> {data['address']}
+<b>📍 Адрес:</b> {data.address}
 <b> Тип подключения:</b> {type_name}
 <b> Модель роутера:</b> {router_info}
 <b> Доступ на роутер:</b> {router_access_status}
@@ -72,8 +79,8 @@ def _format_report_text(connection_id: int, data: Dict, employee_names: List[str
 <b> Порт:</b> {port_display}
 
 <b>📏 Проложенный кабель:</b>
-  • ВОЛС: {data['fiber_meters']} м
-  • Витая пара: {data['twisted_pair_meters']} м
+  • ВОЛС: {data.fiber_meters} м
+  • Витая пара: {data.twisted_pair_meters} м
 
 <b>👥 Исполнители ({emp_count}):</b>
 {chr(10).join(['  • ' + name for name in employee_names])}
@@ -82,17 +89,29 @@ def _format_report_text(connection_id: int, data: Dict, employee_names: List[str
   • ВОЛС: {fiber_per_emp} м
   • Витая пара: {twisted_per_emp} м
 
-<b>📅 Дата подключения:</b> {datetime.now().strftime('%d.%m.%Y %H:%M')}
+<b>📅 Дата подключения:</b> {(created_at or datetime.now()).strftime('%d.%m.%Y %H:%M')}
 """
 
 
-async def send_connection_report(message, connection_id: int, data: Dict, photos: List[str], 
-                                 employee_ids: List[int], db) -> None:
-    """Отправить красиво отформатированный отчет о подключении с фотографиями"""
+def report_channels(connection_type: str) -> List[int]:
+    """Каналы для отчета о подключении: общие и для его типа, без повторов"""
+    channels = REPORTS_CHANNEL_IDS + REPORTS_CHANNELS_BY_TYPE.get(connection_type, [])
+    return list(dict.fromkeys(channels))
+
+
+async def send_connection_report(message, connection_id: int, data: 'ConnectionDraft', photos: List[str], 
+                                 employee_ids: List[int], db) -> List[Message]:
+    """
+    Отправить красиво отформатированный отчет о подключении с фотографиями
+    
+    Returns:
+        Отправленные пользователю сообщения (для копирования в каналы
+        через publish_connection_report) или пустой список при ошибке
+    """
     try:
         # Получаем имена сотрудников
-        employees = db.get_all_employees()
-        employee_names = [emp['full_name'] for emp in employees if emp['id'] in employee_ids]
+        employees = await db.get_all_employees()
+        employee_names = [emp.full_name for emp in employees if emp.id in employee_ids]
         
         # Формируем текст отчета
         report_text = _format_report_text(connection_id, data, employee_names)
@@ -100,30 +119,86 @@ async def send_connection_report(message, connection_id: int, data: Dict, photos
         # Отправляем отчет пользователю
         if photos:
             media_group = _create_media_group(photos, report_text)
-            await message.reply_media_group(media=media_group)
+            sent = list(await message.reply_media_group(media=media_group))
             logger.info(f"Отправлен отчет #{connection_id} пользователю с {len(photos)} фото")
         else:
-            await message.reply_text(report_text, parse_mode='HTML')
+            sent = [await message.reply_text(report_text, parse_mode='HTML')]
             logger.info(f"Отправлен отчет #{connection_id} пользователю без фото")
+        return sent
         
-        # Отправляем отчет в канал, если он настроен
-        if REPORTS_CHANNEL_ID:
-            try:
-                bot = message.get_bot()
-                if photos:
-                    media_group = _create_media_group(photos, report_text)
-                    await bot.send_media_group(chat_id=REPORTS_CHANNEL_ID, media=media_group)
-                    logger.info(f"Отчет #{connection_id} отправлен в канал с {len(photos)} фото")
-                else:
-                    await bot.send_message(chat_id=REPORTS_CHANNEL_ID, text=report_text, parse_mode='HTML')
-                    logger.info(f"Отчет #{connection_id} отправлен в канал без фото")
-            except Exception as channel_error:
-                logger.error(f"Ошибка при отправке отчета в канал: {channel_error}")
-            
     except Exception as e:
         logger.error(f"Ошибка при отправке отчета о подключении: {e}")
         await message.reply_text(
             "⚠️ Отчет создан, но возникла ошибка при отправке фотографий.",
             parse_mode='HTML'
         )
+        return []
+
+
+async def publish_connection_report(outbound, connection_id: int, messages: Sequence[Message]) -> int:
+    """
+    Отправить в каналы отчет, уже поставленный в очередь при создании подключения
+    
+    Отчеты для каналов записываются в outbox в одной транзакции с
+    подключением и придерживаются, пока пользователь не получит свой
+    отчет. Здесь к ним привязываются отправленные пользователю сообщения:
+    каналы получают их копии (copyMessages) без повторной загрузки
+    фотографий. Если сообщений нет, отчет будет собран заново из БД.
+    
+    Returns:
+        Количество отчетов, готовых к отправке
+    """
+    payload = None
+    if messages:
+        payload = {
+            'from_chat_id': messages[0].chat_id,
+            'message_ids': [msg.message_id for msg in messages]
+        }
+    released = await outbound.db.release_connection_reports(connection_id, payload)
+    if released:
+        outbound.wake()
+        logger.info(f"Отчет #{connection_id} передан в очередь для {released} каналов")
+    return released
 
+
+def _local_time(created_at: str) -> datetime:
+    """Время из БД (UTC) в местном часовом поясе"""
+    return datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).astimezone()
+
+
+async def deliver_connection_report(bot, db, chat_id: int, params: Dict) -> None:
+    """
+    Доставить отчет о подключении в канал (обработчик очереди исходящих)
+    
+    Если к отчету привязаны сообщения пользователя, они копируются одним
+    вызовом copyMessages: альбом и подпись сохраняются. Иначе (бот
+    перезапустился до отправки пользователю) отчет собирается из БД
+    и отправляется по file_id фотографий.
+    
+    Raises:
+        LookupError: Подключение удалено
+    """
+    connection_id = params['connection_id']
+    if params.get('message_ids'):
+        await bot.copy_messages(
+            chat_id=chat_id,
+            from_chat_id=params['from_chat_id'],
+            message_ids=params['message_ids']
+        )
+        logger.info(f"Отчет #{connection_id} скопирован в канал {chat_id}")
+        return
+    
+    connection = await db.get_connection_by_id(connection_id)
+    if not connection:
+        raise LookupError(f"подключение #{connection_id} не найдено")
+    
+    employee_names = [emp.full_name for emp in connection.employees]
+    report_text = _format_report_text(
+        connection_id, connection, employee_names, _local_time(connection.created_at)
+    )
+    if connection.photos:
+        media_group = _create_media_group(connection.photos, report_text)
+        await bot.send_media_group(chat_id=chat_id, media=media_group)
+    else:
+        await bot.send_message(chat_id=chat_id, text=report_text, parse_mode='HTML')
+    logger.info(f"Отчет #{connection_id} собран из БД и отправлен в канал {chat_id}")
@@ -0,0 +1,75 @@
+"""
+Настройки режима webhook
+
+В режиме webhook Telegram сам присылает обновления POST-запросами на
+локальный HTTP-сервер бота (обычно за обратным прокси с TLS), поэтому
+бот не опрашивает getUpdates и получает обновления без задержки.
+Подлинность запросов проверяется по секретному токену в заголовке
+X-Telegram-Bot-Api-Secret-Token.
+"""
+import logging
+import re
+import secrets
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Допустимый секретный токен (ограничение Bot API)
+SECRET_TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,256}$')
+
+# Значения по умолчанию
+DEFAULT_LISTEN = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_PATH = 'telegram'
+DEFAULT_MAX_CONNECTIONS = 40
+
+
+class WebhookConfigError(ValueError):
+    """Некорректные настройки webhook"""
+
+
+def webhook_options(
+    url: str,
+    listen: str = DEFAULT_LISTEN,
+    port: int = DEFAULT_PORT,
+    path: str = DEFAULT_PATH,
+    secret_token: Optional[str] = None,
+    max_connections: int = DEFAULT_MAX_CONNECTIONS
+) -> Dict[str, Any]:
+    """
+    Собрать параметры Application.run_webhook / Updater.start_webhook
+
+    Args:
+        url: Публичный адрес, на который Telegram шлет обновления
+             (https://bot.example.com); путь path добавляется к нему
+        listen: Адрес локального HTTP-сервера
+        port: Порт локального HTTP-сервера
+        path: Путь webhook на локальном сервере и в публичном адресе
+        secret_token: Секретный токен; если не задан, создается случайный
+                      на время работы процесса
+        max_connections: Максимум одновременных соединений от Telegram
+
+    Returns:
+        Словарь именованных аргументов для run_webhook
+
+    Raises:
+        WebhookConfigError: Адрес не https или токен недопустим
+    """
+    if not url.startswith('https://'):
+        raise WebhookConfigError(f"Адрес webhook должен начинаться с https://: {url}")
+
+    if secret_token is None:
+        secret_token = secrets.token_urlsafe(32)
+        logger.info("Секретный токен webhook не задан, используется случайный")
+    elif not SECRET_TOKEN_PATTERN.match(secret_token):
+        raise WebhookConfigError("Секретный токен webhook: 1-256 символов A-Z, a-z, 0-9, _ и -")
+
+    path = path.strip('/')
+    return {
+        'listen': listen,
+        'port': port,
+        'url_path': path,
+        'webhook_url': f"{url.rstrip('/')}/{path}",
+        'secret_token': secret_token,
+        'max_connections': max_connections,
+    }